@@ -0,0 +1,74 @@
+"""
+TFLBuilder node memory benchmark
+
+Builds a large synthetic flow and compares the memory held by the compact
+NodeRecord storage in ``builder.nodes`` against the same nodes materialized
+as plain JSON dicts (what ``build()`` hands to the packager).
+
+Usage:
+    python benchmarks/bench_builder_memory.py
+    python benchmarks/bench_builder_memory.py --nodes 50000 --csv-files 20
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from cwprep import TFLBuilder
+
+
+def build_flow(node_count: int, csv_files: int) -> TFLBuilder:
+    """Chain of calculations/filters fed by SQL and CSV-union inputs."""
+    builder = TFLBuilder(flow_name="Memory Benchmark", deterministic_ids=True)
+    conn = builder.add_connection("localhost", "root", "db")
+    file_conn = builder.add_file_connection("orders.csv")
+
+    prev = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+    files = [f"orders_{i}.csv" for i in range(csv_files)]
+    for i in range(node_count):
+        kind = i % 4
+        if kind == 0:
+            prev = builder.add_calculation(f"calc_{i}", prev, f"c{i}", "[amount] * 2")
+        elif kind == 1:
+            prev = builder.add_filter(f"filter_{i}", prev, "[amount] > 0")
+        elif kind == 2:
+            other = builder.add_input_csv_union(f"csv_{i}", file_conn, files)
+            prev = builder.add_union(f"union_{i}", [prev, other])
+        else:
+            prev = builder.add_keep_only(f"keep_{i}", prev, ["id", "amount"])
+    builder.add_output_server("out", prev, "DS")
+    return builder
+
+
+def measure(func):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = func()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def run(node_count: int, csv_files: int):
+    builder, compact_bytes = measure(lambda: build_flow(node_count, csv_files))
+    _plain, plain_bytes = measure(builder.nodes.to_dict)
+    print(f"{len(builder.nodes)} top-level nodes, {csv_files} files per CSV union")
+    print(f"builder (compact records): {compact_bytes / 1e6:>8.1f} MB")
+    print(f"materialized JSON dicts:   {plain_bytes / 1e6:>8.1f} MB")
+    print(f"ratio:                     {plain_bytes / compact_bytes:>8.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=20000,
+                        help="Number of transform steps to chain")
+    parser.add_argument("--csv-files", type=int, default=10,
+                        help="Files per add_input_csv_union input")
+    args = parser.parse_args()
+    run(args.nodes, args.csv_files)
+
+
+if __name__ == "__main__":
+    main()
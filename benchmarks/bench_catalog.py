@@ -0,0 +1,77 @@
+"""
+Flow catalog benchmark
+
+Writes a directory of small .tfl archives, then times the initial crawl,
+an unchanged refresh, a refresh after touching every file, and the catalog
+queries.
+
+Usage:
+    python benchmarks/bench_catalog.py
+    python benchmarks/bench_catalog.py --archives 2000 --workers 8
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from cwprep import TFLBuilder, TFLPackager
+from cwprep.catalog import FlowCatalog
+
+
+def write_archives(out_dir: str, count: int) -> None:
+    """Tenant flows: two inputs, a join, a calculation and an output each."""
+    for i in range(count):
+        builder = TFLBuilder(flow_name=f"tenant_{i}")
+        conn = builder.add_connection(host=f"db{i % 10}.local", username="etl", dbname="sales")
+        orders = builder.add_input_table("orders", f"orders_{i % 50}", conn, schema="sales")
+        users = builder.add_input_sql("users", f"SELECT * FROM crm.users_{i % 20}", conn)
+        join = builder.add_join("Join", orders, users, "user_id", "id")
+        calc = builder.add_calculation("Calc", join, "total", f"[amount] * {i}")
+        builder.add_output_server("Output", calc, f"Tenant {i}")
+        flow, display, meta = builder.build()
+        with contextlib.redirect_stdout(io.StringIO()):
+            TFLPackager.save_tfl(os.path.join(out_dir, f"tenant_{i}.tfl"), flow, display, meta)
+
+
+def timed(label: str, func):
+    start = time.perf_counter()
+    result = func()
+    print(f"{label:<32}{(time.perf_counter() - start) * 1000:>10.1f} ms")
+    return result
+
+
+def run(count: int, workers: int):
+    with tempfile.TemporaryDirectory() as out_dir:
+        flows = os.path.join(out_dir, "flows")
+        os.mkdir(flows)
+        write_archives(flows, count)
+        with FlowCatalog(os.path.join(out_dir, "catalog.sqlite")) as catalog:
+            report = timed(f"initial crawl ({workers} workers)",
+                           lambda: catalog.refresh([flows], workers=workers))
+            print(f"  {report.summary()}")
+            timed("unchanged refresh", lambda: catalog.refresh([flows], workers=workers))
+            for name in os.listdir(flows):
+                os.utime(os.path.join(flows, name))
+            report = timed("refresh after touch", lambda: catalog.refresh([flows], workers=workers))
+            print(f"  {report.summary()}")
+            timed("flows_reading_table", lambda: catalog.flows_reading_table("orders_7"))
+            timed("flows_publishing", lambda: catalog.flows_publishing("Tenant 42"))
+            timed("flows_using_connection", lambda: catalog.flows_using_connection("db3.local"))
+            timed("search_formulas", lambda: catalog.search_formulas("* 42"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--archives", type=int, default=500,
+                        help="Number of archives to write")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Refresh workers")
+    args = parser.parse_args()
+    run(args.archives, args.workers)
+
+
+if __name__ == "__main__":
+    main()
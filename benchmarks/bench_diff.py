@@ -0,0 +1,58 @@
+"""
+Structural flow diff benchmark
+
+Builds two independently generated versions of a flow (different UUIDs
+throughout) with a few edits in the second, and times diff_flows(), to check
+that identical subtrees are skipped and the cost stays linear.
+
+Usage:
+    python benchmarks/bench_diff.py
+    python benchmarks/bench_diff.py --nodes 5000 10000 --edits 50
+"""
+
+import argparse
+import time
+
+from cwprep import TFLBuilder
+from cwprep.diff import diff_flows
+
+
+def build_flow(node_count: int, edits: int):
+    """Flow of about node_count nodes; every (node_count // edits)th calc edited."""
+    builder = TFLBuilder(flow_name="Diff Benchmark")
+    conn = builder.add_connection("localhost", "root", "db")
+    step = max(1, (node_count // 4) // edits) if edits else 0
+    prev = builder.add_input_sql("base", "SELECT * FROM base", conn)
+    for i in range(node_count // 4):
+        side = builder.add_input_sql(f"side_{i}", f"SELECT * FROM side_{i}", conn)
+        prev = builder.add_join(f"join_{i}", prev, side, "id", "key")
+        offset = 1 if step and i % step == 0 else 0
+        prev = builder.add_calculation(f"calc_{i}", prev, f"c{i}", f"[s{i}] + {offset}")
+        prev = builder.add_rename(prev, {f"c{i}": f"r{i}"})
+    builder.add_output_server("out", prev, "DS")
+    return builder.build()[0]
+
+
+def run(sizes, edits: int):
+    print(f"{'nodes':>8}{'diff':>12}{'modified':>10}{'unchanged':>11}")
+    for size in sizes:
+        old, new = build_flow(size, 0), build_flow(size, edits)
+        start = time.perf_counter()
+        result = diff_flows(old, new)
+        seconds = time.perf_counter() - start
+        print(f"{len(new['nodes']):>8}{seconds * 1000:>9.1f} ms"
+              f"{len(result.modified):>10}{result.unchanged:>11}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[1000, 2000, 5000],
+                        help="Flow sizes to diff")
+    parser.add_argument("--edits", type=int, default=10,
+                        help="Calculations edited in the second flow")
+    args = parser.parse_args()
+    run(args.nodes, args.edits)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+ExpressionTranslator batch benchmark
+
+Translates a batch of formulas shaped like a real catalog, where the same
+value filters, quick-calc templates and ISNULL checks repeat constantly, and
+compares the regex and parser engines with and without the LRU cache.
+
+Usage:
+    python benchmarks/bench_expressions.py
+    python benchmarks/bench_expressions.py --count 200000
+"""
+
+import argparse
+import random
+import time
+
+from cwprep import TFLBuilder, ExpressionTranslator
+
+
+def make_formulas(count: int, distinct_columns: int = 50) -> list:
+    """Generate ``count`` formulas drawn from a small set of templates."""
+    rng = random.Random(42)
+    templates = [expr for _type, expr in TFLBuilder._QUICK_CALC_MAP.values()]
+    templates += [
+        "(([{col}] == 'East') OR ([{col}] == 'West')) AND NOT (ISNULL([{col}]))",
+        "NOT ISNULL([{col}])",
+        "IF [{col}] > 100 THEN 'High' ELSEIF [{col}] > 10 THEN 'Mid' ELSE 'Low' END",
+        "DATEADD('month', 3, DATETRUNC('month', [{col}]))",
+        "IIF(ZN([{col}]) > 0, [{col}] * 1.1, 0)",
+    ]
+    columns = [f"col_{i}" for i in range(distinct_columns)]
+    return [
+        rng.choice(templates).format(col=rng.choice(columns))
+        for _ in range(count)
+    ]
+
+
+def run(count: int):
+    formulas = make_formulas(count)
+    print(f"{count} formulas, {len(set(formulas))} distinct")
+    print(f"{'engine':>8}  {'cache':>6}  {'seconds':>8}  {'hits':>8}  {'misses':>8}")
+    for engine in ("regex", "parser"):
+        for cache_size in (0, 4096):
+            translator = ExpressionTranslator(engine=engine, cache_size=cache_size)
+            start = time.perf_counter()
+            for formula in formulas:
+                translator.translate(formula)
+            elapsed = time.perf_counter() - start
+            info = translator.cache_info()
+            print(
+                f"{engine:>8}  {cache_size:>6}  {elapsed:>8.3f}  "
+                f"{info.hits:>8}  {info.misses:>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--count", type=int, default=50000,
+                        help="Number of formulas to translate")
+    args = parser.parse_args()
+    run(args.count)
+
+
+if __name__ == "__main__":
+    main()
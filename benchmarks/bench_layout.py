@@ -0,0 +1,43 @@
+"""
+Layered layout benchmark
+
+Times layout.layered_layout on a large synthetic flow (the same generator as
+bench_builder_memory) and reports the canvas size it produces.
+
+Usage:
+    python benchmarks/bench_layout.py
+    python benchmarks/bench_layout.py --nodes 10000 --repeat 10
+"""
+
+import argparse
+import timeit
+
+from bench_builder_memory import build_flow
+from cwprep.layout import layered_layout
+
+
+def run(node_count: int, repeat: int):
+    builder = build_flow(node_count, csv_files=2)
+    nodes = builder.nodes.to_dict()
+    seconds = min(timeit.repeat(
+        lambda: layered_layout(nodes, builder.initial_nodes), number=1, repeat=repeat
+    ))
+    positions = layered_layout(nodes, builder.initial_nodes)
+    columns = max(x for x, _y in positions.values()) + 1
+    rows = max(y for _x, y in positions.values())
+    print(f"{len(nodes)} nodes -> {columns} columns x {rows} rows")
+    print(f"layered_layout: {seconds * 1000:>8.1f} ms (best of {repeat})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=8000,
+                        help="Number of transform steps to chain")
+    parser.add_argument("--repeat", type=int, default=5,
+                        help="Timing repetitions")
+    args = parser.parse_args()
+    run(args.nodes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Column lineage benchmark
+
+Builds flows of increasing size (a chain of joins, calculations, renames and
+aggregates over inputs with field metadata) and times FlowLineage
+construction plus tracing every output column, to check that the cost grows
+linearly with the node count.
+
+Usage:
+    python benchmarks/bench_lineage.py
+    python benchmarks/bench_lineage.py --nodes 1000 2000 4000 --fields 50
+"""
+
+import argparse
+import time
+
+from cwprep import TFLBuilder
+from cwprep.lineage import FlowLineage
+
+
+def build_flow(node_count: int, field_count: int):
+    """Flow of about node_count nodes; returns the flow JSON."""
+    builder = TFLBuilder(flow_name="Lineage Benchmark", deterministic_ids=True)
+    conn = builder.add_connection("localhost", "root", "db")
+    fields = {}
+    prev = builder.add_input_sql("base", "SELECT * FROM base", conn)
+    fields[prev] = ["id"] + [f"f{j}" for j in range(field_count)]
+    for i in range(node_count // 4):
+        side = builder.add_input_sql(f"side_{i}", f"SELECT * FROM side_{i}", conn)
+        fields[side] = ["key", f"s{i}"]
+        prev = builder.add_join(f"join_{i}", prev, side, "id", "key")
+        prev = builder.add_calculation(f"calc_{i}", prev, f"c{i}", f"[s{i}] + [f{i % field_count}]")
+        prev = builder.add_rename(prev, {f"c{i}": f"r{i}"})
+    prev = builder.add_aggregate("agg", prev, ["id"], [
+        {"field": f"r{i}", "function": "SUM"} for i in range(0, node_count // 4, 7)
+    ])
+    builder.add_output_server("out", prev, "DS")
+    flow = builder.build()[0]
+    for node_id, names in fields.items():
+        flow["nodes"][node_id]["fields"] = [{"name": name} for name in names]
+    return flow
+
+
+def run(sizes, field_count: int):
+    print(f"{'nodes':>8}{'build+trace':>14}{'edges':>10}{'us/node':>10}")
+    for size in sizes:
+        flow = build_flow(size, field_count)
+        start = time.perf_counter()
+        lineage = FlowLineage(flow)
+        traced = sum(
+            len(lineage.sources(node_id, column))
+            for node_id in lineage.outputs()
+            for column in lineage.columns(node_id)
+        )
+        edges = lineage.edges()
+        seconds = time.perf_counter() - start
+        node_count = len(flow["nodes"])
+        print(f"{node_count:>8}{seconds * 1000:>11.1f} ms{len(edges):>10}"
+              f"{seconds / node_count * 1e6:>10.1f}  ({traced} source columns)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, nargs="+", default=[500, 1000, 2000, 4000],
+                        help="Flow sizes to trace")
+    parser.add_argument("--fields", type=int, default=30,
+                        help="Fields of the base input")
+    args = parser.parse_args()
+    run(args.nodes, args.fields)
+
+
+if __name__ == "__main__":
+    main()
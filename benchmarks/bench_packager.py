@@ -0,0 +1,84 @@
+"""
+TFLPackager data-file packaging benchmark
+
+Builds a .tflx embedding many CSV files (the shape produced by
+add_input_csv_union) and compares wall time and archive size at several
+deflate levels.
+
+Usage:
+    python benchmarks/bench_packager.py
+    python benchmarks/bench_packager.py --files 48 --size-mb 32 --compresslevel 1 6 9
+"""
+
+import argparse
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from cwprep import TFLPackager
+
+
+def make_csv_files(directory: str, count: int, size_mb: float) -> list:
+    """Write ``count`` CSV files of roughly ``size_mb`` MiB each."""
+    rng = random.Random(42)
+    regions = ["East", "West", "North", "South", "Central"]
+    target = int(size_mb * 1024 * 1024)
+    paths = []
+    for i in range(count):
+        path = os.path.join(directory, f"orders_{i:03d}.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("order_id,region,amount,order_date\n")
+            written = 0
+            row_id = 0
+            while written < target:
+                line = (
+                    f"{row_id},{rng.choice(regions)},{rng.randint(1, 99999) / 100},"
+                    f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}\n"
+                )
+                f.write(line)
+                written += len(line)
+                row_id += 1
+        paths.append(path)
+    return paths
+
+
+def run(files: int, size_mb: float, levels: list):
+    work_dir = tempfile.mkdtemp(prefix="cwprep_bench_")
+    try:
+        sources = make_csv_files(work_dir, files, size_mb)
+        docs = ({"nodes": {}}, {"flowDisplaySettings": {}}, {"flowEntryName": "flow"})
+        print(f"{files} files x {size_mb} MiB")
+        print(f"{'level':>8}  {'seconds':>8}  {'MiB':>8}")
+
+        for level in levels:
+            output = os.path.join(work_dir, f"bench_{level}.tflx")
+            start = time.perf_counter()
+            TFLPackager.save_tflx(
+                output, *docs,
+                data_files={"conn-1": sources},
+                compresslevel=level,
+            )
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(output) / (1024 * 1024)
+            print(f"{level:>8}  {elapsed:>8.3f}  {size:>8.1f}")
+            os.unlink(output)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--files", type=int, default=24,
+                        help="Number of CSV files to embed")
+    parser.add_argument("--size-mb", type=float, default=8,
+                        help="Approximate size of each CSV file in MiB")
+    parser.add_argument("--compresslevel", type=int, nargs="+", default=[1, 6, 9],
+                        help="Deflate levels 0-9 to compare")
+    args = parser.parse_args()
+    run(args.files, args.size_mb, args.compresslevel)
+
+
+if __name__ == "__main__":
+    main()
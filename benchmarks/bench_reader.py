@@ -0,0 +1,97 @@
+"""
+Lazy flow reader benchmark
+
+Writes a .tfl whose nodes carry bulky field metadata, then compares reading
+it with json.loads on the whole flow entry against FlowDocument queries
+(node headers, one node by ID) for time and peak traced memory.
+
+Usage:
+    python benchmarks/bench_reader.py
+    python benchmarks/bench_reader.py --nodes 2000 --fields 400
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+import zipfile
+
+from bench_builder_memory import build_flow
+from cwprep import TFLPackager
+from cwprep.reader import HAS_IJSON, FlowDocument
+
+
+def write_archive(path: str, node_count: int, field_count: int) -> None:
+    """Flow from bench_builder_memory with field metadata on every node."""
+    flow, display, meta = build_flow(node_count, csv_files=2).build()
+    for node in flow["nodes"].values():
+        node["fields"] = [
+            {"name": f"column_{i}", "type": "string", "collation": "LEN_RUS_S2",
+             "caption": f"Column {i} of {node['name']}", "ordinal": i}
+            for i in range(field_count)
+        ]
+    with contextlib.redirect_stdout(io.StringIO()):
+        TFLPackager.save_tfl(path, flow, display, meta, compact=True)
+
+
+def measure(func):
+    """Result, seconds and peak traced bytes (timed without tracing)."""
+    gc.collect()
+    start = time.perf_counter()
+    func()
+    seconds = time.perf_counter() - start
+    gc.collect()
+    tracemalloc.start()
+    result = func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def load_whole(path: str):
+    with zipfile.ZipFile(path) as zf, zf.open("flow") as fp:
+        return json.loads(fp.read())
+
+
+def run(node_count: int, field_count: int):
+    with tempfile.TemporaryDirectory() as out_dir:
+        path = os.path.join(out_dir, "big.tfl")
+        write_archive(path, node_count, field_count)
+        with zipfile.ZipFile(path) as zf:
+            size = zf.getinfo("flow").file_size
+        flow, seconds, peak = measure(lambda: load_whole(path))
+        target = list(flow["nodes"])[len(flow["nodes"]) // 2]
+        del flow
+        print(f"flow entry: {size / 1e6:.1f} MB, {node_count + 2}+ nodes")
+        print(f"{'json.loads (whole flow)':<32}{seconds:>8.2f} s {peak / 1e6:>9.1f} MB peak")
+
+        backends = ["python"] + (["ijson"] if HAS_IJSON else [])
+        for backend in backends:
+            # Fresh documents each call: headers() is cached after one scan
+            _headers, seconds, peak = measure(
+                lambda: FlowDocument(path, backend=backend).headers()
+            )
+            print(f"{'headers() [' + backend + ']':<32}{seconds:>8.2f} s {peak / 1e6:>9.1f} MB peak")
+            _node, seconds, peak = measure(
+                lambda: FlowDocument(path, backend=backend).node(target)
+            )
+            print(f"{'node(id) [' + backend + ']':<32}{seconds:>8.2f} s {peak / 1e6:>9.1f} MB peak")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--nodes", type=int, default=1000,
+                        help="Number of transform steps to chain")
+    parser.add_argument("--fields", type=int, default=300,
+                        help="Field metadata entries per node")
+    args = parser.parse_args()
+    run(args.nodes, args.fields)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Flow template instantiation benchmark
+
+Writes one .tfl per tenant by replaying the builder for each tenant, then by
+instantiating a compiled FlowTemplate with save_many, in-process and across
+worker processes.
+
+Usage:
+    python benchmarks/bench_template.py
+    python benchmarks/bench_template.py --steps 400 --tenants 3000 --workers 8
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+from cwprep import TFLBuilder, TFLPackager
+from cwprep.template import FlowTemplate
+
+
+def build_tenant(steps: int, schema: str, tenant: str, datasource: str) -> TFLBuilder:
+    """Two tenant tables joined, then a chain of calculations and filters."""
+    builder = TFLBuilder(flow_name="Tenant Flow")
+    conn = builder.add_connection("db.local", "etl", "sales")
+    orders = builder.add_input_table("orders", "orders", conn, schema=schema)
+    customers = builder.add_input_table("customers", "customers", conn, schema=schema)
+    prev = builder.add_join("join", orders, customers, "customer_id", "id")
+    prev = builder.add_filter("tenant", prev, f"[tenant] == '{tenant}'")
+    for i in range(steps):
+        if i % 2:
+            prev = builder.add_filter(f"filter_{i}", prev, f"[c{i - 1}] > 0")
+        else:
+            prev = builder.add_calculation(f"calc_{i}", prev, f"c{i}", "[amount] * 2")
+    builder.add_output_server("out", prev, datasource)
+    return builder
+
+
+def tenant_values(count: int):
+    return [
+        {"schema": f"tenant_{i}", "tenant": f"T{i}", "datasource": f"Orders T{i}"}
+        for i in range(count)
+    ]
+
+
+def run(steps: int, tenants: int, workers: int):
+    values_list = tenant_values(tenants)
+    with tempfile.TemporaryDirectory() as out_dir:
+        jobs = [
+            (os.path.join(out_dir, f"{values['schema']}.tfl"), values)
+            for values in values_list
+        ]
+
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for path, values in jobs:
+                TFLPackager.save_tfl(path, *build_tenant(steps, **values).build())
+        replay = time.perf_counter() - start
+
+        start = time.perf_counter()
+        p = FlowTemplate.param
+        template = FlowTemplate.from_builder(
+            build_tenant(steps, p("schema"), p("tenant"), p("datasource"))
+        )
+        compile_seconds = time.perf_counter() - start
+
+        timings = {}
+        for count in sorted({1, workers}):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                template.save_many(jobs, workers=count)
+            timings[count] = time.perf_counter() - start
+
+    print(f"{tenants} tenants x {steps + 5} nodes, {template.id_count} IDs per flow")
+    print(f"replay builder + save_tfl: {replay:>8.2f} s")
+    print(f"compile template:          {compile_seconds * 1000:>8.1f} ms")
+    for count, seconds in timings.items():
+        label = f"save_many ({count} worker{'s' if count > 1 else ''}):"
+        print(f"{label:<27}{seconds:>8.2f} s  ({replay / seconds:.1f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--steps", type=int, default=200,
+                        help="Transform steps per flow")
+    parser.add_argument("--tenants", type=int, default=500,
+                        help="Number of flows to create")
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Processes for save_many")
+    args = parser.parse_args()
+    run(args.steps, args.tenants, args.workers)
+
+
+if __name__ == "__main__":
+    main()
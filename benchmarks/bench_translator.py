@@ -0,0 +1,71 @@
+"""
+SQLTranslator scaling benchmark
+
+Generates flows of increasing size (inputs joined pairwise, each branch
+followed by a chain of clean steps, everything unioned into one output) and
+times ``SQLTranslator.translate_flow``. With the parent/child index built once
+per flow, time per node should stay roughly flat from 100 to 50,000 nodes.
+
+Usage:
+    python benchmarks/bench_translator.py
+    python benchmarks/bench_translator.py --sizes 100 1000 10000
+"""
+
+import argparse
+import time
+
+from cwprep import TFLBuilder, SQLTranslator
+
+
+def build_flow(target_nodes: int) -> dict:
+    """Build a synthetic flow with roughly ``target_nodes`` nodes."""
+    builder = TFLBuilder(flow_name=f"Bench {target_nodes}")
+    conn_id = builder.add_connection("localhost", "root", "bench")
+
+    # Each branch: 2 inputs + 1 join + 6 clean steps = 9 nodes
+    branch_size = 9
+    branches = max(2, target_nodes // branch_size)
+    tails = []
+    for b in range(branches):
+        left = builder.add_input_table(f"orders_{b}", f"orders_{b}", conn_id)
+        right = builder.add_input_table(f"customers_{b}", f"customers_{b}", conn_id)
+        node = builder.add_join(f"Join {b}", left, right, "customer_id", "id")
+        node = builder.add_filter(f"Filter {b}", node, "[Amount] > 100")
+        node = builder.add_calculation(f"Calc {b}", node, "tax", "[Amount] * 0.1")
+        node = builder.add_rename(node, {"tax": f"tax_{b}"})
+        node = builder.add_keep_only(f"Keep {b}", node, ["id", "Amount", f"tax_{b}"])
+        node = builder.add_value_filter(f"Region {b}", node, "Region", ["East", "West"])
+        node = builder.add_remove_columns(f"Drop {b}", node, ["id"])
+        tails.append(node)
+
+    union = builder.add_union("Union All", tails)
+    builder.add_output_server("Output", union, "Bench_DS")
+    flow, _display, _meta = builder.build()
+    return flow
+
+
+def run(sizes):
+    translator = SQLTranslator(include_comments=False, include_summary=False)
+    print(f"{'nodes':>8}  {'seconds':>9}  {'us/node':>9}")
+    for size in sizes:
+        flow = build_flow(size)
+        node_count = len(flow["nodes"])
+        start = time.perf_counter()
+        translator.translate_flow(flow)
+        elapsed = time.perf_counter() - start
+        print(f"{node_count:>8}  {elapsed:>9.3f}  {elapsed / node_count * 1e6:>9.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+",
+        default=[100, 1000, 5000, 10000, 50000],
+        help="Approximate node counts to benchmark",
+    )
+    args = parser.parse_args()
+    run(args.sizes)
+
+
+if __name__ == "__main__":
+    main()
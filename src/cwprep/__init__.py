@@ -19,6 +19,9 @@ from .builder import TFLBuilder
 from .packager import TFLPackager
 from .translator import SQLTranslator
 from .expression_translator import ExpressionTranslator
+from .template import FlowTemplate
+from .lineage import FlowLineage, CrossFlowLineage
+from .diff import FlowDiff, diff_flows
 from .config import (
     TFLConfig, 
     DatabaseConfig, 
@@ -34,6 +37,12 @@ __all__ = [
     "TFLPackager", 
     "SQLTranslator",
     "ExpressionTranslator",
+    "FlowTemplate",
+    "FlowDocument",
+    "FlowLineage",
+    "CrossFlowLineage",
+    "FlowDiff",
+    "diff_flows",
     "TFLConfig", 
     "DatabaseConfig", 
     "TableauServerConfig", 
@@ -42,5 +51,15 @@ __all__ = [
     "__version__"
 ]
 
+
+def __getattr__(name):
+    # FlowDocument is imported on first use, like diff / lineage do, so
+    # importing cwprep does not load the streaming reader
+    if name == "FlowDocument":
+        from .reader import FlowDocument
+        return FlowDocument
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 # MCP Server is available via `cwprep.mcp_server` (requires `pip install cwprep[mcp]`)
 # Usage: cwprep-mcp  or  python -m cwprep.mcp_server
@@ -15,11 +15,17 @@ Usage:
     flow, display, meta = builder.build()
 """
 
+import json
 import os
+import shutil
 import uuid
-from typing import Optional, List, Dict, Any, Union as TypingUnion
+import zipfile
+from typing import Optional, List, Dict, Any, Tuple, Union as TypingUnion
 
 from .config import TFLConfig, DEFAULT_CONFIG, DatabaseConfig
+from .layout import extend_layout, layered_layout
+from .records import NodeStore
+from .optimizer import FlowOptimizer, OptimizationReport
 
 
 # ---------------------------------------------------------------------------
@@ -70,6 +76,30 @@ _DB_PROFILES: Dict[str, Dict[str, Any]] = {
 }
 
 
+# Canvas colors by _node_order type
+_NODE_COLORS = {
+    "input": {"hexCss": "#EFC637", "rgba": ["239", "198", "55", "1"]},
+    "join": {"hexCss": "#499893", "rgba": ["73", "152", "147", "1"]},
+    "output": {"hexCss": "#E76E50", "rgba": ["231", "110", "80", "1"]},
+    "default": {"hexCss": "#3D7FA6", "rgba": ["61", "127", "166", "1"]},
+}
+
+# _node_order type of loaded nodes, by nodeType (inputs/outputs go by baseType)
+_LOADED_NODE_TYPES = {
+    ".v2018_2_3.SuperJoin": "join",
+    ".v2018_2_3.SuperUnion": "union",
+    ".v2018_3_3.SuperPivot": "pivot",
+    ".v2018_2_3.SuperUnpivot": "unpivot",
+    ".v2018_2_3.SuperAggregate": "aggregate",
+}
+
+# Top-level flow fields the builder generates itself on build()
+_BUILT_FLOW_FIELDS = (
+    "initialNodes", "nodes", "connections", "connectionIds",
+    "nodeProperties", "documentId", "obfuscatorId",
+)
+
+
 class TFLBuilder:
     """
     TFL Builder
@@ -77,24 +107,130 @@ class TFLBuilder:
     Args:
         flow_name: Flow name, displayed in Tableau Prep
         config: TFL config object, defaults to DEFAULT_CONFIG
+        deterministic_ids: If True, mint IDs with uuid5 over the flow name and a
+            per-kind sequence number instead of uuid4, so the same sequence of
+            add_* calls always yields the same IDs (and, packaged with
+            reproducible=True, the same archive bytes). A string is used as the
+            seed instead of the flow name.
+        intern_connections: If True (default), add_connection and
+            add_file_connection return the existing ID when called again with
+            the same normalized attributes, so the flow carries one connection
+            per distinct source. Pass False to always create a new connection.
     """
     
-    def __init__(self, flow_name: str = "Untitled Flow", config: Optional[TFLConfig] = None):
+    def __init__(
+        self,
+        flow_name: str = "Untitled Flow",
+        config: Optional[TFLConfig] = None,
+        deterministic_ids: TypingUnion[bool, str] = False,
+        intern_connections: bool = True,
+    ):
         self.flow_name = flow_name
         self.config = config or DEFAULT_CONFIG
-        
-        self.nodes: Dict[str, Any] = {}
+        self.intern_connections = intern_connections
+
+        # ID minting: uuid4 by default, uuid5(seed namespace, "kind:n") when deterministic
+        self._id_namespace: Optional[uuid.UUID] = None
+        self._id_counters: Dict[str, int] = {}
+        if deterministic_ids:
+            seed = deterministic_ids if isinstance(deterministic_ids, str) else flow_name
+            self._id_namespace = uuid.uuid5(uuid.NAMESPACE_URL, f"cwprep:{seed}")
+        
+        # Node dicts are compacted into NodeRecords on assignment (see records.py)
+        self.nodes: Dict[str, Any] = NodeStore()
         self.initial_nodes: List[str] = []
         self.connections: Dict[str, Any] = {}
+        # Reverse edge index: child_id -> [(parent_id, nextNamespace)], kept in
+        # step with nextNodes by _link/_unlink
+        self._parents: Dict[str, List[Tuple[str, str]]] = {}
+        self._connection_keys: Dict[tuple, str] = {}
         self.node_properties: Dict[str, Any] = {}
-        self.doc_id = str(uuid.uuid4())
-        self.obfuscator_id = str(uuid.uuid4())
+        self.doc_id = self._new_id("document")
+        self.obfuscator_id = self._new_id("obfuscator")
         self.features = {"document.v2019_1_3.Flow", "nodeProperty.v2019_1_3.PrimaryKey"}
         
         # Layout tracking
         self._node_order: List[Dict] = []
         self._input_count = 0
 
+        # Set by from_tfl(): canvas entries of loaded nodes (kept as-is), other
+        # flow / display fields to write back, and extracted packaged files
+        self._node_display: Dict[str, Any] = {}
+        self._loaded_flow_fields: Dict[str, Any] = {}
+        self._loaded_display_fields: Dict[str, Any] = {}
+        self._loaded_display_settings: Dict[str, Any] = {}
+        self.data_files: Dict[str, List[str]] = {}
+
+        # Report of the last optimize() run
+        self.optimization_report: Optional[OptimizationReport] = None
+
+    def _new_id(self, kind: str = "node") -> str:
+        """
+        Mint a new ID for a document, connection, node, action or namespace
+        
+        Args:
+            kind: ID category; each kind keeps its own sequence in deterministic mode
+            
+        Returns:
+            str: UUID string
+        """
+        if self._id_namespace is None:
+            return str(uuid.uuid4())
+        seq = self._id_counters.get(kind, 0) + 1
+        self._id_counters[kind] = seq
+        return str(uuid.uuid5(self._id_namespace, f"{kind}:{seq}"))
+
+    @staticmethod
+    def _connection_key(attrs: Dict[str, Any], is_packaged: bool,
+                        source: Optional[str] = None) -> tuple:
+        """
+        Normalized, hashable identity of a connection's attributes
+
+        Args:
+            source: Identity not kept in the attributes, e.g. the full path
+                    of a packaged file (whose attributes hold only its basename)
+        """
+        normalized = []
+        for key, value in attrs.items():
+            if isinstance(value, str):
+                value = value.strip()
+                if key in ("server", "class"):
+                    value = value.lower()
+                elif key in ("filename", "directory") and value:
+                    value = os.path.normcase(os.path.normpath(value))
+            normalized.append((key, value))
+        return (is_packaged, tuple(sorted(normalized)), source)
+
+    def _register_connection(self, name: str, attrs: Dict[str, Any], is_packaged: bool,
+                             source: Optional[str] = None) -> str:
+        """
+        Store a connection, or return the ID of an identical one when interning
+        
+        Args:
+            source: Extra identity for interning (see _connection_key)
+
+        Returns:
+            str: Connection ID
+        """
+        key = None
+        if self.intern_connections:
+            key = self._connection_key(attrs, is_packaged, source)
+            existing = self._connection_keys.get(key)
+            if existing in self.connections:
+                return existing
+
+        conn_id = self._new_id("connection")
+        self.connections[conn_id] = {
+            "connectionType": ".v1.SqlConnection",
+            "id": conn_id,
+            "name": name,
+            "isPackaged": is_packaged,
+            "connectionAttributes": attrs
+        }
+        if key is not None:
+            self._connection_keys[key] = conn_id
+        return conn_id
+
     def add_connection(
         self, 
         host: str, 
@@ -121,9 +257,8 @@ class TFLBuilder:
             
         Returns:
             str: Connection ID, used by subsequent input nodes
+            (the existing ID if an identical connection was already added)
         """
-        conn_id = str(uuid.uuid4())
-        
         # Resolve defaults from config
         default_db = self.config.database or DatabaseConfig()
         actual_class = db_class or default_db.db_class or "mysql"
@@ -165,14 +300,7 @@ class TFLBuilder:
         if actual_class == "sqlserver":
             connection_attrs[":protocol-clone-parent"] = ""
         
-        self.connections[conn_id] = {
-            "connectionType": ".v1.SqlConnection",
-            "id": conn_id,
-            "name": host,
-            "isPackaged": False,
-            "connectionAttributes": connection_attrs
-        }
-        return conn_id
+        return self._register_connection(host, connection_attrs, is_packaged=False)
 
     def add_connection_from_config(self) -> str:
         """
@@ -197,7 +325,25 @@ class TFLBuilder:
             authentication=db.authentication,
         )
 
-    def add_input_sql(self, name: str, sql: str, connection_id: str) -> str:
+    @staticmethod
+    def _input_fields(fields: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict[str, Any]]]:
+        """Field metadata of a database input, or None (Prep reads it on open)"""
+        if not fields:
+            return None
+        return [
+            {
+                "name": f["name"],
+                "type": f.get("type", "string"),
+                "collation": f.get("collation"),
+                "caption": f.get("caption", ""),
+                "ordinal": i,
+                "isGenerated": False,
+            }
+            for i, f in enumerate(fields)
+        ]
+
+    def add_input_sql(self, name: str, sql: str, connection_id: str,
+                      fields: List[Dict[str, Any]] = None) -> str:
         """
         Add SQL input node
         
@@ -205,11 +351,14 @@ class TFLBuilder:
             name: Node name (usually table name)
             sql: SQL query statement
             connection_id: Database connection ID
+            fields: Optional list of the query's columns, each dict has:
+                    {"name": str, "type": str}. Declaring them lets the
+                    fold_joins optimizer pass fold joins on this input.
             
         Returns:
             str: Node ID, used by subsequent operations
         """
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self._input_count += 1
         self._node_order.append({"id": node_id, "type": "input", "y_hint": self._input_count})
         
@@ -224,7 +373,7 @@ class TFLBuilder:
             "baseType": "input", "nextNodes": [], "serialize": False, "description": None,
             "connectionId": connection_id, 
             "connectionAttributes": {"dbname": dbname},
-            "fields": None, "actions": [], "debugModeRowLimit": None,
+            "fields": self._input_fields(fields), "actions": [], "debugModeRowLimit": None,
             "originalDataTypes": {}, "randomSampling": None,
             "updateTimestamp": None,
             "restrictedFields": {}, "userRenamedFields": {},
@@ -236,7 +385,7 @@ class TFLBuilder:
         return node_id
 
     def add_input_table(self, name: str, table_name: str, connection_id: str,
-                        schema: str = None) -> str:
+                        schema: str = None, fields: List[Dict[str, Any]] = None) -> str:
         """
         Add table input node (direct table connection, no custom SQL)
         
@@ -246,11 +395,12 @@ class TFLBuilder:
             connection_id: Database connection ID
             schema: Table schema prefix (e.g. "dbo" for SQL Server).
                     When provided, table reference becomes [schema].[table].
+            fields: Optional list of the table's columns, as in add_input_sql
             
         Returns:
             str: Node ID, used by subsequent operations
         """
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self._input_count += 1
         self._node_order.append({"id": node_id, "type": "input", "y_hint": self._input_count})
         
@@ -271,7 +421,7 @@ class TFLBuilder:
             "baseType": "input", "nextNodes": [], "serialize": False, "description": None,
             "connectionId": connection_id, 
             "connectionAttributes": {"dbname": dbname},
-            "fields": None, "actions": [], "debugModeRowLimit": None,
+            "fields": self._input_fields(fields), "actions": [], "debugModeRowLimit": None,
             "originalDataTypes": {}, "randomSampling": None,
             "updateTimestamp": None,
             "restrictedFields": {}, "userRenamedFields": {},
@@ -306,9 +456,8 @@ class TFLBuilder:
             
         Returns:
             str: Connection ID, used by subsequent input nodes
+            (the existing ID if an identical connection was already added)
         """
-        conn_id = str(uuid.uuid4())
-
         # Auto-detect class from file extension
         if file_class == "auto":
             lower = filename.lower()
@@ -325,12 +474,15 @@ class TFLBuilder:
         # Determine display name (always basename)
         base_name = os.path.basename(filename)
 
+        source = None
         if is_packaged:
-            # Packaged (tflx): store only basename
+            # Packaged (tflx): store only basename, but intern by full path so
+            # same-named files from different directories stay separate
             connection_attrs = {
                 "filename": base_name,
                 "class": file_class,
             }
+            source = os.path.normcase(os.path.abspath(filename))
         else:
             # Non-packaged (tfl): store full path + directory
             full_path = os.path.abspath(filename)
@@ -341,14 +493,7 @@ class TFLBuilder:
                 "directory": directory,
             }
 
-        self.connections[conn_id] = {
-            "connectionType": ".v1.SqlConnection",
-            "id": conn_id,
-            "name": base_name,
-            "isPackaged": is_packaged,
-            "connectionAttributes": connection_attrs,
-        }
-        return conn_id
+        return self._register_connection(base_name, connection_attrs, is_packaged, source)
 
     def add_input_excel(
         self,
@@ -370,7 +515,7 @@ class TFLBuilder:
         Returns:
             str: Node ID, used by subsequent operations
         """
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self._input_count += 1
         self._node_order.append({"id": node_id, "type": "input", "y_hint": self._input_count})
 
@@ -445,7 +590,7 @@ class TFLBuilder:
         Returns:
             str: Node ID, used by subsequent operations
         """
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self._input_count += 1
         self._node_order.append({"id": node_id, "type": "input", "y_hint": self._input_count})
 
@@ -532,7 +677,7 @@ class TFLBuilder:
         if len(file_names) < 1:
             raise ValueError("csv_union requires at least 1 file name")
 
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self._input_count += 1
         self._node_order.append({"id": node_id, "type": "input", "y_hint": self._input_count})
 
@@ -552,7 +697,7 @@ class TFLBuilder:
         # Build generated inputs (one LoadCsv per file)
         generated_inputs = []
         for fname in file_names:
-            sub_node_id = str(uuid.uuid4())
+            sub_node_id = self._new_id("node")
             # Build per-file fields (same structure)
             sub_fields = []
             if fields:
@@ -652,7 +797,7 @@ class TFLBuilder:
         Returns:
             str: Join node ID
         """
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self.features.add("node.v2018_2_3.SuperJoin")
         self._node_order.append({"id": node_id, "type": "join"})
         
@@ -691,14 +836,14 @@ class TFLBuilder:
             "beforeActionAnnotations": [],
             "afterActionAnnotations": [],
             "actionNode": {
-                "nodeType": ".v1.SimpleJoin", "name": name, "id": str(uuid.uuid4()),
+                "nodeType": ".v1.SimpleJoin", "name": name, "id": self._new_id("action"),
                 "baseType": "transform", "nextNodes": [], "serialize": False, "description": None,
                 "conditions": conditions,
                 "joinType": join_type
             }
         }
-        self.nodes[left_id]["nextNodes"].append({"namespace": "Default", "nextNodeId": node_id, "nextNamespace": "Left"})
-        self.nodes[right_id]["nextNodes"].append({"namespace": "Default", "nextNodeId": node_id, "nextNamespace": "Right"})
+        self._link(left_id, node_id, "Left")
+        self._link(right_id, node_id, "Right")
         return node_id
 
     def add_union(
@@ -719,23 +864,19 @@ class TFLBuilder:
         if len(parent_ids) < 2:
             raise ValueError("Union requires at least 2 data sources")
         
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self._node_order.append({"id": node_id, "type": "union"})
         
         # Create unique namespace for each input
         namespace_mappings = []
         for parent_id in parent_ids:
-            namespace_id = f"Union-Namespace-{str(uuid.uuid4())}"
+            namespace_id = f"Union-Namespace-{self._new_id('namespace')}"
             namespace_mappings.append({
                 "namespaceName": namespace_id,
                 "fieldMappings": {}
             })
             # Connect upstream node to union node
-            self.nodes[parent_id]["nextNodes"].append({
-                "namespace": "Default",
-                "nextNodeId": node_id,
-                "nextNamespace": namespace_id
-            })
+            self._link(parent_id, node_id, namespace_id)
         
         self.nodes[node_id] = {
             "nodeType": ".v2018_2_3.SuperUnion",
@@ -750,7 +891,7 @@ class TFLBuilder:
             "actionNode": {
                 "nodeType": ".v1.SimpleUnion",
                 "name": name,
-                "id": str(uuid.uuid4()),
+                "id": self._new_id("action"),
                 "baseType": "transform",
                 "nextNodes": [],
                 "serialize": False,
@@ -785,7 +926,7 @@ class TFLBuilder:
         Returns:
             str: Pivot node ID
         """
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self._node_order.append({"id": node_id, "type": "pivot"})
         
         self.nodes[node_id] = {
@@ -801,7 +942,7 @@ class TFLBuilder:
             "actionNode": {
                 "nodeType": ".v2018_3_3.Pivot",
                 "name": f"{pivot_column} 1",
-                "id": str(uuid.uuid4()),
+                "id": self._new_id("action"),
                 "baseType": "transform",
                 "nextNodes": [],
                 "serialize": False,
@@ -814,11 +955,7 @@ class TFLBuilder:
             }
         }
         
-        self.nodes[parent_id]["nextNodes"].append({
-            "namespace": "Default",
-            "nextNodeId": node_id,
-            "nextNamespace": "Default"
-        })
+        self._link(parent_id, node_id)
         return node_id
 
     def add_unpivot(
@@ -842,7 +979,7 @@ class TFLBuilder:
         Returns:
             str: Unpivot node ID
         """
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self._node_order.append({"id": node_id, "type": "unpivot"})
         
         # Build unpivotGroups
@@ -876,7 +1013,7 @@ class TFLBuilder:
             "actionNode": {
                 "nodeType": ".v1.Unpivot",
                 "name": name,
-                "id": str(uuid.uuid4()),
+                "id": self._new_id("action"),
                 "baseType": "transform",
                 "nextNodes": [],
                 "serialize": False,
@@ -886,11 +1023,7 @@ class TFLBuilder:
             }
         }
         
-        self.nodes[parent_id]["nextNodes"].append({
-            "namespace": "Default",
-            "nextNodeId": node_id,
-            "nextNamespace": "Default"
-        })
+        self._link(parent_id, node_id)
         return node_id
 
     def add_output_server(
@@ -914,7 +1047,7 @@ class TFLBuilder:
         Returns:
             str: Output node ID
         """
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self._node_order.append({"id": node_id, "type": "output"})
         
         # Use passed parameters or config defaults
@@ -931,7 +1064,7 @@ class TFLBuilder:
             "datasourceDescription": "",
             "serverUrl": actual_server
         }
-        self.nodes[parent_id]["nextNodes"].append({"namespace": "Default", "nextNodeId": node_id, "nextNamespace": "Default"})
+        self._link(parent_id, node_id)
         return node_id
 
     def add_clean_step(
@@ -953,7 +1086,7 @@ class TFLBuilder:
         Returns:
             str: Clean step node ID
         """
-        node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
         self._node_order.append({"id": node_id, "type": "clean"})
         
         # Build inner nodes
@@ -963,7 +1096,7 @@ class TFLBuilder:
         
         if actions:
             for i, action in enumerate(actions):
-                action_node_id = str(uuid.uuid4())
+                action_node_id = self._new_id("action")
                 if i == 0:
                     initial_node_id = action_node_id
                 
@@ -1005,11 +1138,7 @@ class TFLBuilder:
             "providedParameters": None
         }
         
-        self.nodes[parent_id]["nextNodes"].append({
-            "namespace": "Default",
-            "nextNodeId": node_id,
-            "nextNamespace": "Default"
-        })
+        self._link(parent_id, node_id)
         return node_id
     
     def _create_action_node(self, action: Dict[str, Any], node_id: str) -> Dict[str, Any]:
@@ -1119,8 +1248,8 @@ class TFLBuilder:
         Returns:
             str: Node ID
         """
-        node_id = str(uuid.uuid4())
-        filter_node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
+        filter_node_id = self._new_id("action")
         self._node_order.append({"id": node_id, "type": "clean"})
         
         # Build filter expression with proper single quotes for string values
@@ -1179,11 +1308,7 @@ class TFLBuilder:
             "providedParameters": None
         }
         
-        self.nodes[parent_id]["nextNodes"].append({
-            "namespace": "Default",
-            "nextNodeId": node_id,
-            "nextNamespace": "Default"
-        })
+        self._link(parent_id, node_id)
         return node_id
     
     def add_calculation(
@@ -1209,8 +1334,8 @@ class TFLBuilder:
         Returns:
             str: Clean step node ID
         """
-        node_id = str(uuid.uuid4())
-        calc_node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
+        calc_node_id = self._new_id("action")
         self._node_order.append({"id": node_id, "type": "clean"})
         
         self.nodes[node_id] = {
@@ -1249,11 +1374,7 @@ class TFLBuilder:
             "providedParameters": None
         }
         
-        self.nodes[parent_id]["nextNodes"].append({
-            "namespace": "Default",
-            "nextNodeId": node_id,
-            "nextNamespace": "Default"
-        })
+        self._link(parent_id, node_id)
         return node_id
 
     # QuickCalc expression mapping
@@ -1422,8 +1543,8 @@ class TFLBuilder:
         Returns:
             str: Filter node ID
         """
-        node_id = str(uuid.uuid4())
-        filter_node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
+        filter_node_id = self._new_id("action")
         self._node_order.append({"id": node_id, "type": "clean"})
         
         self.nodes[node_id] = {
@@ -1461,11 +1582,7 @@ class TFLBuilder:
             "providedParameters": None
         }
         
-        self.nodes[parent_id]["nextNodes"].append({
-            "namespace": "Default",
-            "nextNodeId": node_id,
-            "nextNamespace": "Default"
-        })
+        self._link(parent_id, node_id)
         return node_id
     
     def add_aggregate(
@@ -1490,8 +1607,8 @@ class TFLBuilder:
         Returns:
             str: Aggregate step node ID
         """
-        node_id = str(uuid.uuid4())
-        action_node_id = str(uuid.uuid4())
+        node_id = self._new_id("node")
+        action_node_id = self._new_id("action")
         self._node_order.append({"id": node_id, "type": "aggregate"})
         self.features.add("node.v2018_2_3.SuperAggregate")
         
@@ -1540,57 +1657,389 @@ class TFLBuilder:
             }
         }
         
+        self._link(parent_id, node_id)
+        return node_id
+
+    # -----------------------------------------------------------------------
+    # Loading existing flows
+    # -----------------------------------------------------------------------
+
+    @classmethod
+    def from_tfl(
+        cls,
+        path: str,
+        config: Optional[TFLConfig] = None,
+        intern_connections: bool = True,
+        data_dir: Optional[str] = None,
+    ) -> "TFLBuilder":
+        """
+        Load an existing .tfl / .tflx archive into a builder for editing
+        
+        Only the metadata, flow and display settings entries are read; the
+        packaged files under Data/ stay in the archive unless data_dir is
+        given. Loaded nodes keep their canvas positions on build().
+        
+        Args:
+            path: Path to the .tfl / .tflx file
+            config: Configuration used for nodes and connections added later
+            intern_connections: Reuse loaded connections for identical add_*
+                                connection calls
+            data_dir: Extract packaged data files here, listed per connection
+                      in self.data_files (for TFLPackager.save_tflx)
+            
+        Returns:
+            TFLBuilder: Builder holding the loaded flow
+        """
+        with zipfile.ZipFile(path) as zf:
+            names = set(zf.namelist())
+            meta = cls._read_json_entry(zf, "maestroMetadata", names) or {}
+            flow = cls._read_json_entry(zf, meta.get("flowEntryName", "flow"), names)
+            if flow is None:
+                raise ValueError(f"No flow entry found in {path}")
+            display = cls._read_json_entry(
+                zf, meta.get("displaySettingsEntryName", "displaySettings"), names
+            ) or {}
+            data_files = cls._extract_data_files(zf, data_dir) if data_dir else {}
+
+        connections = flow.get("connections") or {}
+        flow_name = next(
+            (conn.get("connectionAttributes", {}).get(":flow-name")
+             for conn in connections.values()
+             if conn.get("connectionAttributes", {}).get(":flow-name")),
+            os.path.splitext(os.path.basename(path))[0],
+        )
+        builder = cls(flow_name=flow_name, config=config,
+                      intern_connections=intern_connections)
+        builder.doc_id = flow.get("documentId", builder.doc_id)
+        builder.obfuscator_id = flow.get("obfuscatorId", builder.obfuscator_id)
+        builder.initial_nodes = list(flow.get("initialNodes") or [])
+        builder.connections = dict(connections)
+        builder.node_properties = dict(flow.get("nodeProperties") or {})
+        builder.data_files = data_files
+        features = {
+            feature["id"] for feature in meta.get("documentFeaturesUsedInDocument", [])
+            if "id" in feature
+        }
+        if features:
+            builder.features = features
+
+        for node_id, node in (flow.get("nodes") or {}).items():
+            builder.nodes[node_id] = node
+            base_type = node.get("baseType")
+            if base_type in ("input", "output"):
+                node_type = base_type
+            else:
+                node_type = _LOADED_NODE_TYPES.get(node.get("nodeType"), "clean")
+            builder._node_order.append({"id": node_id, "type": node_type})
+            if node_type == "input":
+                builder._input_count += 1
+        builder._reindex_edges()
+
+        if intern_connections:
+            for conn_id, conn in builder.connections.items():
+                key = cls._connection_key(
+                    conn.get("connectionAttributes") or {}, conn.get("isPackaged", False)
+                )
+                builder._connection_keys.setdefault(key, conn_id)
+
+        builder._loaded_flow_fields = {
+            key: value for key, value in flow.items() if key not in _BUILT_FLOW_FIELDS
+        }
+        settings = dict(display.get("flowDisplaySettings") or {})
+        builder._node_display = dict(settings.pop("flowNodeDisplaySettings", None) or {})
+        builder._loaded_display_settings = settings
+        builder._loaded_display_fields = {
+            key: value for key, value in display.items() if key != "flowDisplaySettings"
+        }
+        return builder
+
+    @staticmethod
+    def _read_json_entry(zf: zipfile.ZipFile, name: str, names: set) -> Optional[Any]:
+        """Parse one JSON entry of an archive, or None if it is missing"""
+        if name not in names:
+            return None
+        with zf.open(name) as fp:
+            return json.load(fp)
+
+    @staticmethod
+    def _extract_data_files(zf: zipfile.ZipFile, data_dir: str) -> Dict[str, List[str]]:
+        """Stream Data/<connection_id>/<file> entries to data_dir/<connection_id>/"""
+        data_files: Dict[str, List[str]] = {}
+        for info in zf.infolist():
+            parts = info.filename.split("/")
+            if len(parts) < 3 or parts[0] != "Data" or info.is_dir():
+                continue
+            # Only the connection ID and base name are used, so entry names
+            # cannot point outside data_dir
+            conn_id = os.path.basename(parts[1])
+            file_name = os.path.basename(parts[-1])
+            if conn_id in ("", ".", "..") or file_name in ("", ".", ".."):
+                continue
+            target_dir = os.path.join(data_dir, conn_id)
+            os.makedirs(target_dir, exist_ok=True)
+            target = os.path.join(target_dir, file_name)
+            with zf.open(info) as src, open(target, "wb") as dest:
+                shutil.copyfileobj(src, dest, 1024 * 1024)
+            data_files.setdefault(conn_id, []).append(target)
+        return data_files
+
+    # -----------------------------------------------------------------------
+    # Graph editing
+    # -----------------------------------------------------------------------
+
+    def _require_node(self, node_id: str) -> None:
+        if node_id not in self.nodes:
+            raise ValueError(f"Unknown node ID: {node_id}")
+
+    def _link(
+        self,
+        parent_id: str,
+        child_id: str,
+        next_namespace: str = "Default",
+        namespace: str = "Default",
+    ) -> None:
+        """Add edge parent -> child and record it in the reverse index"""
         self.nodes[parent_id]["nextNodes"].append({
-            "namespace": "Default",
-            "nextNodeId": node_id,
-            "nextNamespace": "Default"
+            "namespace": namespace,
+            "nextNodeId": child_id,
+            "nextNamespace": next_namespace
         })
-        return node_id
+        self._parents.setdefault(child_id, []).append((parent_id, next_namespace))
 
-    def _calculate_layout(self) -> Dict[str, Any]:
-        """Calculate node layout"""
-        layout = {}
+    def _unlink(self, parent_id: str, child_id: str) -> List[Dict[str, Any]]:
+        """Remove every edge parent -> child; returns the removed links"""
+        links = self.nodes[parent_id]["nextNodes"]
+        removed = [link for link in links if link.get("nextNodeId") == child_id]
+        if removed:
+            links[:] = [link for link in links if link.get("nextNodeId") != child_id]
+            edges = [edge for edge in self._parents.get(child_id, ()) if edge[0] != parent_id]
+            if edges:
+                self._parents[child_id] = edges
+            else:
+                self._parents.pop(child_id, None)
+        return removed
+
+    def _reindex_edges(self) -> None:
+        """Rebuild the reverse edge index from nextNodes (after bulk rewrites)"""
+        parents: Dict[str, List[Tuple[str, str]]] = {}
+        for node_id, node in self.nodes.items():
+            for link in node.get("nextNodes") or []:
+                child_id = link.get("nextNodeId")
+                if child_id:
+                    parents.setdefault(child_id, []).append(
+                        (node_id, link.get("nextNamespace", ""))
+                    )
+        self._parents = parents
+
+    def parents_of(self, node_id: str) -> List[Tuple[str, str]]:
+        """
+        Get the edges pointing into a node
         
-        # Input nodes arranged vertically
-        input_nodes = [n for n in self._node_order if n["type"] == "input"]
-        for i, node_info in enumerate(input_nodes):
-            layout[node_info["id"]] = {
-                "color": {"hexCss": "#EFC637", "rgba": ["239", "198", "55", "1"]},
-                "position": {"x": 0, "y": i + 1},
-                "size": {"width": 1, "height": 1}
-            }
+        Args:
+            node_id: Node ID
+            
+        Returns:
+            List[Tuple[str, str]]: (parent_id, namespace) pairs, e.g. "Left"/"Right" for joins
+
+        Raises:
+            ValueError: If the node does not exist
+        """
+        self._require_node(node_id)
+        return list(self._parents.get(node_id, ()))
+
+    def children_of(self, node_id: str) -> List[Tuple[str, str]]:
+        """
+        Get the edges leaving a node
         
-        # Other nodes arranged horizontally
-        other_nodes = [n for n in self._node_order if n["type"] != "input"]
-        mid_y = len(input_nodes) // 2 + 1 if input_nodes else 1
+        Args:
+            node_id: Node ID
+            
+        Returns:
+            List[Tuple[str, str]]: (child_id, namespace) pairs
+
+        Raises:
+            ValueError: If the node does not exist
+        """
+        self._require_node(node_id)
+        return [
+            (link["nextNodeId"], link.get("nextNamespace", ""))
+            for link in self.nodes[node_id]["nextNodes"]
+        ]
+
+    def remove_node(self, node_id: str, reconnect: bool = False) -> None:
+        """
+        Remove a node and all of its edges
         
-        for i, node_info in enumerate(other_nodes):
-            if node_info["type"] == "join":
-                color = {"hexCss": "#499893", "rgba": ["73", "152", "147", "1"]}
-            elif node_info["type"] == "output":
-                color = {"hexCss": "#E76E50", "rgba": ["231", "110", "80", "1"]}
-            else:
-                color = {"hexCss": "#3D7FA6", "rgba": ["61", "127", "166", "1"]}
+        Args:
+            node_id: Node to remove
+            reconnect: If True, connect the node's single parent directly to the
+                       node's children (keeping their namespaces), e.g. to drop a
+                       step from the middle of a chain
+            
+        Raises:
+            ValueError: If the node does not exist, or reconnect is requested for
+                        a node that does not have exactly one parent
+        """
+        self._require_node(node_id)
+        parent_ids = list(dict.fromkeys(pid for pid, _ns in self.parents_of(node_id)))
+        if reconnect and len(parent_ids) != 1:
+            raise ValueError(
+                f"reconnect requires exactly one parent; node {node_id} has {len(parent_ids)}"
+            )
+
+        outgoing = list(self.nodes[node_id]["nextNodes"])
+        for parent_id in parent_ids:
+            self._unlink(parent_id, node_id)
+        for child_id in dict.fromkeys(link["nextNodeId"] for link in outgoing):
+            self._unlink(node_id, child_id)
+        if reconnect:
+            for link in outgoing:
+                self._link(parent_ids[0], link["nextNodeId"], link.get("nextNamespace", "Default"))
+
+        node = self.nodes.pop(node_id)
+        self.node_properties.pop(node_id, None)
+        if node.get("baseType") == "input" and node_id in self.initial_nodes:
+            self.initial_nodes.remove(node_id)
+        # Stale _node_order entries are skipped when the layout is calculated
+
+    def insert_between(self, parent_id: str, child_id: str, node_id: str) -> None:
+        """
+        Route the edge parent -> child through an existing node
+        
+        The node usually comes from an add_* call on ``parent_id``, e.g.
+        ``builder.insert_between(src, join, builder.add_filter("f", src, expr))``;
+        otherwise an edge parent -> node is added. The child keeps the namespace
+        (e.g. "Left") it had for the parent.
+        
+        Args:
+            parent_id: Upstream end of the edge
+            child_id: Downstream end of the edge
+            node_id: Node to insert
+            
+        Raises:
+            ValueError: If a node does not exist or there is no edge parent -> child
+        """
+        for nid in (parent_id, child_id, node_id):
+            self._require_node(nid)
+        if node_id in (parent_id, child_id):
+            raise ValueError("Cannot insert a node between itself and another node")
+        removed = self._unlink(parent_id, child_id)
+        if not removed:
+            raise ValueError(f"No edge from {parent_id} to {child_id}")
+
+        if all(pid != parent_id for pid, _ns in self._parents.get(node_id, ())):
+            self._link(parent_id, node_id)
+        for link in removed:
+            self._link(node_id, child_id, link.get("nextNamespace", "Default"))
+
+    def replace_parent(self, child_id: str, old_parent_id: str, new_parent_id: str) -> None:
+        """
+        Move the edge(s) old_parent -> child so they start at new_parent
+        
+        Args:
+            child_id: Node whose input is rewired
+            old_parent_id: Current parent
+            new_parent_id: Replacement parent (keeps the edge's namespace)
             
+        Raises:
+            ValueError: If a node does not exist or old_parent is not a parent of child
+        """
+        for nid in (child_id, old_parent_id, new_parent_id):
+            self._require_node(nid)
+        removed = self._unlink(old_parent_id, child_id)
+        if not removed:
+            raise ValueError(f"No edge from {old_parent_id} to {child_id}")
+        for link in removed:
+            self._link(
+                new_parent_id,
+                child_id,
+                link.get("nextNamespace", "Default"),
+                link.get("namespace", "Default"),
+            )
+
+    def _calculate_layout(self) -> Dict[str, Any]:
+        """Calculate node layout (layered left-to-right, see layout.py)
+
+        Nodes loaded by from_tfl() keep their canvas entries; only nodes added
+        since are placed.
+        """
+        if self._node_display:
+            fixed = {
+                node_id: (entry["position"]["x"], entry["position"]["y"])
+                for node_id, entry in self._node_display.items()
+                if "position" in entry
+            }
+            positions = extend_layout(self.nodes, fixed, self.initial_nodes)
+        else:
+            positions = layered_layout(self.nodes, self.initial_nodes)
+        layout = {}
+        for node_info in self._node_order:
+            position = positions.get(node_info["id"])
+            if position is None:
+                continue
+            loaded = self._node_display.get(node_info["id"])
+            if loaded is not None and "position" in loaded:
+                layout[node_info["id"]] = loaded
+                continue
             layout[node_info["id"]] = {
-                "color": color,
-                "position": {"x": i + 1, "y": mid_y},
+                "color": _NODE_COLORS.get(node_info["type"], _NODE_COLORS["default"]),
+                "position": {"x": position[0], "y": position[1]},
                 "size": {"width": 1, "height": 1}
             }
-        
         return layout
 
-    def build(self, is_packaged: bool = False) -> tuple:
+    def optimize(self, passes: Optional[List[str]] = None) -> OptimizationReport:
+        """
+        Rewrite the flow in place with optimizer passes (see optimizer.py)
+        
+        Args:
+            passes: Pass names to run, in order (defaults to
+                    FlowOptimizer.DEFAULT_PASSES, i.e. fuse_containers; pass
+                    FlowOptimizer.PASSES for every pass, including the ones
+                    that rewrite inputs as custom SQL)
+            
+        Returns:
+            OptimizationReport: What was changed; also kept on self.optimization_report
+        """
+        self.optimization_report = FlowOptimizer(self).run(passes)
+        return self.optimization_report
+
+    def prune_unreachable(self) -> List[str]:
+        """
+        Remove nodes that do not feed any output, and connections left unused
+        
+        Returns:
+            List[str]: Pruned node IDs (pruned connections are listed in
+                       self.optimization_report.pruned_connections)
+        """
+        self.optimization_report = FlowOptimizer(self).run(["prune_unreachable"])
+        return self.optimization_report.pruned_nodes
+
+    def build(
+        self,
+        is_packaged: bool = False,
+        materialize: bool = True,
+        optimize: bool = False,
+    ) -> tuple:
         """
         Build final TFL file components
         
         Args:
             is_packaged: If True, marks the flow as a packaged document (tflx)
                          and sets isPackaged=True on all file-based connections.
+            materialize: If False, flow["nodes"] is the builder's live node store
+                         (compact records) instead of a plain-dict copy. TFLPackager
+                         streams such a flow, materializing one node at a time.
+            optimize: If True, run optimize() with its default passes
+                      (clean-step fusion) first. This rewrites the builder
+                      itself; inputs are left unchanged.
         
         Returns:
             tuple: (flow, displaySettings, maestroMetadata) three JSON objects
         """
+        if optimize:
+            self.optimize()
+
         # When building for tflx, mark all file connections as packaged
         if is_packaged:
             for conn in self.connections.values():
@@ -1603,7 +2052,7 @@ class TFLBuilder:
         flow = {
             "parameters": {"parameters": {}},
             "initialNodes": self.initial_nodes,
-            "nodes": self.nodes,
+            "nodes": self.nodes.to_dict() if materialize else self.nodes,
             "connections": self.connections,
             "dataConnections": {},
             "connectionIds": connection_ids,
@@ -1616,6 +2065,7 @@ class TFLBuilder:
             "documentId": self.doc_id,
             "obfuscatorId": self.obfuscator_id
         }
+        flow.update(self._loaded_flow_fields)
         
         display = {
             "majorVersion": 1, "minorVersion": 0,
@@ -1626,6 +2076,8 @@ class TFLBuilder:
             },
             "hiddenColumns": []
         }
+        display.update(self._loaded_display_fields)
+        display["flowDisplaySettings"].update(self._loaded_display_settings)
         
         # Use version info from config
         v = {
@@ -0,0 +1,576 @@
+"""
+Flow Catalog
+
+Indexes directories of .tfl / .tflx archives into a local SQLite database so
+questions like "which flows read table X" or "which flows publish datasource
+Y" are answered by an indexed query instead of opening every archive.
+
+Indexed per archive:
+    nodes        id, name, nodeType, baseType
+    connections  class, server, dbname, username, filename
+    tables       tables read by inputs, and tables named in custom SQL
+                 (FROM / JOIN clauses, source = "sql")
+    custom_sql   input queries
+    formulas     calculation and filter expressions, inside clean steps too
+    outputs      datasource / project / server of output nodes
+
+Refreshes are incremental. An archive whose mtime and size match the index
+is skipped without being opened; otherwise the CRC32s of its JSON entries
+are read from the zip central directory (nothing is decompressed), and only
+archives whose JSON changed are re-indexed. Changed archives are parsed in
+worker processes with the streaming FlowDocument reader; rows are written by
+the parent in one transaction.
+
+Usage:
+    from cwprep.catalog import FlowCatalog
+
+    with FlowCatalog("flows.sqlite") as catalog:
+        report = catalog.refresh(["//share/flows"], workers=8)
+        catalog.flows_reading_table("orders", schema="sales")
+        catalog.flows_publishing("Orders Daily")
+
+    cwprep-catalog --db flows.sqlite refresh //share/flows --workers 8
+    cwprep-catalog --db flows.sqlite table orders
+"""
+
+import os
+import re
+import sqlite3
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .reader import FlowDocument
+
+
+ARCHIVE_EXTENSIONS = (".tfl", ".tflx")
+DEFAULT_CATALOG_PATH = "cwprep_catalog.sqlite"
+SCHEMA_VERSION = 1
+
+# Rows of each table; every row starts with the archive path
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS archives (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    flow_name TEXT,
+    node_count INTEGER,
+    error TEXT
+);
+CREATE TABLE IF NOT EXISTS nodes (
+    path TEXT NOT NULL, node_id TEXT, name TEXT, node_type TEXT, base_type TEXT
+);
+CREATE TABLE IF NOT EXISTS connections (
+    path TEXT NOT NULL, connection_id TEXT, class TEXT, server TEXT,
+    dbname TEXT, username TEXT, filename TEXT
+);
+CREATE TABLE IF NOT EXISTS tables (
+    path TEXT NOT NULL, node_id TEXT, connection_id TEXT,
+    schema_name TEXT, table_name TEXT, source TEXT
+);
+CREATE TABLE IF NOT EXISTS custom_sql (
+    path TEXT NOT NULL, node_id TEXT, connection_id TEXT, query TEXT
+);
+CREATE TABLE IF NOT EXISTS formulas (
+    path TEXT NOT NULL, node_id TEXT, action_id TEXT, kind TEXT,
+    column_name TEXT, expression TEXT
+);
+CREATE TABLE IF NOT EXISTS outputs (
+    path TEXT NOT NULL, node_id TEXT, node_type TEXT, name TEXT,
+    datasource_name TEXT, project_name TEXT, server_url TEXT
+);
+CREATE INDEX IF NOT EXISTS nodes_path ON nodes (path);
+CREATE INDEX IF NOT EXISTS connections_path ON connections (path);
+CREATE INDEX IF NOT EXISTS connections_server ON connections (server COLLATE NOCASE, dbname COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS tables_path ON tables (path);
+CREATE INDEX IF NOT EXISTS tables_name ON tables (table_name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS custom_sql_path ON custom_sql (path);
+CREATE INDEX IF NOT EXISTS formulas_path ON formulas (path);
+CREATE INDEX IF NOT EXISTS outputs_path ON outputs (path);
+CREATE INDEX IF NOT EXISTS outputs_datasource ON outputs (datasource_name COLLATE NOCASE);
+"""
+
+_ROW_TABLES = ("nodes", "connections", "tables", "custom_sql", "formulas", "outputs")
+
+# Table names after FROM / JOIN in custom SQL: [a].[b], `a`.`b`, "a"."b" or a.b
+_SQL_NAME_PART = r'(?:\[[^\]]+\]|`[^`]+`|"[^"]+"|[A-Za-z_][\w$]*)'
+_RE_SQL_TABLE = re.compile(
+    r"\b(?:FROM|JOIN)\s+(" + _SQL_NAME_PART + r"(?:\s*\.\s*" + _SQL_NAME_PART + r")*)",
+    re.IGNORECASE,
+)
+_RE_NAME_PART = re.compile(_SQL_NAME_PART)
+
+
+@dataclass
+class RefreshReport:
+    """What a FlowCatalog.refresh() run did"""
+    scanned: int = 0
+    # Skipped on mtime + size, without opening the archive
+    unchanged: int = 0
+    # mtime changed but the JSON entry CRCs did not
+    touched: int = 0
+    indexed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    # {"path": ..., "error": message}
+    failed: List[Dict[str, str]] = field(default_factory=list)
+
+    def summary(self) -> str:
+        return (
+            f"{self.scanned} archives: {len(self.indexed)} indexed, "
+            f"{self.unchanged + self.touched} unchanged, {len(self.removed)} removed, "
+            f"{len(self.failed)} failed"
+        )
+
+
+# ---------------------------------------------------------------------------
+# Extraction (runs in worker processes)
+# ---------------------------------------------------------------------------
+
+def archive_fingerprint(path: str) -> str:
+    """
+    CRC32 and size of every JSON entry, read from the zip central directory
+
+    Packaged data files under Data/ are left out: they are not indexed.
+    """
+    with zipfile.ZipFile(path) as zf:
+        return ";".join(
+            f"{info.filename}:{info.CRC:08x}:{info.file_size}"
+            for info in sorted(zf.infolist(), key=lambda info: info.filename)
+            if not info.filename.startswith("Data/")
+        )
+
+
+def split_table_name(reference: str) -> Tuple[Optional[str], str]:
+    """
+    Split "[schema].[table]" / "schema.table" / "table" into (schema, table)
+
+    Only the last two parts are kept (a database prefix is dropped).
+    """
+    parts = [
+        part.strip('[]`"') for part in _RE_NAME_PART.findall(reference or "")
+    ]
+    if not parts:
+        return None, reference or ""
+    if len(parts) == 1:
+        return None, parts[0]
+    return parts[-2], parts[-1]
+
+
+def sql_tables(query: str) -> List[Tuple[Optional[str], str]]:
+    """(schema, table) pairs named after FROM / JOIN in a SQL query"""
+    seen = []
+    for match in _RE_SQL_TABLE.finditer(query or ""):
+        pair = split_table_name(match.group(1))
+        if pair not in seen:
+            seen.append(pair)
+    return seen
+
+
+def _walk_actions(value: Any) -> Iterator[Dict[str, Any]]:
+    """Every nested mapping with a nodeType below a node (actions, container steps)"""
+    if isinstance(value, dict):
+        if "nodeType" in value:
+            yield value
+        for item in value.values():
+            if isinstance(item, (dict, list)):
+                yield from _walk_actions(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _walk_actions(item)
+
+
+def _node_rows(path: str, node_id: str, node: Dict[str, Any], rows: Dict[str, list]) -> None:
+    """Append the catalog rows of one top-level node"""
+    node_type = node.get("nodeType")
+    base_type = node.get("baseType")
+    rows["nodes"].append((path, node_id, node.get("name"), node_type, base_type))
+
+    relation = node.get("relation")
+    if not isinstance(relation, dict):
+        relation = {}
+    conn_id = node.get("connectionId")
+    if relation.get("type") == "table" and relation.get("table"):
+        schema, table = split_table_name(relation["table"])
+        rows["tables"].append((path, node_id, conn_id, schema, table, "table"))
+    elif relation.get("type") == "query" and relation.get("query"):
+        rows["custom_sql"].append((path, node_id, conn_id, relation["query"]))
+        for schema, table in sql_tables(relation["query"]):
+            rows["tables"].append((path, node_id, conn_id, schema, table, "sql"))
+
+    if base_type == "output":
+        rows["outputs"].append((
+            path, node_id, node_type, node.get("name"), node.get("datasourceName"),
+            node.get("projectName"), node.get("serverUrl"),
+        ))
+
+    for action in _walk_actions({key: value for key, value in node.items()
+                                 if key not in ("fields", "nextNodes")}):
+        if action is node:
+            continue
+        for key in ("expression", "filterExpression"):
+            if action.get(key):
+                rows["formulas"].append((
+                    path, node_id, action.get("id"), action.get("nodeType"),
+                    action.get("columnName"), action[key],
+                ))
+    for key in ("expression", "filterExpression"):
+        if node.get(key):
+            rows["formulas"].append((
+                path, node_id, node_id, node_type, node.get("columnName"), node[key],
+            ))
+
+
+def extract_archive(path: str) -> Dict[str, Any]:
+    """
+    Catalog rows of one archive, streamed with FlowDocument
+
+    Returns:
+        dict: {"fingerprint", "flow_name", "node_count", "rows": {table: [rows]}}
+    """
+    fingerprint = archive_fingerprint(path)
+    rows: Dict[str, list] = {table: [] for table in _ROW_TABLES}
+    doc = FlowDocument(path)
+    node_count = 0
+    for node_id, node in doc.iter_nodes():
+        _node_rows(path, node_id, node, rows)
+        node_count += 1
+
+    flow_name = None
+    for conn_id, conn in doc.connections.items():
+        attrs = conn.get("connectionAttributes") or {}
+        flow_name = flow_name or attrs.get(":flow-name")
+        rows["connections"].append((
+            path, conn_id, attrs.get("class"), attrs.get("server"),
+            attrs.get("dbname"), attrs.get("username"), attrs.get("filename"),
+        ))
+    return {
+        "fingerprint": fingerprint,
+        "flow_name": flow_name or os.path.splitext(os.path.basename(path))[0],
+        "node_count": node_count,
+        "rows": rows,
+    }
+
+
+def _extract_or_error(path: str) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+    """extract_archive() for a worker: errors are returned, not raised"""
+    try:
+        return path, extract_archive(path), None
+    # One malformed archive (bad zip, truncated stream, unexpected JSON shape)
+    # must not abort the whole refresh
+    except Exception as exc:
+        return path, None, f"{type(exc).__name__}: {exc}"
+
+
+def _fingerprint_or_none(path: str) -> Optional[str]:
+    try:
+        return archive_fingerprint(path)
+    except (OSError, zipfile.BadZipFile):
+        return None
+
+
+def iter_archives(roots: Iterable[str]) -> Iterator[os.DirEntry]:
+    """.tfl / .tflx files under the given directories (or the files themselves)"""
+    for root in roots:
+        if os.path.isfile(root):
+            directory = os.path.dirname(os.path.abspath(root))
+            for entry in os.scandir(directory):
+                if entry.path == os.path.abspath(root):
+                    yield entry
+            continue
+        stack = [os.path.abspath(root)]
+        while stack:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.name.lower().endswith(ARCHIVE_EXTENSIONS):
+                        yield entry
+
+
+# ---------------------------------------------------------------------------
+# Catalog
+# ---------------------------------------------------------------------------
+
+class FlowCatalog:
+    """
+    SQLite index of flow archives
+
+    Args:
+        db_path: SQLite database file (":memory:" for a throwaway index)
+    """
+
+    def __init__(self, db_path: str = DEFAULT_CATALOG_PATH):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError(
+                f"Catalog {db_path} has schema version {version}, expected {SCHEMA_VERSION}"
+            )
+        self.conn.executescript(_SCHEMA)
+        self.conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> "FlowCatalog":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    def refresh(self, roots: Iterable[str], workers: int = 1) -> RefreshReport:
+        """
+        Bring the index up to date with the archives under roots
+
+        Args:
+            roots: Directories (searched recursively) or archive paths
+            workers: Processes parsing changed archives, and threads reading
+                     zip directories (1 does everything in-process)
+
+        Returns:
+            RefreshReport
+        """
+        if not isinstance(workers, int) or isinstance(workers, bool) or workers < 1:
+            raise ValueError(f"workers must be a positive integer, got {workers!r}")
+        roots = [os.path.abspath(root) for root in roots]
+        report = RefreshReport()
+        known = {
+            path: (mtime_ns, size, fingerprint)
+            for path, mtime_ns, size, fingerprint in self.conn.execute(
+                "SELECT path, mtime_ns, size, fingerprint FROM archives"
+            )
+        }
+
+        # 1. mtime + size: no I/O beyond the directory listing
+        seen = set()
+        stale: Dict[str, Tuple[int, int]] = {}
+        for entry in iter_archives(roots):
+            stat = entry.stat()
+            seen.add(entry.path)
+            report.scanned += 1
+            stored = known.get(entry.path)
+            if stored and stored[:2] == (stat.st_mtime_ns, stat.st_size):
+                report.unchanged += 1
+            else:
+                stale[entry.path] = (stat.st_mtime_ns, stat.st_size)
+
+        # 2. JSON entry CRCs from the central directory (no decompression)
+        candidates = [path for path in stale if path in known]
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            fingerprints = dict(zip(candidates, pool.map(_fingerprint_or_none, candidates)))
+        touched = []
+        for path, fingerprint in fingerprints.items():
+            if fingerprint is not None and fingerprint == known[path][2]:
+                touched.append((*stale.pop(path), path))
+        report.touched = len(touched)
+
+        # 3. Parse what changed
+        changed = sorted(stale)
+        if workers == 1 or len(changed) < 2:
+            results = map(_extract_or_error, changed)
+        else:
+            pool = ProcessPoolExecutor(max_workers=workers)
+            results = pool.map(_extract_or_error, changed, chunksize=4)
+
+        removed = [
+            path for path in known
+            if path not in seen and any(_is_under(path, root) for root in roots)
+        ]
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "UPDATE archives SET mtime_ns = ?, size = ? WHERE path = ?", touched
+                )
+                for path in removed:
+                    self._delete(path)
+                report.removed = removed
+                for path, extracted, error in results:
+                    self._delete(path)
+                    mtime_ns, size = stale[path]
+                    if extracted is None:
+                        # Recorded so an unchanged broken file is not retried
+                        self.conn.execute(
+                            "INSERT INTO archives (path, mtime_ns, size, fingerprint, error)"
+                            " VALUES (?, ?, ?, '', ?)",
+                            (path, mtime_ns, size, error),
+                        )
+                        report.failed.append({"path": path, "error": error})
+                        continue
+                    self._insert(path, mtime_ns, size, extracted)
+                    report.indexed.append(path)
+        finally:
+            if workers > 1 and len(changed) >= 2:
+                pool.shutdown()
+        return report
+
+    def _delete(self, path: str) -> None:
+        self.conn.execute("DELETE FROM archives WHERE path = ?", (path,))
+        for table in _ROW_TABLES:
+            self.conn.execute(f"DELETE FROM {table} WHERE path = ?", (path,))
+
+    def _insert(self, path: str, mtime_ns: int, size: int, extracted: Dict[str, Any]) -> None:
+        self.conn.execute(
+            "INSERT INTO archives (path, mtime_ns, size, fingerprint, flow_name, node_count)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (path, mtime_ns, size, extracted["fingerprint"],
+             extracted["flow_name"], extracted["node_count"]),
+        )
+        for table, rows in extracted["rows"].items():
+            if rows:
+                placeholders = ", ".join("?" * len(rows[0]))
+                self.conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        """Run a read-only SQL query against the catalog tables"""
+        cursor = self.conn.execute(sql, tuple(params))
+        cursor.row_factory = sqlite3.Row
+        return cursor.fetchall()
+
+    def flows_reading_table(self, table: str, schema: Optional[str] = None) -> List[str]:
+        """
+        Archives with an input on the table, or custom SQL naming it
+
+        Args:
+            table: Table name (case-insensitive, without brackets)
+            schema: Also require this schema (case-insensitive)
+        """
+        sql = "SELECT DISTINCT path FROM tables WHERE table_name = ? COLLATE NOCASE"
+        params = [table]
+        if schema is not None:
+            sql += " AND schema_name = ? COLLATE NOCASE"
+            params.append(schema)
+        return [row[0] for row in self.conn.execute(sql + " ORDER BY path", params)]
+
+    def flows_publishing(self, datasource: str) -> List[str]:
+        """Archives with an output publishing the datasource (case-insensitive)"""
+        return [row[0] for row in self.conn.execute(
+            "SELECT DISTINCT path FROM outputs WHERE datasource_name = ? COLLATE NOCASE"
+            " ORDER BY path",
+            (datasource,),
+        )]
+
+    def flows_using_connection(self, server: Optional[str] = None,
+                               dbname: Optional[str] = None) -> List[str]:
+        """Archives with a connection to the server and/or database"""
+        clauses, params = [], []
+        if server is not None:
+            clauses.append("server = ? COLLATE NOCASE")
+            params.append(server)
+        if dbname is not None:
+            clauses.append("dbname = ? COLLATE NOCASE")
+            params.append(dbname)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        return [row[0] for row in self.conn.execute(
+            f"SELECT DISTINCT path FROM connections{where} ORDER BY path", params
+        )]
+
+    def search_formulas(self, text: str) -> List[sqlite3.Row]:
+        """Formulas and filter expressions containing text (case-insensitive)"""
+        return self.query(
+            "SELECT path, node_id, column_name, expression FROM formulas"
+            " WHERE expression LIKE ? ESCAPE '\\' ORDER BY path",
+            ["%" + re.sub(r"([%_\\])", r"\\\1", text) + "%"],
+        )
+
+    def search_sql(self, text: str) -> List[sqlite3.Row]:
+        """Custom SQL queries containing text (case-insensitive)"""
+        return self.query(
+            "SELECT path, node_id, query FROM custom_sql"
+            " WHERE query LIKE ? ESCAPE '\\' ORDER BY path",
+            ["%" + re.sub(r"([%_\\])", r"\\\1", text) + "%"],
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Row count of every catalog table"""
+        return {
+            table: self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("archives",) + _ROW_TABLES
+        }
+
+
+def _is_under(path: str, root: str) -> bool:
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+
+# ---------------------------------------------------------------------------
+# Command line
+# ---------------------------------------------------------------------------
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """CLI entry point for the flow catalog."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="cwprep-catalog",
+        description="Index .tfl / .tflx archives into SQLite and query them",
+    )
+    parser.add_argument(
+        "--db",
+        default=DEFAULT_CATALOG_PATH,
+        help=f"Catalog database (default: {DEFAULT_CATALOG_PATH})",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    refresh = commands.add_parser("refresh", help="Index new and changed archives")
+    refresh.add_argument("roots", nargs="+", help="Directories or archive files")
+    refresh.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                         help="Parallel workers (default: CPU count)")
+
+    table = commands.add_parser("table", help="Flows reading a table")
+    table.add_argument("name")
+    table.add_argument("--schema")
+
+    output = commands.add_parser("datasource", help="Flows publishing a datasource")
+    output.add_argument("name")
+
+    connection = commands.add_parser("connection", help="Flows using a server / database")
+    connection.add_argument("--server")
+    connection.add_argument("--dbname")
+
+    formula = commands.add_parser("formula", help="Search formulas and filters")
+    formula.add_argument("text")
+
+    sql = commands.add_parser("sql", help="Search custom SQL")
+    sql.add_argument("text")
+
+    commands.add_parser("stats", help="Row counts")
+
+    args = parser.parse_args(argv)
+    with FlowCatalog(args.db) as catalog:
+        if args.command == "refresh":
+            report = catalog.refresh(args.roots, workers=args.workers)
+            for failure in report.failed:
+                print(f"failed: {failure['path']}: {failure['error']}")
+            print(report.summary())
+        elif args.command == "table":
+            print("\n".join(catalog.flows_reading_table(args.name, args.schema)))
+        elif args.command == "datasource":
+            print("\n".join(catalog.flows_publishing(args.name)))
+        elif args.command == "connection":
+            print("\n".join(catalog.flows_using_connection(args.server, args.dbname)))
+        elif args.command == "formula":
+            for row in catalog.search_formulas(args.text):
+                print(f"{row['path']}\t{row['column_name'] or ''}\t{row['expression']}")
+        elif args.command == "sql":
+            for row in catalog.search_sql(args.text):
+                print(f"{row['path']}\t{row['query']}")
+        else:
+            for name, count in catalog.stats().items():
+                print(f"{name:<12}{count:>10}")
+
+
+if __name__ == "__main__":
+    main()
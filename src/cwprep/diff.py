@@ -0,0 +1,349 @@
+"""
+Structural Flow Diff
+
+Compares two flows by structure instead of by JSON text, so regenerated
+flows whose every UUID changed still diff cleanly. Nodes are canonicalized
+with graph.canonical_node (node-local IDs made positional, connection IDs
+replaced by the connection's attributes, layout not involved at all), then
+given a Merkle hash over the DAG: the digest of their own content plus the
+hashes of their parents and the namespaces the edges target.
+
+Equal Merkle hashes mean the node and everything upstream of it are
+identical, so such nodes are paired by one dict lookup and never compared.
+The nodes left are paired in topological order, by content with the same
+(paired) parents, then by type and name, then by type and parents, and the
+pairs that differ are reported with the keys and clean-step actions that
+changed.
+
+Usage:
+    from cwprep.diff import diff_flows, diff_tfl
+
+    result = diff_flows(old_flow, new_flow)
+    print(result.summary())          # "2 added, 1 removed, 3 modified, 480 unchanged"
+    for change in result.modified:
+        print(change.name, change.fields, change.actions)
+
+    diff_tfl("before.tfl", "after.tfl").to_dict()
+"""
+
+import difflib
+import hashlib
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from .graph import FlowGraph, action_chain, canonical_node, content_digest
+
+
+# Top-level node keys canonicalized separately or ignored
+_NODE_IGNORED_KEYS = ("id", "name", "description", "nextNodes", "connectionId")
+# Connection keys that do not change what it reads
+_CONNECTION_IGNORED_KEYS = ("id", "name")
+_CONNECTION_IGNORED_ATTRIBUTES = (":flow-name",)
+
+
+@dataclass
+class ActionChange:
+    """A clean-step action or super-node action that differs"""
+    status: str  # added / removed / modified
+    node_type: str
+    name: str
+    # Keys whose values differ (modified only)
+    fields: List[str] = field(default_factory=list)
+
+
+@dataclass
+class NodeChange:
+    """A node that was added, removed or modified"""
+    status: str  # added / removed / modified
+    node_type: str
+    name: str
+    old_id: Optional[str] = None
+    new_id: Optional[str] = None
+    # Keys that differ (modified only); "name", "connection" and "parents"
+    # are reported under those names
+    fields: List[str] = field(default_factory=list)
+    actions: List[ActionChange] = field(default_factory=list)
+
+
+@dataclass
+class FlowDiff:
+    """Result of diff_flows()"""
+    added: List[NodeChange] = field(default_factory=list)
+    removed: List[NodeChange] = field(default_factory=list)
+    modified: List[NodeChange] = field(default_factory=list)
+    unchanged: int = 0
+
+    @property
+    def identical(self) -> bool:
+        return not (self.added or self.removed or self.modified)
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.added)} added, {len(self.removed)} removed, "
+            f"{len(self.modified)} modified, {self.unchanged} unchanged"
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready dict"""
+        return asdict(self)
+
+
+# ---------------------------------------------------------------------------
+# Canonical form and Merkle hashes
+# ---------------------------------------------------------------------------
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def connection_digests(connections: Mapping[str, Any]) -> Dict[str, str]:
+    """Connection ID -> digest of its content without IDs or the flow name"""
+    digests = {}
+    for conn_id, conn in connections.items():
+        content = {key: value for key, value in conn.items() if key not in _CONNECTION_IGNORED_KEYS}
+        attrs = content.get("connectionAttributes")
+        if isinstance(attrs, Mapping):
+            content["connectionAttributes"] = {
+                key: value for key, value in attrs.items()
+                if key not in _CONNECTION_IGNORED_ATTRIBUTES
+            }
+        digests[conn_id] = content_digest(content)
+    return digests
+
+
+class _Canonical:
+    """Local digest, parent edges and Merkle hash of each node of a flow"""
+
+    def __init__(self, flow: Mapping[str, Any]):
+        self.nodes: Mapping[str, Any] = flow.get("nodes") or {}
+        self.graph = FlowGraph(self.nodes)
+        self.order = self.graph.topological_order(flow.get("initialNodes"))
+        self.node_properties = flow.get("nodeProperties") or {}
+        self.connections = connection_digests(flow.get("connections") or {})
+
+        # Only digests are kept; content is rebuilt for the few changed pairs
+        self.local: Dict[str, str] = {}
+        self.parents: Dict[str, List[Tuple[str, str]]] = {}
+        self.merkle: Dict[str, str] = {}
+        for node_id in self.order:
+            node = self.nodes[node_id]
+            content, local_ids = self.content(node_id)
+            local = content_digest(content)
+            self.local[node_id] = local
+            # Edge namespaces may name the node's own union namespaces
+            parents = sorted(
+                (pid, local_ids.get(ns, ns)) for pid, ns in self.graph.parents_of(node_id)
+            )
+            self.parents[node_id] = parents
+            upstream = sorted(f"{self.merkle.get(pid, pid)}:{ns}" for pid, ns in parents)
+            self.merkle[node_id] = _sha256(
+                local + "|" + node.get("name", "") + "|" + ";".join(upstream)
+            )
+
+    def content(self, node_id: str) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        """canonical_node() of a node, plus its connection and node properties"""
+        node = self.nodes[node_id]
+        content, local_ids = canonical_node(node, _NODE_IGNORED_KEYS)
+        conn_id = node.get("connectionId")
+        if conn_id is not None:
+            content["connection"] = self.connections.get(conn_id, conn_id)
+        if node_id in self.node_properties:
+            content["nodeProperties"] = canonical_node(
+                {"properties": self.node_properties[node_id]}, ()
+            )[0]["properties"]
+        return content, local_ids
+
+
+def merkle_hashes(flow: Mapping[str, Any]) -> Dict[str, str]:
+    """
+    Node ID -> Merkle hash of the node and everything upstream of it
+
+    Independent of node IDs, action IDs, union namespace names and connection
+    IDs; node names count.
+    """
+    return _Canonical(flow).merkle
+
+
+def flow_digest(flow: Mapping[str, Any]) -> str:
+    """Digest of a whole flow: equal for flows that diff as identical"""
+    return _sha256(";".join(sorted(merkle_hashes(flow).values())))
+
+
+# ---------------------------------------------------------------------------
+# Diff
+# ---------------------------------------------------------------------------
+
+def _label(node: Mapping[str, Any]) -> Tuple[str, str]:
+    return node.get("nodeType", ""), node.get("name", "")
+
+
+def _changed_keys(old: Mapping[str, Any], new: Mapping[str, Any]) -> List[str]:
+    return sorted(key for key in set(old) | set(new) if old.get(key) != new.get(key))
+
+
+def _node_actions(node: Mapping[str, Any]) -> List[Mapping[str, Any]]:
+    """Clean-step actions in order, or a super node's single action"""
+    loom = node.get("loomContainer")
+    if isinstance(loom, Mapping):
+        return action_chain(loom.get("nodes") or {}, loom.get("initialNodes") or [])
+    action = node.get("actionNode")
+    return [action] if isinstance(action, Mapping) else []
+
+
+def _action_changes(old: Mapping[str, Any], new: Mapping[str, Any]) -> List[ActionChange]:
+    """Actions added / removed / modified between two versions of a node"""
+    old_actions = _node_actions(old)
+    new_actions = _node_actions(new)
+    ignored = ("id", "name", "description", "nextNodes")
+    old_content = [canonical_node(action, ignored)[0] for action in old_actions]
+    new_content = [canonical_node(action, ignored)[0] for action in new_actions]
+    old_keys = [content_digest(content) for content in old_content]
+    new_keys = [content_digest(content) for content in new_content]
+
+    changes = []
+    matcher = difflib.SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        # Replaced actions of the same type, position by position, are edits
+        paired = 0
+        if tag == "replace":
+            for i, j in zip(range(i1, i2), range(j1, j2)):
+                if old_actions[i].get("nodeType") != new_actions[j].get("nodeType"):
+                    break
+                changes.append(ActionChange(
+                    "modified", *_label(new_actions[j]),
+                    fields=_changed_keys(old_content[i], new_content[j]),
+                ))
+                paired += 1
+        for i in range(i1 + paired, i2):
+            changes.append(ActionChange("removed", *_label(old_actions[i])))
+        for j in range(j1 + paired, j2):
+            changes.append(ActionChange("added", *_label(new_actions[j])))
+    return changes
+
+
+# (key function, uses parents) per matching level of diff_flows()
+_MATCH_LEVELS = (
+    (lambda canon, nid, parents: (canon.local[nid], parents), True),
+    (lambda canon, nid, parents: (_label(canon.nodes[nid]), parents), True),
+    (lambda canon, nid, parents: _label(canon.nodes[nid]), False),
+    (lambda canon, nid, parents: (canon.nodes[nid].get("nodeType"), parents), True),
+)
+
+
+def diff_flows(old: Mapping[str, Any], new: Mapping[str, Any]) -> FlowDiff:
+    """
+    Structural diff of two flow documents
+
+    Args:
+        old: Flow before (builder.build()[0] or an archive's flow entry)
+        new: Flow after
+
+    Returns:
+        FlowDiff: added, removed and modified nodes, and the unchanged count
+    """
+    before, after = _Canonical(old), _Canonical(new)
+    result = FlowDiff()
+
+    # 1. Same Merkle hash: identical node and ancestry, nothing to compare
+    by_merkle: Dict[str, List[str]] = {}
+    for node_id in reversed(before.order):
+        by_merkle.setdefault(before.merkle[node_id], []).append(node_id)
+    pairs: Dict[str, str] = {}  # new ID -> old ID
+    for node_id in after.order:
+        candidates = by_merkle.get(after.merkle[node_id])
+        if candidates:
+            pairs[node_id] = candidates.pop()
+    result.unchanged = len(pairs)
+    if len(pairs) == len(after.order) == len(before.order):
+        return result
+
+    # 2. Pair the rest in topological order, so parents are paired first
+    matched_old = set(pairs.values())
+    remaining_old = [node_id for node_id in before.order if node_id not in matched_old]
+
+    def mapped_parents(node_id: str) -> Optional[Tuple[Tuple[str, str], ...]]:
+        """New node's parent edges in old IDs, or None if a parent is unpaired"""
+        mapped = []
+        for pid, ns in after.parents[node_id]:
+            if pid not in pairs:
+                return None
+            mapped.append((pairs[pid], ns))
+        return tuple(sorted(mapped))
+
+    # Candidate old nodes per matching level, most specific first; levels
+    # keyed by parents are skipped while a new node's parents are unpaired
+    indexes: List[Dict[Any, List[str]]] = [{} for _level in _MATCH_LEVELS]
+    for node_id in reversed(remaining_old):
+        parents = tuple(before.parents[node_id])
+        for (key_of, _by_parents), index in zip(_MATCH_LEVELS, indexes):
+            index.setdefault(key_of(before, node_id, parents), []).append(node_id)
+
+    for node_id in after.order:
+        if node_id in pairs:
+            continue
+        parents = mapped_parents(node_id)
+        for (key_of, by_parents), index in zip(_MATCH_LEVELS, indexes):
+            if by_parents and parents is None:
+                continue
+            candidates = index.get(key_of(after, node_id, parents))
+            while candidates and candidates[-1] in matched_old:
+                candidates.pop()
+            if candidates:
+                old_id = candidates.pop()
+                pairs[node_id] = old_id
+                matched_old.add(old_id)
+                break
+
+        if node_id not in pairs:
+            result.added.append(NodeChange("added", *_label(after.nodes[node_id]), new_id=node_id))
+            continue
+        change = _node_change(before, after, pairs[node_id], node_id, parents)
+        if change is None:
+            result.unchanged += 1
+        else:
+            result.modified.append(change)
+
+    for node_id in remaining_old:
+        if node_id not in matched_old:
+            result.removed.append(NodeChange("removed", *_label(before.nodes[node_id]), old_id=node_id))
+    return result
+
+
+def _node_change(before: _Canonical, after: _Canonical, old_id: str, new_id: str,
+                 parents: Optional[Tuple[Tuple[str, str], ...]]) -> Optional[NodeChange]:
+    """What differs between two paired nodes, or None if only ancestors changed"""
+    old_node, new_node = before.nodes[old_id], after.nodes[new_id]
+    fields = []
+    actions = []
+    if before.local[old_id] != after.local[new_id]:
+        fields = _changed_keys(before.content(old_id)[0], after.content(new_id)[0])
+        if "loomContainer" in fields or "actionNode" in fields:
+            actions = _action_changes(old_node, new_node)
+    if old_node.get("name") != new_node.get("name"):
+        fields.append("name")
+    if parents != tuple(before.parents[old_id]):
+        fields.append("parents")
+    if not fields:
+        return None
+    return NodeChange(
+        "modified", *_label(new_node), old_id=old_id, new_id=new_id,
+        fields=sorted(fields), actions=actions,
+    )
+
+
+def diff_tfl(old_path: str, new_path: str) -> FlowDiff:
+    """diff_flows() on the flow entries of two .tfl / .tflx archives"""
+    from .reader import FlowDocument
+
+    flows = []
+    for path in (old_path, new_path):
+        doc = FlowDocument(path)
+        flows.append({
+            "nodes": dict(doc.iter_nodes()),
+            "connections": doc.connections,
+            "initialNodes": doc.field("initialNodes", []),
+            "nodeProperties": doc.field("nodeProperties", {}),
+        })
+    return diff_flows(*flows)
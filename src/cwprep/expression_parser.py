@@ -0,0 +1,685 @@
+"""
+Tableau Prep Expression Parser
+
+A lexer and recursive-descent parser for Tableau Prep calculation syntax,
+plus an emitter that renders the resulting AST as an ANSI SQL expression in a
+single tree walk. Because the formula is parsed once, nested function calls
+and parentheses are translated correctly regardless of depth.
+
+Usage:
+    from cwprep.expression_parser import parse_expression, SqlEmitter
+
+    tree = parse_expression("IIF(ISNULL([Name]), 'n/a', UPPER([Name]))")
+    SqlEmitter().emit(tree)
+    # => CASE WHEN ("Name") IS NULL THEN 'n/a' ELSE UPPER("Name") END
+"""
+
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class ExpressionSyntaxError(ValueError):
+    """Raised when a formula cannot be tokenized or parsed."""
+
+
+# ---------------------------------------------------------------------------
+# Lexer
+# ---------------------------------------------------------------------------
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ws>\s+|//[^\n]*|/\*.*?\*/)
+  | (?P<field>\[(?:[^\]]|\]\])*\])
+  | (?P<string>'(?:[^']|'')*'|"(?:[^"]|"")*")
+  | (?P<date>\#[^#]*\#)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<ident>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op>==|!=|<>|<=|>=|[-+*/%^<>=(),])
+    """,
+    re.VERBOSE | re.DOTALL,
+)
+
+_KEYWORDS = {
+    "IF", "THEN", "ELSEIF", "ELSE", "END", "CASE", "WHEN",
+    "AND", "OR", "NOT", "IN", "TRUE", "FALSE", "NULL",
+}
+
+
+class Token:
+    """A single lexical token."""
+
+    __slots__ = ("kind", "value", "pos")
+
+    def __init__(self, kind: str, value: str, pos: int):
+        self.kind = kind
+        self.value = value
+        self.pos = pos
+
+    def __repr__(self):
+        return f"Token({self.kind}, {self.value!r})"
+
+
+def tokenize(text: str) -> List[Token]:
+    """Split a formula into tokens. Keywords are reported as kind "kw"."""
+    tokens = []
+    pos = 0
+    length = len(text)
+    match = _TOKEN_RE.match
+    while pos < length:
+        m = match(text, pos)
+        if not m:
+            raise ExpressionSyntaxError(
+                f"Unexpected character {text[pos]!r} at position {pos}"
+            )
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == "ident" and value.upper() in _KEYWORDS:
+            tokens.append(Token("kw", value.upper(), pos))
+        elif kind != "ws":
+            tokens.append(Token(kind, value, pos))
+        pos = m.end()
+    tokens.append(Token("eof", "", pos))
+    return tokens
+
+
+# ---------------------------------------------------------------------------
+# AST
+# ---------------------------------------------------------------------------
+
+class Node:
+    """Base class for AST nodes."""
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, s) == getattr(other, s) for s in self.__slots__
+        )
+
+    def __repr__(self):
+        args = ", ".join(f"{s}={getattr(self, s)!r}" for s in self.__slots__)
+        return f"{type(self).__name__}({args})"
+
+
+class Literal(Node):
+    """Literal value. kind is one of number/string/date/bool/null."""
+
+    __slots__ = ("kind", "value")
+
+    def __init__(self, kind: str, value: str):
+        self.kind = kind
+        self.value = value
+
+
+class Field(Node):
+    """Field reference such as [Order Date]."""
+
+    __slots__ = ("name",)
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+class Group(Node):
+    """Parenthesized sub-expression (kept so output mirrors source grouping)."""
+
+    __slots__ = ("expr",)
+
+    def __init__(self, expr: Node):
+        self.expr = expr
+
+
+class Unary(Node):
+    __slots__ = ("op", "operand")
+
+    def __init__(self, op: str, operand: Node):
+        self.op = op
+        self.operand = operand
+
+
+class Binary(Node):
+    __slots__ = ("op", "left", "right")
+
+    def __init__(self, op: str, left: Node, right: Node):
+        self.op = op
+        self.left = left
+        self.right = right
+
+
+class InList(Node):
+    __slots__ = ("expr", "items")
+
+    def __init__(self, expr: Node, items: List[Node]):
+        self.expr = expr
+        self.items = items
+
+
+class Call(Node):
+    """Function call. name is upper-cased."""
+
+    __slots__ = ("name", "args")
+
+    def __init__(self, name: str, args: List[Node]):
+        self.name = name
+        self.args = args
+
+
+class IfExpr(Node):
+    """IF c THEN v [ELSEIF c THEN v]* [ELSE v] END"""
+
+    __slots__ = ("branches", "else_")
+
+    def __init__(self, branches: List[Tuple[Node, Node]], else_: Optional[Node]):
+        self.branches = branches
+        self.else_ = else_
+
+
+class CaseExpr(Node):
+    """CASE subject WHEN v THEN r [WHEN ...]* [ELSE r] END"""
+
+    __slots__ = ("subject", "whens", "else_")
+
+    def __init__(self, subject: Optional[Node], whens: List[Tuple[Node, Node]],
+                 else_: Optional[Node]):
+        self.subject = subject
+        self.whens = whens
+        self.else_ = else_
+
+
+# ---------------------------------------------------------------------------
+# Parser
+# ---------------------------------------------------------------------------
+
+_COMPARISON_OPS = {"=", "==", "!=", "<>", "<", ">", "<=", ">="}
+
+
+class _Parser:
+    """Recursive-descent parser; one method per precedence level."""
+
+    def __init__(self, tokens: List[Token]):
+        self.tokens = tokens
+        self.index = 0
+
+    # -- token helpers --
+    def _peek(self) -> Token:
+        return self.tokens[self.index]
+
+    def _next(self) -> Token:
+        tok = self.tokens[self.index]
+        self.index += 1
+        return tok
+
+    def _at(self, kind: str, value: Optional[str] = None) -> bool:
+        tok = self.tokens[self.index]
+        return tok.kind == kind and (value is None or tok.value == value)
+
+    def _expect(self, kind: str, value: Optional[str] = None) -> Token:
+        if not self._at(kind, value):
+            tok = self._peek()
+            wanted = value or kind
+            raise ExpressionSyntaxError(
+                f"Expected {wanted} at position {tok.pos}, got {tok.value or 'end of input'!r}"
+            )
+        return self._next()
+
+    # -- grammar --
+    def parse(self) -> Node:
+        node = self._or()
+        if not self._at("eof"):
+            tok = self._peek()
+            raise ExpressionSyntaxError(
+                f"Unexpected {tok.value!r} at position {tok.pos}"
+            )
+        return node
+
+    def _or(self) -> Node:
+        node = self._and()
+        while self._at("kw", "OR"):
+            self._next()
+            node = Binary("OR", node, self._and())
+        return node
+
+    def _and(self) -> Node:
+        node = self._not()
+        while self._at("kw", "AND"):
+            self._next()
+            node = Binary("AND", node, self._not())
+        return node
+
+    def _not(self) -> Node:
+        if self._at("kw", "NOT"):
+            self._next()
+            return Unary("NOT", self._not())
+        return self._comparison()
+
+    def _comparison(self) -> Node:
+        node = self._additive()
+        tok = self._peek()
+        if tok.kind == "op" and tok.value in _COMPARISON_OPS:
+            self._next()
+            return Binary(tok.value, node, self._additive())
+        if tok.kind == "kw" and tok.value == "IN":
+            self._next()
+            self._expect("op", "(")
+            items = self._arguments()
+            return InList(node, items)
+        return node
+
+    def _additive(self) -> Node:
+        node = self._multiplicative()
+        while self._peek().kind == "op" and self._peek().value in ("+", "-"):
+            op = self._next().value
+            node = Binary(op, node, self._multiplicative())
+        return node
+
+    def _multiplicative(self) -> Node:
+        node = self._unary()
+        while self._peek().kind == "op" and self._peek().value in ("*", "/", "%"):
+            op = self._next().value
+            node = Binary(op, node, self._unary())
+        return node
+
+    def _unary(self) -> Node:
+        if self._at("op", "-"):
+            self._next()
+            return Unary("-", self._unary())
+        if self._at("op", "+"):
+            self._next()
+            return self._unary()
+        return self._power()
+
+    def _power(self) -> Node:
+        node = self._primary()
+        if self._at("op", "^"):
+            self._next()
+            return Binary("^", node, self._unary())
+        return node
+
+    def _primary(self) -> Node:
+        tok = self._next()
+        kind, value = tok.kind, tok.value
+
+        if kind == "number":
+            return Literal("number", value)
+        if kind == "string":
+            quote = value[0]
+            return Literal("string", value[1:-1].replace(quote * 2, quote))
+        if kind == "date":
+            return Literal("date", value[1:-1].strip())
+        if kind == "field":
+            return Field(value[1:-1].replace("]]", "]"))
+        if kind == "op" and value == "(":
+            inner = self._or()
+            self._expect("op", ")")
+            return Group(inner)
+        if kind == "kw":
+            if value in ("TRUE", "FALSE"):
+                return Literal("bool", value)
+            if value == "NULL":
+                return Literal("null", value)
+            if value == "IF":
+                return self._if()
+            if value == "CASE":
+                return self._case()
+        if kind == "ident":
+            self._expect("op", "(")
+            return Call(value.upper(), self._arguments())
+
+        raise ExpressionSyntaxError(
+            f"Unexpected {value or 'end of input'!r} at position {tok.pos}"
+        )
+
+    def _arguments(self) -> List[Node]:
+        """Parse a comma-separated list after "(" up to and including ")"."""
+        args: List[Node] = []
+        if self._at("op", ")"):
+            self._next()
+            return args
+        while True:
+            args.append(self._or())
+            if self._at("op", ","):
+                self._next()
+                continue
+            self._expect("op", ")")
+            return args
+
+    def _if(self) -> Node:
+        branches = []
+        cond = self._or()
+        self._expect("kw", "THEN")
+        branches.append((cond, self._or()))
+        else_ = None
+        while True:
+            if self._at("kw", "ELSEIF"):
+                self._next()
+                cond = self._or()
+                self._expect("kw", "THEN")
+                branches.append((cond, self._or()))
+            elif self._at("kw", "ELSE"):
+                self._next()
+                else_ = self._or()
+                self._expect("kw", "END")
+                return IfExpr(branches, else_)
+            else:
+                self._expect("kw", "END")
+                return IfExpr(branches, else_)
+
+    def _case(self) -> Node:
+        subject = None if self._at("kw", "WHEN") else self._or()
+        whens = []
+        while self._at("kw", "WHEN"):
+            self._next()
+            match = self._or()
+            self._expect("kw", "THEN")
+            whens.append((match, self._or()))
+        if not whens:
+            raise ExpressionSyntaxError("CASE requires at least one WHEN branch")
+        else_ = None
+        if self._at("kw", "ELSE"):
+            self._next()
+            else_ = self._or()
+        self._expect("kw", "END")
+        return CaseExpr(subject, whens, else_)
+
+
+def parse_expression(text: str) -> Node:
+    """Parse a Tableau Prep formula into an AST.
+
+    Raises:
+        ExpressionSyntaxError: If the formula is not valid calculation syntax
+            (or uses constructs this parser does not cover, such as LOD
+            expressions).
+    """
+    return _Parser(tokenize(text)).parse()
+
+
+# ---------------------------------------------------------------------------
+# SQL emitter
+# ---------------------------------------------------------------------------
+
+# Binding strength of emitted SQL; used to decide where parentheses are needed
+_PREC_OR = 1
+_PREC_AND = 2
+_PREC_NOT = 3
+_PREC_CMP = 4
+_PREC_ADD = 5
+_PREC_MUL = 6
+_PREC_UNARY = 7
+_PREC_ATOM = 9
+
+_BINARY_PREC = {
+    "OR": _PREC_OR, "AND": _PREC_AND,
+    "+": _PREC_ADD, "-": _PREC_ADD,
+    "*": _PREC_MUL, "/": _PREC_MUL, "%": _PREC_MUL,
+}
+_ASSOCIATIVE_OPS = {"OR", "AND", "+", "*"}
+_OPERATOR_MAP = {"==": "=", "!=": "<>"}
+
+_CAST_TYPES = {
+    "INT": "INTEGER",
+    "FLOAT": "REAL",
+    "STR": "VARCHAR",
+    "DATE": "DATE",
+    "DATETIME": "TIMESTAMP",
+}
+_RENAMED_FUNCS = {
+    "IFNULL": "COALESCE",
+    "LEN": "LENGTH",
+    "PROPER": "INITCAP",
+    "DATETRUNC": "DATE_TRUNC",
+    "MAKEDATE": "MAKE_DATE",
+}
+_DATE_PART_FUNCS = {"YEAR", "MONTH", "DAY"}
+
+Emitted = Tuple[str, int]
+
+
+def quote_identifier_ansi(name: str) -> str:
+    """Quote a column name with ANSI double quotes."""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_identifier_mysql(name: str) -> str:
+    """Quote a column name with MySQL backticks."""
+    return "`" + name.replace("`", "``") + "`"
+
+
+def quote_identifier_tsql(name: str) -> str:
+    """Quote a column name with SQL Server square brackets."""
+    return "[" + name.replace("]", "]]") + "]"
+
+
+class SqlEmitter:
+    """Render an expression AST as ANSI SQL.
+
+    Args:
+        unsupported_funcs: Function names that have no SQL equivalent; calls
+            are kept but prefixed with a ``/* UNSUPPORTED: NAME */`` comment.
+        quote_identifier: Callable used to quote field references
+            (defaults to ANSI double quotes).
+    """
+
+    def __init__(
+        self,
+        unsupported_funcs=(),
+        quote_identifier: Callable[[str], str] = quote_identifier_ansi,
+    ):
+        self.unsupported_funcs = {f.upper() for f in unsupported_funcs}
+        self.quote_identifier = quote_identifier
+
+    def emit(self, node: Node) -> str:
+        """Return the SQL text for an AST."""
+        return self._emit(node)[0]
+
+    # -- dispatch --
+    def _emit(self, node: Node) -> Emitted:
+        method = getattr(self, "_emit_" + type(node).__name__)
+        return method(node)
+
+    def _operand(self, node: Node, min_prec: int) -> str:
+        """Emit a child, parenthesizing it if it binds looser than min_prec."""
+        sql, prec = self._emit(node)
+        return sql if prec >= min_prec else f"({sql})"
+
+    # -- leaves --
+    def _emit_Literal(self, node: Literal) -> Emitted:
+        if node.kind == "string":
+            return "'" + node.value.replace("'", "''") + "'", _PREC_ATOM
+        if node.kind == "date":
+            keyword = "TIMESTAMP" if ":" in node.value else "DATE"
+            return f"{keyword} '{node.value}'", _PREC_ATOM
+        return node.value, _PREC_ATOM
+
+    def _emit_Field(self, node: Field) -> Emitted:
+        return self.quote_identifier(node.name), _PREC_ATOM
+
+    def _emit_Group(self, node: Group) -> Emitted:
+        return f"({self._emit(node.expr)[0]})", _PREC_ATOM
+
+    # -- operators --
+    def _emit_Unary(self, node: Unary) -> Emitted:
+        if node.op == "NOT":
+            return f"NOT {self._operand(node.operand, _PREC_NOT)}", _PREC_NOT
+        operand = self._operand(node.operand, _PREC_UNARY)
+        # "--" would start a SQL line comment
+        if operand.startswith("-"):
+            operand = f"({operand})"
+        return f"-{operand}", _PREC_UNARY
+
+    def _emit_Binary(self, node: Binary) -> Emitted:
+        op = node.op
+        if op == "^":
+            left = self._emit(node.left)[0]
+            right = self._emit(node.right)[0]
+            return f"POWER({left}, {right})", _PREC_ATOM
+        if op in _BINARY_PREC:
+            prec = _BINARY_PREC[op]
+            right_min = prec if op in _ASSOCIATIVE_OPS else prec + 1
+            left = self._operand(node.left, prec)
+            right = self._operand(node.right, right_min)
+            return f"{left} {op} {right}", prec
+        # Comparisons are non-associative in SQL: wrap nested predicates
+        left = self._operand(node.left, _PREC_CMP + 1)
+        right = self._operand(node.right, _PREC_CMP + 1)
+        return f"{left} {_OPERATOR_MAP.get(op, op)} {right}", _PREC_CMP
+
+    def _emit_InList(self, node: InList) -> Emitted:
+        items = ", ".join(self._emit(i)[0] for i in node.items)
+        return f"{self._operand(node.expr, _PREC_CMP + 1)} IN ({items})", _PREC_CMP
+
+    # -- conditionals --
+    def _emit_IfExpr(self, node: IfExpr) -> Emitted:
+        parts = ["CASE"]
+        for cond, value in node.branches:
+            parts.append(f"WHEN {self._emit(cond)[0]} THEN {self._emit(value)[0]}")
+        if node.else_ is not None:
+            parts.append(f"ELSE {self._emit(node.else_)[0]}")
+        parts.append("END")
+        return " ".join(parts), _PREC_ATOM
+
+    def _emit_CaseExpr(self, node: CaseExpr) -> Emitted:
+        parts = ["CASE"]
+        if node.subject is not None:
+            parts.append(self._emit(node.subject)[0])
+        for match, value in node.whens:
+            parts.append(f"WHEN {self._emit(match)[0]} THEN {self._emit(value)[0]}")
+        if node.else_ is not None:
+            parts.append(f"ELSE {self._emit(node.else_)[0]}")
+        parts.append("END")
+        return " ".join(parts), _PREC_ATOM
+
+    # -- functions --
+    def _emit_Call(self, node: Call) -> Emitted:
+        name = node.name
+        args = node.args
+
+        if name in self.unsupported_funcs:
+            arg_sql = ", ".join(self._emit(a)[0] for a in args)
+            return f"/* UNSUPPORTED: {name} */ {name}({arg_sql})", _PREC_ATOM
+
+        handler = self._FUNCTIONS.get(name)
+        if handler is not None:
+            result = handler(self, args)
+            if result is not None:
+                return result
+
+        sql_name = _RENAMED_FUNCS.get(name, name)
+        if name in _CAST_TYPES and len(args) == 1:
+            return f"CAST({self._emit(args[0])[0]} AS {_CAST_TYPES[name]})", _PREC_ATOM
+        if name in _DATE_PART_FUNCS and len(args) == 1:
+            return f"EXTRACT({name} FROM {self._emit(args[0])[0]})", _PREC_ATOM
+        arg_sql = ", ".join(self._emit(a)[0] for a in args)
+        return f"{sql_name}({arg_sql})", _PREC_ATOM
+
+    def _date_part(self, node: Node) -> Optional[str]:
+        """Return the upper-cased date part of a 'part' string literal."""
+        if isinstance(node, Literal) and node.kind == "string" and node.value.isidentifier():
+            return node.value.upper()
+        return None
+
+    def _fn_isnull(self, args):
+        if len(args) != 1:
+            return None
+        return f"({self._emit(args[0])[0]}) IS NULL", _PREC_CMP
+
+    def _fn_zn(self, args):
+        if len(args) != 1:
+            return None
+        return f"COALESCE({self._emit(args[0])[0]}, 0)", _PREC_ATOM
+
+    def _fn_iif(self, args):
+        if len(args) not in (3, 4):
+            return None
+        cond, then_val, else_val = (self._emit(a)[0] for a in args[:3])
+        if len(args) == 4:
+            unknown = self._emit(args[3])[0]
+            return (
+                f"CASE WHEN {cond} THEN {then_val} WHEN NOT ({cond}) THEN {else_val} "
+                f"ELSE {unknown} END"
+            ), _PREC_ATOM
+        return f"CASE WHEN {cond} THEN {then_val} ELSE {else_val} END", _PREC_ATOM
+
+    def _like(self, args, pattern: str):
+        if len(args) != 2:
+            return None
+        subject = self._operand(args[0], _PREC_CMP + 1)
+        needle = self._operand(args[1], _PREC_UNARY)
+        return f"{subject} LIKE {pattern.format(needle)}", _PREC_CMP
+
+    def _fn_contains(self, args):
+        return self._like(args, "'%' || {} || '%'")
+
+    def _fn_startswith(self, args):
+        return self._like(args, "{} || '%'")
+
+    def _fn_endswith(self, args):
+        return self._like(args, "'%' || {}")
+
+    def _fn_mid(self, args):
+        if len(args) not in (2, 3):
+            return None
+        parts = [self._emit(a)[0] for a in args]
+        if len(parts) == 3:
+            return f"SUBSTRING({parts[0]} FROM {parts[1]} FOR {parts[2]})", _PREC_ATOM
+        return f"SUBSTRING({parts[0]} FROM {parts[1]})", _PREC_ATOM
+
+    def _fn_find(self, args):
+        if len(args) != 2:
+            return None
+        return f"POSITION({self._emit(args[1])[0]} IN {self._emit(args[0])[0]})", _PREC_ATOM
+
+    def _fn_countd(self, args):
+        if len(args) != 1:
+            return None
+        return f"COUNT(DISTINCT {self._emit(args[0])[0]})", _PREC_ATOM
+
+    def _fn_datepart(self, args):
+        part = self._date_part(args[0]) if len(args) == 2 else None
+        if part is None:
+            return None
+        return f"EXTRACT({part} FROM {self._emit(args[1])[0]})", _PREC_ATOM
+
+    def _fn_dateadd(self, args):
+        part = self._date_part(args[0]) if len(args) == 3 else None
+        if part is None:
+            return None
+        amount, date = args[1], args[2]
+        date_sql = self._operand(date, _PREC_ADD)
+        if isinstance(amount, Literal) and amount.kind == "number":
+            return f"{date_sql} + INTERVAL '{amount.value}' {part}", _PREC_ADD
+        amount_sql = self._operand(amount, _PREC_MUL)
+        return f"{date_sql} + {amount_sql} * INTERVAL '1' {part}", _PREC_ADD
+
+    def _fn_datediff(self, args):
+        part = self._date_part(args[0]) if len(args) in (3, 4) else None
+        if part is None:
+            return None
+        start = self._emit(args[1])[0]
+        end = self._emit(args[2])[0]
+        return (
+            f"/* DATEDIFF({part.lower()}) */ EXTRACT(EPOCH FROM ({end}) - ({start}))",
+            _PREC_ATOM,
+        )
+
+    def _fn_now(self, args):
+        return ("CURRENT_TIMESTAMP", _PREC_ATOM) if not args else None
+
+    def _fn_today(self, args):
+        return ("CURRENT_DATE", _PREC_ATOM) if not args else None
+
+    _FUNCTIONS: Dict[str, Callable] = {
+        "ISNULL": _fn_isnull,
+        "ZN": _fn_zn,
+        "IIF": _fn_iif,
+        "CONTAINS": _fn_contains,
+        "STARTSWITH": _fn_startswith,
+        "ENDSWITH": _fn_endswith,
+        "MID": _fn_mid,
+        "FIND": _fn_find,
+        "COUNTD": _fn_countd,
+        "DATEPART": _fn_datepart,
+        "DATEADD": _fn_dateadd,
+        "DATEDIFF": _fn_datediff,
+        "NOW": _fn_now,
+        "TODAY": _fn_today,
+    }
@@ -1,9 +1,12 @@
 """
 Tableau Prep Expression → ANSI SQL Translator
 
-Translates Tableau Prep calculation formulas to equivalent ANSI SQL expressions
-using regex-based pattern matching. Covers ~80% of common scenarios; unsupported
-functions are preserved with /* [UNSUPPORTED] */ SQL comments.
+Translates Tableau Prep calculation formulas to equivalent ANSI SQL expressions.
+The default "parser" engine tokenizes and parses each formula once and emits
+SQL in a single tree walk (see expression_parser). The original regex-based
+pipeline is kept as the "regex" engine, and is also used as a fallback for
+formulas the parser does not understand. Unsupported functions are preserved
+with /* [UNSUPPORTED] */ SQL comments.
 
 Usage:
     from cwprep.expression_translator import ExpressionTranslator
@@ -11,14 +14,114 @@ Usage:
     translator = ExpressionTranslator()
     sql_expr = translator.translate("[Amount] > 100 AND ISNULL([Name])")
     # => "Amount" > 100 AND ("Name") IS NULL
+
+    # Compare with the legacy regex pipeline
+    ExpressionTranslator(engine="regex").translate("[Amount] > 100")
+
+    # Repeated formulas are served from a bounded LRU cache
+    translator.cache_info()   # CacheInfo(hits=..., misses=..., maxsize=..., currsize=...)
 """
 
 import re
-from typing import List, Tuple
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+from .expression_parser import (
+    ExpressionSyntaxError,
+    SqlEmitter,
+    parse_expression,
+    quote_identifier_ansi,
+)
+
+
+# Functions that cannot be translated to standard SQL
+_UNSUPPORTED_FUNCS = [
+    "REGEXP_REPLACE", "REGEXP_MATCH", "REGEXP_EXTRACT",
+    "REGEXP_EXTRACT_NTH",
+    "SPLIT", "FINDNTH", "SPACE", "CHAR",
+    "HEXBINX", "HEXBINY", "RADIANS", "SQUARE", "DIV",
+    "DATEPARSE", "DATENAME", "MAKEDATETIME", "MAKETIME",
+    "ISDATE", "ISBLANK",
+    "LAST_VALUE", "LOOKUP", "NTILE",
+    "RANK", "RANK_DENSE", "RANK_MODIFIED", "RANK_PERCENTILE",
+    "ROW_NUMBER", "RUNNING_AVG", "RUNNING_SUM",
+    "PERCENTILE", "ATTR",
+]
+
+# ---------------------------------------------------------------------------
+# Precompiled patterns for the regex engine (compiled once at import time)
+# ---------------------------------------------------------------------------
+_I = re.IGNORECASE
+
+# One alternation for every unsupported function; longest names first so
+# REGEXP_EXTRACT_NTH is not cut short by REGEXP_EXTRACT. The lookahead keeps
+# the call itself in place, so nested unsupported calls are all annotated.
+_RE_UNSUPPORTED = re.compile(
+    r"\b("
+    + "|".join(sorted(_UNSUPPORTED_FUNCS, key=len, reverse=True))
+    + r")(?=\s*\([^)]*\))",
+    _I,
+)
+_RE_FIELD_REF = re.compile(r'\[([^\]]+)\]')
+_RE_DOUBLE_EQUALS = re.compile(r'(?<!=)==(?!=)')
+_RE_ELSEIF = re.compile(r'\bELSEIF\b', _I)
+_RE_IF = re.compile(r'\bIF\b\s+', _I)
+_RE_IIF = re.compile(r'\bIIF\s*\(\s*(.+?)\s*,\s*(.+?)\s*,\s*(.+?)\s*\)', _I)
+_RE_ISNULL = re.compile(r'\bISNULL\s*\(\s*(.+?)\s*\)', _I)
+_RE_IFNULL = re.compile(r'\bIFNULL\s*\(', _I)
+_RE_ZN = re.compile(r'\bZN\s*\(\s*(.+?)\s*\)', _I)
+_RE_CONTAINS = re.compile(r'\bCONTAINS\s*\(\s*(.+?)\s*,\s*(.+?)\s*\)', _I)
+_RE_STARTSWITH = re.compile(r'\bSTARTSWITH\s*\(\s*(.+?)\s*,\s*(.+?)\s*\)', _I)
+_RE_ENDSWITH = re.compile(r'\bENDSWITH\s*\(\s*(.+?)\s*,\s*(.+?)\s*\)', _I)
+_RE_LEN = re.compile(r'\bLEN\s*\(', _I)
+_RE_MID3 = re.compile(r'\bMID\s*\(\s*(.+?)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)', _I)
+_RE_MID2 = re.compile(r'\bMID\s*\(\s*(.+?)\s*,\s*(\d+)\s*\)', _I)
+_RE_FIND = re.compile(r'\bFIND\s*\(\s*(.+?)\s*,\s*(.+?)\s*\)', _I)
+_RE_PROPER = re.compile(r'\bPROPER\s*\(', _I)
+_RE_COUNTD = re.compile(r'\bCOUNTD\s*\(\s*(.+?)\s*\)', _I)
+_RE_DATEPART = re.compile(r'\bDATEPART\s*\(\s*[\'"](\w+)[\'"]\s*,\s*(.+?)\s*\)', _I)
+_RE_DATEADD = re.compile(
+    r'\bDATEADD\s*\(\s*[\'"](\w+)[\'"]\s*,\s*(.+?)\s*,\s*(.+?)\s*\)', _I
+)
+_RE_DATEDIFF = re.compile(
+    r'\bDATEDIFF\s*\(\s*[\'"](\w+)[\'"]\s*,\s*(.+?)\s*,\s*(.+?)\s*\)', _I
+)
+_RE_DATETRUNC = re.compile(r'\bDATETRUNC\s*\(', _I)
+_RE_DATE_PARTS = [
+    (part, re.compile(rf'\b{part}\s*\(\s*(.+?)\s*\)', _I))
+    for part in ("YEAR", "MONTH", "DAY")
+]
+_RE_NOW = re.compile(r'\bNOW\s*\(\s*\)', _I)
+_RE_TODAY = re.compile(r'\bTODAY\s*\(\s*\)', _I)
+_RE_MAKEDATE = re.compile(r'\bMAKEDATE\s*\(', _I)
+_RE_TYPE_CASTS = [
+    (re.compile(rf'\b{func}\s*\(\s*(.+?)\s*\)', _I), rf'CAST(\1 AS {sql_type})')
+    for func, sql_type in (
+        ("INT", "INTEGER"),
+        ("FLOAT", "REAL"),
+        ("STR", "VARCHAR"),
+        ("DATE", "DATE"),
+        ("DATETIME", "TIMESTAMP"),
+    )
+]
+
+DEFAULT_CACHE_SIZE = 4096
 
 
 class ExpressionTranslator:
-    """Translate Tableau Prep calculation syntax to ANSI SQL expressions."""
+    """Translate Tableau Prep calculation syntax to ANSI SQL expressions.
+
+    Args:
+        engine: "parser" (default) parses the formula into an AST and emits
+            SQL in one pass, falling back to the regex pipeline on syntax it
+            does not cover. "regex" always uses the regex pipeline.
+        cache_size: Maximum number of distinct formulas kept in the LRU
+            translation cache (default 4096). Use 0 to disable caching.
+        quote_identifier: Callable used by the parser engine to quote field
+            references (defaults to ANSI double quotes).
+    """
+
+    ENGINES = ("parser", "regex")
 
     # Functions that are directly compatible with ANSI SQL (no translation needed)
     _PASSTHROUGH_FUNCS = {
@@ -35,22 +138,36 @@ class ExpressionTranslator:
     }
 
     # Functions that cannot be translated to standard SQL
-    _UNSUPPORTED_FUNCS = [
-        "REGEXP_REPLACE", "REGEXP_MATCH", "REGEXP_EXTRACT",
-        "REGEXP_EXTRACT_NTH",
-        "SPLIT", "FINDNTH", "SPACE", "CHAR",
-        "HEXBINX", "HEXBINY", "RADIANS", "SQUARE", "DIV",
-        "DATEPARSE", "DATENAME", "MAKEDATETIME", "MAKETIME",
-        "ISDATE", "ISBLANK",
-        "LAST_VALUE", "LOOKUP", "NTILE",
-        "RANK", "RANK_DENSE", "RANK_MODIFIED", "RANK_PERCENTILE",
-        "ROW_NUMBER", "RUNNING_AVG", "RUNNING_SUM",
-        "PERCENTILE", "ATTR",
-    ]
+    _UNSUPPORTED_FUNCS = _UNSUPPORTED_FUNCS
+
+    def __init__(
+        self,
+        engine: str = "parser",
+        cache_size: int = DEFAULT_CACHE_SIZE,
+        quote_identifier: Callable[[str], str] = quote_identifier_ansi,
+    ):
+        if engine not in self.ENGINES:
+            raise ValueError(
+                f"Unknown engine: '{engine}'. Use one of {list(self.ENGINES)}."
+            )
+        if cache_size < 0:
+            raise ValueError("cache_size must be >= 0")
+        self.engine = engine
+        self.cache_size = cache_size
+        self._emitter = SqlEmitter(
+            unsupported_funcs=self._UNSUPPORTED_FUNCS,
+            quote_identifier=quote_identifier,
+        )
+        # Per-instance cache so engines/emitter settings never share entries
+        self._translate_cached = lru_cache(maxsize=cache_size)(self._translate_uncached)
 
     def translate(self, expr: str) -> str:
         """Translate a Tableau Prep expression to ANSI SQL.
 
+        Results are memoized per translator instance, so repeated formulas
+        (value filters, quick-calc templates, ISNULL checks) are translated
+        once.
+
         Args:
             expr: Tableau Prep calculation formula
 
@@ -59,7 +176,31 @@ class ExpressionTranslator:
         """
         if not expr:
             return expr
+        return self._translate_cached(expr)
+
+    def cache_info(self):
+        """Return hit/miss statistics of the translation cache.
+
+        Returns:
+            functools ``CacheInfo(hits, misses, maxsize, currsize)``
+        """
+        return self._translate_cached.cache_info()
+
+    def cache_clear(self) -> None:
+        """Drop all cached translations and reset statistics."""
+        self._translate_cached.cache_clear()
+
+    def _translate_uncached(self, expr: str) -> str:
+        if self.engine == "parser":
+            try:
+                return self._emitter.emit(parse_expression(expr))
+            except ExpressionSyntaxError:
+                pass
+
+        return self._translate_regex(expr)
 
+    def _translate_regex(self, expr: str) -> str:
+        """Translate with the sequential regex pipeline."""
         result = expr
 
         # Order matters: translate inner constructs before outer ones
@@ -95,29 +236,23 @@ class ExpressionTranslator:
     # Field references: [Field Name] → "Field Name"
     # ------------------------------------------------------------------
     def _translate_field_refs(self, expr: str) -> str:
-        return re.sub(r'\[([^\]]+)\]', r'"\1"', expr)
+        return _RE_FIELD_REF.sub(r'"\1"', expr)
 
     # ------------------------------------------------------------------
     # Operators: == → =
     # ------------------------------------------------------------------
     def _translate_operators(self, expr: str) -> str:
         # Replace == with = (but not inside strings)
-        return re.sub(r'(?<!=)==(?!=)', '=', expr)
+        return _RE_DOUBLE_EQUALS.sub('=', expr)
 
     # ------------------------------------------------------------------
     # IF / THEN / ELSEIF / ELSE / END → CASE WHEN
     # ------------------------------------------------------------------
     def _translate_if_then(self, expr: str) -> str:
         # Multi-step: first handle ELSEIF → WHEN
-        result = re.sub(
-            r'\bELSEIF\b', 'WHEN',
-            expr, flags=re.IGNORECASE
-        )
+        result = _RE_ELSEIF.sub('WHEN', expr)
         # IF ... THEN → CASE WHEN ... THEN
-        result = re.sub(
-            r'\bIF\b\s+', 'CASE WHEN ',
-            result, flags=re.IGNORECASE
-        )
+        result = _RE_IF.sub('CASE WHEN ', result)
         # ELSE stays the same, END stays the same — compatible with SQL CASE
         return result
 
@@ -132,70 +267,52 @@ class ExpressionTranslator:
     # IIF(condition, then, else) → CASE WHEN condition THEN then ELSE else END
     # ------------------------------------------------------------------
     def _translate_iif(self, expr: str) -> str:
-        pattern = re.compile(
-            r'\bIIF\s*\(\s*(.+?)\s*,\s*(.+?)\s*,\s*(.+?)\s*\)',
-            re.IGNORECASE
-        )
         def _replace(m):
             cond, then_val, else_val = m.group(1), m.group(2), m.group(3)
             return f"CASE WHEN {cond} THEN {then_val} ELSE {else_val} END"
-        return pattern.sub(_replace, expr)
+        return _RE_IIF.sub(_replace, expr)
 
     # ------------------------------------------------------------------
     # ISNULL(expr) → (expr) IS NULL
     # ------------------------------------------------------------------
     def _translate_isnull(self, expr: str) -> str:
-        pattern = re.compile(r'\bISNULL\s*\(\s*(.+?)\s*\)', re.IGNORECASE)
-        return pattern.sub(r'(\1) IS NULL', expr)
+        return _RE_ISNULL.sub(r'(\1) IS NULL', expr)
 
     # ------------------------------------------------------------------
     # IFNULL(a, b) → COALESCE(a, b)
     # ------------------------------------------------------------------
     def _translate_ifnull(self, expr: str) -> str:
-        return re.sub(r'\bIFNULL\s*\(', 'COALESCE(', expr, flags=re.IGNORECASE)
+        return _RE_IFNULL.sub('COALESCE(', expr)
 
     # ------------------------------------------------------------------
     # ZN(expr) → COALESCE(expr, 0)
     # ------------------------------------------------------------------
     def _translate_zn(self, expr: str) -> str:
-        pattern = re.compile(r'\bZN\s*\(\s*(.+?)\s*\)', re.IGNORECASE)
-        return pattern.sub(r'COALESCE(\1, 0)', expr)
+        return _RE_ZN.sub(r'COALESCE(\1, 0)', expr)
 
     # ------------------------------------------------------------------
     # CONTAINS(string, substring) → string LIKE '%' || substring || '%'
     # ------------------------------------------------------------------
     def _translate_contains(self, expr: str) -> str:
-        pattern = re.compile(
-            r'\bCONTAINS\s*\(\s*(.+?)\s*,\s*(.+?)\s*\)',
-            re.IGNORECASE
-        )
-        return pattern.sub(r"\1 LIKE '%' || \2 || '%'", expr)
+        return _RE_CONTAINS.sub(r"\1 LIKE '%' || \2 || '%'", expr)
 
     # ------------------------------------------------------------------
     # STARTSWITH(string, sub) → string LIKE sub || '%'
     # ------------------------------------------------------------------
     def _translate_startswith(self, expr: str) -> str:
-        pattern = re.compile(
-            r'\bSTARTSWITH\s*\(\s*(.+?)\s*,\s*(.+?)\s*\)',
-            re.IGNORECASE
-        )
-        return pattern.sub(r"\1 LIKE \2 || '%'", expr)
+        return _RE_STARTSWITH.sub(r"\1 LIKE \2 || '%'", expr)
 
     # ------------------------------------------------------------------
     # ENDSWITH(string, sub) → string LIKE '%' || sub
     # ------------------------------------------------------------------
     def _translate_endswith(self, expr: str) -> str:
-        pattern = re.compile(
-            r'\bENDSWITH\s*\(\s*(.+?)\s*,\s*(.+?)\s*\)',
-            re.IGNORECASE
-        )
-        return pattern.sub(r"\1 LIKE '%' || \2", expr)
+        return _RE_ENDSWITH.sub(r"\1 LIKE '%' || \2", expr)
 
     # ------------------------------------------------------------------
     # LEN(s) → LENGTH(s)
     # ------------------------------------------------------------------
     def _translate_len(self, expr: str) -> str:
-        return re.sub(r'\bLEN\s*\(', 'LENGTH(', expr, flags=re.IGNORECASE)
+        return _RE_LEN.sub('LENGTH(', expr)
 
     # ------------------------------------------------------------------
     # MID(s, start, len) → SUBSTRING(s FROM start FOR len)
@@ -203,97 +320,63 @@ class ExpressionTranslator:
     # ------------------------------------------------------------------
     def _translate_mid(self, expr: str) -> str:
         # Three-argument form
-        pattern3 = re.compile(
-            r'\bMID\s*\(\s*(.+?)\s*,\s*(\d+)\s*,\s*(\d+)\s*\)',
-            re.IGNORECASE
-        )
-        result = pattern3.sub(r'SUBSTRING(\1 FROM \2 FOR \3)', expr)
-
+        result = _RE_MID3.sub(r'SUBSTRING(\1 FROM \2 FOR \3)', expr)
         # Two-argument form
-        pattern2 = re.compile(
-            r'\bMID\s*\(\s*(.+?)\s*,\s*(\d+)\s*\)',
-            re.IGNORECASE
-        )
-        result = pattern2.sub(r'SUBSTRING(\1 FROM \2)', result)
-        return result
+        return _RE_MID2.sub(r'SUBSTRING(\1 FROM \2)', result)
 
     # ------------------------------------------------------------------
     # FIND(string, substring) → POSITION(substring IN string)
     # ------------------------------------------------------------------
     def _translate_find(self, expr: str) -> str:
-        pattern = re.compile(
-            r'\bFIND\s*\(\s*(.+?)\s*,\s*(.+?)\s*\)',
-            re.IGNORECASE
-        )
-        return pattern.sub(r'POSITION(\2 IN \1)', expr)
+        return _RE_FIND.sub(r'POSITION(\2 IN \1)', expr)
 
     # ------------------------------------------------------------------
     # PROPER(s) → INITCAP(s)
     # ------------------------------------------------------------------
     def _translate_proper(self, expr: str) -> str:
-        return re.sub(r'\bPROPER\s*\(', 'INITCAP(', expr, flags=re.IGNORECASE)
+        return _RE_PROPER.sub('INITCAP(', expr)
 
     # ------------------------------------------------------------------
     # COUNTD(expr) → COUNT(DISTINCT expr)
     # ------------------------------------------------------------------
     def _translate_countd(self, expr: str) -> str:
-        pattern = re.compile(r'\bCOUNTD\s*\(\s*(.+?)\s*\)', re.IGNORECASE)
-        return pattern.sub(r'COUNT(DISTINCT \1)', expr)
+        return _RE_COUNTD.sub(r'COUNT(DISTINCT \1)', expr)
 
     # ------------------------------------------------------------------
     # DATEPART('part', date) → EXTRACT(part FROM date)
     # ------------------------------------------------------------------
     def _translate_datepart(self, expr: str) -> str:
-        pattern = re.compile(
-            r'\bDATEPART\s*\(\s*[\'"](\w+)[\'"]\s*,\s*(.+?)\s*\)',
-            re.IGNORECASE
-        )
-        return pattern.sub(r'EXTRACT(\1 FROM \2)', expr)
+        return _RE_DATEPART.sub(r'EXTRACT(\1 FROM \2)', expr)
 
     # ------------------------------------------------------------------
     # DATEADD('part', n, date) → date + INTERVAL 'n' part
     # ------------------------------------------------------------------
     def _translate_dateadd(self, expr: str) -> str:
-        pattern = re.compile(
-            r'\bDATEADD\s*\(\s*[\'"](\w+)[\'"]\s*,\s*(.+?)\s*,\s*(.+?)\s*\)',
-            re.IGNORECASE
-        )
         def _replace(m):
             part, interval, date = m.group(1), m.group(2), m.group(3)
             return f"{date} + INTERVAL '{interval}' {part.upper()}"
-        return pattern.sub(_replace, expr)
+        return _RE_DATEADD.sub(_replace, expr)
 
     # ------------------------------------------------------------------
     # DATEDIFF('part', start, end) → approximate translation
     # ------------------------------------------------------------------
     def _translate_datediff(self, expr: str) -> str:
-        pattern = re.compile(
-            r'\bDATEDIFF\s*\(\s*[\'"](\w+)[\'"]\s*,\s*(.+?)\s*,\s*(.+?)\s*\)',
-            re.IGNORECASE
-        )
         def _replace(m):
             part, start, end = m.group(1), m.group(2), m.group(3)
             return f"/* DATEDIFF({part}) */ EXTRACT(EPOCH FROM ({end}) - ({start}))"
-        return pattern.sub(_replace, expr)
+        return _RE_DATEDIFF.sub(_replace, expr)
 
     # ------------------------------------------------------------------
     # DATETRUNC('part', date) → DATE_TRUNC('part', date)
     # ------------------------------------------------------------------
     def _translate_datetrunc(self, expr: str) -> str:
-        return re.sub(
-            r'\bDATETRUNC\s*\(', "DATE_TRUNC(",
-            expr, flags=re.IGNORECASE
-        )
+        return _RE_DATETRUNC.sub("DATE_TRUNC(", expr)
 
     # ------------------------------------------------------------------
     # YEAR(d)/MONTH(d)/DAY(d) → EXTRACT(YEAR/MONTH/DAY FROM d)
     # ------------------------------------------------------------------
     def _translate_year_month_day(self, expr: str) -> str:
-        for part in ("YEAR", "MONTH", "DAY"):
-            pattern = re.compile(
-                rf'\b{part}\s*\(\s*(.+?)\s*\)',
-                re.IGNORECASE
-            )
+        for part, pattern in _RE_DATE_PARTS:
             expr = pattern.sub(rf'EXTRACT({part} FROM \1)', expr)
         return expr
 
@@ -301,18 +384,14 @@ class ExpressionTranslator:
     # NOW() → CURRENT_TIMESTAMP, TODAY() → CURRENT_DATE
     # ------------------------------------------------------------------
     def _translate_now_today(self, expr: str) -> str:
-        expr = re.sub(r'\bNOW\s*\(\s*\)', 'CURRENT_TIMESTAMP', expr, flags=re.IGNORECASE)
-        expr = re.sub(r'\bTODAY\s*\(\s*\)', 'CURRENT_DATE', expr, flags=re.IGNORECASE)
-        return expr
+        expr = _RE_NOW.sub('CURRENT_TIMESTAMP', expr)
+        return _RE_TODAY.sub('CURRENT_DATE', expr)
 
     # ------------------------------------------------------------------
     # MAKEDATE(y, m, d) → MAKE_DATE(y, m, d)  (SQL:2003)
     # ------------------------------------------------------------------
     def _translate_makedate(self, expr: str) -> str:
-        return re.sub(
-            r'\bMAKEDATE\s*\(', 'MAKE_DATE(',
-            expr, flags=re.IGNORECASE
-        )
+        return _RE_MAKEDATE.sub('MAKE_DATE(', expr)
 
     # ------------------------------------------------------------------
     # INT(x) → CAST(x AS INTEGER)
@@ -322,29 +401,14 @@ class ExpressionTranslator:
     # DATETIME(x) → CAST(x AS TIMESTAMP)
     # ------------------------------------------------------------------
     def _translate_type_cast(self, expr: str) -> str:
-        cast_map = {
-            "INT": "INTEGER",
-            "FLOAT": "REAL",
-            "STR": "VARCHAR",
-            "DATE": "DATE",
-            "DATETIME": "TIMESTAMP",
-        }
-        for func, sql_type in cast_map.items():
-            pattern = re.compile(
-                rf'\b{func}\s*\(\s*(.+?)\s*\)',
-                re.IGNORECASE
-            )
-            expr = pattern.sub(rf'CAST(\1 AS {sql_type})', expr)
+        for pattern, replacement in _RE_TYPE_CASTS:
+            expr = pattern.sub(replacement, expr)
         return expr
 
     # ------------------------------------------------------------------
     # Unsupported functions → /* [UNSUPPORTED: FUNC] */ original
     # ------------------------------------------------------------------
     def _translate_unsupported(self, expr: str) -> str:
-        for func in self._UNSUPPORTED_FUNCS:
-            pattern = re.compile(
-                rf'(\b{func}\s*\([^)]*\))',
-                re.IGNORECASE
-            )
-            expr = pattern.sub(rf'/* UNSUPPORTED: {func} */ \1', expr)
-        return expr
+        return _RE_UNSUPPORTED.sub(
+            lambda m: f"/* UNSUPPORTED: {m.group(1).upper()} */ {m.group(1)}", expr
+        )
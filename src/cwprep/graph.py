@@ -0,0 +1,230 @@
+"""
+Flow DAG Adjacency Index
+
+Builds the parent/child adjacency of a flow's node graph in a single pass over
+``nextNodes``, so graph consumers can look up a node's parents (with the
+namespace each edge targets, e.g. "Left"/"Right" for joins or a
+"Union-Namespace-..." for unions) without rescanning every node.
+
+Usage:
+    from cwprep.graph import FlowGraph
+
+    graph = FlowGraph(flow["nodes"])
+    graph.parents_of(join_id)      # [(left_id, "Left"), (right_id, "Right")]
+    graph.topological_order(flow["initialNodes"])
+
+    # Structural fingerprint of a node, independent of its IDs and name
+    content, local_ids = canonical_node(flow["nodes"][node_id])
+    content_digest(content)
+"""
+
+import hashlib
+import json
+from collections import deque
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+# Try to import optional dependencies
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+    orjson = None
+
+
+# (node_id, namespace) — namespace is the edge's "nextNamespace"
+Edge = Tuple[str, str]
+
+
+class FlowGraph:
+    """Parent/child adjacency index over a flow ``nodes`` mapping.
+
+    The index is built once in O(V + E). Parent lists preserve the order in
+    which nodes appear in ``nodes``, matching what a linear scan would find.
+
+    Args:
+        nodes: Mapping of node_id -> node dict (flow JSON or builder nodes)
+    """
+
+    def __init__(self, nodes: Mapping[str, Any]):
+        self.nodes = nodes
+        self.parents: Dict[str, List[Edge]] = {}
+        self.children: Dict[str, List[Edge]] = {}
+
+        for nid, node in nodes.items():
+            for link in node.get("nextNodes") or []:
+                child_id = link.get("nextNodeId")
+                if not child_id:
+                    continue
+                namespace = link.get("nextNamespace", "")
+                self.children.setdefault(nid, []).append((child_id, namespace))
+                self.parents.setdefault(child_id, []).append((nid, namespace))
+
+    def parents_of(self, node_id: str) -> List[Edge]:
+        """Return ``(parent_id, namespace)`` edges pointing into a node."""
+        return self.parents.get(node_id, [])
+
+    def children_of(self, node_id: str) -> List[Edge]:
+        """Return ``(child_id, namespace)`` edges leaving a node."""
+        return self.children.get(node_id, [])
+
+    def parent_ids(self, node_id: str) -> List[str]:
+        """Return parent node IDs in edge order."""
+        return [pid for pid, _ns in self.parents.get(node_id, [])]
+
+    def child_ids(self, node_id: str) -> List[str]:
+        """Return child node IDs in edge order."""
+        return [cid for cid, _ns in self.children.get(node_id, [])]
+
+    def topological_order(self, initial_nodes: Optional[List[str]] = None) -> List[str]:
+        """Topological sort (Kahn's algorithm) in O(V + E).
+
+        Traversal starts from ``initial_nodes`` (in their given order), then
+        any other node without parents. Nodes left over because of cycles or
+        dangling references are appended at the end.
+        """
+        nodes = self.nodes
+        in_degree: Dict[str, int] = {
+            nid: len(self.parents.get(nid, ())) for nid in nodes
+        }
+
+        seen = set()
+        start: List[str] = []
+        for nid in initial_nodes or []:
+            if nid in nodes and nid not in seen:
+                start.append(nid)
+                seen.add(nid)
+        for nid in nodes:
+            if in_degree[nid] == 0 and nid not in seen:
+                start.append(nid)
+                seen.add(nid)
+
+        queue = deque(start)
+        result = []
+        visited = set()
+        while queue:
+            nid = queue.popleft()
+            if nid in visited:
+                continue
+            visited.add(nid)
+            result.append(nid)
+            for child_id, _ns in self.children.get(nid, ()):
+                if child_id not in in_degree:
+                    continue
+                in_degree[child_id] -= 1
+                if in_degree[child_id] <= 0 and child_id not in visited:
+                    queue.append(child_id)
+
+        if len(result) < len(in_degree):
+            result.extend(nid for nid in nodes if nid not in visited)
+
+        return result
+
+
+def action_chain(actions: Mapping[str, Any], initial: List[str]) -> List[Dict[str, Any]]:
+    """Clean-step actions (``loomContainer`` nodes) in order, following nextNodes."""
+    result = []
+    seen = set()
+    current = initial[0] if initial else None
+    while current in actions and current not in seen:
+        seen.add(current)
+        action = actions[current]
+        result.append(action)
+        links = action.get("nextNodes") or []
+        current = links[0].get("nextNodeId") if links else None
+    return result
+
+
+# ---------------------------------------------------------------------------
+# Canonical node content
+# ---------------------------------------------------------------------------
+
+# Keys that do not change what a node computes
+CANONICAL_IGNORED_KEYS = ("id", "name", "description", "nextNodes")
+
+# Labels of nested actions (any mapping with a nodeType), ignored as well
+_ACTION_LABEL_KEYS = ("name", "description")
+
+# Keys whose string values are IDs local to one node (its own ID, inner
+# action IDs, union namespace names)
+_LOCAL_ID_KEYS = ("id", "namespaceName")
+
+
+# JSON scalars, checked first: isinstance() against the typing ABCs is
+# several times slower and would dominate on large flows
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def _collect_local_ids(value: Any, found: Dict[str, str]) -> None:
+    if isinstance(value, _SCALARS):
+        return
+    if isinstance(value, dict) or (not isinstance(value, list) and isinstance(value, Mapping)):
+        for key, item in value.items():
+            if key in _LOCAL_ID_KEYS and isinstance(item, str) and item not in found:
+                found[item] = f"${len(found)}"
+            _collect_local_ids(item, found)
+    elif isinstance(value, list):
+        for item in value:
+            _collect_local_ids(item, found)
+
+
+def _substitute(value: Any, local_ids: Dict[str, str]) -> Any:
+    if isinstance(value, str):
+        return local_ids.get(value, value)
+    if isinstance(value, _SCALARS):
+        return value
+    if isinstance(value, dict) or (not isinstance(value, list) and isinstance(value, Mapping)):
+        skip = _ACTION_LABEL_KEYS if "nodeType" in value else ()
+        return {
+            local_ids.get(key, key): _substitute(item, local_ids)
+            for key, item in value.items()
+            if key not in skip
+        }
+    if isinstance(value, list):
+        return [_substitute(item, local_ids) for item in value]
+    return value
+
+
+def canonical_node(
+    node: Mapping[str, Any],
+    ignore: Iterable[str] = CANONICAL_IGNORED_KEYS,
+) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """Return a node's content with node-local IDs made positional.
+
+    The node's own ID, the IDs of its inner actions and its union namespace
+    names are replaced by ``$0``, ``$1``, ... in order of first appearance,
+    so two nodes built the same way compare equal even though every ID
+    differs. Top-level keys in ``ignore`` are dropped, as are the names and
+    descriptions of nested actions.
+
+    Returns:
+        (content, local_ids): plain-dict content, and the mapping of original
+        local ID -> placeholder (use it to canonicalize edge namespaces)
+    """
+    local_ids: Dict[str, str] = {}
+    _collect_local_ids(node, local_ids)
+    ignored = set(ignore)
+    content = {
+        key: _substitute(value, local_ids)
+        for key, value in node.items()
+        if key not in ignored
+    }
+    return content, local_ids
+
+
+def content_digest(value: Any) -> str:
+    """SHA-256 hex digest of a JSON value (key order does not matter).
+
+    Uses orjson when installed; digests are only comparable within one
+    environment, not persisted.
+    """
+    if HAS_ORJSON:
+        try:
+            encoded = orjson.dumps(value, default=str, option=orjson.OPT_SORT_KEYS)
+            return hashlib.sha256(encoded).hexdigest()
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits
+    encoded = json.dumps(
+        value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str
+    )
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
@@ -0,0 +1,208 @@
+"""
+Streaming JSON Encoder
+
+Writes the flow documents as JSON chunks straight into a binary stream (e.g. a
+zip entry) instead of rendering one large string. The outer levels of the
+document (the flow object, its ``nodes`` mapping, ...) are walked
+incrementally and each node is encoded on its own, so a builder's compact
+``NodeRecord`` nodes are materialized one at a time.
+
+Backends:
+    "json"    stdlib json (default, output identical to ``json.dumps``)
+    "orjson"  orjson, if installed
+    "msgspec" msgspec, if installed
+    "auto"    orjson, then msgspec, then json
+
+Usage:
+    from cwprep.jsonstream import dump_json
+
+    with zipf.open("flow", "w") as fp:
+        dump_json(flow, fp, indent=2, backend="auto")
+"""
+
+import json
+from collections.abc import Mapping
+from typing import Any, BinaryIO, Callable, Iterator, Optional
+
+from .records import NodeRecord
+
+# Try to import optional dependencies
+try:
+    import orjson
+    HAS_ORJSON = True
+except ImportError:
+    HAS_ORJSON = False
+    orjson = None
+
+try:
+    import msgspec
+    HAS_MSGSPEC = True
+except ImportError:
+    HAS_MSGSPEC = False
+    msgspec = None
+
+
+JSON_BACKENDS = ("auto", "json", "orjson", "msgspec")
+
+# Levels of nesting walked incrementally; deeper values are encoded whole.
+# 2 = flow object -> nodes mapping -> one node per encode call.
+DEFAULT_STREAM_DEPTH = 2
+
+# Chunks are coalesced into writes of roughly this many bytes.
+DEFAULT_WRITE_SIZE = 64 * 1024
+
+
+def json_default(obj: Any) -> Any:
+    """``default`` hook that materializes compact node records."""
+    if isinstance(obj, NodeRecord):
+        return obj.to_dict()
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def resolve_backend(backend: str = "json") -> str:
+    """Validate a backend name and resolve "auto" to an installed backend."""
+    if backend not in JSON_BACKENDS:
+        raise ValueError(
+            f"Unknown JSON backend: {backend!r}. Choose from {JSON_BACKENDS}."
+        )
+    if backend == "auto":
+        if HAS_ORJSON:
+            return "orjson"
+        if HAS_MSGSPEC:
+            return "msgspec"
+        return "json"
+    if backend == "orjson" and not HAS_ORJSON:
+        raise ImportError("JSON backend 'orjson' requires: pip install orjson")
+    if backend == "msgspec" and not HAS_MSGSPEC:
+        raise ImportError("JSON backend 'msgspec' requires: pip install msgspec")
+    return backend
+
+
+def _make_encoder(backend: str, indent: Optional[int], sort_keys: bool) -> Callable[[Any], bytes]:
+    """Return a function encoding one value to UTF-8 JSON bytes."""
+    if backend == "orjson":
+        if indent not in (None, 2):
+            raise ValueError("The orjson backend only supports indent=2 or compact output")
+        option = 0
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return lambda value: orjson.dumps(value, default=json_default, option=option)
+
+    if backend == "msgspec":
+        encoder = msgspec.json.Encoder(
+            enc_hook=json_default, order="sorted" if sort_keys else None
+        )
+        if indent:
+            return lambda value: msgspec.json.format(encoder.encode(value), indent=indent)
+        return encoder.encode
+
+    separators = None if indent else (",", ":")
+    encoder = json.JSONEncoder(
+        indent=indent,
+        separators=separators,
+        ensure_ascii=False,
+        sort_keys=sort_keys,
+        default=json_default,
+    )
+    return lambda value: encoder.encode(value).encode("utf-8")
+
+
+def iter_json(
+    obj: Any,
+    indent: Optional[int] = 2,
+    sort_keys: bool = False,
+    backend: str = "json",
+    stream_depth: int = DEFAULT_STREAM_DEPTH,
+) -> Iterator[bytes]:
+    """
+    Encode ``obj`` as a sequence of UTF-8 JSON chunks
+
+    Args:
+        obj: JSON document (dicts, lists, scalars and NodeRecords)
+        indent: Indent width, or None for compact output without whitespace
+        sort_keys: Sort mapping keys
+        backend: One of JSON_BACKENDS
+        stream_depth: Levels walked incrementally before values are encoded whole
+
+    Yields:
+        bytes: Consecutive pieces of the document
+    """
+    encode = _make_encoder(resolve_backend(backend), indent, sort_keys)
+    item_sep = b","
+    key_sep = b": " if indent else b":"
+
+    def newline(level: int) -> bytes:
+        return b"\n" + b" " * (indent * level) if indent else b""
+
+    def walk(value: Any, depth: int, level: int) -> Iterator[bytes]:
+        streamable_mapping = isinstance(value, Mapping) and not isinstance(value, NodeRecord)
+        if depth > 0 and streamable_mapping and value:
+            items = sorted(value.items()) if sort_keys else value.items()
+            yield b"{"
+            first = True
+            for key, item in items:
+                prefix = b"" if first else item_sep
+                first = False
+                key_json = json.dumps(key, ensure_ascii=False).encode("utf-8")
+                yield prefix + newline(level + 1) + key_json + key_sep
+                yield from walk(item, depth - 1, level + 1)
+            yield newline(level) + b"}"
+        elif depth > 0 and isinstance(value, list) and value:
+            yield b"["
+            for i, item in enumerate(value):
+                yield (item_sep if i else b"") + newline(level + 1)
+                yield from walk(item, depth - 1, level + 1)
+            yield newline(level) + b"]"
+        else:
+            encoded = encode(value)
+            if indent and level:
+                # Structural newlines only: newlines inside strings are escaped.
+                encoded = encoded.replace(b"\n", newline(level))
+            yield encoded
+
+    yield from walk(obj, stream_depth, 0)
+
+
+def dump_json(
+    obj: Any,
+    fp: BinaryIO,
+    indent: Optional[int] = 2,
+    sort_keys: bool = False,
+    backend: str = "json",
+    write_size: int = DEFAULT_WRITE_SIZE,
+) -> int:
+    """
+    Stream ``obj`` as UTF-8 JSON into a binary file object
+
+    Returns:
+        int: Number of bytes written
+    """
+    written = 0
+    pending = []
+    pending_size = 0
+    for chunk in iter_json(obj, indent=indent, sort_keys=sort_keys, backend=backend):
+        pending.append(chunk)
+        pending_size += len(chunk)
+        if pending_size >= write_size:
+            fp.write(b"".join(pending))
+            written += pending_size
+            pending = []
+            pending_size = 0
+    if pending:
+        fp.write(b"".join(pending))
+        written += pending_size
+    return written
+
+
+def dumps_json(
+    obj: Any,
+    indent: Optional[int] = 2,
+    sort_keys: bool = False,
+    backend: str = "json",
+) -> bytes:
+    """Encode ``obj`` to UTF-8 JSON bytes (same chunks as dump_json, joined)."""
+    return b"".join(iter_json(obj, indent=indent, sort_keys=sort_keys, backend=backend))
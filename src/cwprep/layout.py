@@ -0,0 +1,170 @@
+"""
+Layered Flow Layout
+
+Assigns Tableau Prep canvas grid positions to flow nodes with a layered
+(Sugiyama-style) layout:
+
+    1. Layers   Longest path from the inputs, so every edge points right
+    2. Order    Barycentric sweeps down and up the layers to reduce crossings
+    3. Rows     Each node takes the free row closest to its parents' mean row,
+                so linear chains stay on one row
+
+Inputs are then pulled right to sit just before their first consumer.
+Runs in O((V + E) * sweeps + V log V); no dummy nodes are inserted for edges
+that skip layers, and sweeping stops early once the order is stable.
+
+extend_layout keeps existing positions (e.g. of a flow loaded from a file)
+and only places the nodes added since.
+
+Usage:
+    from cwprep.layout import layered_layout
+
+    positions = layered_layout(flow["nodes"], flow["initialNodes"])
+    positions[node_id]      # (x, y) grid cell, both starting at 0 / 1
+"""
+
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from .graph import FlowGraph
+
+
+DEFAULT_SWEEPS = 4
+
+
+def _assign_layers(
+    order: List[str],
+    parents: Dict[str, List[str]],
+    children: Dict[str, List[str]],
+) -> List[List[str]]:
+    """Longest-path layering over a topological order"""
+    layer: Dict[str, int] = {}
+    for node_id in order:
+        ranks = [layer[pid] for pid in parents.get(node_id, ()) if pid in layer]
+        layer[node_id] = max(ranks) + 1 if ranks else 0
+    # Pull inputs right, next to their first consumer, instead of stacking
+    # every input in column 0
+    for node_id in order:
+        if node_id not in parents:
+            ranks = [layer[cid] for cid in children.get(node_id, ()) if cid in layer]
+            if ranks:
+                layer[node_id] = max(min(ranks) - 1, 0)
+
+    layers: List[List[str]] = [[] for _ in range(max(layer.values(), default=-1) + 1)]
+    for node_id in order:
+        layers[layer[node_id]].append(node_id)
+    return layers
+
+
+def _reorder(
+    members: List[str],
+    neighbours: Dict[str, List[str]],
+    index: Dict[str, int],
+) -> bool:
+    """Sort one layer by the mean index of each node's neighbours (in place)
+
+    Returns:
+        bool: Whether the order changed
+    """
+    keyed = []
+    for pos, node_id in enumerate(members):
+        ranks = [index[nid] for nid in neighbours.get(node_id, ()) if nid in index]
+        # Nodes without neighbours on that side keep their slot, yielding ties
+        # to nodes that are attached
+        barycenter = sum(ranks) / len(ranks) if ranks else pos
+        keyed.append((barycenter, not ranks, pos, node_id))
+    keyed.sort()
+    changed = False
+    for pos, (_barycenter, _detached, old_pos, node_id) in enumerate(keyed):
+        if pos != old_pos:
+            members[pos] = node_id
+            index[node_id] = pos
+            changed = True
+    return changed
+
+
+def layered_layout(
+    nodes: Mapping[str, Any],
+    initial_nodes: Optional[List[str]] = None,
+    sweeps: int = DEFAULT_SWEEPS,
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Compute grid positions for every node
+
+    Args:
+        nodes: Mapping of node_id -> node dict (flow JSON or builder nodes)
+        initial_nodes: Input node IDs, used to seed the order of the first layer
+        sweeps: Number of down+up barycentric passes (0 keeps topological order)
+
+    Returns:
+        dict: node_id -> (x, y); x is the layer, y the row (starting at 1)
+    """
+    if sweeps < 0:
+        raise ValueError("sweeps must be >= 0")
+    graph = FlowGraph(nodes)
+    parents = {nid: [pid for pid, _ns in edges] for nid, edges in graph.parents.items()}
+    children = {nid: [cid for cid, _ns in edges] for nid, edges in graph.children.items()}
+    layers = _assign_layers(graph.topological_order(initial_nodes), parents, children)
+
+    index = {node_id: pos for members in layers for pos, node_id in enumerate(members)}
+    # Single-node layers never change order
+    crowded = [members for members in layers if len(members) > 1]
+    for _ in range(sweeps):
+        changed = False
+        for members in crowded:
+            changed |= _reorder(members, parents, index)
+        for members in reversed(crowded):
+            changed |= _reorder(members, children, index)
+        if not changed:
+            break
+
+    row: Dict[str, int] = {}
+    positions: Dict[str, Tuple[int, int]] = {}
+    for x, members in enumerate(layers):
+        next_free = 0
+        for node_id in members:
+            parent_rows = [row[pid] for pid in parents.get(node_id, ()) if pid in row]
+            wanted = round(sum(parent_rows) / len(parent_rows)) if parent_rows else next_free
+            y = max(wanted, next_free)
+            row[node_id] = y
+            next_free = y + 1
+            positions[node_id] = (x, y + 1)
+    return positions
+
+
+def extend_layout(
+    nodes: Mapping[str, Any],
+    fixed: Mapping[str, Tuple[int, int]],
+    initial_nodes: Optional[List[str]] = None,
+) -> Dict[str, Tuple[int, int]]:
+    """
+    Place nodes added to a flow that already has positions, leaving the rest
+
+    Each new node goes one column right of its rightmost parent, on the free
+    row closest below its parents' mean row; new sources go in column 0.
+
+    Args:
+        nodes: Mapping of node_id -> node dict
+        fixed: node_id -> (x, y) positions to keep (e.g. loaded from a file)
+        initial_nodes: Input node IDs, used to seed the topological order
+
+    Returns:
+        dict: node_id -> (x, y) for every node in nodes
+    """
+    graph = FlowGraph(nodes)
+    positions = {nid: tuple(pos) for nid, pos in fixed.items() if nid in nodes}
+    occupied = set(positions.values())
+    for node_id in graph.topological_order(initial_nodes):
+        if node_id in positions:
+            continue
+        placed = [positions[pid] for pid, _ns in graph.parents.get(node_id, ())
+                  if pid in positions]
+        if placed:
+            x = max(px for px, _py in placed) + 1
+            y = max(round(sum(py for _px, py in placed) / len(placed)), 1)
+        else:
+            x, y = 0, 1
+        while (x, y) in occupied:
+            y += 1
+        positions[node_id] = (x, y)
+        occupied.add((x, y))
+    return positions
@@ -0,0 +1,853 @@
+"""
+Column-Level Lineage
+
+Traces every column of a flow back to the source table columns it is
+computed from, through clean-step actions (renames, calculations, quick
+calcs, type changes, duplicates, kept / removed columns), joins, unions,
+aggregates, pivots and unpivots. Calculation inputs are the field
+references of the formula, found with the expression tokenizer.
+
+Columns are resolved on demand and memoized per (node, column). A column
+that passes through a step unchanged is not copied, and a lookup skips
+straight to the only step that can provide the column (ancestor bitsets),
+so building the lineage of a flow is linear in its nodes and the columns its
+steps name. Flows without field metadata (e.g. built with TFLBuilder) have
+open schemas: any column asked for is traced to the inputs that could
+provide it; a column that could come from either side of such a join is
+traced to both.
+
+Lineage can cross flows: an input reading a published data source (a
+"sqlproxy" connection) continues into the flow whose PublishExtract output
+publishes that data source.
+
+Usage:
+    from cwprep.lineage import FlowLineage, CrossFlowLineage
+
+    lineage = FlowLineage(flow, flow_name="orders")
+    lineage.sources(output_id, "double_amount")
+    # [SourceColumn(flow="orders", node_id=..., column="amount",
+    #               table="[sales].[orders]", ...)]
+    lineage.to_json()                    # {"edges": [...]} for governance tools
+
+    cross = CrossFlowLineage([FlowLineage.from_tfl(p) for p in paths])
+    cross.sources("reporting", output_id, "total")
+"""
+
+import json
+import os
+import re
+from collections import deque
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from .expression_parser import ExpressionSyntaxError, tokenize
+from .graph import FlowGraph, action_chain
+from .translator import aggregate_output_name
+
+
+INPUT_NODE_TYPES = (".v1.LoadSql", ".v1.LoadExcel", ".v1.LoadCsv", ".v1.LoadCsvInputUnion")
+
+# Connection class of inputs reading a published data source
+PUBLISHED_DATASOURCE_CLASS = "sqlproxy"
+
+_RE_FIELD_REF = re.compile(r"\[((?:[^\]]|\]\])*)\]")
+
+
+class ColumnRef(NamedTuple):
+    """A column as output by one node of one flow"""
+    flow: str
+    node_id: str
+    column: str
+
+
+class Derivation(NamedTuple):
+    """How a column is computed from its input columns"""
+    # source, rename, calculation, quick_calc, change_type, duplicate, join,
+    # union, aggregate, pivot, unpivot, published
+    kind: str
+    inputs: Tuple[ColumnRef, ...]
+    expression: Optional[str] = None
+
+
+class SourceColumn(NamedTuple):
+    """A column read by an input node"""
+    flow: str
+    node_id: str
+    column: str
+    # "[schema].[table]", custom SQL, or file name (whichever the input reads)
+    table: Optional[str] = None
+    query: Optional[str] = None
+    filename: Optional[str] = None
+    server: Optional[str] = None
+    dbname: Optional[str] = None
+
+
+@lru_cache(maxsize=4096)
+def field_references(expression: str) -> Tuple[str, ...]:
+    """
+    Column names referenced by a formula, in order of first appearance
+
+    Bracketed names inside string literals and comments are not references.
+    Formulas the tokenizer rejects fall back to a plain [name] scan.
+    """
+    try:
+        names = [
+            token.value[1:-1].replace("]]", "]")
+            for token in tokenize(expression)
+            if token.kind == "field"
+        ]
+    except ExpressionSyntaxError:
+        names = [name.replace("]]", "]") for name in _RE_FIELD_REF.findall(expression)]
+    return tuple(dict.fromkeys(names))
+
+
+class _Step:
+    """What one node does to the columns of its parents"""
+
+    __slots__ = ("defs", "fallback", "merge", "join", "source", "parents", "base", "ops")
+
+    def __init__(self, parents: List[str], base: str = "parents"):
+        # column -> ColumnRef defined here, or None if the column is dropped
+        self.defs: Dict[str, Optional[ColumnRef]] = {}
+        # Parents that provide columns not in defs (empty: schema is closed)
+        self.fallback: List[str] = []
+        # Derivation kind when more than one fallback parent provides a column
+        self.merge = "union"
+        # (left, right) parents of a join
+        self.join: Optional[Tuple[str, str]] = None
+        # Input with unknown fields: any column name is a source column
+        self.source = False
+        # Known output columns: start from the parents' columns ("parents",
+        # "join") or from none ("empty"), then add / drop names in order
+        self.parents = parents
+        self.base = base
+        self.ops: List[Tuple[str, bool]] = []
+
+    def define(self, name: str, ref: Optional[ColumnRef]) -> None:
+        self.defs[name] = ref
+        self.ops.append((name, ref is not None))
+
+
+# ---------------------------------------------------------------------------
+# Single flow
+# ---------------------------------------------------------------------------
+
+class FlowLineage:
+    """
+    Column lineage of one flow
+
+    Args:
+        flow: Flow document (builder.build()[0] or the archive's flow entry)
+        flow_name: Name identifying the flow in ColumnRefs and JSON edges
+                   (default: the connections' flow name, else "flow")
+    """
+
+    def __init__(self, flow: Dict[str, Any], flow_name: Optional[str] = None):
+        self.nodes: Dict[str, Any] = flow.get("nodes", {})
+        self.connections: Dict[str, Any] = flow.get("connections", {})
+        self.flow_name = flow_name or self._connection_flow_name() or "flow"
+        self.graph = FlowGraph(self.nodes)
+        self.derivations: Dict[ColumnRef, Derivation] = {}
+        self._steps: Dict[str, _Step] = {}
+        self._memo: Dict[Tuple[str, str], Optional[ColumnRef]] = {}
+        # Columns only assumed to exist: read from inputs without field
+        # metadata, or matched on both sides of such a join
+        self._assumed = set()
+        # Bitsets over topological positions: each node's ancestors (itself
+        # included), the nodes defining or dropping each column name, open
+        # inputs and joins. A walk skips parents that no candidate reaches.
+        self._ancestors: Dict[str, int] = {}
+        self._definers: Dict[str, int] = {}
+        self._open_inputs = 0
+        self._joins = 0
+        # Steps with a closed schema that are not inputs (aggregates, kept
+        # columns, grouped pivots): they stop columns passing through
+        self._closed = 0
+
+        self._order = self.graph.topological_order(flow.get("initialNodes"))
+        for position, node_id in enumerate(self._order):
+            bit = 1 << position
+            ancestors = bit
+            for pid in self.graph.parent_ids(node_id):
+                ancestors |= self._ancestors.get(pid, 0)
+            self._ancestors[node_id] = ancestors
+
+            step = self._build_step(node_id, self.nodes[node_id])
+            self._steps[node_id] = step
+            definers = self._definers
+            for name in step.defs:
+                definers[name] = definers.get(name, 0) | bit
+            if step.source:
+                self._open_inputs |= bit
+            if step.join:
+                self._joins |= bit
+            if not step.fallback and step.parents:
+                self._closed |= bit
+
+    @classmethod
+    def from_tfl(cls, path: str, flow_name: Optional[str] = None) -> "FlowLineage":
+        """
+        Lineage of a .tfl / .tflx archive, read with the streaming FlowDocument
+
+        Field metadata is only kept for input nodes, the only nodes that use it.
+
+        Args:
+            path: Archive path (or a plain flow JSON file)
+            flow_name: Defaults to the file name without extension
+        """
+        from .reader import FlowDocument
+
+        doc = FlowDocument(path)
+        nodes = {}
+        for node_id, node in doc.iter_nodes():
+            if node.get("nodeType") not in INPUT_NODE_TYPES:
+                node.pop("fields", None)
+            nodes[node_id] = node
+        flow = {
+            "nodes": nodes,
+            "connections": doc.connections,
+            "initialNodes": doc.field("initialNodes", []),
+        }
+        return cls(flow, flow_name or os.path.splitext(os.path.basename(path))[0])
+
+    def _connection_flow_name(self) -> Optional[str]:
+        for conn in self.connections.values():
+            name = (conn.get("connectionAttributes") or {}).get(":flow-name")
+            if name:
+                return name
+        return None
+
+    # ------------------------------------------------------------------
+    # Resolution
+    # ------------------------------------------------------------------
+
+    def _ref(self, node_id: str, column: str, kind: str,
+             inputs: Iterable[Optional[ColumnRef]] = (),
+             expression: Optional[str] = None) -> ColumnRef:
+        """Register a column computed by node_id"""
+        ref = ColumnRef(self.flow_name, node_id, column)
+        self.derivations[ref] = Derivation(
+            kind, tuple(dict.fromkeys(r for r in inputs if r is not None)), expression
+        )
+        return ref
+
+    def resolve(self, node_id: str, column: str) -> Optional[ColumnRef]:
+        """
+        The column as output by node_id: where it was last computed
+
+        Columns passed through steps unchanged resolve to the step that
+        produced them (e.g. an input, a calculation or a rename).
+
+        Returns:
+            ColumnRef, or None if the node does not output the column
+        """
+        memo = self._memo
+        key = (node_id, column)
+        if key in memo:
+            return memo[key]
+        ancestors = self._ancestors
+        candidates = self._definers.get(column, 0) | self._open_inputs
+        if column.endswith("-1"):
+            candidates |= self._joins
+        if not ancestors.get(node_id, 0) & candidates:
+            memo[key] = None
+            return None
+
+        # Iterative depth-first walk up the fallback parents (flows can be
+        # thousands of steps deep). The stack is the current path, so a
+        # parent already on it is a cycle and provides nothing.
+        stack = [node_id]
+        on_stack = {node_id}
+        while stack:
+            nid = stack[-1]
+            if (nid, column) in memo:
+                stack.pop()
+                on_stack.discard(nid)
+                continue
+            step = self._steps.get(nid)
+            jumped = self._jump(nid, column, candidates) if step else None
+            if jumped is not None:
+                result = jumped[0]
+            elif step is None:
+                result = None
+            elif column in step.defs:
+                result = step.defs[column]
+            elif step.source:
+                result = self._ref(nid, column, "source")
+                self._assumed.add(result)
+            elif len(step.fallback) == 1:
+                # A single parent reaches the same candidates as its child
+                pid = step.fallback[0]
+                if (pid, column) not in memo and pid not in on_stack:
+                    stack.append(pid)
+                    on_stack.add(pid)
+                    continue
+                result = memo.get((pid, column))
+            else:
+                pending = None
+                for pid in step.fallback:
+                    if (pid, column) in memo or pid in on_stack:
+                        continue
+                    if ancestors.get(pid, 0) & candidates:
+                        pending = pid
+                        break
+                    memo[(pid, column)] = None
+                if pending is not None:
+                    stack.append(pending)
+                    on_stack.add(pending)
+                    continue
+                found = [memo.get((pid, column)) for pid in step.fallback]
+                if step.join:
+                    result = self._join_column(nid, column, step.join, *found)
+                else:
+                    result = self._merge_column(nid, column, step.merge, found)
+            memo[(nid, column)] = result
+            stack.pop()
+            on_stack.discard(nid)
+        return memo[key]
+
+    def _jump(self, node_id: str, column: str, candidates: int) -> Optional[Tuple[Optional[ColumnRef]]]:
+        """
+        Resolve without walking when a single candidate can provide the column
+
+        If exactly one node defining the column (or open input) is an
+        ancestor, and no closed step comes after it, every path from it
+        carries the column here unchanged.
+
+        Returns:
+            (result,), or None if the parents have to be walked
+        """
+        reach = self._ancestors.get(node_id, 0) & candidates
+        if not reach or reach & (reach - 1):
+            return None
+        position = reach.bit_length() - 1
+        if (self._ancestors[node_id] & self._closed) >> (position + 1):
+            return None
+        definer = self._order[position]
+        step = self._steps[definer]
+        if column in step.defs:
+            return (step.defs[column],)
+        if step.source and definer != node_id:
+            return (self.resolve(definer, column),)
+        return None
+
+    def _merge_column(self, node_id: str, column: str, kind: str,
+                      found: List[Optional[ColumnRef]]) -> Optional[ColumnRef]:
+        """One column from several parents (union, unknown node types)"""
+        found = [ref for ref in dict.fromkeys(found) if ref is not None]
+        if len(found) < 2:
+            return found[0] if found else None
+        ref = self._ref(node_id, column, kind, found)
+        if all(parent in self._assumed for parent in found):
+            self._assumed.add(ref)
+        return ref
+
+    def _join_column(self, node_id: str, column: str, sides: Tuple[str, str],
+                     left: Optional[ColumnRef], right: Optional[ColumnRef]) -> Optional[ColumnRef]:
+        """One column of a join: the left side wins a name both sides have"""
+        assumed = self._assumed
+        if left is not None and (left == right or right is None or left not in assumed):
+            return left
+        if right is not None and (left is None or right not in assumed):
+            return right
+        if left is not None:
+            # Neither side is known to have it: trace to both
+            ref = self._ref(node_id, column, "join", [left, right])
+            assumed.add(ref)
+            return ref
+        # Right-hand columns whose names the left side has are renamed "-1"
+        if column.endswith("-1"):
+            base = column[:-2]
+            base_left = self.resolve(sides[0], base)
+            base_right = self.resolve(sides[1], base)
+            if base_left is not None and base_right is not None and base_right not in assumed:
+                return self._ref(node_id, column, "join", [base_right])
+        return None
+
+    def columns(self, node_id: str) -> List[str]:
+        """
+        Known output columns of a node
+
+        Complete when the inputs upstream carry field metadata; otherwise only
+        the columns named by the steps themselves. Built on request in one
+        pass over the node's ancestors; a parent's list is handed to its last
+        consumer instead of being copied.
+        """
+        if node_id not in self._steps:
+            return []
+        needed = {node_id}
+        stack = [node_id]
+        while stack:
+            for pid in self._steps[stack.pop()].parents:
+                if pid in self._steps and pid not in needed:
+                    needed.add(pid)
+                    stack.append(pid)
+        consumers = dict.fromkeys(needed, 0)
+        for nid in needed:
+            for pid in self._steps[nid].parents:
+                if pid in consumers:
+                    consumers[pid] += 1
+
+        known: Dict[str, Dict[str, None]] = {}
+
+        def release(pid: str, take: bool = False) -> Dict[str, None]:
+            consumers[pid] -= 1
+            if consumers[pid] == 0:
+                return known.pop(pid)
+            return dict(known[pid]) if take else known[pid]
+
+        for nid in self._order:
+            if nid not in needed:
+                continue
+            step = self._steps[nid]
+            parents = [pid for pid in step.parents if pid in known]
+            columns: Dict[str, None] = {}
+            if step.base == "empty":
+                for pid in parents:
+                    release(pid)
+            elif step.base == "join" and len(parents) == 2:
+                columns = release(parents[0], take=True)
+                left = set(columns)
+                for name in release(parents[1]):
+                    columns[f"{name}-1" if name in left else name] = None
+            elif parents:
+                columns = release(parents[0], take=True)
+                for pid in parents[1:]:
+                    columns.update(release(pid))
+            for name, present in step.ops:
+                if present:
+                    columns[name] = None
+                else:
+                    columns.pop(name, None)
+            known[nid] = columns
+        return list(known[node_id])
+
+    # ------------------------------------------------------------------
+    # Steps
+    # ------------------------------------------------------------------
+
+    def _build_step(self, node_id: str, node: Dict[str, Any]) -> _Step:
+        node_type = node.get("nodeType", "")
+        parents = self.graph.parent_ids(node_id)
+
+        if node_type in INPUT_NODE_TYPES:
+            step = _Step([], base="empty")
+            names = [f.get("name") for f in node.get("fields") or [] if f.get("name")]
+            for name in names:
+                step.define(name, self._ref(node_id, name, "source"))
+            step.source = not names
+            return step
+
+        if node_type == ".v1.Container":
+            return self._container_step(node_id, node, parents[:1])
+        if node_type == ".v2018_2_3.SuperJoin":
+            return self._join_step(node_id)
+        if node_type == ".v2018_2_3.SuperAggregate":
+            return self._aggregate_step(node_id, node, parents[:1])
+        if node_type == ".v2018_3_3.SuperPivot":
+            return self._pivot_step(node_id, node, parents[:1])
+        if node_type == ".v2018_2_3.SuperUnpivot":
+            return self._unpivot_step(node_id, node, parents[:1])
+
+        # Union, outputs and unknown node types pass their parents' columns
+        step = _Step(parents)
+        step.fallback = list(parents)
+        return step
+
+    def _container_step(self, node_id: str, node: Dict[str, Any], parents: List[str]) -> _Step:
+        step = _Step(parents)
+        step.fallback = list(parents)
+        defs = step.defs
+
+        def current(name: str) -> Optional[ColumnRef]:
+            if name in defs:
+                return defs[name]
+            return self.resolve(parents[0], name) if step.fallback else None
+
+        loom = node.get("loomContainer") or {}
+        for action in action_chain(loom.get("nodes") or {}, loom.get("initialNodes") or []):
+            action_type = action.get("nodeType", "")
+            if action_type == ".v1.RenameColumn":
+                old, new = action.get("columnName", ""), action.get("rename", "")
+                source = current(old)
+                step.define(old, None)
+                step.define(new, self._ref(node_id, new, "rename", [source]))
+            elif action_type == ".v1.RemoveColumns":
+                for name in action.get("columnNames") or []:
+                    step.define(name, None)
+            elif action_type == ".v2019_2_2.KeepOnlyColumns":
+                kept = {name: current(name) for name in action.get("columnNames") or []}
+                defs.clear()
+                step.ops.clear()
+                step.fallback = []
+                step.base = "empty"
+                for name, ref in kept.items():
+                    step.define(name, ref)
+            elif action_type == ".v1.ChangeColumnType":
+                for name, info in (action.get("fields") or {}).items():
+                    step.define(name, self._ref(
+                        node_id, name, "change_type", [current(name)],
+                        (info or {}).get("type"),
+                    ))
+            elif action.get("columnName") and action.get("expression"):
+                # AddColumn, QuickCalcColumn, DuplicateColumn and the like
+                kind = {
+                    ".v1.AddColumn": "calculation",
+                    ".v2024_2_0.QuickCalcColumn": "quick_calc",
+                    ".v2019_2_3.DuplicateColumn": "duplicate",
+                }.get(action_type, "calculation")
+                name, expression = action["columnName"], action["expression"]
+                inputs = [current(ref) for ref in field_references(expression)]
+                step.define(name, self._ref(node_id, name, kind, inputs, expression))
+        return step
+
+    def _join_step(self, node_id: str) -> _Step:
+        left = right = None
+        for pid, namespace in self.graph.parents_of(node_id):
+            if namespace == "Left":
+                left = pid
+            elif namespace == "Right":
+                right = pid
+        sides = [pid for pid in (left, right) if pid in self._steps]
+        if len(sides) < 2:
+            step = _Step(sides)
+            step.fallback = sides
+            return step
+        step = _Step(sides, base="join")
+        step.fallback = sides
+        step.join = (left, right)
+        return step
+
+    def _aggregate_step(self, node_id: str, node: Dict[str, Any], parents: List[str]) -> _Step:
+        action = node.get("actionNode") or {}
+        step = _Step(parents, base="empty")
+        for field in action.get("groupByFields") or []:
+            name = field.get("columnName", "")
+            step.define(name, self._parent_column(parents, name))
+        for agg in action.get("aggregateFields") or []:
+            name = aggregate_output_name(agg)
+            column = agg.get("columnName", "")
+            step.define(name, self._ref(
+                node_id, name, "aggregate", [self._parent_column(parents, column)],
+                f"{agg.get('function', 'COUNT')}([{column}])",
+            ))
+        return step
+
+    def _pivot_step(self, node_id: str, node: Dict[str, Any], parents: List[str]) -> _Step:
+        action = node.get("actionNode") or {}
+        pivot = action.get("pivotColumnName", "")
+        value = action.get("aggregateColumnName", "")
+        grouping = action.get("pivotGroupingColumns") or []
+        inputs = [self._parent_column(parents, pivot), self._parent_column(parents, value)]
+        function = action.get("defaultAggregation", "COUNT")
+
+        if grouping:
+            step = _Step(parents, base="empty")
+            for name in grouping:
+                step.define(name, self._parent_column(parents, name))
+        else:
+            # Every other column groups the pivot and passes through
+            step = _Step(parents)
+            step.fallback = list(parents)
+            step.define(pivot, None)
+            step.define(value, None)
+        for new_column in action.get("newPivotColumns") or []:
+            name = new_column.get("newColumnName", "")
+            step.define(name, self._ref(
+                node_id, name, "pivot", inputs, f"{function}([{value}]) WHERE [{pivot}] = '{name}'"
+            ))
+        return step
+
+    def _unpivot_step(self, node_id: str, node: Dict[str, Any], parents: List[str]) -> _Step:
+        action = node.get("actionNode") or {}
+        step = _Step(parents)
+        step.fallback = list(parents)
+
+        # new column -> (source columns of column bindings, literal group names)
+        new_columns: Dict[str, Tuple[List[Optional[ColumnRef]], List[str]]] = {}
+        unpivoted = []
+        for group in action.get("unpivotGroups") or []:
+            for expression in group.get("expressions") or []:
+                for binding in expression.get("bindings") or []:
+                    inputs, labels = new_columns.setdefault(
+                        binding.get("newColumnName", ""), ([], [])
+                    )
+                    if binding.get("bindingType") == "column":
+                        column = binding.get("columnName", "")
+                        unpivoted.append(column)
+                        inputs.append(self._parent_column(parents, column))
+                    else:
+                        labels.append(str(binding.get("groupName", "")))
+        for column in unpivoted:
+            step.define(column, None)
+        for name, (inputs, labels) in new_columns.items():
+            step.define(name, self._ref(
+                node_id, name, "unpivot", inputs, ", ".join(labels) or None
+            ))
+        return step
+
+    def _parent_column(self, parents: List[str], name: str) -> Optional[ColumnRef]:
+        return self.resolve(parents[0], name) if parents else None
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def upstream(self, node_id: str, column: str) -> List[Tuple[ColumnRef, Derivation]]:
+        """
+        Every computed column the given column depends on, nearest first
+
+        Returns:
+            list: (ColumnRef, Derivation) pairs; sources have kind "source"
+        """
+        start = self.resolve(node_id, column)
+        return self._walk([start] if start else [])
+
+    def _walk(self, start: List[ColumnRef]) -> List[Tuple[ColumnRef, Derivation]]:
+        seen = set(start)
+        queue = deque(start)
+        result = []
+        while queue:
+            ref = queue.popleft()
+            derivation = self.derivations[ref]
+            result.append((ref, derivation))
+            for parent in derivation.inputs:
+                if parent not in seen:
+                    seen.add(parent)
+                    queue.append(parent)
+        return result
+
+    def sources(self, node_id: str, column: str) -> List[SourceColumn]:
+        """Input columns the given column is computed from"""
+        return [
+            self.source_column(ref)
+            for ref, derivation in self.upstream(node_id, column)
+            if derivation.kind == "source"
+        ]
+
+    def source_column(self, ref: ColumnRef) -> SourceColumn:
+        """Table / query / file details of a column read by an input node"""
+        node = self.nodes.get(ref.node_id, {})
+        relation = node.get("relation") or {}
+        conn = self.connections.get(node.get("connectionId"), {})
+        attrs = conn.get("connectionAttributes") or {}
+        return SourceColumn(
+            ref.flow, ref.node_id, ref.column,
+            table=relation.get("table"),
+            query=relation.get("query"),
+            filename=attrs.get("filename"),
+            server=attrs.get("server"),
+            dbname=attrs.get("dbname"),
+        )
+
+    def outputs(self) -> Dict[str, str]:
+        """Output node ID -> published data source name"""
+        return {
+            node_id: node.get("datasourceName") or node.get("name", "")
+            for node_id, node in self.nodes.items()
+            if node.get("baseType") == "output"
+        }
+
+    def published_inputs(self) -> Dict[str, str]:
+        """Input node ID -> name of the published data source it reads"""
+        result = {}
+        for node_id, node in self.nodes.items():
+            if node.get("nodeType") not in INPUT_NODE_TYPES:
+                continue
+            attrs = (self.connections.get(node.get("connectionId"), {})
+                     .get("connectionAttributes") or {})
+            if attrs.get("class") != PUBLISHED_DATASOURCE_CLASS:
+                continue
+            name = (attrs.get("server-ds-friendly-name") or attrs.get("dbname")
+                    or ((node.get("relation") or {}).get("table") or "").strip("[]"))
+            if name:
+                result[node_id] = name
+        return result
+
+    def output_columns(self) -> Dict[str, Dict[str, List[SourceColumn]]]:
+        """Output node ID -> {known output column: source columns}"""
+        return {
+            node_id: {column: self.sources(node_id, column) for column in self.columns(node_id)}
+            for node_id in self.outputs()
+        }
+
+    # ------------------------------------------------------------------
+    # Export
+    # ------------------------------------------------------------------
+
+    def _endpoint(self, ref: ColumnRef) -> Dict[str, Any]:
+        node = self.nodes.get(ref.node_id, {})
+        return {
+            "flow": ref.flow,
+            "node_id": ref.node_id,
+            "node_name": node.get("name"),
+            "column": ref.column,
+        }
+
+    def edges(self, resolve_outputs: bool = True) -> List[Dict[str, Any]]:
+        """
+        Lineage edges as JSON-ready dicts
+
+        One edge per (input column -> computed column) dependency, plus a
+        "read" edge from each table / query / file column to the input
+        column reading it.
+
+        Args:
+            resolve_outputs: First resolve the known columns of every output
+                             node, so pass-through columns are included
+        """
+        if resolve_outputs:
+            for node_id in self.outputs():
+                for column in self.columns(node_id):
+                    self.resolve(node_id, column)
+        edges = []
+        for ref, derivation in self.derivations.items():
+            target = self._endpoint(ref)
+            if derivation.kind == "source":
+                source = self.source_column(ref)
+                edges.append({
+                    "source": {
+                        key: value for key, value in source._asdict().items()
+                        if key not in ("flow", "node_id") and value is not None
+                    },
+                    "target": target,
+                    "kind": "read",
+                    "expression": None,
+                })
+                continue
+            for parent in derivation.inputs:
+                edges.append({
+                    "source": self._endpoint(parent),
+                    "target": target,
+                    "kind": derivation.kind,
+                    "expression": derivation.expression,
+                })
+        return edges
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """{"flow": name, "outputs": {...}, "edges": [...]} as JSON text"""
+        return json.dumps(
+            {"flow": self.flow_name, "outputs": self.outputs(), "edges": self.edges()},
+            ensure_ascii=False, indent=indent,
+        )
+
+
+# ---------------------------------------------------------------------------
+# Across flows
+# ---------------------------------------------------------------------------
+
+class CrossFlowLineage:
+    """
+    Lineage across flows linked by published data sources
+
+    An input of one flow that reads a published data source (see
+    FlowLineage.published_inputs) is linked to the output of the flow that
+    publishes it, matched by data source name (case-insensitive).
+
+    Args:
+        lineages: FlowLineage of each flow; flow names must be unique
+    """
+
+    def __init__(self, lineages: Iterable[FlowLineage]):
+        self.flows: Dict[str, FlowLineage] = {}
+        for lineage in lineages:
+            if lineage.flow_name in self.flows:
+                raise ValueError(f"Duplicate flow name: {lineage.flow_name}")
+            self.flows[lineage.flow_name] = lineage
+
+        publishers: Dict[str, Tuple[str, str]] = {}
+        for lineage in self.flows.values():
+            for node_id, datasource in lineage.outputs().items():
+                publishers.setdefault(datasource.casefold(), (lineage.flow_name, node_id))
+        # (flow, input node) -> (publishing flow, output node)
+        self.links: Dict[Tuple[str, str], Tuple[str, str]] = {}
+        for lineage in self.flows.values():
+            for node_id, datasource in lineage.published_inputs().items():
+                publisher = publishers.get(datasource.casefold())
+                if publisher and publisher[0] != lineage.flow_name:
+                    self.links[(lineage.flow_name, node_id)] = publisher
+
+    def _published(self, ref: ColumnRef) -> Optional[ColumnRef]:
+        """The output column a linked input column reads, if any"""
+        publisher = self.links.get((ref.flow, ref.node_id))
+        if publisher is None:
+            return None
+        return self.flows[publisher[0]].resolve(publisher[1], ref.column)
+
+    def upstream(self, flow: str, node_id: str, column: str) -> List[Tuple[ColumnRef, Derivation]]:
+        """
+        FlowLineage.upstream() continued through published data sources
+
+        A linked input column is reported with kind "published" and the
+        upstream flow's output column as its input.
+        """
+        start = self.flows[flow].resolve(node_id, column)
+        if start is None:
+            return []
+        seen = {start}
+        queue = deque([start])
+        result = []
+        while queue:
+            ref = queue.popleft()
+            derivation = self.flows[ref.flow].derivations[ref]
+            if derivation.kind == "source":
+                published = self._published(ref)
+                if published is not None:
+                    derivation = Derivation("published", (published,))
+            result.append((ref, derivation))
+            for parent in derivation.inputs:
+                if parent not in seen:
+                    seen.add(parent)
+                    queue.append(parent)
+        return result
+
+    def sources(self, flow: str, node_id: str, column: str) -> List[SourceColumn]:
+        """Original source columns, possibly in other flows"""
+        return [
+            self.flows[ref.flow].source_column(ref)
+            for ref, derivation in self.upstream(flow, node_id, column)
+            if derivation.kind == "source"
+        ]
+
+    def edges(self) -> List[Dict[str, Any]]:
+        """Edges of every flow plus one "published" edge per linked input column"""
+        for lineage in self.flows.values():
+            for node_id in lineage.outputs():
+                for column in lineage.columns(node_id):
+                    lineage.resolve(node_id, column)
+
+        # Resolving a published column can reach linked inputs of a third
+        # flow; repeat until no new columns appear (each one is linked once)
+        published: Dict[ColumnRef, ColumnRef] = {}
+        checked = set()
+        while True:
+            count = sum(len(lineage.derivations) for lineage in self.flows.values())
+            for lineage in self.flows.values():
+                for ref, derivation in list(lineage.derivations.items()):
+                    if derivation.kind != "source" or ref in checked:
+                        continue
+                    checked.add(ref)
+                    upstream = self._published(ref)
+                    if upstream is not None:
+                        published[ref] = upstream
+            if count == sum(len(lineage.derivations) for lineage in self.flows.values()):
+                break
+
+        edges = []
+        for lineage in self.flows.values():
+            edges.extend(lineage.edges(resolve_outputs=False))
+        for ref, upstream in published.items():
+            edges.append({
+                "source": self.flows[upstream.flow]._endpoint(upstream),
+                "target": self.flows[ref.flow]._endpoint(ref),
+                "kind": "published",
+                "expression": None,
+            })
+        return edges
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        """{"flows": [...], "edges": [...]} as JSON text"""
+        return json.dumps(
+            {"flows": list(self.flows), "edges": self.edges()},
+            ensure_ascii=False, indent=indent,
+        )
@@ -0,0 +1,968 @@
+"""
+Flow Optimizer
+
+Rewrite passes over a TFLBuilder graph that produce an equivalent flow which
+is cheaper for Tableau Prep to run. Passes mutate the builder in place and
+record what they changed in an OptimizationReport.
+
+Passes:
+    prune_unreachable Drop nodes that do not feed any output, and their connections
+    dedup_nodes       Merge identical inputs and identical transform chains
+    fuse_containers   Merge linear chains of clean steps into one Container
+    fold_joins        Replace joins of two same-connection inputs with one SQL input
+    push_aggregates   Run an aggregate that follows a database input as GROUP BY SQL
+    fold_filters      Push leading filters / keep-only steps into database inputs
+
+Only fuse_containers runs by default (and under build(optimize=True)). The
+other passes are opt-in: the last three turn inputs into dialect-specific
+custom SQL.
+
+Usage:
+    builder = TFLBuilder(flow_name="My Flow")
+    ...
+    report = builder.optimize()                 # fuse_containers
+    report = builder.optimize(FlowOptimizer.PASSES)  # every pass
+    print(report.summary())
+
+    flow, display, meta = builder.build(optimize=True)
+"""
+
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+from .expression_parser import (
+    Binary,
+    Call,
+    ExpressionSyntaxError,
+    Field,
+    Group,
+    InList,
+    Literal,
+    Node,
+    Unary,
+    parse_expression,
+    quote_identifier_ansi,
+    quote_identifier_mysql,
+    quote_identifier_tsql,
+)
+from .expression_translator import ExpressionTranslator
+from .graph import FlowGraph, canonical_node, content_digest
+from .translator import aggregate_output_name, aggregate_sql
+
+if TYPE_CHECKING:
+    from .builder import TFLBuilder
+
+
+_CONTAINER = ".v1.Container"
+_LOAD_SQL = ".v1.LoadSql"
+_FILTER = ".v1.FilterOperation"
+_KEEP_ONLY = ".v2019_2_2.KeepOnlyColumns"
+_SUPER_JOIN = ".v2018_2_3.SuperJoin"
+_SUPER_AGGREGATE = ".v2018_2_3.SuperAggregate"
+
+# Identifier quoting per connection class; inputs on other classes are not folded
+_DIALECT_QUOTERS: Dict[str, Callable[[str], str]] = {
+    "mysql": quote_identifier_mysql,
+    "adb_mysql": quote_identifier_mysql,
+    "sqlserver": quote_identifier_tsql,
+    "postgres": quote_identifier_ansi,
+}
+_MYSQL_DIALECTS = {"mysql", "adb_mysql"}
+
+# Operators whose SQL meaning matches Tableau's for any operand types.
+# "+" (string concatenation in Tableau) and "/" (integer division on
+# SQL Server) are left out on purpose.
+_PORTABLE_OPS = {"AND", "OR", "=", "==", "!=", "<>", "<", ">", "<=", ">=", "-", "*"}
+
+# Alias of the derived table when a custom-SQL input is wrapped
+_FOLD_ALIAS = "cwprep_src"
+_JOIN_KEYWORDS = {
+    "inner": "INNER JOIN",
+    "left": "LEFT JOIN",
+    "right": "RIGHT JOIN",
+    "full": "FULL OUTER JOIN",
+}
+_JOIN_COMPARATORS = {
+    "==": "=", "=": "=", "!=": "<>", "<>": "<>",
+    "<": "<", ">": ">", "<=": "<=", ">=": ">=",
+}
+_JOIN_ALIASES = ("cwprep_l", "cwprep_r")
+
+# Aggregate functions whose database result matches Prep's. AVG of an
+# integer column is itself an integer on SQL Server, so it is not pushed there.
+_PUSHDOWN_AGGREGATES = {"SUM", "AVG", "COUNT", "COUNTD", "MIN", "MAX"}
+_RE_TABLE_PART = re.compile(r"\[([^\]]*)\]")
+_RE_ORDER_BY = re.compile(r"\bORDER\s+BY\b", re.IGNORECASE)
+
+
+@dataclass
+class OptimizationReport:
+    """What each optimizer pass changed"""
+    # Node / connection IDs removed because they cannot reach an output
+    pruned_nodes: List[str] = field(default_factory=list)
+    pruned_connections: List[str] = field(default_factory=list)
+    # {"kept": node_id, "merged": [duplicate node ids]}
+    deduplicated_nodes: List[Dict[str, Any]] = field(default_factory=list)
+    # {"into": container_id, "fused": [absorbed container ids], "actions": n}
+    fused_containers: List[Dict[str, Any]] = field(default_factory=list)
+    # {"input": node_id, "predicates": [sql], "columns": [names] | None,
+    #  "removed": [container ids], "trimmed": container id | None}
+    folded_filters: List[Dict[str, Any]] = field(default_factory=list)
+    # {"join": join_id, "left": input_id, "right": input_id, "input": new input_id}
+    folded_joins: List[Dict[str, Any]] = field(default_factory=list)
+    # {"aggregate": aggregate_id, "input": input_id, "predicates": [sql],
+    #  "removed": [container ids]}
+    pushed_aggregates: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def merged_nodes(self) -> int:
+        """Number of duplicate nodes merged away"""
+        return sum(len(entry["merged"]) for entry in self.deduplicated_nodes)
+
+    @property
+    def fused_steps(self) -> int:
+        """Number of clean steps removed by fusion"""
+        return sum(len(entry["fused"]) for entry in self.fused_containers)
+
+    @property
+    def folded_predicates(self) -> int:
+        """Number of filter predicates pushed into database inputs"""
+        return sum(len(entry["predicates"]) for entry in self.folded_filters)
+
+    def summary(self) -> str:
+        """One line per pass, for logging"""
+        return "\n".join([
+            f"prune_unreachable: {len(self.pruned_nodes)} node(s), "
+            f"{len(self.pruned_connections)} connection(s) pruned",
+            f"dedup_nodes: {self.merged_nodes} duplicate node(s) merged into "
+            f"{len(self.deduplicated_nodes)}",
+            f"fuse_containers: {self.fused_steps} step(s) fused into {len(self.fused_containers)}",
+            f"fold_joins: {len(self.folded_joins)} join(s) folded into custom SQL",
+            f"push_aggregates: {len(self.pushed_aggregates)} aggregate(s) pushed into inputs",
+            f"fold_filters: {self.folded_predicates} predicate(s) folded into "
+            f"{len(self.folded_filters)} input(s)",
+        ])
+
+
+class FlowOptimizer:
+    """
+    Runs optimizer passes over a TFLBuilder
+
+    Args:
+        builder: The builder to rewrite in place
+    """
+
+    PASSES = (
+        "prune_unreachable",
+        "dedup_nodes",
+        "fuse_containers",
+        "fold_joins",
+        "push_aggregates",
+        "fold_filters",
+    )
+    # Passes run when none are named: rewrites that keep every input as is
+    DEFAULT_PASSES = ("fuse_containers",)
+
+    def __init__(self, builder: "TFLBuilder"):
+        self.builder = builder
+        self.report = OptimizationReport()
+        self._translators: Dict[Tuple[str, Optional[str]], ExpressionTranslator] = {}
+
+    def run(self, passes: Optional[Sequence[str]] = None) -> OptimizationReport:
+        """
+        Run passes in order
+
+        Args:
+            passes: Pass names to run, in order (defaults to DEFAULT_PASSES)
+
+        Returns:
+            OptimizationReport: Accumulated report
+        """
+        selected = list(self.DEFAULT_PASSES if passes is None else passes)
+        unknown = [name for name in selected if name not in self.PASSES]
+        if unknown:
+            raise ValueError(
+                f"Unknown optimizer pass(es): {unknown}. Supported: {list(self.PASSES)}"
+            )
+        for name in selected:
+            getattr(self, name)()
+        # Passes rewrite nextNodes directly; resync the builder's parent index
+        self.builder._reindex_edges()
+        return self.report
+
+    # -----------------------------------------------------------------------
+    # Graph helpers
+    # -----------------------------------------------------------------------
+
+    def _remove_node(self, node_id: str) -> None:
+        """Drop a node and its builder bookkeeping (edges are the caller's job)"""
+        self._remove_nodes([node_id])
+
+    def _remove_nodes(self, node_ids: Sequence[str]) -> None:
+        """Drop several nodes in one pass over the builder's ordered lists"""
+        builder = self.builder
+        removed = set(node_ids)
+        for node_id in removed:
+            builder.nodes.pop(node_id, None)
+            builder.node_properties.pop(node_id, None)
+        builder.initial_nodes[:] = [n for n in builder.initial_nodes if n not in removed]
+        builder._node_order = [n for n in builder._node_order if n["id"] not in removed]
+
+    # -----------------------------------------------------------------------
+    # Pass: output-reachability pruning
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _connection_refs(node: Any) -> List[str]:
+        """Connection IDs used by a node (including generated union inputs)"""
+        refs = [node.get("connectionId")]
+        for generated in node.get("generatedInputs") or []:
+            refs.append((generated.get("inputNode") or {}).get("connectionId"))
+        return [ref for ref in refs if ref]
+
+    def prune_unreachable(self) -> List[str]:
+        """
+        Remove nodes from which no output node can be reached
+
+        Reachability is computed by one backward walk from every output node
+        over the parent index, O(V + E). Edges into pruned nodes are dropped
+        from surviving parents, and connections no remaining node uses are
+        removed. A flow without any output is left untouched.
+
+        Returns:
+            list: Pruned node IDs, in builder order
+        """
+        builder = self.builder
+        nodes = builder.nodes
+        graph = FlowGraph(nodes)
+
+        stack = [nid for nid, node in nodes.items() if node.get("baseType") == "output"]
+        if not stack:
+            return []
+        reachable = set(stack)
+        while stack:
+            for parent_id in graph.parent_ids(stack.pop()):
+                if parent_id not in reachable and parent_id in nodes:
+                    reachable.add(parent_id)
+                    stack.append(parent_id)
+
+        pruned = [nid for nid in nodes if nid not in reachable]
+        self._remove_nodes(pruned)
+        pruned_set = set(pruned)
+        for node in nodes.values():
+            links = node.get("nextNodes") or []
+            if any(link.get("nextNodeId") in pruned_set for link in links):
+                node["nextNodes"] = [
+                    link for link in links if link.get("nextNodeId") not in pruned_set
+                ]
+
+        used = {ref for node in nodes.values() for ref in self._connection_refs(node)}
+        dropped = [cid for cid in builder.connections if cid not in used]
+        for conn_id in dropped:
+            del builder.connections[conn_id]
+
+        self.report.pruned_nodes.extend(pruned)
+        self.report.pruned_connections.extend(dropped)
+        return pruned
+
+    # -----------------------------------------------------------------------
+    # Pass: duplicate node / common-subgraph merging
+    # -----------------------------------------------------------------------
+
+    def dedup_nodes(self) -> List[Dict[str, Any]]:
+        """
+        Merge nodes that compute the same thing from the same parents
+
+        Nodes are visited in topological order and keyed by a digest of their
+        canonical content (graph.canonical_node: IDs and names ignored) plus
+        their parents' representatives and edge namespaces. Identical inputs
+        therefore merge first, and identical steps below them then share a key
+        and merge too, so whole duplicated chains collapse. A duplicate's
+        outgoing edges move to the node it duplicates, which fans out to both
+        sets of children. Outputs are never merged, and a merge that would give
+        a child two edges from the same node (e.g. a self-join) is skipped.
+
+        Returns:
+            list: Dedup entries added to the report
+        """
+        nodes = self.builder.nodes
+        graph = FlowGraph(nodes)
+        representative: Dict[str, str] = {}
+        seen: Dict[str, str] = {}
+        merged: Dict[str, List[str]] = {}
+
+        for node_id in graph.topological_order(self.builder.initial_nodes):
+            node = nodes.get(node_id)
+            if node is None:
+                continue
+            representative[node_id] = node_id
+            if node.get("baseType") == "output":
+                continue
+
+            content, local_ids = canonical_node(node)
+            parents = sorted(
+                (representative.get(pid, pid), local_ids.get(ns, ns))
+                for pid, ns in graph.parents_of(node_id)
+            )
+            keep_id = seen.setdefault(content_digest([content, parents]), node_id)
+            if keep_id == node_id:
+                continue
+
+            keep = nodes[keep_id]
+            links = node.get("nextNodes") or []
+            kept_children = {link.get("nextNodeId") for link in keep.get("nextNodes") or []}
+            if any(link.get("nextNodeId") in kept_children for link in links):
+                continue
+
+            for parent_id in graph.parent_ids(node_id):
+                parent = nodes.get(representative.get(parent_id, parent_id))
+                if parent is not None:
+                    parent["nextNodes"] = [
+                        link for link in parent["nextNodes"]
+                        if link.get("nextNodeId") != node_id
+                    ]
+            keep["nextNodes"] = list(keep.get("nextNodes") or []) + [dict(link) for link in links]
+            representative[node_id] = keep_id
+            merged.setdefault(keep_id, []).append(node_id)
+
+        self._remove_nodes([nid for dups in merged.values() for nid in dups])
+        entries = [{"kept": keep_id, "merged": dups} for keep_id, dups in merged.items()]
+        self.report.deduplicated_nodes.extend(entries)
+        return entries
+
+    # -----------------------------------------------------------------------
+    # Pass: clean-step fusion
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _is_linear_container(node: Any) -> bool:
+        """Container with one Default input/output and a non-empty action chain"""
+        if node.get("nodeType") != _CONTAINER:
+            return False
+        ns_in = node.get("namespacesToInput") or {}
+        ns_out = node.get("namespacesToOutput") or {}
+        if set(ns_in) != {"Default"} or set(ns_out) != {"Default"}:
+            return False
+        loom = node.get("loomContainer") or {}
+        inner = loom.get("nodes") or {}
+        return (
+            ns_in["Default"].get("nodeId") in inner
+            and ns_out["Default"].get("nodeId") in inner
+        )
+
+    def _only_child(self, node: Any, parent_count: Dict[str, int]) -> Optional[str]:
+        """Return the single Default child of ``node`` if ``node`` is its only parent"""
+        links = node.get("nextNodes") or []
+        if len(links) != 1:
+            return None
+        link = links[0]
+        child_id = link.get("nextNodeId")
+        if link.get("namespace") != "Default" or link.get("nextNamespace") != "Default":
+            return None
+        if parent_count.get(child_id) != 1 or child_id not in self.builder.nodes:
+            return None
+        return child_id
+
+    def _fusable_child(self, node: Any, parent_count: Dict[str, int]) -> Optional[str]:
+        """Return the container that ``node`` can absorb, if any"""
+        child_id = self._only_child(node, parent_count)
+        if child_id is None or not self._is_linear_container(self.builder.nodes[child_id]):
+            return None
+        return child_id
+
+    def fuse_containers(self) -> List[Dict[str, Any]]:
+        """
+        Fuse linear chains of Containers (no fan-out, no fan-in) into one
+
+        The downstream container's action chain is appended after the upstream
+        container's output action, so actions keep their order. The fused
+        container keeps the first step's ID and name.
+
+        Returns:
+            list: Fusion entries added to the report
+        """
+        nodes = self.builder.nodes
+        graph = FlowGraph(nodes)
+        # Parent counts stay valid while fusing: an absorbed container's
+        # children are re-parented to the absorbing one edge for edge.
+        parent_count = {nid: len(graph.parents_of(nid)) for nid in nodes}
+
+        entries = []
+        for node_id in graph.topological_order(self.builder.initial_nodes):
+            node = nodes.get(node_id)
+            if node is None or not self._is_linear_container(node):
+                continue
+
+            fused = []
+            child_id = self._fusable_child(node, parent_count)
+            while child_id is not None:
+                self._absorb_container(node, nodes[child_id])
+                self._remove_node(child_id)
+                fused.append(child_id)
+                child_id = self._fusable_child(node, parent_count)
+
+            if fused:
+                entries.append({
+                    "into": node_id,
+                    "fused": fused,
+                    "actions": len(node["loomContainer"]["nodes"]),
+                })
+
+        self.report.fused_containers.extend(entries)
+        return entries
+
+    @staticmethod
+    def _absorb_container(node: Any, child: Any) -> None:
+        """Append ``child``'s action chain to ``node`` and take over its outputs"""
+        loom = node["loomContainer"]
+        child_loom = child["loomContainer"]
+        tail_id = node["namespacesToOutput"]["Default"]["nodeId"]
+        head_id = child["namespacesToInput"]["Default"]["nodeId"]
+
+        loom["nodes"][tail_id]["nextNodes"].append({
+            "namespace": "Default",
+            "nextNodeId": head_id,
+            "nextNamespace": "Default"
+        })
+        for action_id, action in child_loom["nodes"].items():
+            loom["nodes"][action_id] = action
+
+        node["namespacesToOutput"] = {
+            "Default": dict(child["namespacesToOutput"]["Default"])
+        }
+        node["nextNodes"] = list(child.get("nextNodes") or [])
+
+    # -----------------------------------------------------------------------
+    # Pass: filter / projection folding
+    # -----------------------------------------------------------------------
+
+    def _input_dialect(self, node: Any) -> Optional[str]:
+        """Connection class of a database input that can be folded into"""
+        if node.get("nodeType") != _LOAD_SQL:
+            return None
+        # Inputs that already carry Prep-side filters or field selection are left alone
+        if node.get("filters") or node.get("actions") or node.get("selectedFields") is not None:
+            return None
+        conn = self.builder.connections.get(node.get("connectionId"), {})
+        dialect = conn.get("connectionAttributes", {}).get("class")
+        return dialect if dialect in _DIALECT_QUOTERS else None
+
+    @staticmethod
+    def _fold_source(node: Any, dialect: str, alias: Optional[str] = None) -> Optional[str]:
+        """
+        FROM-clause item for an input's relation, or None if it cannot be wrapped
+
+        Tables are aliased only when ``alias`` is given; custom SQL always
+        becomes a derived table (named ``alias`` or cwprep_src).
+        """
+        relation = node.get("relation") or {}
+        if relation.get("type") == "table":
+            table_ref = relation.get("table") or ""
+            parts = _RE_TABLE_PART.findall(table_ref)
+            if not parts or ".".join(f"[{part}]" for part in parts) != table_ref:
+                return None
+            quote = _DIALECT_QUOTERS[dialect]
+            table = ".".join(quote(part) for part in parts)
+            return f"{table} AS {alias}" if alias else table
+        if relation.get("type") == "query":
+            query = (relation.get("query") or "").strip().rstrip(";").rstrip()
+            if not query:
+                return None
+            # SQL Server rejects ORDER BY inside a derived table
+            if dialect == "sqlserver" and _RE_ORDER_BY.search(query):
+                return None
+            # Newlines keep a trailing "-- comment" from swallowing the parenthesis
+            return f"(\n{query}\n) AS {alias or _FOLD_ALIAS}"
+        return None
+
+    @classmethod
+    def _is_portable(cls, tree: Node, dialect: str) -> bool:
+        """Whether a filter AST means the same thing when run by the database"""
+        if isinstance(tree, Literal):
+            if tree.kind == "string":
+                # MySQL treats backslashes in string literals as escapes
+                return dialect not in _MYSQL_DIALECTS or "\\" not in tree.value
+            return tree.kind in ("number", "null")
+        if isinstance(tree, Field):
+            return True
+        if isinstance(tree, Group):
+            return cls._is_portable(tree.expr, dialect)
+        if isinstance(tree, Unary):
+            return cls._is_portable(tree.operand, dialect)
+        if isinstance(tree, Binary):
+            return (
+                tree.op in _PORTABLE_OPS
+                and cls._is_portable(tree.left, dialect)
+                and cls._is_portable(tree.right, dialect)
+            )
+        if isinstance(tree, InList):
+            return cls._is_portable(tree.expr, dialect) and all(
+                cls._is_portable(item, dialect) for item in tree.items
+            )
+        if isinstance(tree, Call):
+            return (
+                tree.name == "ISNULL"
+                and len(tree.args) == 1
+                and cls._is_portable(tree.args[0], dialect)
+            )
+        return False
+
+    def _translate_portable(
+        self, expression: str, dialect: str, alias: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        SQL for a Tableau expression, or None if it is not portable
+
+        Args:
+            expression: Tableau calculation syntax
+            dialect: Connection class (key of _DIALECT_QUOTERS)
+            alias: Table alias to qualify field references with
+        """
+        try:
+            tree = parse_expression(expression)
+        except ExpressionSyntaxError:
+            return None
+        if not self._is_portable(tree, dialect):
+            return None
+        translator = self._translators.get((dialect, alias))
+        if translator is None:
+            quote = _DIALECT_QUOTERS[dialect]
+            if alias:
+                quote = lambda name, _quote=quote: f"{alias}.{_quote(name)}"
+            translator = ExpressionTranslator(quote_identifier=quote)
+            self._translators[(dialect, alias)] = translator
+        return translator.translate(expression)
+
+    def _take_foldable_prefix(
+        self, container: Any, dialect: str
+    ) -> Tuple[List[str], Optional[List[str]], List[str], Optional[str]]:
+        """
+        Collect the leading actions of a container that can run in the database
+
+        Returns:
+            tuple: (predicates, kept columns or None, consumed action IDs,
+                    first remaining action ID or None if all were consumed)
+        """
+        inner = container["loomContainer"]["nodes"]
+        tail_id = container["namespacesToOutput"]["Default"]["nodeId"]
+        action_id = container["namespacesToInput"]["Default"]["nodeId"]
+
+        predicates: List[str] = []
+        columns: Optional[List[str]] = None
+        consumed: List[str] = []
+        while action_id is not None:
+            action = inner[action_id]
+            links = action.get("nextNodes") or []
+            if action_id == tail_id:
+                next_id = None
+            elif len(links) == 1:
+                next_id = links[0]["nextNodeId"]
+            else:
+                break
+
+            node_type = action.get("nodeType")
+            if node_type == _FILTER:
+                predicate = self._translate_portable(action.get("filterExpression") or "", dialect)
+                if predicate is None:
+                    break
+                predicates.append(predicate)
+            elif node_type == _KEEP_ONLY and action.get("columnNames"):
+                columns = list(action["columnNames"])
+            else:
+                break
+            consumed.append(action_id)
+            action_id = next_id
+        return predicates, columns, consumed, action_id
+
+    @staticmethod
+    def _trim_container(container: Any, consumed: List[str], head_id: str) -> None:
+        """Drop consumed leading actions so the chain starts at ``head_id``"""
+        loom = container["loomContainer"]
+        for action_id in consumed:
+            loom["nodes"].pop(action_id, None)
+            (loom.get("nodeProperties") or {}).pop(action_id, None)
+        loom["initialNodes"] = [head_id]
+        container["namespacesToInput"] = {
+            "Default": {"nodeId": head_id, "namespace": "Default"}
+        }
+
+    @staticmethod
+    def _folded_query(
+        source: str, predicates: List[str], columns: Optional[List[str]], dialect: str
+    ) -> str:
+        """SELECT statement replacing a folded input's relation"""
+        quote = _DIALECT_QUOTERS[dialect]
+        select_list = ", ".join(quote(name) for name in columns) if columns else "*"
+        sql = f"SELECT {select_list} FROM {source}"
+        where = FlowOptimizer._conjunction(predicates)
+        if where:
+            sql += f" WHERE {where}"
+        return sql
+
+    @staticmethod
+    def _project_fields(
+        fields: Optional[List[Dict[str, Any]]], names: List[str]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Field metadata narrowed to ``names`` in order, or None if any is unknown"""
+        by_name = {f.get("name"): f for f in fields or []}
+        if not all(name in by_name for name in names):
+            return None
+        return [{**by_name[name], "ordinal": i} for i, name in enumerate(names)]
+
+    @staticmethod
+    def _conjunction(predicates: List[str]) -> Optional[str]:
+        """AND together folded predicates (None if there are none)"""
+        if len(predicates) == 1:
+            return predicates[0]
+        if predicates:
+            return " AND ".join(f"({p})" for p in predicates)
+        return None
+
+    def fold_filters(self) -> List[Dict[str, Any]]:
+        """
+        Fold filters and keep-only steps that follow a database input into it
+
+        Filter expressions are translated with ExpressionTranslator using the
+        connection's identifier quoting. Only predicates built from fields,
+        string/number literals, comparisons, AND/OR/NOT, IN, ISNULL and
+        ``-``/``*`` are folded. Table inputs become custom SQL
+        ``SELECT <columns> FROM <table> WHERE ...``; custom SQL inputs are
+        wrapped as a derived table. Folding follows single-parent containers
+        only and stops at the first action that does not qualify, so other
+        branches still see every row. A folded keep-only step narrows the
+        input's ``fields`` to the kept columns (cleared if any is unknown).
+
+        Returns:
+            list: Fold entries added to the report
+        """
+        nodes = self.builder.nodes
+        graph = FlowGraph(nodes)
+        # Removed containers hand their children to the input edge for edge,
+        # so parent counts stay valid.
+        parent_count = {nid: len(graph.parents_of(nid)) for nid in nodes}
+
+        entries = []
+        for input_id in list(self.builder.initial_nodes):
+            node = nodes.get(input_id)
+            dialect = self._input_dialect(node) if node is not None else None
+            if dialect is None:
+                continue
+            source = self._fold_source(node, dialect)
+            if source is None:
+                continue
+
+            predicates: List[str] = []
+            columns: Optional[List[str]] = None
+            removed: List[str] = []
+            trimmed: Optional[str] = None
+            child_id = self._fusable_child(node, parent_count)
+            while child_id is not None:
+                container = nodes[child_id]
+                taken, kept, consumed, head_id = self._take_foldable_prefix(container, dialect)
+                if not consumed:
+                    break
+                predicates.extend(taken)
+                if kept is not None:
+                    columns = kept
+                if head_id is not None:
+                    self._trim_container(container, consumed, head_id)
+                    trimmed = child_id
+                    break
+                node["nextNodes"] = [dict(link) for link in container.get("nextNodes") or []]
+                self._remove_node(child_id)
+                removed.append(child_id)
+                child_id = self._fusable_child(node, parent_count)
+
+            if not removed and trimmed is None:
+                continue
+            node["relation"] = {
+                "type": "query",
+                "query": self._folded_query(source, predicates, columns, dialect),
+            }
+            if columns:
+                # Stale metadata would list dropped columns; None makes Prep re-read it
+                node["fields"] = self._project_fields(node.get("fields"), columns)
+            entries.append({
+                "input": input_id,
+                "predicates": predicates,
+                "columns": columns,
+                "removed": removed,
+                "trimmed": trimmed,
+            })
+
+        self.report.folded_filters.extend(entries)
+        return entries
+
+    # -----------------------------------------------------------------------
+    # Pass: join folding
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _join_columns(left: Any, right: Any) -> Optional[List[Tuple[str, str, str]]]:
+        """
+        (alias, column, output name) for each column of a join's output
+
+        Prep renames a right-side column whose name the left side also has
+        to "<name>-1"; the folded SELECT has to do the same, so both inputs'
+        field lists must be known. Returns None when they are not, or when a
+        renamed column would still clash.
+        """
+        left_names = [f.get("name") for f in left.get("fields") or []]
+        right_names = [f.get("name") for f in right.get("fields") or []]
+        if not left_names or not right_names or not all(left_names + right_names):
+            return None
+        left_alias, right_alias = _JOIN_ALIASES
+        columns = [(left_alias, name, name) for name in left_names]
+        columns.extend(
+            (right_alias, name, f"{name}-1" if name in left_names else name)
+            for name in right_names
+        )
+        outputs = [output for _alias, _column, output in columns]
+        if len(set(outputs)) != len(outputs):
+            return None
+        return columns
+
+    def _join_sql(
+        self, join: Any, left: Any, right: Any,
+        columns: List[Tuple[str, str, str]], dialect: str,
+    ) -> Optional[str]:
+        """SELECT statement equivalent to ``join`` over two inputs, if any"""
+        action = join.get("actionNode") or {}
+        keyword = _JOIN_KEYWORDS.get(action.get("joinType"))
+        if keyword is None or (keyword == "FULL OUTER JOIN" and dialect in _MYSQL_DIALECTS):
+            return None
+        conditions = action.get("conditions") or []
+        if not conditions:
+            return None
+
+        left_alias, right_alias = _JOIN_ALIASES
+        on_parts = []
+        for cond in conditions:
+            comparator = _JOIN_COMPARATORS.get(cond.get("comparator"))
+            left_expr = self._translate_portable(
+                cond.get("leftExpression") or "", dialect, left_alias
+            )
+            right_expr = self._translate_portable(
+                cond.get("rightExpression") or "", dialect, right_alias
+            )
+            if comparator is None or left_expr is None or right_expr is None:
+                return None
+            on_parts.append(f"{left_expr} {comparator} {right_expr}")
+
+        left_source = self._fold_source(left, dialect, left_alias)
+        right_source = self._fold_source(right, dialect, right_alias)
+        if left_source is None or right_source is None:
+            return None
+        quote = _DIALECT_QUOTERS[dialect]
+        select = ", ".join(
+            f"{alias}.{quote(column)}" if column == output
+            else f"{alias}.{quote(column)} AS {quote(output)}"
+            for alias, column, output in columns
+        )
+        return (
+            f"SELECT {select}\n"
+            f"FROM {left_source}\n"
+            f"{keyword} {right_source}\n"
+            f"    ON " + " AND ".join(on_parts)
+        )
+
+    def fold_joins(self) -> List[Dict[str, Any]]:
+        """
+        Replace joins of two database inputs on the same connection with one
+        custom SQL input, so the database runs the join
+
+        Both parents must be plain inputs (see fold_filters) that feed only the
+        join, the join must carry no extra actions, every condition must
+        translate to portable SQL, and both inputs' field lists must be known
+        (declared with ``fields=`` on add_input_table / add_input_sql, or read
+        from a loaded flow; builder inputs without them are left alone):
+        the new input selects every column explicitly, renaming right-side
+        columns the left side also has to "<name>-1" as Prep does, and carries
+        the resulting field list. Folded inputs can feed further joins, which
+        are then folded in turn.
+
+        Returns:
+            list: Fold entries added to the report
+        """
+        builder = self.builder
+        nodes = builder.nodes
+        graph = FlowGraph(nodes)
+        replaced: Dict[str, str] = {}
+
+        entries = []
+        for join_id in graph.topological_order(builder.initial_nodes):
+            join = nodes.get(join_id)
+            if join is None or join.get("nodeType") != _SUPER_JOIN:
+                continue
+            if join.get("beforeActionAnnotations") or join.get("afterActionAnnotations"):
+                continue
+
+            sides = {
+                namespace: replaced.get(pid, pid)
+                for pid, namespace in graph.parents_of(join_id)
+            }
+            if len(graph.parents_of(join_id)) != 2 or set(sides) != {"Left", "Right"}:
+                continue
+            left_id, right_id = sides["Left"], sides["Right"]
+            left, right = nodes.get(left_id), nodes.get(right_id)
+            if left is None or right is None or left_id == right_id:
+                continue
+            if len(left["nextNodes"]) != 1 or len(right["nextNodes"]) != 1:
+                continue
+            if left.get("connectionId") != right.get("connectionId"):
+                continue
+            dialect = self._input_dialect(left)
+            if dialect is None or self._input_dialect(right) != dialect:
+                continue
+            columns = self._join_columns(left, right)
+            if columns is None:
+                continue
+            sql = self._join_sql(join, left, right, columns, dialect)
+            if sql is None:
+                continue
+
+            input_id = builder.add_input_sql(join.get("name", ""), sql, left["connectionId"])
+            # Carry the output schema so the folded input can feed a further fold
+            nodes[input_id]["fields"] = [
+                {**field_, "name": output}
+                for field_, (_alias, _column, output) in zip(left["fields"] + right["fields"], columns)
+            ]
+            nodes[input_id]["nextNodes"] = [dict(link) for link in join.get("nextNodes") or []]
+            self._remove_nodes([join_id, left_id, right_id])
+            replaced[join_id] = input_id
+            entries.append({
+                "join": join_id, "left": left_id, "right": right_id, "input": input_id,
+            })
+
+        self.report.folded_joins.extend(entries)
+        return entries
+
+    # -----------------------------------------------------------------------
+    # Pass: aggregate pushdown
+    # -----------------------------------------------------------------------
+
+    @staticmethod
+    def _pushdown_sql(
+        aggregate: Any, source: str, predicates: List[str], dialect: str
+    ) -> Optional[str]:
+        """GROUP BY statement for an aggregate step, or None if it cannot be pushed"""
+        if aggregate.get("beforeActionAnnotations") or aggregate.get("afterActionAnnotations"):
+            return None
+        action = dict(aggregate.get("actionNode") or {})
+        if not action.get("groupByFields") and not action.get("aggregateFields"):
+            return None
+
+        fields = []
+        for agg in action.get("aggregateFields") or []:
+            func = (agg.get("function") or "").upper()
+            if func not in _PUSHDOWN_AGGREGATES or (func == "AVG" and dialect == "sqlserver"):
+                return None
+            # Prep keeps the source column name for aggregates that are not renamed
+            fields.append({**agg, "newColumnName": agg.get("newColumnName") or agg.get("columnName")})
+        outputs = [f.get("columnName") for f in action.get("groupByFields") or []]
+        outputs.extend(aggregate_output_name(agg) for agg in fields)
+        if len(set(outputs)) != len(outputs):
+            return None
+
+        action["aggregateFields"] = fields
+        return aggregate_sql(
+            action,
+            source,
+            quote_identifier=_DIALECT_QUOTERS[dialect],
+            where=FlowOptimizer._conjunction(predicates),
+        )
+
+    @staticmethod
+    def _aggregate_fields(
+        fields: Optional[List[Dict[str, Any]]], aggregate: Any
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Field metadata of a pushed-down aggregate's output, or None if a source is unknown"""
+        action = aggregate.get("actionNode") or {}
+        by_name = {f.get("name"): f for f in fields or []}
+        output = []
+        for group in action.get("groupByFields") or []:
+            source = by_name.get(group.get("columnName"))
+            if source is None:
+                return None
+            output.append(dict(source))
+        for agg in action.get("aggregateFields") or []:
+            source = by_name.get(agg.get("columnName"))
+            if source is None:
+                return None
+            func = (agg.get("function") or "").upper()
+            name = agg.get("newColumnName") or agg.get("columnName")
+            field_ = {**source, "name": name}
+            if func in ("COUNT", "COUNTD"):
+                field_["type"] = "integer"
+            elif func == "AVG":
+                field_["type"] = "real"
+            output.append(field_)
+        return [{**field_, "ordinal": i} for i, field_ in enumerate(output)]
+
+    def push_aggregates(self) -> List[Dict[str, Any]]:
+        """
+        Replace a database input feeding an aggregate step with a GROUP BY query
+
+        The chain may pass through clean steps made only of foldable filters
+        (see fold_filters); they become the WHERE clause. The SELECT is
+        rendered by the SQL translator's aggregate_sql, so COUNTD becomes
+        COUNT(DISTINCT ...). The input keeps its ID, takes the aggregate's
+        name and outgoing edges, and the absorbed steps are removed. Its
+        ``fields`` become the group-by and aggregate outputs (cleared if a
+        source column is not declared).
+
+        Returns:
+            list: Pushdown entries added to the report
+        """
+        nodes = self.builder.nodes
+        graph = FlowGraph(nodes)
+        parent_count = {nid: len(graph.parents_of(nid)) for nid in nodes}
+
+        entries = []
+        for input_id in list(self.builder.initial_nodes):
+            node = nodes.get(input_id)
+            dialect = self._input_dialect(node) if node is not None else None
+            if dialect is None:
+                continue
+            source = self._fold_source(node, dialect)
+            if source is None:
+                continue
+
+            predicates: List[str] = []
+            containers: List[str] = []
+            child_id = self._only_child(node, parent_count)
+            while child_id is not None and self._is_linear_container(nodes[child_id]):
+                taken, _columns, consumed, head_id = self._take_foldable_prefix(
+                    nodes[child_id], dialect
+                )
+                if not consumed or head_id is not None:
+                    child_id = None
+                    break
+                predicates.extend(taken)
+                containers.append(child_id)
+                child_id = self._only_child(nodes[child_id], parent_count)
+
+            if child_id is None:
+                continue
+            aggregate = nodes[child_id]
+            if aggregate.get("nodeType") != _SUPER_AGGREGATE:
+                continue
+            sql = self._pushdown_sql(aggregate, source, predicates, dialect)
+            if sql is None:
+                continue
+
+            node["relation"] = {"type": "query", "query": sql}
+            node["fields"] = self._aggregate_fields(node.get("fields"), aggregate)
+            node["name"] = aggregate.get("name", node.get("name"))
+            node["nextNodes"] = [dict(link) for link in aggregate.get("nextNodes") or []]
+            self._remove_nodes(containers + [child_id])
+            entries.append({
+                "aggregate": child_id,
+                "input": input_id,
+                "predicates": predicates,
+                "removed": containers,
+            })
+
+        self.report.pushed_aggregates.extend(entries)
+        return entries
@@ -1,10 +1,36 @@
+import hashlib
+import io
 import json
 import os
+import re
 import shutil
+import sys
 import uuid
 import zipfile
+from contextlib import contextmanager
 from datetime import datetime
 
+from .jsonstream import dump_json, dumps_json, resolve_backend
+
+
+# Read size used when streaming data files into archive entries.
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+
+# Inputs that are already compressed; deflating them again only burns CPU.
+COMPRESSED_EXTENSIONS = frozenset({
+    ".xlsx", ".xlsm", ".xlsb", ".gz", ".tgz", ".bz2", ".xz", ".zip", ".7z", ".parquet",
+})
+
+# Sidecar written next to an archive saved with skip_unchanged=True.
+MANIFEST_SUFFIX = ".manifest.json"
+MANIFEST_VERSION = 1
+
+# Entry timestamp used by reproducible=True (the earliest date zip can encode).
+REPRODUCIBLE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Zip entries holding the flow, display settings and metadata documents.
+DOCUMENT_ENTRIES = ("flow", "displaySettings", "maestroMetadata")
+
 
 class TFLPackager:
     @staticmethod
@@ -13,12 +39,23 @@ class TFLPackager:
         parent = os.path.dirname(path) or "."
         name = os.path.basename(path)
         timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        backup_path = os.path.join(parent, f"{name}.bak-{timestamp}")
-        suffix = 1
 
+        # Continue after the highest suffix in use (not the first free one) so
+        # that name order stays creation order once old backups are pruned.
+        pattern = re.compile(re.escape(f"{name}.bak-{timestamp}") + r"(?:-(\d+))?$")
+        used = [
+            int(match.group(1) or 0)
+            for match in map(pattern.match, os.listdir(parent))
+            if match
+        ]
+        if not used:
+            return os.path.join(parent, f"{name}.bak-{timestamp}")
+
+        suffix = max(used) + 1
+        backup_path = os.path.join(parent, f"{name}.bak-{timestamp}-{suffix}")
         while os.path.exists(backup_path):
-            backup_path = os.path.join(parent, f"{name}.bak-{timestamp}-{suffix}")
             suffix += 1
+            backup_path = os.path.join(parent, f"{name}.bak-{timestamp}-{suffix}")
 
         return backup_path
 
@@ -33,20 +70,349 @@ class TFLPackager:
         return backup_path
 
     @staticmethod
-    def _create_temp_workspace(parent_dir):
-        """Create a unique temporary workspace near the final output."""
-        os.makedirs(parent_dir, exist_ok=True)
+    def _list_backups(path):
+        """Return existing ``<name>.bak-<timestamp>[-n]`` backups, oldest first."""
+        parent = os.path.dirname(path) or "."
+        name = os.path.basename(path)
+        pattern = re.compile(re.escape(name) + r"\.bak-(\d{14})(?:-(\d+))?$")
+
+        backups = []
+        for entry in os.listdir(parent):
+            match = pattern.match(entry)
+            if match:
+                order = (match.group(1), int(match.group(2) or 0))
+                backups.append((order, os.path.join(parent, entry)))
+        return [backup for _order, backup in sorted(backups)]
+
+    @staticmethod
+    def _dedup_backup(backup_path, older_backups):
+        """Replace a backup file with a hardlink to an identical older backup."""
+        if not os.path.isfile(backup_path):
+            return None
+
+        stat = os.stat(backup_path)
+        digest = None
+        for candidate in reversed(older_backups):
+            if not os.path.isfile(candidate):
+                continue
+            candidate_stat = os.stat(candidate)
+            if candidate_stat.st_size != stat.st_size:
+                continue
+            if os.path.samefile(candidate, backup_path):
+                return candidate
+            digest = digest or TFLPackager._file_digest(backup_path)["sha256"]
+            if TFLPackager._file_digest(candidate)["sha256"] != digest:
+                continue
+
+            link_tmp = f"{backup_path}.link-{uuid.uuid4().hex}"
+            try:
+                os.link(candidate, link_tmp)
+                os.replace(link_tmp, backup_path)
+            except OSError:
+                # Filesystem without hardlink support: keep the plain copy.
+                if os.path.exists(link_tmp):
+                    os.unlink(link_tmp)
+                return None
+            return candidate
+        return None
+
+    @staticmethod
+    def _check_keep_backups(keep_backups):
+        """Validate a backup retention count (None means unlimited)."""
+        if keep_backups is None:
+            return
+        if not isinstance(keep_backups, int) or isinstance(keep_backups, bool) or keep_backups < 0:
+            raise ValueError(
+                f"keep_backups must be a non-negative integer, got {keep_backups!r}"
+            )
+
+    @staticmethod
+    def _apply_backup_retention(path, keep_backups):
+        """Hardlink-dedup the newest backup and keep only the last N backups.
+
+        Args:
+            path: The output path whose backups are managed.
+            keep_backups: Number of backups to keep (0 removes all of them).
+        """
+        TFLPackager._check_keep_backups(keep_backups)
+        backups = TFLPackager._list_backups(path)
+        if len(backups) > 1:
+            TFLPackager._dedup_backup(backups[-1], backups[:-1])
+
+        stale = backups[:-keep_backups] if keep_backups else backups
+        for backup in stale:
+            if os.path.isdir(backup) and not os.path.islink(backup):
+                shutil.rmtree(backup, ignore_errors=True)
+            else:
+                os.unlink(backup)
+        return stale
+
+    # ------------------------------------------------------------------
+    # Content hashing / manifest
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _file_digest(path, cache=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Return ``{"size", "mtime_ns", "sha256"}`` for a file.
+
+        A cached record is reused without reading the file when its size and
+        mtime_ns still match, so unchanged multi-GB extracts are not rehashed.
+        """
+        stat = os.stat(path)
+        cached = (cache or {}).get(os.path.abspath(path))
+        if (
+            cached
+            and cached.get("size") == stat.st_size
+            and cached.get("mtime_ns") == stat.st_mtime_ns
+            and cached.get("sha256")
+        ):
+            return cached
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                digest.update(chunk)
+        return {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": digest.hexdigest(),
+        }
+
+    @staticmethod
+    def content_hash(flow, display, meta, data_files=None, digest_cache=None,
+                     options=None):
+        """Compute a canonical SHA-256 over the archive's logical contents.
+
+        JSON documents are hashed in canonical form (sorted keys, compact
+        separators), so key order and indentation do not matter. Data files are
+        hashed by content together with their archive path, and ``options`` (the
+        save options that change the archive bytes) are hashed as well.
 
+        Args:
+            flow: Flow JSON object.
+            display: Display settings JSON object.
+            meta: Maestro metadata JSON object.
+            data_files: Optional dict mapping connection_id to source paths.
+            digest_cache: Optional ``{abs_path: digest record}`` from a previous
+                          manifest; records with matching size/mtime are reused.
+            options: Optional JSON-serializable dict of output options
+                     (compact, reproducible, compresslevel, ...).
+
+        Returns:
+            tuple: (hex digest, {abs_path: digest record} for the data files)
+        """
+        digest = hashlib.sha256()
+        for entry_name, document in (
+            ("flow", flow),
+            ("displaySettings", display),
+            ("maestroMetadata", meta),
+        ):
+            canonical = dumps_json(document, indent=None, sort_keys=True)
+            digest.update(entry_name.encode("utf-8") + b"\0")
+            digest.update(canonical + b"\0")
+        if options:
+            digest.update(b"options\0" + dumps_json(options, indent=None, sort_keys=True) + b"\0")
+
+        file_records = {}
+        entries = sorted(
+            (f"Data/{conn_id}/{os.path.basename(src_path)}", src_path)
+            for conn_id, file_paths in (data_files or {}).items()
+            for src_path in file_paths
+        )
+        for arcname, src_path in entries:
+            record = TFLPackager._file_digest(src_path, cache=digest_cache)
+            file_records[os.path.abspath(src_path)] = record
+            digest.update(f"{arcname}\0{record['sha256']}\0".encode("utf-8"))
+
+        return digest.hexdigest(), file_records
+
+    @staticmethod
+    def _manifest_path(output_path):
+        return f"{output_path}{MANIFEST_SUFFIX}"
+
+    @staticmethod
+    def _read_manifest(output_path):
+        """Load the sidecar manifest, or None when missing or unreadable."""
+        try:
+            with open(TFLPackager._manifest_path(output_path), "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(manifest, dict) or manifest.get("version") != MANIFEST_VERSION:
+            return None
+        return manifest
+
+    @staticmethod
+    def _write_manifest(output_path, content_hash, file_records):
+        """Atomically write the sidecar manifest for a freshly written archive."""
+        stat = os.stat(output_path)
+        manifest = {
+            "version": MANIFEST_VERSION,
+            "content_hash": content_hash,
+            "archive": {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+            "data_files": file_records,
+        }
+        manifest_path = TFLPackager._manifest_path(output_path)
+        temp_path = f"{manifest_path}.{uuid.uuid4().hex}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+        os.replace(temp_path, manifest_path)
+
+    @staticmethod
+    def _is_unchanged(output_path, manifest, content_hash):
+        """True when the output on disk is the one the manifest describes."""
+        if not manifest or manifest.get("content_hash") != content_hash:
+            return False
+        try:
+            stat = os.stat(output_path)
+        except OSError:
+            return False
+        archive = manifest.get("archive") or {}
+        return (
+            archive.get("size") == stat.st_size
+            and archive.get("mtime_ns") == stat.st_mtime_ns
+        )
+
+    @staticmethod
+    def _create_temp_archive_path(output_dir, suffix):
+        """Reserve a unique temporary archive path next to the final output."""
         while True:
             token = uuid.uuid4().hex
-            temp_root = os.path.join(parent_dir, f"cwprep_build_{token}")
-            if os.path.exists(temp_root):
-                continue
-            os.makedirs(temp_root)
-            return temp_root, os.path.join(temp_root, "flow")
+            candidate = os.path.join(output_dir, f"cwprep_output_{token}{suffix}")
+            if not os.path.exists(candidate):
+                return candidate
+
+    @staticmethod
+    @contextmanager
+    def _atomic_archive(output_path, compresslevel=None, keep_backups=None):
+        """Yield a ZipFile writing to a temp file; publish it atomically on success.
+
+        The archive is written next to ``output_path``. Only after it has been
+        closed successfully is any existing output backed up and the temp file
+        renamed over it, so a failed write never touches the existing output.
+        With ``keep_backups`` set, older backups are pruned afterwards.
+        """
+        output_dir = os.path.dirname(output_path) or "."
+        os.makedirs(output_dir, exist_ok=True)
+        temp_archive = TFLPackager._create_temp_archive_path(
+            output_dir, os.path.splitext(output_path)[1]
+        )
+
+        try:
+            with zipfile.ZipFile(
+                temp_archive, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel
+            ) as zipf:
+                yield zipf
+
+            TFLPackager._backup_existing_path(output_path)
+            os.replace(temp_archive, output_path)
+            if keep_backups is not None:
+                TFLPackager._apply_backup_retention(output_path, keep_backups)
+        finally:
+            if os.path.exists(temp_archive):
+                os.unlink(temp_archive)
+
+    @staticmethod
+    def _deflate_entry(zipf, zinfo):
+        """Deflate ``zinfo`` at the archive's level when written with ZipFile.open()."""
+        zinfo.compress_type = zipf.compression
+        if sys.version_info >= (3, 13):
+            zinfo.compress_level = zipf.compresslevel
+        else:
+            # No public attribute before 3.13; ZipFile.write() sets the same one
+            zinfo._compresslevel = zipf.compresslevel
+
+    @staticmethod
+    def _entry_info(zipf, src_path, arcname, store_compressed=True, reproducible=False):
+        """Build the ZipInfo for a data file, choosing stored vs deflated."""
+        zinfo = zipfile.ZipInfo.from_file(src_path, arcname)
+        if reproducible:
+            zinfo.date_time = REPRODUCIBLE_DATE_TIME
+            zinfo.external_attr = 0o644 << 16
+        extension = os.path.splitext(src_path)[1].lower()
+        if store_compressed and extension in COMPRESSED_EXTENSIONS:
+            zinfo.compress_type = zipfile.ZIP_STORED
+        else:
+            # ZipFile.open() takes the level from the ZipInfo, not the archive.
+            TFLPackager._deflate_entry(zipf, zinfo)
+        return zinfo
+
+    @staticmethod
+    def _embed_file(zipf, src_path, arcname, store_compressed=True,
+                    chunk_size=DEFAULT_CHUNK_SIZE, reproducible=False):
+        """Stream a file from disk into a zip entry in fixed-size chunks.
+
+        The entry size is known up front, so zipfile switches to Zip64 headers
+        automatically for files past the 4 GiB limit. Already-compressed inputs
+        (see COMPRESSED_EXTENSIONS) are stored instead of deflated again when
+        ``store_compressed`` is set.
+        """
+        zinfo = TFLPackager._entry_info(
+            zipf, src_path, arcname, store_compressed, reproducible
+        )
+        with open(src_path, "rb") as src, zipf.open(zinfo, "w") as dest:
+            shutil.copyfileobj(src, dest, chunk_size)
 
     @staticmethod
-    def _pack_archive(folder_path, output_path, keep_folder=False):
+    def _embed_files(zipf, entries, store_compressed=True,
+                     chunk_size=DEFAULT_CHUNK_SIZE, reproducible=False):
+        """Stream ``(src_path, arcname)`` pairs into the archive, in order."""
+        for src_path, arcname in entries:
+            TFLPackager._embed_file(
+                zipf, src_path, arcname,
+                store_compressed=store_compressed,
+                chunk_size=chunk_size,
+                reproducible=reproducible,
+            )
+
+    @staticmethod
+    def _document_entry(zipf, entry_name, reproducible=False):
+        """Entry name, or a fixed-timestamp ZipInfo with ``reproducible``."""
+        if not reproducible:
+            return entry_name
+        zinfo = zipfile.ZipInfo(entry_name, date_time=REPRODUCIBLE_DATE_TIME)
+        TFLPackager._deflate_entry(zipf, zinfo)
+        zinfo.external_attr = 0o644 << 16
+        return zinfo
+
+    @staticmethod
+    def _write_entries(zipf, flow, display, meta, data_files=None,
+                       store_compressed=True, chunk_size=DEFAULT_CHUNK_SIZE,
+                       reproducible=False, compact=False,
+                       json_backend="json"):
+        """Serialize the flow documents (and data files) straight into zip entries.
+
+        JSON is streamed into each entry in chunks (see jsonstream), so the
+        documents are never rendered as one big string. With ``reproducible``
+        the JSON is written with sorted keys and every entry gets a fixed
+        timestamp, so identical inputs give identical bytes.
+        """
+        for entry_name, document in zip(DOCUMENT_ENTRIES, (flow, display, meta)):
+            zinfo = TFLPackager._document_entry(zipf, entry_name, reproducible)
+            with zipf.open(zinfo, "w") as dest:
+                dump_json(
+                    document, dest,
+                    indent=None if compact else 2,
+                    sort_keys=reproducible,
+                    backend=json_backend,
+                )
+
+        if data_files:
+            entries = [
+                (src_path, f"Data/{conn_id}/{os.path.basename(src_path)}")
+                for conn_id, file_paths in data_files.items()
+                for src_path in file_paths
+            ]
+            TFLPackager._embed_files(
+                zipf, entries,
+                store_compressed=store_compressed,
+                chunk_size=chunk_size,
+                reproducible=reproducible,
+            )
+
+    @staticmethod
+    def _pack_archive(folder_path, output_path, keep_folder=False,
+                      compresslevel=None, keep_backups=None):
         """Pack an exploded flow folder into a final archive file."""
         folder_path = os.path.abspath(folder_path)
         output_path = os.path.abspath(output_path)
@@ -63,36 +429,21 @@ class TFLPackager:
         if is_nested_output:
             raise ValueError("output_path must be outside folder_path.")
 
-        output_dir = os.path.dirname(output_path) or "."
-        os.makedirs(output_dir, exist_ok=True)
-
-        suffix = os.path.splitext(output_path)[1]
-        temp_archive = None
-        success = False
+        TFLPackager._check_keep_backups(keep_backups)
+        entries = []
+        for root, _dirs, files in os.walk(folder_path):
+            for file in files:
+                file_path = os.path.join(root, file)
+                arcname = os.path.relpath(file_path, folder_path).replace(os.sep, "/")
+                entries.append((file_path, arcname))
 
-        try:
-            while True:
-                token = uuid.uuid4().hex
-                candidate = os.path.join(output_dir, f"cwprep_output_{token}{suffix}")
-                if not os.path.exists(candidate):
-                    temp_archive = candidate
-                    break
-
-            with zipfile.ZipFile(temp_archive, "w", zipfile.ZIP_DEFLATED) as zipf:
-                for root, _dirs, files in os.walk(folder_path):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        arcname = os.path.relpath(file_path, folder_path)
-                        zipf.write(file_path, arcname)
+        with TFLPackager._atomic_archive(
+            output_path, compresslevel=compresslevel, keep_backups=keep_backups
+        ) as zipf:
+            TFLPackager._embed_files(zipf, entries)
 
-            TFLPackager._backup_existing_path(output_path)
-            os.replace(temp_archive, output_path)
-            success = True
-        finally:
-            if temp_archive and os.path.exists(temp_archive):
-                os.unlink(temp_archive)
-            if success and not keep_folder:
-                shutil.rmtree(folder_path, ignore_errors=True)
+        if not keep_folder:
+            shutil.rmtree(folder_path, ignore_errors=True)
 
         print(f"Successfully created: {output_path}")
         return output_path
@@ -114,14 +465,14 @@ class TFLPackager:
             TFLPackager._backup_existing_path(folder_path)
         os.makedirs(folder_path)
 
-        with open(os.path.join(folder_path, "flow"), "w", encoding="utf-8") as f:
-            json.dump(flow, f, indent=2, ensure_ascii=False)
+        with open(os.path.join(folder_path, "flow"), "wb") as f:
+            dump_json(flow, f, indent=2)
 
-        with open(os.path.join(folder_path, "displaySettings"), "w", encoding="utf-8") as f:
-            json.dump(display, f, indent=2, ensure_ascii=False)
+        with open(os.path.join(folder_path, "displaySettings"), "wb") as f:
+            dump_json(display, f, indent=2)
 
-        with open(os.path.join(folder_path, "maestroMetadata"), "w", encoding="utf-8") as f:
-            json.dump(meta, f, indent=2, ensure_ascii=False)
+        with open(os.path.join(folder_path, "maestroMetadata"), "wb") as f:
+            dump_json(meta, f, indent=2)
 
         if data_files:
             data_dir = os.path.join(folder_path, "Data")
@@ -133,48 +484,209 @@ class TFLPackager:
                     shutil.copy2(src_path, dst_path)
 
     @staticmethod
-    def save_tfl(output_tfl_path, flow, display, meta):
-        """Build a .tfl archive without leaving an exploded folder behind."""
-        output_path = os.path.abspath(output_tfl_path)
-        temp_root, temp_folder = TFLPackager._create_temp_workspace(
-            os.path.dirname(output_path) or "."
+    def _save_archive(output_path, flow, display, meta, data_files=None,
+                      store_compressed=True, chunk_size=DEFAULT_CHUNK_SIZE,
+                      compresslevel=None, skip_unchanged=False,
+                      keep_backups=None, reproducible=False, compact=False,
+                      json_backend="json"):
+        """Shared implementation of save_tfl/save_tflx."""
+        resolve_backend(json_backend)
+        TFLPackager._check_keep_backups(keep_backups)
+        output_path = os.path.abspath(output_path)
+
+        if skip_unchanged:
+            manifest = TFLPackager._read_manifest(output_path)
+            # Options that change the written bytes, so re-saving with other
+            # options is not skipped as unchanged
+            options = {
+                "store_compressed": store_compressed,
+                "compresslevel": compresslevel,
+                "reproducible": reproducible,
+                "compact": compact,
+                "json_backend": resolve_backend(json_backend),
+            }
+            content_hash, file_records = TFLPackager.content_hash(
+                flow, display, meta, data_files,
+                digest_cache=(manifest or {}).get("data_files"),
+                options=options,
+            )
+            if TFLPackager._is_unchanged(output_path, manifest, content_hash):
+                print(f"Unchanged, skipped: {output_path}")
+                return output_path
+
+        with TFLPackager._atomic_archive(
+            output_path, compresslevel=compresslevel, keep_backups=keep_backups
+        ) as zipf:
+            TFLPackager._write_entries(
+                zipf, flow, display, meta,
+                data_files=data_files,
+                store_compressed=store_compressed,
+                chunk_size=chunk_size,
+                reproducible=reproducible,
+                compact=compact,
+                json_backend=json_backend,
+            )
+
+        if skip_unchanged:
+            TFLPackager._write_manifest(output_path, content_hash, file_records)
+
+        print(f"Successfully created: {output_path}")
+        return output_path
+
+    @staticmethod
+    def _save_encoded(output_path, documents, compresslevel=None,
+                      keep_backups=None, reproducible=False):
+        """Write already-encoded flow, display and metadata JSON as an archive.
+
+        ``documents`` holds the three entries as UTF-8 bytes, in
+        DOCUMENT_ENTRIES order (e.g. rendered by a FlowTemplate).
+        """
+        TFLPackager._check_keep_backups(keep_backups)
+        output_path = os.path.abspath(output_path)
+        with TFLPackager._atomic_archive(
+            output_path, compresslevel=compresslevel, keep_backups=keep_backups
+        ) as zipf:
+            for entry_name, payload in zip(DOCUMENT_ENTRIES, documents):
+                zipf.writestr(
+                    TFLPackager._document_entry(zipf, entry_name, reproducible),
+                    payload,
+                )
+        print(f"Successfully created: {output_path}")
+        return output_path
+
+    @staticmethod
+    def save_tfl(output_tfl_path, flow, display, meta, compresslevel=None,
+                 skip_unchanged=False, keep_backups=None, reproducible=False,
+                 compact=False, json_backend="json"):
+        """Build a .tfl archive by writing the flow JSON directly into zip entries.
+
+        Args:
+            output_tfl_path: Output .tfl path.
+            flow: Flow JSON object.
+            display: Display settings JSON object.
+            meta: Maestro metadata JSON object.
+            compresslevel: Deflate level 0-9 (None uses zlib's default).
+            skip_unchanged: Record a content hash in ``<output>.manifest.json``
+                            and skip the write (and backup) when it matches.
+            keep_backups: Keep only the newest N ``.bak-`` backups, hardlinking
+                          identical ones. None keeps every backup.
+            reproducible: Sort JSON keys and use a fixed entry timestamp so the
+                          same flow always produces the same archive bytes.
+            compact: Write JSON without indentation or whitespace.
+            json_backend: "json" (default), "orjson", "msgspec" or "auto"
+                          (fastest installed).
+        """
+        return TFLPackager._save_archive(
+            output_tfl_path, flow, display, meta,
+            compresslevel=compresslevel,
+            skip_unchanged=skip_unchanged,
+            keep_backups=keep_backups,
+            reproducible=reproducible,
+            compact=compact,
+            json_backend=json_backend,
         )
-        try:
-            TFLPackager.save_to_folder(temp_folder, flow, display, meta)
-            return TFLPackager.pack_zip(temp_folder, output_path)
-        finally:
-            shutil.rmtree(temp_root, ignore_errors=True)
 
     @staticmethod
-    def save_tflx(output_tflx_path, flow, display, meta, data_files=None):
-        """Build a .tflx archive without leaving an exploded folder behind."""
-        output_path = os.path.abspath(output_tflx_path)
-        temp_root, temp_folder = TFLPackager._create_temp_workspace(
-            os.path.dirname(output_path) or "."
+    def save_tflx(output_tflx_path, flow, display, meta, data_files=None,
+                  store_compressed=True, chunk_size=DEFAULT_CHUNK_SIZE,
+                  compresslevel=None, skip_unchanged=False,
+                  keep_backups=None, reproducible=False, compact=False,
+                  json_backend="json"):
+        """Build a .tflx archive by writing JSON and data files directly into zip entries.
+
+        Args:
+            output_tflx_path: Output .tflx path.
+            flow: Flow JSON object.
+            display: Display settings JSON object.
+            meta: Maestro metadata JSON object.
+            data_files: Optional dict mapping connection_id to list of source
+                        file paths, embedded as Data/{connection_id}/{basename}.
+                        Files are streamed in chunks, never copied to disk first.
+            store_compressed: Store already-compressed inputs (.xlsx, .gz, ...)
+                              with ZIP_STORED instead of deflating them again.
+            chunk_size: Read size in bytes used while streaming data files.
+            compresslevel: Deflate level 0-9 (None uses zlib's default).
+            skip_unchanged: Record a content hash in ``<output>.manifest.json``
+                            and skip the write (and backup) when it matches.
+                            Data-file digests are cached by size and mtime.
+            keep_backups: Keep only the newest N ``.bak-`` backups, hardlinking
+                          identical ones. None keeps every backup.
+            reproducible: Sort JSON keys and use a fixed entry timestamp so the
+                          same flow always produces the same archive bytes.
+            compact: Write JSON without indentation or whitespace.
+            json_backend: "json" (default), "orjson", "msgspec" or "auto"
+                          (fastest installed).
+        """
+        return TFLPackager._save_archive(
+            output_tflx_path, flow, display, meta,
+            data_files=data_files,
+            store_compressed=store_compressed,
+            chunk_size=chunk_size,
+            compresslevel=compresslevel,
+            skip_unchanged=skip_unchanged,
+            keep_backups=keep_backups,
+            reproducible=reproducible,
+            compact=compact,
+            json_backend=json_backend,
         )
-        try:
-            TFLPackager.save_to_folder(
-                temp_folder,
-                flow,
-                display,
-                meta,
+
+    @staticmethod
+    def to_bytes(flow, display, meta, data_files=None, as_stream=False,
+                 store_compressed=True, compresslevel=None,
+                 reproducible=False, compact=False, json_backend="json"):
+        """Build the archive entirely in memory, without touching disk.
+
+        Args:
+            flow: Flow JSON object.
+            display: Display settings JSON object.
+            meta: Maestro metadata JSON object.
+            data_files: Optional dict mapping connection_id to list of source
+                        file paths (embedded like save_tflx).
+            as_stream: If True, return a BytesIO positioned at the start
+                       instead of bytes.
+            store_compressed: Store already-compressed inputs without deflating.
+            compresslevel: Deflate level 0-9 (None uses zlib's default).
+            reproducible: Sort JSON keys and use fixed entry timestamps.
+            compact: Write JSON without indentation or whitespace.
+            json_backend: "json" (default), "orjson", "msgspec" or "auto".
+
+        Returns:
+            bytes or io.BytesIO: The .tfl/.tflx archive contents.
+        """
+        resolve_backend(json_backend)
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(
+            buffer, "w", zipfile.ZIP_DEFLATED, compresslevel=compresslevel
+        ) as zipf:
+            TFLPackager._write_entries(
+                zipf, flow, display, meta,
                 data_files=data_files,
+                store_compressed=store_compressed,
+                reproducible=reproducible,
+                compact=compact,
+                json_backend=json_backend,
             )
-            return TFLPackager.pack_tflx(temp_folder, output_path)
-        finally:
-            shutil.rmtree(temp_root, ignore_errors=True)
+
+        if as_stream:
+            buffer.seek(0)
+            return buffer
+        return buffer.getvalue()
 
     @staticmethod
-    def pack_zip(folder_path, output_tfl_path, keep_folder=False):
+    def pack_zip(folder_path, output_tfl_path, keep_folder=False,
+                 compresslevel=None, keep_backups=None):
         """Pack folder as .tfl and remove the source folder by default."""
         return TFLPackager._pack_archive(
             folder_path,
             output_tfl_path,
             keep_folder=keep_folder,
+            compresslevel=compresslevel,
+            keep_backups=keep_backups,
         )
 
     @staticmethod
-    def pack_tflx(folder_path, output_tflx_path, keep_folder=False):
+    def pack_tflx(folder_path, output_tflx_path, keep_folder=False,
+                  compresslevel=None, keep_backups=None):
         """Pack folder as .tflx and remove the source folder by default.
 
         Same as pack_zip but specifically for .tflx output. The folder should
@@ -185,4 +697,6 @@ class TFLPackager:
             folder_path,
             output_tflx_path,
             keep_folder=keep_folder,
+            compresslevel=compresslevel,
+            keep_backups=keep_backups,
         )
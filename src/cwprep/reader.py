@@ -0,0 +1,564 @@
+"""
+Lazy Flow Reader
+
+Reads the ``flow`` entry of a .tfl / .tflx archive incrementally, straight
+from the zip stream, instead of ``json.loads`` on the whole document. Only
+the parts asked for are built: node headers (id, name, type, links),
+connections and other top-level fields, or the nodes with given IDs.
+Everything else is skipped without being decoded, so peak memory is bounded
+by the largest value built, not by the size of the flow.
+
+Backends:
+    "python"  Built-in pull scanner: finds value boundaries with regex and
+              bytes searches and decodes only the values kept (json.loads)
+    "ijson"   ijson event parser, if installed
+    "auto"    ijson when its C backend is available, else "python"
+
+Usage:
+    from cwprep.reader import FlowDocument
+
+    doc = FlowDocument("big.tflx")
+    for node_id, header in doc.headers().items():
+        print(header["name"], header["nodeType"])
+    doc.connection_attributes()          # {connection_id: {...}}
+    node = doc.nodes[node_id]            # materialized on demand
+    for node_id, node in doc.iter_nodes():
+        ...                              # one node in memory at a time
+"""
+
+import json
+import re
+import zipfile
+from collections import abc
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+# Try to import optional dependencies
+try:
+    import ijson
+    HAS_IJSON = True
+except ImportError:
+    HAS_IJSON = False
+    ijson = None
+
+
+READER_BACKENDS = ("auto", "python", "ijson")
+
+# Fields kept for each node by FlowDocument.headers()
+HEADER_FIELDS = ("id", "name", "nodeType", "baseType", "nextNodes")
+
+# Bytes read from the (decompressed) stream at a time
+DEFAULT_CHUNK_SIZE = 256 * 1024
+
+# Materialized nodes kept (and read ahead on a miss) by FlowDocument.nodes
+DEFAULT_NODE_CACHE = 64
+
+_RE_NON_WHITESPACE = re.compile(rb"[^ \t\r\n]")
+# Everything up to the next bracket: non-structural bytes and whole strings.
+# Strings use the unrolled [^"\\]*(?:\\.[^"\\]*)* form, whose alternatives
+# cannot overlap, so a string cut off by the buffer end fails in linear time
+# without possessive quantifiers (Python 3.11+ only).
+_RE_FLAT = re.compile(rb'(?:[^\[\]{}"]+|"[^"\\]*(?:\\.[^"\\]*)*")*')
+_RE_SCALAR_END = re.compile(rb"[,\]} \t\r\n]")
+_OPEN = frozenset(b"[{")
+
+
+def resolve_reader_backend(backend: str = "auto") -> str:
+    """Validate a reader backend name and resolve "auto"."""
+    if backend not in READER_BACKENDS:
+        raise ValueError(
+            f"Unknown reader backend: {backend!r}. Choose from {READER_BACKENDS}."
+        )
+    if backend == "auto":
+        return "ijson" if HAS_IJSON and ijson.backend == "yajl2_c" else "python"
+    if backend == "ijson" and not HAS_IJSON:
+        raise ImportError("Reader backend 'ijson' requires: pip install ijson")
+    return backend
+
+
+# ---------------------------------------------------------------------------
+# Pull scanners
+#
+# Both scanners walk one JSON document in order. iter_object() positions the
+# scanner on each member value; the caller then consumes that value with
+# read_value(), skip_value() or a nested iter_object() before moving on.
+# ---------------------------------------------------------------------------
+
+class _PythonScanner:
+    """Pull scanner over a UTF-8 JSON byte stream"""
+
+    def __init__(self, fp: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._fp = fp
+        self._chunk_size = chunk_size
+        self._buf = b""
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self) -> int:
+        """Read one more chunk, dropping consumed bytes
+
+        Returns:
+            int: Bytes dropped from the front of the buffer (subtract from
+                 any buffer index held by the caller)
+        """
+        if self._eof:
+            raise ValueError("Unexpected end of JSON document")
+        chunk = self._fp.read(self._chunk_size)
+        if not chunk:
+            self._eof = True
+        dropped = self._pos
+        self._buf = self._buf[dropped:] + chunk
+        self._pos = 0
+        return dropped
+
+    def _peek(self) -> int:
+        """Next non-whitespace byte, without consuming it"""
+        while True:
+            match = _RE_NON_WHITESPACE.search(self._buf, self._pos)
+            if match:
+                self._pos = match.start()
+                return self._buf[self._pos]
+            self._pos = len(self._buf)
+            if self._eof:
+                raise ValueError("Unexpected end of JSON document")
+            self._fill()
+
+    def _expect(self, char: int) -> None:
+        found = self._peek()
+        if found != char:
+            raise ValueError(
+                f"Expected {chr(char)!r} in JSON document, found {chr(found)!r}"
+            )
+        self._pos += 1
+
+    def _string_end(self, i: int, keep: bool) -> int:
+        """Buffer index just past the string whose opening quote is at index i
+
+        With keep=False, bytes of the string may be dropped while reading.
+        """
+        j = i + 1
+        while True:
+            quote = self._buf.find(b'"', j)
+            if quote < 0:
+                j = len(self._buf)
+                # Keep a trailing run of backslashes: it decides whether the
+                # next quote is escaped
+                stop = j
+                while stop > max(i + 1, 0) and self._buf[stop - 1] == 0x5C:
+                    stop -= 1
+                if not keep:
+                    self._pos = stop
+                dropped = self._fill()
+                i -= dropped
+                j -= dropped
+                continue
+            k = quote
+            while k > max(i + 1, 0) and self._buf[k - 1] == 0x5C:
+                k -= 1
+            if (quote - k) % 2 == 0:
+                return quote + 1
+            j = quote + 1
+
+    def _value_end(self, keep: bool) -> int:
+        """Buffer index just past the value starting at the next byte
+
+        With keep=True the value stays buffered as self._buf[self._pos:end];
+        with keep=False it is dropped as it is scanned.
+        """
+        first = self._peek()
+        i = self._pos
+        if first == 0x22:  # '"'
+            return self._string_end(i, keep)
+        if first not in _OPEN:
+            while True:
+                match = _RE_SCALAR_END.search(self._buf, i)
+                if match:
+                    return match.start()
+                if self._eof:
+                    return len(self._buf)
+                i = len(self._buf)
+                i -= self._fill()
+
+        depth = 0
+        while True:
+            i = _RE_FLAT.match(self._buf, i).end()
+            if i == len(self._buf):
+                if not keep:
+                    self._pos = i
+                i -= self._fill()
+                continue
+            char = self._buf[i]
+            if char == 0x22:
+                # A string cut off by the end of the buffer
+                i = self._string_end(i, keep)
+                continue
+            i += 1
+            if char in _OPEN:
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return i
+
+    def read_value(self) -> Any:
+        """Decode the next value"""
+        end = self._value_end(keep=True)
+        value = json.loads(self._buf[self._pos:end])
+        self._pos = end
+        return value
+
+    def skip_value(self) -> None:
+        """Consume the next value without decoding or buffering it"""
+        self._pos = self._value_end(keep=False)
+
+    def _members(self, close: int) -> Iterator[None]:
+        """Yield once per member of the container just opened"""
+        if self._peek() == close:
+            self._pos += 1
+            return
+        while True:
+            yield
+            char = self._peek()
+            self._pos += 1
+            if char == close:
+                return
+            if char != 0x2C:  # ','
+                raise ValueError(f"Expected ',' or {chr(close)!r} in JSON document")
+
+    def iter_object(self) -> Iterator[str]:
+        """Yield each key of the next object, positioned on its value"""
+        self._expect(0x7B)  # '{'
+        for _ in self._members(0x7D):
+            if self._peek() != 0x22:
+                raise ValueError("Expected an object key in JSON document")
+            key = self.read_value()
+            self._expect(0x3A)  # ':'
+            yield key
+
+
+class _IjsonScanner:
+    """Pull scanner over ijson basic_parse events"""
+
+    def __init__(self, fp: BinaryIO, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        self._events = self._checked(ijson.basic_parse(fp, buf_size=chunk_size, use_float=True))
+
+    @staticmethod
+    def _checked(events: Iterator[Tuple[str, Any]]) -> Iterator[Tuple[str, Any]]:
+        """ijson events, with parse errors raised as ValueError like _PythonScanner"""
+        try:
+            yield from events
+        except ijson.JSONError as exc:
+            raise ValueError(f"Invalid JSON document: {exc}") from exc
+
+    def _next(self) -> Tuple[str, Any]:
+        event = next(self._events, None)
+        if event is None:
+            raise ValueError("Unexpected end of JSON document")
+        return event
+
+    def _build(self, event: str, value: Any) -> Any:
+        if event == "start_map":
+            result = {}
+            for key_event, key in self._events:
+                if key_event == "end_map":
+                    return result
+                result[key] = self._build(*self._next())
+        if event == "start_array":
+            result = []
+            for item_event, item in self._events:
+                if item_event == "end_array":
+                    return result
+                result.append(self._build(item_event, item))
+        return value
+
+    def read_value(self) -> Any:
+        return self._build(*self._next())
+
+    def skip_value(self) -> None:
+        depth = 0
+        for event, _value in self._events:
+            if event in ("start_map", "start_array"):
+                depth += 1
+            elif event in ("end_map", "end_array"):
+                depth -= 1
+            if depth == 0:
+                return
+
+    def iter_object(self) -> Iterator[str]:
+        event, _value = self._next()
+        if event != "start_map":
+            raise ValueError(f"Expected an object in JSON document, found {event}")
+        for event, key in self._events:
+            if event == "end_map":
+                return
+            yield key
+
+
+_SCANNERS = {"python": _PythonScanner, "ijson": _IjsonScanner}
+
+
+# ---------------------------------------------------------------------------
+# FlowDocument
+# ---------------------------------------------------------------------------
+
+class FlowDocument:
+    """
+    Lazy view of a flow document inside a .tfl / .tflx archive
+
+    Each query streams the flow entry once; top-level fields and node headers
+    seen on the way are cached, so later header / field lookups are free.
+    Full nodes are only built when asked for (node(), nodes_by_id(),
+    iter_nodes() or the ``nodes`` mapping).
+    """
+
+    def __init__(
+        self,
+        path: str,
+        entry: Optional[str] = None,
+        backend: str = "auto",
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ):
+        """
+        Args:
+            path: .tfl / .tflx archive, or a plain flow JSON file
+            entry: Flow entry name (defaults to maestroMetadata's flowEntryName,
+                   then "flow")
+            backend: One of READER_BACKENDS
+            chunk_size: Bytes read from the stream at a time
+        """
+        self.path = path
+        self.backend = resolve_reader_backend(backend)
+        self.chunk_size = chunk_size
+        self.is_archive = zipfile.is_zipfile(path)
+        if self.is_archive and entry is None:
+            with zipfile.ZipFile(path) as zf:
+                entry = "flow"
+                if "maestroMetadata" in zf.namelist():
+                    with zf.open("maestroMetadata") as fp:
+                        entry = json.load(fp).get("flowEntryName", "flow")
+        self.entry = entry
+        self._fields: Optional[Dict[str, Any]] = None
+        self._headers: Optional[Dict[str, Dict[str, Any]]] = None
+        self.nodes = LazyNodes(self)
+
+    @contextmanager
+    def _open(self) -> Iterator[BinaryIO]:
+        """Binary stream of the flow JSON (decompressed as it is read)"""
+        if not self.is_archive:
+            with open(self.path, "rb") as fp:
+                yield fp
+            return
+        with zipfile.ZipFile(self.path) as zf, zf.open(self.entry) as fp:
+            yield fp
+
+    def _scan(self, wanted: Iterable[str] = ()) -> Dict[str, Any]:
+        """
+        Stream the document once, caching top-level fields and node headers
+
+        Args:
+            wanted: Node IDs to build in full
+
+        Returns:
+            dict: node_id -> node for the wanted IDs that were found
+        """
+        wanted = set(wanted)
+        found: Dict[str, Any] = {}
+        fields: Dict[str, Any] = {}
+        headers: Dict[str, Dict[str, Any]] = {}
+        with self._open() as fp:
+            scanner = _SCANNERS[self.backend](fp, self.chunk_size)
+            for key in scanner.iter_object():
+                if key != "nodes":
+                    fields[key] = scanner.read_value()
+                    continue
+                for node_id in scanner.iter_object():
+                    if node_id in wanted:
+                        node = scanner.read_value()
+                        headers[node_id] = _header(node_id, node)
+                        found[node_id] = node
+                    else:
+                        headers[node_id] = self._read_header(scanner, node_id)
+        self._fields = fields
+        self._headers = headers
+        return found
+
+    @staticmethod
+    def _read_header(scanner, node_id: str) -> Dict[str, Any]:
+        """Build a node's header fields and skip the rest of it"""
+        header: Dict[str, Any] = {"id": node_id}
+        for key in scanner.iter_object():
+            if key in HEADER_FIELDS:
+                header[key] = scanner.read_value()
+            else:
+                scanner.skip_value()
+        return header
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def headers(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Node headers without the heavy parts of each node
+
+        Returns:
+            dict: node_id -> {"id", "name", "nodeType", "baseType", "nextNodes"}
+        """
+        if self._headers is None:
+            self._scan()
+        return self._headers
+
+    def node_ids(self) -> List[str]:
+        """IDs of all nodes, in document order"""
+        return list(self.headers())
+
+    def field(self, name: str, default: Any = None) -> Any:
+        """
+        A top-level flow field other than "nodes" (e.g. "initialNodes")
+
+        Args:
+            name: Field name
+            default: Returned when the flow has no such field
+        """
+        if self._fields is None:
+            self._scan()
+        return self._fields.get(name, default)
+
+    @property
+    def connections(self) -> Dict[str, Any]:
+        """Connection objects by connection ID"""
+        return self.field("connections") or {}
+
+    def connection_attributes(self) -> Dict[str, Dict[str, Any]]:
+        """connectionAttributes by connection ID"""
+        return {
+            conn_id: conn.get("connectionAttributes") or {}
+            for conn_id, conn in self.connections.items()
+        }
+
+    def nodes_by_id(self, node_ids: Iterable[str]) -> Dict[str, Any]:
+        """
+        Build the given nodes in one pass over the document
+
+        Args:
+            node_ids: Node IDs to materialize
+
+        Returns:
+            dict: node_id -> node, for the IDs present in the flow
+        """
+        return self._scan(wanted=node_ids)
+
+    def node(self, node_id: str) -> Dict[str, Any]:
+        """
+        Build one node
+
+        Raises:
+            KeyError: If the flow has no such node
+        """
+        found = self.nodes_by_id([node_id])
+        if node_id not in found:
+            raise KeyError(node_id)
+        return found[node_id]
+
+    def iter_nodes(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """
+        Yield (node_id, node) for every node in one streaming pass
+
+        Only the current node is built. Top-level fields met on the way are
+        cached once the pass completes, so field() / connections are free
+        afterwards.
+        """
+        fields: Dict[str, Any] = {}
+        with self._open() as fp:
+            scanner = _SCANNERS[self.backend](fp, self.chunk_size)
+            for key in scanner.iter_object():
+                if key != "nodes":
+                    fields[key] = scanner.read_value()
+                    continue
+                for node_id in scanner.iter_object():
+                    yield node_id, scanner.read_value()
+        if self._fields is None:
+            self._fields = fields
+
+
+def _header(node_id: str, node: Mapping[str, Any]) -> Dict[str, Any]:
+    """Header fields of a built node"""
+    header = {"id": node_id}
+    for key in HEADER_FIELDS:
+        if key in node:
+            header[key] = node[key]
+    return header
+
+
+class LazyNodes(abc.Mapping):
+    """
+    Read-only node mapping of a FlowDocument; values are built on access
+
+    A cache miss builds the requested node and the uncached nodes after it in
+    document order, up to cache_size, in one pass, so walking the mapping key
+    by key costs about len / cache_size passes. items() and values() stream
+    the document once.
+    """
+
+    def __init__(self, document: FlowDocument, cache_size: int = DEFAULT_NODE_CACHE):
+        self._document = document
+        self._cache: Dict[str, Any] = {}
+        self._cache_size = max(1, cache_size)
+        self._order: Optional[List[str]] = None
+        self._positions: Optional[Dict[str, int]] = None
+
+    def _read_ahead(self, node_id: str) -> Dict[str, Any]:
+        """Build node_id and the uncached nodes that follow it in one pass"""
+        if self._positions is None:
+            self._order = self._document.node_ids()
+            self._positions = {nid: i for i, nid in enumerate(self._order)}
+        start = self._positions.get(node_id)
+        if start is None:
+            raise KeyError(node_id)
+        following = self._order[start + 1:start + self._cache_size]
+        found = self._document.nodes_by_id(
+            [node_id] + [nid for nid in following if nid not in self._cache]
+        )
+        node = found.pop(node_id)
+        self._cache.update(found)
+        return node
+
+    def __getitem__(self, node_id: str) -> Dict[str, Any]:
+        node = self._cache.pop(node_id, None)
+        if node is None:
+            node = self._read_ahead(node_id)
+        self._cache[node_id] = node
+        while len(self._cache) > self._cache_size:
+            # Dicts keep insertion order: drop the least recently used node
+            del self._cache[next(iter(self._cache))]
+        return node
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._document.headers())
+
+    def __len__(self) -> int:
+        return len(self._document.headers())
+
+    def __contains__(self, node_id: object) -> bool:
+        return node_id in self._document.headers()
+
+    def items(self) -> "_NodeItems":
+        return _NodeItems(self)
+
+    def values(self) -> "_NodeValues":
+        return _NodeValues(self)
+
+
+class _NodeItems(abc.ItemsView):
+    """items() of LazyNodes: one streaming pass, nodes are not cached"""
+
+    def __iter__(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        return self._mapping._document.iter_nodes()
+
+
+class _NodeValues(abc.ValuesView):
+    """values() of LazyNodes: one streaming pass, nodes are not cached"""
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        for _node_id, node in self._mapping._document.iter_nodes():
+            yield node
@@ -0,0 +1,304 @@
+"""
+Compact Node Records
+
+Tableau Prep node JSON carries a dozen constant boilerplate fields per node
+(``serialize``, ``description``, ``debugModeRowLimit``, ``originalDataTypes``,
+...). ``NodeRecord`` stores only the meaningful values of a node and shares the
+boilerplate (and the key order) through a ``NodeTemplate`` cached per
+nodeType/key layout, so large builders keep a fraction of the memory.
+
+Records are mutable mappings, but not ``dict`` subclasses:
+``isinstance(node, dict)`` is False and ``json.dumps()`` rejects them, so
+check against ``collections.abc.Mapping`` and serialize ``record.to_dict()``
+(or ``materialize()``) instead. ``build()`` already returns plain dicts.
+Reading a boilerplate list/dict (e.g. ``filters``) returns a fresh empty
+copy that is not kept on the record; assign a new value
+(``node["filters"] = [...]``) to change it. Clean-step ``loomContainer``
+documents are compacted the same way. ``NodeStore`` is the ``dict`` used for
+``TFLBuilder.nodes``; it compacts plain dicts on assignment, and
+``to_dict()`` materializes the full JSON for ``build()``.
+
+Usage:
+    from cwprep.records import NodeRecord, NodeStore
+
+    nodes = NodeStore()
+    nodes["n1"] = {"nodeType": ".v1.LoadSql", "serialize": False, "nextNodes": []}
+    nodes["n1"]["nextNodes"].append({"nextNodeId": "n2"})  # stored values mutate in place
+    nodes["n1"]["serialize"] = True                         # boilerplate is assigned
+    plain = nodes.to_dict()                                 # JSON-ready dicts
+"""
+
+import copy
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# Constant fields repeated on (almost) every node. A node value equal to the
+# default here is kept in the shared template instead of on the record.
+_NODE_DEFAULTS: Dict[str, Any] = {
+    "serialize": False,
+    "description": None,
+    "connectionAttributes": {},
+    "fields": None,
+    "actions": [],
+    "debugModeRowLimit": None,
+    "originalDataTypes": {},
+    "randomSampling": None,
+    "updateTimestamp": None,
+    "restrictedFields": {},
+    "userRenamedFields": {},
+    "selectedFields": None,
+    "samplingType": None,
+    "groupByFields": None,
+    "filters": [],
+    "beforeActionAnnotations": [],
+    "afterActionAnnotations": [],
+    "providedParameters": None,
+}
+
+# Boilerplate of the nested flow document inside a Container's loomContainer.
+_LOOM_CONTAINER_DEFAULTS: Dict[str, Any] = {
+    "parameters": {"parameters": {}},
+    "connections": {},
+    "dataConnections": {},
+    "connectionIds": [],
+    "dataConnectionIds": [],
+    "nodeProperties": {},
+    "extensibility": None,
+}
+
+_MUTABLE_TYPES = (list, dict)
+
+# Marks a key that was deleted from one record.
+_DELETED = object()
+_UNSET = object()
+
+
+def _is_default(value: Any, default: Any) -> bool:
+    # Compare types too so that 0 / False and [] / () are not conflated.
+    return type(value) is type(default) and value == default
+
+
+def _copy_default(value: Any) -> Any:
+    if isinstance(value, _MUTABLE_TYPES):
+        return copy.deepcopy(value) if value else type(value)()
+    return value
+
+
+class NodeTemplate:
+    """Shared key order, value positions and boilerplate for one node layout."""
+
+    __slots__ = ("node_type", "keys", "key_set", "value_index", "defaults")
+
+    def __init__(self, node_type: Any, keys: Tuple[str, ...], defaults: Dict[str, Any]):
+        self.node_type = node_type
+        self.keys = keys
+        self.key_set = frozenset(keys)
+        self.defaults = defaults
+        self.value_index = {
+            key: i for i, key in enumerate(k for k in keys if k not in defaults)
+        }
+
+
+# Templates kept for reuse. Records hold their own template, so evicting one
+# only costs sharing with records compacted later.
+MAX_TEMPLATES = 1024
+
+_TEMPLATES: Dict[Tuple[Any, ...], NodeTemplate] = {}
+
+
+def _get_template(table: Dict[str, Any], node_type: Any, keys: Tuple[str, ...],
+                  defaulted: Tuple[str, ...]) -> NodeTemplate:
+    signature = (id(table), node_type, keys, defaulted)
+    template = _TEMPLATES.pop(signature, None)
+    if template is None:
+        template = NodeTemplate(node_type, keys, {key: table[key] for key in defaulted})
+    _TEMPLATES[signature] = template
+    if len(_TEMPLATES) > MAX_TEMPLATES:
+        # Dicts keep insertion order: drop the least recently used template
+        del _TEMPLATES[next(iter(_TEMPLATES))]
+    return template
+
+
+def _compact_value(value: Any) -> Any:
+    """Compact nested node dicts (actionNode, loomContainer nodes, ...) in place."""
+    if type(value) is dict:
+        if "nodeType" in value:
+            return NodeRecord.from_dict(value)
+        if "initialNodes" in value and "nodes" in value:
+            return NodeRecord.from_dict(value, _LOOM_CONTAINER_DEFAULTS)
+        for key, item in value.items():
+            if isinstance(item, _MUTABLE_TYPES):
+                value[key] = _compact_value(item)
+    elif type(value) is list:
+        for i, item in enumerate(value):
+            if isinstance(item, _MUTABLE_TYPES):
+                value[i] = _compact_value(item)
+    return value
+
+
+def materialize(value: Any) -> Any:
+    """Return a plain JSON-ready copy of ``value`` with records expanded."""
+    if isinstance(value, NodeRecord):
+        return value.to_dict()
+    if isinstance(value, dict):
+        return {key: materialize(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [materialize(item) for item in value]
+    return value
+
+
+class NodeRecord(MutableMapping):
+    """Compact mapping storage for a single flow node.
+
+    Meaningful values live in a positional list laid out by the shared
+    template; ``_extra`` is only allocated once a record gains a key, has a
+    boilerplate value replaced, or has a key deleted. Use
+    ``NodeRecord.from_dict()`` to build one from node JSON, and
+    ``to_dict()`` for a plain dict (e.g. for ``json.dumps()``).
+    """
+
+    __slots__ = ("_template", "_data", "_extra")
+
+    def __init__(self, template: NodeTemplate, data: List[Any],
+                 extra: Optional[Dict[str, Any]] = None):
+        self._template = template
+        self._data = data
+        self._extra = extra
+
+    @classmethod
+    def from_dict(cls, node: Dict[str, Any],
+                  defaults: Optional[Dict[str, Any]] = None) -> "NodeRecord":
+        """Compact a node dict, moving boilerplate values into a shared template.
+
+        Args:
+            node: Node JSON dict (nested nodes are compacted too)
+            defaults: Boilerplate table to compact against (node fields by default)
+        """
+        table = _NODE_DEFAULTS if defaults is None else defaults
+        keys = tuple(node)
+        defaulted = tuple(
+            key for key in keys
+            if key in table and _is_default(node[key], table[key])
+        )
+        template = _get_template(table, node.get("nodeType"), keys, defaulted)
+        data = [
+            _compact_value(value) if isinstance(value, _MUTABLE_TYPES) else value
+            for key, value in node.items()
+            if key in template.value_index
+        ]
+        return cls(template, data)
+
+    # -- Mapping protocol --------------------------------------------------
+
+    def _lookup(self, key: str) -> Any:
+        """Return the stored value, a boilerplate default, or _UNSET/_DELETED."""
+        i = self._template.value_index.get(key)
+        if i is not None:
+            return self._data[i]
+        extra = self._extra
+        if extra is not None and key in extra:
+            return extra[key]
+        return self._template.defaults.get(key, _UNSET)
+
+    def __getitem__(self, key: str) -> Any:
+        value = self._lookup(key)
+        if value is _UNSET or value is _DELETED:
+            raise KeyError(key)
+        if isinstance(value, _MUTABLE_TYPES) and key in self._template.defaults and (
+            self._extra is None or key not in self._extra
+        ):
+            # Never hand out the shared boilerplate; reads leave the record compact
+            return _copy_default(value)
+        return value
+
+    def _set_extra(self, key: str, value: Any) -> None:
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        i = self._template.value_index.get(key)
+        if i is not None:
+            self._data[i] = value
+        else:
+            self._set_extra(key, value)
+
+    def __delitem__(self, key: str) -> None:
+        if key not in self:
+            raise KeyError(key)
+        i = self._template.value_index.get(key)
+        if i is not None:
+            self._data[i] = _DELETED
+        elif key in self._template.key_set:
+            self._set_extra(key, _DELETED)
+        else:
+            del self._extra[key]
+
+    def __contains__(self, key: object) -> bool:
+        value = self._lookup(key)
+        return value is not _UNSET and value is not _DELETED
+
+    def __iter__(self) -> Iterator[str]:
+        template = self._template
+        data = self._data
+        extra = self._extra
+        value_index = template.value_index
+        for key in template.keys:
+            i = value_index.get(key)
+            if i is not None:
+                if data[i] is not _DELETED:
+                    yield key
+            elif extra is None or extra.get(key, _UNSET) is not _DELETED:
+                yield key
+        if extra:
+            key_set = template.key_set
+            for key, value in list(extra.items()):
+                if key not in key_set and value is not _DELETED:
+                    yield key
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"NodeRecord({self.to_dict()!r})"
+
+    def __reduce__(self):
+        return (NodeRecord.from_dict, (self.to_dict(),))
+
+    # -- Materialization ---------------------------------------------------
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Return the full node JSON as plain dicts/lists (a fresh copy)."""
+        result = {}
+        for key in self:
+            value = self._lookup(key)
+            if key in self._template.defaults and (
+                self._extra is None or key not in self._extra
+            ):
+                result[key] = _copy_default(value)
+            else:
+                result[key] = materialize(value)
+        return result
+
+
+class NodeStore(dict):
+    """``dict`` of node_id -> NodeRecord that compacts plain dicts on assignment."""
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        if type(value) is dict:
+            value = NodeRecord.from_dict(value)
+        super().__setitem__(key, value)
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key: str, default: Any = None) -> Any:
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """Materialize every node as plain JSON-ready dicts."""
+        return {node_id: materialize(node) for node_id, node in self.items()}
@@ -0,0 +1,422 @@
+"""
+Flow Templates
+
+Compiles a builder session into a JSON skeleton once and stamps out many
+flows from it by filling parameter slots and remapping IDs, instead of
+replaying hundreds of ``add_*`` calls per flow.
+
+Parameters are placeholder tokens from ``FlowTemplate.param(name)``, passed
+wherever a string argument goes (schema, table names, SQL, filter values,
+datasource names, ...). Compiling serializes ``builder.build()`` and splits
+the text at every parameter token and every ID the builder minted (documents,
+connections, nodes, actions, union namespaces). Instantiating joins the
+pieces back with JSON-escaped values and fresh IDs: instantiate() parses the
+result (with orjson when installed), while save() writes the text straight
+into the archive entries, already laid out the way TFLPackager writes them.
+
+UUID-shaped strings the builder did not mint (e.g. inside custom SQL) are
+copied as-is.
+
+Usage:
+    from cwprep import TFLBuilder
+    from cwprep.template import FlowTemplate
+
+    p = FlowTemplate.param
+    builder = TFLBuilder(flow_name="Tenant Orders")
+    conn = builder.add_connection(host="db", username="etl", dbname="sales")
+    orders = builder.add_input_table("Orders", "orders", conn, schema=p("schema"))
+    builder.add_output_server("Output", orders, p("datasource"))
+
+    template = FlowTemplate.from_builder(builder)
+    flow, display, meta = template.instantiate({"schema": "acme", "datasource": "Acme"})
+
+    template.save_many(
+        [(f"out/{t}.tfl", {"schema": t, "datasource": t}) for t in tenants],
+        workers=8,
+    )
+"""
+
+import json
+import os
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+from .jsonstream import HAS_ORJSON, json_default
+from .packager import TFLPackager
+
+
+PARAM_PREFIX = "{{cwprep:"
+PARAM_SUFFIX = "}}"
+
+_PARAM_NAME = re.compile(r"[A-Za-z_]\w*\Z")
+_UUID = r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+_TOKEN = r"\{\{cwprep:([A-Za-z_]\w*)\}\}"
+_RE_PARAM = re.compile(_TOKEN)
+_RE_SLOT = re.compile(_TOKEN + "|(" + _UUID + ")")
+_RE_UUID = re.compile(_UUID + r"\Z")
+_NAMESPACE_PREFIX = "Union-Namespace-"
+
+DEFAULT_CHUNKSIZE = 16
+
+if HAS_ORJSON:
+    import orjson
+    _loads = orjson.loads
+else:
+    _loads = json.loads
+
+
+def _random_ids(count: int) -> List[str]:
+    """count random (version 4) UUID strings from one urandom call"""
+    digits = os.urandom(16 * count).hex()
+    return [
+        f"{digits[i:i + 8]}-{digits[i + 8:i + 12]}-4{digits[i + 13:i + 16]}-"
+        f"{'89ab'[int(digits[i + 16], 16) & 3]}{digits[i + 17:i + 20]}-{digits[i + 20:i + 32]}"
+        for i in range(0, 32 * count, 32)
+    ]
+
+
+def _minted_ids(flow: Mapping[str, Any]) -> set:
+    """IDs the builder generated: documents, connections, nodes, actions, namespaces"""
+    found = set()
+
+    def add(value: Any) -> None:
+        if isinstance(value, str):
+            if value.startswith(_NAMESPACE_PREFIX):
+                value = value[len(_NAMESPACE_PREFIX):]
+            if _RE_UUID.match(value):
+                found.add(value)
+
+    def walk(value: Any) -> None:
+        if isinstance(value, Mapping):
+            for key, item in value.items():
+                if key in ("id", "namespaceName", "nextNamespace"):
+                    add(item)
+                walk(item)
+        elif isinstance(value, list):
+            for item in value:
+                walk(item)
+
+    add(flow.get("documentId"))
+    add(flow.get("obfuscatorId"))
+    for conn_id in flow.get("connections", {}):
+        add(conn_id)
+    for node_id, node in flow.get("nodes", {}).items():
+        add(node_id)
+        walk(node)
+    return found
+
+
+def _split(text: str, index: Mapping[str, int]) -> Tuple[List[str], List[int]]:
+    """Split JSON text at parameter tokens and minted IDs
+
+    Returns:
+        tuple: (literals, slots); literals has one more item than slots, and
+               each slot is the index of the value filling it
+    """
+    literals: List[str] = []
+    slots: List[int] = []
+    pos = 0
+    for match in _RE_SLOT.finditer(text):
+        slot = index.get(match.group(1) or match.group(2))
+        if slot is None:
+            # A UUID the builder did not mint
+            continue
+        literals.append(text[pos:match.start()])
+        slots.append(slot)
+        pos = match.end()
+    literals.append(text[pos:])
+    return literals, slots
+
+
+def _encode(document: Any, indent: Optional[int], sort_keys: bool) -> str:
+    """JSON text as TFLPackager writes it with the stdlib backend"""
+    return json.dumps(
+        document,
+        indent=indent,
+        separators=None if indent else (",", ":"),
+        ensure_ascii=False,
+        sort_keys=sort_keys,
+        default=json_default,
+    )
+
+
+class FlowTemplate:
+    """
+    Precompiled flow skeleton with parameter and ID slots
+
+    Build once with from_builder(), then call instantiate() or save() per
+    flow. A skeleton is compiled per JSON layout (compact for instantiate(),
+    indented or sorted for save()) on first use. Templates are plain data and
+    pickle cheaply, so the bulk methods ship one copy to each worker process.
+    """
+
+    def __init__(self, flow: Mapping[str, Any], display: Mapping[str, Any],
+                 meta: Mapping[str, Any]):
+        """
+        Compile built flow components into a template
+
+        Args:
+            flow: Flow JSON object, containing FlowTemplate.param() tokens
+            display: Display settings JSON object
+            meta: Maestro metadata JSON object
+        """
+        self._source = tuple(_encode(doc, None, False) for doc in (flow, display, meta))
+        self._ids = sorted(_minted_ids(flow))
+        self.params = list(dict.fromkeys(
+            name for text in self._source for name in _RE_PARAM.findall(text)
+        ))
+        self._index = {key: i for i, key in enumerate(self._ids + self.params)}
+        self._skeletons: Dict[Tuple[Optional[int], bool], tuple] = {}
+
+    @staticmethod
+    def param(name: str) -> str:
+        """
+        Placeholder token for a template parameter
+
+        Args:
+            name: Parameter name (letters, digits and underscores)
+
+        Returns:
+            str: Token to pass to builder methods in place of the value
+        """
+        if not isinstance(name, str) or not _PARAM_NAME.match(name):
+            raise ValueError(f"Invalid template parameter name: {name!r}")
+        return f"{PARAM_PREFIX}{name}{PARAM_SUFFIX}"
+
+    @classmethod
+    def from_builder(cls, builder, is_packaged: bool = False) -> "FlowTemplate":
+        """
+        Compile a builder session
+
+        Args:
+            builder: TFLBuilder whose string arguments used param() tokens
+            is_packaged: Build for a .tflx archive (see TFLBuilder.build)
+
+        Returns:
+            FlowTemplate
+        """
+        return cls(*builder.build(is_packaged=is_packaged))
+
+    @property
+    def id_count(self) -> int:
+        """Number of distinct IDs remapped per instance"""
+        return len(self._ids)
+
+    def _fresh_ids(self, seed: Optional[str]) -> List[str]:
+        """New IDs: random, or uuid5 over the seed and the template ID when seeded"""
+        if seed is None:
+            return _random_ids(len(self._ids))
+        namespace = uuid.uuid5(uuid.NAMESPACE_URL, f"cwprep:{seed}")
+        return [str(uuid.uuid5(namespace, old_id)) for old_id in self._ids]
+
+    def _skeleton(self, indent: Optional[int], sort_keys: bool) -> tuple:
+        """(literals, slots) per document for one JSON layout, compiled on first use"""
+        key = (indent, sort_keys)
+        if key not in self._skeletons:
+            texts = self._source
+            if key != (None, False):
+                texts = [_encode(json.loads(text), indent, sort_keys) for text in texts]
+            self._skeletons[key] = tuple(_split(text, self._index) for text in texts)
+        return self._skeletons[key]
+
+    def render(
+        self,
+        values: Mapping[str, Any],
+        seed: Optional[str] = None,
+        indent: Optional[int] = None,
+        sort_keys: bool = False,
+    ) -> Tuple[str, str, str]:
+        """
+        Fill the skeleton and return the JSON text of each document
+
+        Args:
+            values: Parameter name -> value (converted with str())
+            seed: Derive IDs deterministically from this string instead of
+                  random version 4 UUIDs
+            indent: Indent width, or None for compact JSON
+            sort_keys: Sort mapping keys (by their template keys, so mappings
+                       keyed by IDs or parameters keep one order per template)
+
+        Returns:
+            tuple: (flow, displaySettings, maestroMetadata) JSON texts
+        """
+        missing = [name for name in self.params if name not in values]
+        if missing:
+            raise ValueError(f"Missing template parameters: {', '.join(missing)}")
+        unknown = [str(name) for name in values if name not in self.params]
+        if unknown:
+            raise ValueError(f"Unknown template parameters: {', '.join(unknown)}")
+
+        # Tokens only occur inside JSON strings, so values are escaped the same way
+        slot_values = self._fresh_ids(seed) + [
+            json.dumps(str(values[name]), ensure_ascii=False)[1:-1]
+            for name in self.params
+        ]
+        texts = []
+        for literals, slots in self._skeleton(indent, sort_keys):
+            pieces = [None] * (2 * len(slots) + 1)
+            pieces[0::2] = literals
+            pieces[1::2] = [slot_values[i] for i in slots]
+            texts.append("".join(pieces))
+        return tuple(texts)
+
+    def instantiate(self, values: Mapping[str, Any], seed: Optional[str] = None) -> tuple:
+        """
+        Create one flow from the template
+
+        Args:
+            values: Parameter name -> value
+            seed: Derive IDs deterministically from this string
+
+        Returns:
+            tuple: (flow, displaySettings, maestroMetadata) three JSON objects
+        """
+        flow, display, meta = (_loads(text) for text in self.render(values, seed))
+        return flow, display, meta
+
+    def save(
+        self,
+        output_path: str,
+        values: Mapping[str, Any],
+        seed: Optional[str] = None,
+        compresslevel: Optional[int] = None,
+        keep_backups: Optional[int] = None,
+        reproducible: bool = False,
+        compact: bool = False,
+        **save_kwargs,
+    ) -> str:
+        """
+        Create one flow and write it as a .tfl / .tflx archive
+
+        The rendered JSON text goes straight into the zip entries, in the
+        same layout TFLPackager writes; no documents are built or encoded.
+        Any other TFLPackager option (skip_unchanged, data_files, ...) falls
+        back to instantiate() plus TFLPackager.save_tfl / save_tflx.
+
+        Args:
+            output_path: Output .tfl or .tflx path
+            values: Parameter name -> value
+            seed: Derive IDs deterministically from this string
+            compresslevel, keep_backups, reproducible, compact: As in
+                TFLPackager.save_tfl
+            **save_kwargs: Other TFLPackager.save_tfl / save_tflx options
+
+        Returns:
+            str: Absolute output path
+        """
+        options = dict(compresslevel=compresslevel, keep_backups=keep_backups,
+                       reproducible=reproducible)
+        if save_kwargs:
+            flow, display, meta = self.instantiate(values, seed)
+            save = (TFLPackager.save_tflx if output_path.lower().endswith(".tflx")
+                    else TFLPackager.save_tfl)
+            return save(output_path, flow, display, meta, compact=compact,
+                        **options, **save_kwargs)
+
+        texts = self.render(values, seed, indent=None if compact else 2,
+                            sort_keys=reproducible)
+        return TFLPackager._save_encoded(
+            output_path, [text.encode("utf-8") for text in texts], **options
+        )
+
+    # ------------------------------------------------------------------
+    # Bulk instantiation
+    # ------------------------------------------------------------------
+
+    def _map(self, worker, jobs: List[tuple], workers: int, chunksize: int) -> List[Any]:
+        """Run worker(template, job) over jobs, in-process or over a process pool"""
+        if not isinstance(workers, int) or isinstance(workers, bool) or workers < 1:
+            raise ValueError(f"workers must be a positive integer, got {workers!r}")
+        if workers == 1 or len(jobs) < 2:
+            return [worker(self, job) for job in jobs]
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self,),
+        ) as pool:
+            return list(pool.map(_run_worker, [worker] * len(jobs), jobs,
+                                 chunksize=chunksize))
+
+    def instantiate_many(
+        self,
+        values_list: Iterable[Mapping[str, Any]],
+        workers: int = 1,
+        seed: Optional[str] = None,
+        chunksize: int = DEFAULT_CHUNKSIZE,
+    ) -> List[tuple]:
+        """
+        Create many flows, optionally across worker processes
+
+        Args:
+            values_list: One parameter mapping per flow
+            workers: Number of processes (1 runs in-process)
+            seed: Derive IDs deterministically from "<seed>:<index>"
+            chunksize: Jobs sent to a worker at a time
+
+        Returns:
+            List[tuple]: (flow, display, meta) per flow, in input order
+        """
+        jobs = [
+            (values, None if seed is None else f"{seed}:{i}")
+            for i, values in enumerate(values_list)
+        ]
+        return self._map(_instantiate_job, jobs, workers, chunksize)
+
+    def save_many(
+        self,
+        jobs: Iterable[Tuple[str, Mapping[str, Any]]],
+        workers: int = 1,
+        seed: Optional[str] = None,
+        chunksize: int = DEFAULT_CHUNKSIZE,
+        **save_kwargs,
+    ) -> List[str]:
+        """
+        Instantiate and write many flows; each worker packages its own archives
+
+        Args:
+            jobs: (output_path, values) pairs
+            workers: Number of processes (1 runs in-process)
+            seed: Derive IDs deterministically from "<seed>:<output_path>"
+            chunksize: Jobs sent to a worker at a time
+            **save_kwargs: Passed to save()
+
+        Returns:
+            List[str]: Absolute output paths, in input order
+        """
+        jobs = [
+            (path, values, None if seed is None else f"{seed}:{path}", save_kwargs)
+            for path, values in jobs
+        ]
+        # Compile the archive layout once here rather than once per worker
+        self._skeleton(None if save_kwargs.get("compact") else 2,
+                       bool(save_kwargs.get("reproducible")))
+        return self._map(_save_job, jobs, workers, chunksize)
+
+
+# ---------------------------------------------------------------------------
+# Worker processes
+# ---------------------------------------------------------------------------
+
+_worker_template: Optional[FlowTemplate] = None
+
+
+def _init_worker(template: FlowTemplate) -> None:
+    """Process pool initializer: keep one template per worker"""
+    global _worker_template
+    _worker_template = template
+
+
+def _run_worker(worker, job: tuple) -> Any:
+    return worker(_worker_template, job)
+
+
+def _instantiate_job(template: FlowTemplate, job: tuple) -> tuple:
+    values, seed = job
+    return template.instantiate(values, seed)
+
+
+def _save_job(template: FlowTemplate, job: tuple) -> str:
+    path, values, seed, save_kwargs = job
+    return template.save(path, values, seed, **save_kwargs)
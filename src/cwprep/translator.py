@@ -23,9 +23,11 @@ import json
 import zipfile
 from collections import defaultdict
 from datetime import datetime
-from typing import Any, Dict, List, Optional, Tuple, Set
+from typing import Any, Callable, Dict, List, Optional, Tuple, Set
 
+from .expression_parser import quote_identifier_ansi
 from .expression_translator import ExpressionTranslator
+from .graph import FlowGraph
 
 
 class ColumnTracker:
@@ -111,6 +113,54 @@ _NODE_ICONS = {
 }
 
 
+def aggregate_output_name(agg: Dict[str, Any]) -> str:
+    """Output column name of one ``aggregateFields`` entry."""
+    func = agg.get("function", "COUNT")
+    return agg.get("newColumnName") or f"{func}_{agg.get('columnName', '')}"
+
+
+def aggregate_sql(
+    action_node: Dict[str, Any],
+    source: str,
+    quote_identifier: Callable[[str], str] = quote_identifier_ansi,
+    where: Optional[str] = None,
+) -> str:
+    """Render an Aggregate action as ``SELECT ... GROUP BY`` over ``source``.
+
+    Args:
+        action_node: ``.v1.Aggregate`` action (groupByFields / aggregateFields)
+        source: FROM-clause item (CTE name, table or aliased subquery)
+        quote_identifier: Callable used to quote column names
+        where: Optional predicate applied before grouping
+
+    Returns:
+        SQL statement; COUNTD is emitted as COUNT(DISTINCT ...)
+    """
+    group_cols = [
+        f.get("columnName", "") for f in action_node.get("groupByFields", [])
+    ]
+
+    select_parts = [quote_identifier(col) for col in group_cols]
+    for agg in action_node.get("aggregateFields", []):
+        func = agg.get("function", "COUNT")
+        col = quote_identifier(agg.get("columnName", ""))
+        output = quote_identifier(aggregate_output_name(agg))
+        # COUNTD → COUNT(DISTINCT ...)
+        if func.upper() == "COUNTD":
+            select_parts.append(f"COUNT(DISTINCT {col}) AS {output}")
+        else:
+            select_parts.append(f"{func}({col}) AS {output}")
+
+    select_clause = ",\n        ".join(select_parts)
+    sql = f"SELECT {select_clause}\n    FROM {source}"
+    if where:
+        sql += f"\n    WHERE {where}"
+    if group_cols:
+        group_by = ", ".join(quote_identifier(col) for col in group_cols)
+        sql += f"\n    GROUP BY {group_by}"
+    return sql
+
+
 class SQLTranslator:
     """Translate TFL flow JSON to ANSI SQL (CTE format).
 
@@ -156,8 +206,9 @@ class SQLTranslator:
         if not nodes:
             return "-- Empty flow (no nodes)"
 
-        # Build the DAG and get topological order
-        ordered_ids = self._topological_sort(nodes, initial_nodes)
+        # Build the parent/child index once; every node translator uses it
+        graph = FlowGraph(nodes)
+        ordered_ids = graph.topological_order(initial_nodes)
 
         # Parse hidden columns from displaySettings
         hidden_map = {}
@@ -176,7 +227,7 @@ class SQLTranslator:
             cte_name_map[node_id] = cte_name
 
             entry = self._translate_node(
-                node, node_id, connections, cte_name_map, nodes, tracker
+                node, node_id, connections, cte_name_map, graph, tracker
             )
             entry["cte_name"] = cte_name
             cte_entries.append(entry)
@@ -235,54 +286,7 @@ class SQLTranslator:
         initial_nodes: List[str],
     ) -> List[str]:
         """Topological sort of the node DAG."""
-        # Build adjacency list and in-degree count
-        in_degree: Dict[str, int] = defaultdict(int)
-        children: Dict[str, List[str]] = defaultdict(list)
-
-        for nid, node in nodes.items():
-            if nid not in in_degree:
-                in_degree[nid] = 0
-            for link in node.get("nextNodes", []):
-                child_id = link.get("nextNodeId")
-                if child_id:
-                    children[nid].append(child_id)
-                    in_degree[child_id] = in_degree.get(child_id, 0) + 1
-
-        # BFS starting from nodes with in_degree == 0
-        queue = [nid for nid in nodes if in_degree.get(nid, 0) == 0]
-        # Prefer initial_nodes ordering
-        if initial_nodes:
-            seen = set()
-            ordered_start = []
-            for nid in initial_nodes:
-                if nid in nodes and nid not in seen:
-                    ordered_start.append(nid)
-                    seen.add(nid)
-            for nid in queue:
-                if nid not in seen:
-                    ordered_start.append(nid)
-                    seen.add(nid)
-            queue = ordered_start
-
-        result = []
-        visited = set()
-        while queue:
-            nid = queue.pop(0)
-            if nid in visited:
-                continue
-            visited.add(nid)
-            result.append(nid)
-            for child_id in children.get(nid, []):
-                in_degree[child_id] -= 1
-                if in_degree[child_id] <= 0 and child_id not in visited:
-                    queue.append(child_id)
-
-        # Append any remaining unvisited nodes
-        for nid in nodes:
-            if nid not in visited:
-                result.append(nid)
-
-        return result
+        return FlowGraph(nodes).topological_order(initial_nodes)
 
     # ==================================================================
     # CTE name generation
@@ -317,7 +321,7 @@ class SQLTranslator:
         node_id: str,
         connections: Dict[str, Any],
         cte_name_map: Dict[str, str],
-        all_nodes: Dict[str, Any],
+        graph: FlowGraph,
         tracker: ColumnTracker,
     ) -> Dict[str, Any]:
         """Translate a single node to a CTE entry dict."""
@@ -346,15 +350,15 @@ class SQLTranslator:
 
         # Join
         if node_type == ".v2018_2_3.SuperJoin":
-            return self._translate_join(node, cte_name, cte_name_map, all_nodes, tracker)
+            return self._translate_join(node, cte_name, cte_name_map, graph, tracker)
 
         # Union
         if node_type == ".v2018_2_3.SuperUnion":
-            return self._translate_union(node, cte_name, cte_name_map, all_nodes, tracker)
+            return self._translate_union(node, cte_name, cte_name_map, graph, tracker)
 
         # Aggregate
         if node_type == ".v2018_2_3.SuperAggregate":
-            return self._translate_aggregate(node, cte_name, cte_name_map, all_nodes, tracker)
+            return self._translate_aggregate(node, cte_name, cte_name_map, graph, tracker)
 
         # Pivot / Unpivot — unsupported
         if node_type in (".v2018_3_3.SuperPivot", ".v2018_2_3.SuperUnpivot"):
@@ -363,11 +367,11 @@ class SQLTranslator:
 
         # Clean step (Container)
         if node_type == ".v1.Container":
-            return self._translate_container(node, cte_name, cte_name_map, all_nodes, tracker)
+            return self._translate_container(node, cte_name, cte_name_map, graph, tracker)
 
         # Output
         if node_type == ".v1.PublishExtract":
-            return self._translate_output(node, cte_name_map, all_nodes)
+            return self._translate_output(node, cte_name_map, graph)
 
         # Fallback
         tracker.set_state(cte_name, "UNKNOWN", set())
@@ -437,7 +441,7 @@ class SQLTranslator:
         node: Dict[str, Any],
         cte_name: str,
         cte_name_map: Dict[str, str],
-        all_nodes: Dict[str, Any],
+        graph: FlowGraph,
         tracker: ColumnTracker,
     ) -> Dict[str, Any]:
         node_name = node.get("name", "")
@@ -445,9 +449,9 @@ class SQLTranslator:
         join_type = action_node.get("joinType", "left").upper()
         conditions = action_node.get("conditions", [])
 
-        # Find parent CTEs by scanning all_nodes for nextNodes pointing here
+        # Find parent CTEs through the Left/Right namespaces of incoming edges
         left_cte, right_cte = self._find_join_parents(
-            node.get("id", ""), all_nodes, cte_name_map
+            node.get("id", ""), graph, cte_name_map
         )
 
         # Build ON clause
@@ -500,21 +504,18 @@ class SQLTranslator:
     def _find_join_parents(
         self,
         join_node_id: str,
-        all_nodes: Dict[str, Any],
+        graph: FlowGraph,
         cte_name_map: Dict[str, str],
     ) -> Tuple[str, str]:
         """Find the Left and Right parent CTE names for a join node."""
         left_cte = "unknown_left"
         right_cte = "unknown_right"
-        for nid, n in all_nodes.items():
-            for link in n.get("nextNodes", []):
-                if link.get("nextNodeId") == join_node_id:
-                    ns = link.get("nextNamespace", "")
-                    cte = cte_name_map.get(nid, nid)
-                    if ns == "Left":
-                        left_cte = cte
-                    elif ns == "Right":
-                        right_cte = cte
+        for nid, ns in graph.parents_of(join_node_id):
+            cte = cte_name_map.get(nid, nid)
+            if ns == "Left":
+                left_cte = cte
+            elif ns == "Right":
+                right_cte = cte
         return left_cte, right_cte
 
     # ==================================================================
@@ -526,14 +527,14 @@ class SQLTranslator:
         node: Dict[str, Any],
         cte_name: str,
         cte_name_map: Dict[str, str],
-        all_nodes: Dict[str, Any],
+        graph: FlowGraph,
         tracker: ColumnTracker,
     ) -> Dict[str, Any]:
         node_name = node.get("name", "")
 
         # Find all parent CTEs pointing to this union node
         parent_ctes = self._find_union_parents(
-            node.get("id", ""), all_nodes, cte_name_map
+            node.get("id", ""), graph, cte_name_map
         )
 
         if len(parent_ctes) < 2:
@@ -559,16 +560,14 @@ class SQLTranslator:
     def _find_union_parents(
         self,
         union_node_id: str,
-        all_nodes: Dict[str, Any],
+        graph: FlowGraph,
         cte_name_map: Dict[str, str],
     ) -> List[str]:
         """Find all parent CTE names for a union node."""
-        parents = []
-        for nid, n in all_nodes.items():
-            for link in n.get("nextNodes", []):
-                if link.get("nextNodeId") == union_node_id:
-                    parents.append(cte_name_map.get(nid, nid))
-        return parents
+        return [
+            cte_name_map.get(nid, nid)
+            for nid in graph.parent_ids(union_node_id)
+        ]
 
     # ==================================================================
     # Aggregate node
@@ -579,40 +578,21 @@ class SQLTranslator:
         node: Dict[str, Any],
         cte_name: str,
         cte_name_map: Dict[str, str],
-        all_nodes: Dict[str, Any],
+        graph: FlowGraph,
         tracker: ColumnTracker,
     ) -> Dict[str, Any]:
         node_name = node.get("name", "")
         action_node = node.get("actionNode", {})
 
         parent_cte = self._find_single_parent(
-            node.get("id", ""), all_nodes, cte_name_map
+            node.get("id", ""), graph, cte_name_map
         )
 
-        # Group by fields
-        group_fields = action_node.get("groupByFields", [])
-        group_cols = [f.get("columnName", "") for f in group_fields]
-
-        # Aggregate fields
+        group_cols = [
+            f.get("columnName", "") for f in action_node.get("groupByFields", [])
+        ]
         agg_fields = action_node.get("aggregateFields", [])
-
-        select_parts = [f'"{col}"' for col in group_cols]
-        for agg in agg_fields:
-            func = agg.get("function", "COUNT")
-            col = agg.get("columnName", "")
-            output = agg.get("newColumnName") or f"{func}_{col}"
-            # COUNTD → COUNT(DISTINCT ...)
-            if func.upper() == "COUNTD":
-                select_parts.append(f'COUNT(DISTINCT "{col}") AS "{output}"')
-            else:
-                select_parts.append(f'{func}("{col}") AS "{output}"')
-
-        group_by = ", ".join(f'"{col}"' for col in group_cols)
-        select_clause = ",\n        ".join(select_parts)
-
-        sql = f"SELECT {select_clause}\n    FROM {parent_cte}"
-        if group_cols:
-            sql += f"\n    GROUP BY {group_by}"
+        sql = aggregate_sql(action_node, parent_cte)
 
         agg_desc = ", ".join(
             f'{a.get("function", "")}({a.get("columnName", "")})'
@@ -626,11 +606,7 @@ class SQLTranslator:
 
         # Aggregate always outputs specific columns -> KNOWN
         out_cols = set(group_cols)
-        for agg in agg_fields:
-            col = agg.get("columnName", "")
-            func = agg.get("function", "COUNT")
-            output = agg.get("newColumnName") or f"{func}_{col}"
-            out_cols.add(output)
+        out_cols.update(aggregate_output_name(agg) for agg in agg_fields)
         tracker.set_state(cte_name, "KNOWN", out_cols)
 
         return {
@@ -650,13 +626,13 @@ class SQLTranslator:
         node: Dict[str, Any],
         cte_name: str,
         cte_name_map: Dict[str, str],
-        all_nodes: Dict[str, Any],
+        graph: FlowGraph,
         tracker: ColumnTracker,
     ) -> Dict[str, Any]:
         node_name = node.get("name", "")
 
         parent_cte = self._find_single_parent(
-            node.get("id", ""), all_nodes, cte_name_map
+            node.get("id", ""), graph, cte_name_map
         )
 
         # Get start state from parent
@@ -888,13 +864,13 @@ class SQLTranslator:
         self,
         node: Dict[str, Any],
         cte_name_map: Dict[str, str],
-        all_nodes: Dict[str, Any],
+        graph: FlowGraph,
     ) -> Dict[str, Any]:
         node_name = node.get("name", "")
         ds_name = node.get("datasourceName", "")
 
         parent_cte = self._find_single_parent(
-            node.get("id", ""), all_nodes, cte_name_map
+            node.get("id", ""), graph, cte_name_map
         )
 
         return {
@@ -1051,14 +1027,13 @@ class SQLTranslator:
     def _find_single_parent(
         self,
         node_id: str,
-        all_nodes: Dict[str, Any],
+        graph: FlowGraph,
         cte_name_map: Dict[str, str],
     ) -> str:
         """Find the single parent CTE name for a node."""
-        for nid, n in all_nodes.items():
-            for link in n.get("nextNodes", []):
-                if link.get("nextNodeId") == node_id:
-                    return cte_name_map.get(nid, nid)
+        parents = graph.parents_of(node_id)
+        if parents:
+            return cte_name_map.get(parents[0][0], parents[0][0])
         return "unknown_parent"
 
     def _get_connection_info(
@@ -44,6 +44,44 @@ def test_add_connection():
     assert builder.connections[conn_id]["connectionAttributes"]["dbname"] == "test_db"
 
 
+def test_identical_connections_are_interned():
+    """测试相同属性的连接复用同一个连接 ID"""
+    from cwprep import TFLBuilder
+
+    builder = TFLBuilder(flow_name="Test")
+    first = builder.add_connection(host="localhost", username="root", dbname="test_db")
+    second = builder.add_connection(host=" LocalHost ", username="root", dbname="test_db")
+    other_db = builder.add_connection(host="localhost", username="root", dbname="other_db")
+    csv_a = builder.add_file_connection("data/orders.csv")
+    csv_b = builder.add_file_connection("data/./orders.csv")
+
+    assert first == second
+    assert other_db != first
+    assert csv_a == csv_b
+    assert len(builder.connections) == 3
+
+    plain = TFLBuilder(flow_name="Test", intern_connections=False)
+    assert plain.add_connection("localhost", "root", "test_db") != plain.add_connection(
+        "localhost", "root", "test_db"
+    )
+
+
+def test_packaged_files_with_same_name_are_not_interned():
+    """测试不同目录下同名的 packaged 文件使用不同的连接 ID"""
+    from cwprep import TFLBuilder
+
+    builder = TFLBuilder(flow_name="Test")
+    jan = builder.add_file_connection("/data/jan/orders.xlsx", is_packaged=True)
+    feb = builder.add_file_connection("/data/feb/orders.xlsx", is_packaged=True)
+    jan_again = builder.add_file_connection("/data/jan/./orders.xlsx", is_packaged=True)
+
+    assert jan != feb
+    assert jan == jan_again
+    assert builder.connections[feb]["connectionAttributes"] == {
+        "filename": "orders.xlsx", "class": "excel-direct",
+    }
+
+
 def test_add_input_sql():
     """测试添加 SQL 输入节点"""
     from cwprep import TFLBuilder
@@ -86,6 +124,79 @@ def test_add_join():
     assert builder.nodes[join_id]["nodeType"] == ".v2018_2_3.SuperJoin"
 
 
+def _edges_from_next_nodes(builder):
+    """按 nextNodes 重新计算的父节点索引（用于校验增量索引）"""
+    from cwprep.graph import FlowGraph
+
+    graph = FlowGraph(builder.nodes)
+    return {nid: sorted(graph.parents_of(nid)) for nid in builder.nodes if graph.parents_of(nid)}
+
+
+def test_graph_editing_keeps_reverse_index_in_sync():
+    """测试 remove_node / insert_between / replace_parent 与反向索引保持一致"""
+    from cwprep import TFLBuilder
+    from cwprep.optimizer import FlowOptimizer
+
+    builder = TFLBuilder(flow_name="Edit")
+    conn = builder.add_connection("localhost", "root", "db")
+    orders = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+    users = builder.add_input_sql("users", "SELECT * FROM users", conn)
+    join = builder.add_join("join", orders, users, "user_id", "id")
+    calc = builder.add_calculation("calc", join, "x", "1")
+    out = builder.add_output_server("out", calc, "DS")
+
+    assert builder.parents_of(join) == [(orders, "Left"), (users, "Right")]
+    assert builder.children_of(join) == [(calc, "Default")]
+
+    # 在 users 与 join 之间插入过滤步骤，保留 Right 命名空间
+    filter_id = builder.add_filter("active", users, "[a] > 0")
+    builder.insert_between(users, join, filter_id)
+    assert builder.children_of(users) == [(filter_id, "Default")]
+    assert builder.parents_of(join) == [(orders, "Left"), (filter_id, "Right")]
+    assert builder.parents_of(filter_id) == [(users, "Default")]
+
+    # 移除中间步骤并重新连接
+    builder.remove_node(calc, reconnect=True)
+    assert calc not in builder.nodes
+    assert builder.parents_of(out) == [(join, "Default")]
+
+    # 替换父节点
+    archive = builder.add_input_sql("archive", "SELECT * FROM old_users", conn)
+    builder.replace_parent(join, filter_id, archive)
+    assert builder.parents_of(join) == [(orders, "Left"), (archive, "Right")]
+
+    assert {nid: sorted(edges) for nid, edges in builder._parents.items()} == _edges_from_next_nodes(builder)
+
+    builder.optimize(FlowOptimizer.PASSES)
+    assert {nid: sorted(edges) for nid, edges in builder._parents.items()} == _edges_from_next_nodes(builder)
+
+
+def test_graph_editing_rejects_invalid_edits():
+    """测试非法编辑操作抛出 ValueError"""
+    from cwprep import TFLBuilder
+
+    builder = TFLBuilder(flow_name="Edit")
+    conn = builder.add_connection("localhost", "root", "db")
+    a = builder.add_input_sql("a", "SELECT 1", conn)
+    b = builder.add_input_sql("b", "SELECT 2", conn)
+    union = builder.add_union("union", [a, b])
+
+    with pytest.raises(ValueError, match="Unknown node"):
+        builder.remove_node("missing")
+    with pytest.raises(ValueError, match="Unknown node"):
+        builder.parents_of("missing")
+    with pytest.raises(ValueError, match="Unknown node"):
+        builder.children_of("missing")
+    with pytest.raises(ValueError, match="exactly one parent"):
+        builder.remove_node(union, reconnect=True)
+    with pytest.raises(ValueError, match="No edge"):
+        builder.replace_parent(a, b, union)
+
+    builder.remove_node(a)
+    assert a not in builder.initial_nodes
+    assert [pid for pid, _ns in builder.parents_of(union)] == [b]
+
+
 def test_add_filter():
     """测试添加筛选器"""
     from cwprep import TFLBuilder
@@ -489,6 +600,300 @@ def test_save_tflx_embeds_data_without_leaving_folder(workspace_tmp_dir):
         assert "Data/conn-1/orders.csv" in set(zf.namelist())
 
 
+def test_save_tfl_writes_json_entries_directly(workspace_tmp_dir):
+    """测试 save_tfl() 直接写入 JSON 条目且不留下临时文件"""
+    import json
+    from cwprep import TFLPackager
+
+    archive_path = workspace_tmp_dir / "flow.tfl"
+    flow = {"nodes": {"n1": {"name": "中文节点"}}}
+
+    TFLPackager.save_tfl(
+        str(archive_path),
+        flow,
+        {"flowDisplaySettings": {}},
+        {"flowEntryName": "flow"},
+    )
+
+    assert sorted(p.name for p in workspace_tmp_dir.iterdir()) == ["flow.tfl"]
+    with zipfile.ZipFile(archive_path, "r") as zf:
+        assert sorted(zf.namelist()) == ["displaySettings", "flow", "maestroMetadata"]
+        raw = zf.read("flow").decode("utf-8")
+    assert "中文节点" in raw
+    assert json.loads(raw) == flow
+
+
+def test_save_tfl_failure_keeps_existing_output(workspace_tmp_dir):
+    """测试序列化失败时保留原有输出且不留临时文件"""
+    from cwprep import TFLPackager
+
+    archive_path = workspace_tmp_dir / "flow.tfl"
+    archive_path.write_bytes(b"original")
+
+    with pytest.raises(TypeError):
+        TFLPackager.save_tfl(str(archive_path), {"bad": object()}, {}, {})
+
+    assert archive_path.read_bytes() == b"original"
+    assert [p.name for p in workspace_tmp_dir.iterdir()] == ["flow.tfl"]
+
+
+def test_to_bytes_builds_archive_in_memory(workspace_tmp_dir):
+    """测试 to_bytes() 在内存中生成归档"""
+    import io
+    from cwprep import TFLPackager
+
+    source_file = workspace_tmp_dir / "orders.csv"
+    source_file.write_text("order_id\n1\n", encoding="utf-8")
+    args = ({"nodes": {}}, {"flowDisplaySettings": {}}, {"flowEntryName": "flow"})
+
+    data = TFLPackager.to_bytes(*args, data_files={"conn-1": [str(source_file)]})
+    assert isinstance(data, bytes)
+    with zipfile.ZipFile(io.BytesIO(data), "r") as zf:
+        assert zf.read("Data/conn-1/orders.csv") == b"order_id\n1\n"
+
+    stream = TFLPackager.to_bytes(*args, as_stream=True)
+    assert stream.tell() == 0
+    with zipfile.ZipFile(stream, "r") as zf:
+        assert "flow" in zf.namelist()
+
+
+def test_save_tflx_streams_and_stores_compressed_inputs(workspace_tmp_dir):
+    """测试 save_tflx() 分块流式写入数据文件，已压缩文件使用 ZIP_STORED"""
+    from cwprep import TFLPackager
+
+    csv_file = workspace_tmp_dir / "orders.csv"
+    gz_file = workspace_tmp_dir / "orders.csv.gz"
+    csv_payload = b"order_id,amount\n" + b"1,120\n" * 5000
+    csv_file.write_bytes(csv_payload)
+    gz_file.write_bytes(b"\x1f\x8b" + b"x" * 100)
+    archive_path = workspace_tmp_dir / "flow.tflx"
+    data_files = {"conn-1": [str(csv_file), str(gz_file)]}
+    docs = ({"nodes": {}}, {"flowDisplaySettings": {}}, {"flowEntryName": "flow"})
+
+    TFLPackager.save_tflx(str(archive_path), *docs, data_files=data_files, chunk_size=1024)
+
+    with zipfile.ZipFile(archive_path, "r") as zf:
+        assert zf.read("Data/conn-1/orders.csv") == csv_payload
+        assert zf.getinfo("Data/conn-1/orders.csv").compress_type == zipfile.ZIP_DEFLATED
+        assert zf.getinfo("Data/conn-1/orders.csv.gz").compress_type == zipfile.ZIP_STORED
+
+    TFLPackager.save_tflx(str(archive_path), *docs, data_files=data_files, store_compressed=False)
+
+    with zipfile.ZipFile(archive_path, "r") as zf:
+        assert zf.getinfo("Data/conn-1/orders.csv.gz").compress_type == zipfile.ZIP_DEFLATED
+
+
+def test_save_tflx_applies_compresslevel_to_every_entry(workspace_tmp_dir):
+    """测试 compresslevel 作用于数据文件和 reproducible 文档条目"""
+    from cwprep import TFLPackager
+
+    source = workspace_tmp_dir / "orders.csv"
+    source.write_bytes("".join(f"{i},{i % 7},{i * 31 % 1000}\n" for i in range(20000)).encode())
+    docs = ({"nodes": {str(i): {"name": f"n{i % 13}"} for i in range(2000)}},
+            {"flowDisplaySettings": {}}, {"flowEntryName": "flow"})
+
+    sizes = {}
+    for level in (0, 9):
+        path = workspace_tmp_dir / f"level{level}.tflx"
+        TFLPackager.save_tflx(str(path), *docs, data_files={"conn-1": [str(source)]},
+                              compresslevel=level, reproducible=True, chunk_size=4096)
+        with zipfile.ZipFile(path) as zf:
+            assert zf.testzip() is None
+            assert zf.read("Data/conn-1/orders.csv") == source.read_bytes()
+            sizes[level] = {info.filename: info.compress_size for info in zf.infolist()}
+
+    for name in ("flow", "Data/conn-1/orders.csv"):
+        assert sizes[9][name] < sizes[0][name]
+
+
+def test_save_tflx_skip_unchanged_skips_write_and_backup(workspace_tmp_dir):
+    """测试内容未变化时跳过写入和备份，变化时正常重写"""
+    import json
+    from cwprep import TFLPackager
+    from cwprep.packager import MANIFEST_SUFFIX
+
+    source_file = workspace_tmp_dir / "orders.csv"
+    source_file.write_text("order_id\n1\n", encoding="utf-8")
+    archive_path = workspace_tmp_dir / "flow.tflx"
+    data_files = {"conn-1": [str(source_file)]}
+
+    def save(flow):
+        return TFLPackager.save_tflx(
+            str(archive_path), flow, {"flowDisplaySettings": {}}, {"flowEntryName": "flow"},
+            data_files=data_files, skip_unchanged=True,
+        )
+
+    save({"nodes": {"a": 1, "b": 2}})
+    manifest_path = workspace_tmp_dir / f"flow.tflx{MANIFEST_SUFFIX}"
+    manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    first_stat = archive_path.stat()
+
+    # Key order does not change the canonical hash.
+    save({"nodes": {"b": 2, "a": 1}})
+    assert archive_path.stat().st_mtime_ns == first_stat.st_mtime_ns
+    assert not list(workspace_tmp_dir.glob("flow.tflx.bak-*"))
+
+    source_file.write_text("order_id\n2\n", encoding="utf-8")
+    save({"nodes": {"a": 1, "b": 2}})
+    assert len(list(workspace_tmp_dir.glob("flow.tflx.bak-*"))) == 1
+    new_manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    assert new_manifest["content_hash"] != manifest["content_hash"]
+
+
+def test_save_tfl_skip_unchanged_rewrites_on_new_options(workspace_tmp_dir):
+    """测试输出选项变化时不会被当作未变化而跳过"""
+    import zipfile
+    from cwprep import TFLPackager
+
+    archive_path = workspace_tmp_dir / "flow.tfl"
+    docs = ({"nodes": {"a": 1}}, {"flowDisplaySettings": {}}, {"flowEntryName": "flow"})
+
+    TFLPackager.save_tfl(str(archive_path), *docs, skip_unchanged=True)
+    TFLPackager.save_tfl(str(archive_path), *docs, skip_unchanged=True)
+    assert not list(workspace_tmp_dir.glob("flow.tfl.bak-*"))
+
+    TFLPackager.save_tfl(str(archive_path), *docs, skip_unchanged=True, compact=True)
+    assert len(list(workspace_tmp_dir.glob("flow.tfl.bak-*"))) == 1
+    with zipfile.ZipFile(archive_path) as zf:
+        assert zf.read("flow") == b'{"nodes":{"a":1}}'
+
+    TFLPackager.save_tfl(str(archive_path), *docs, skip_unchanged=True, compact=True,
+                         compresslevel=1)
+    assert len(list(workspace_tmp_dir.glob("flow.tfl.bak-*"))) == 2
+
+
+def test_content_hash_reuses_cached_file_digest(workspace_tmp_dir):
+    """测试数据文件摘要按 (size, mtime_ns) 复用缓存"""
+    from cwprep import TFLPackager
+
+    source_file = workspace_tmp_dir / "orders.csv"
+    source_file.write_text("order_id\n1\n", encoding="utf-8")
+    docs = ({}, {}, {})
+    data_files = {"conn-1": [str(source_file)]}
+
+    digest, records = TFLPackager.content_hash(*docs, data_files)
+    record = records[str(source_file.resolve())]
+    fake_cache = {str(source_file.resolve()): dict(record, sha256="cached")}
+
+    cached_digest, cached_records = TFLPackager.content_hash(
+        *docs, data_files, digest_cache=fake_cache
+    )
+    assert cached_records[str(source_file.resolve())]["sha256"] == "cached"
+    assert cached_digest != digest
+
+
+def test_save_tfl_keep_backups_prunes_and_hardlinks(monkeypatch, workspace_tmp_dir):
+    """测试备份保留策略：只保留最近 N 个，并对相同备份做硬链接去重"""
+    import os
+    from datetime import datetime as real_datetime
+    from cwprep import TFLPackager
+
+    class FixedDateTime:
+        @classmethod
+        def now(cls):
+            return real_datetime(2024, 1, 1, 12, 0, 0)
+
+    monkeypatch.setattr("cwprep.packager.datetime", FixedDateTime)
+    archive_path = workspace_tmp_dir / "flow.tfl"
+    docs = ({"nodes": {}}, {"flowDisplaySettings": {}}, {"flowEntryName": "flow"})
+    first = workspace_tmp_dir / "flow.tfl.bak-20240101120000"
+    second = workspace_tmp_dir / "flow.tfl.bak-20240101120000-1"
+
+    for _ in range(2):
+        archive_path.write_bytes(b"same")
+        TFLPackager.save_tfl(str(archive_path), *docs, keep_backups=5)
+    assert os.path.samefile(first, second)
+
+    for _ in range(3):
+        TFLPackager.save_tfl(str(archive_path), *docs, keep_backups=2)
+    backups = TFLPackager._list_backups(str(archive_path))
+    assert [os.path.basename(p) for p in backups] == [
+        "flow.tfl.bak-20240101120000-3",
+        "flow.tfl.bak-20240101120000-4",
+    ]
+
+    with pytest.raises(ValueError, match="keep_backups"):
+        TFLPackager.save_tfl(str(archive_path), *docs, keep_backups=-1)
+
+
+def _build_sample_flow(**builder_kwargs):
+    from cwprep import TFLBuilder
+
+    builder = TFLBuilder(flow_name="Deterministic", **builder_kwargs)
+    conn = builder.add_connection("localhost", "root", "db")
+    orders = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+    users = builder.add_input_sql("users", "SELECT * FROM users", conn)
+    joined = builder.add_join("join", orders, users, "user_id", "id")
+    unioned = builder.add_union("union", [joined, orders])
+    filtered = builder.add_filter("filter", unioned, "[amount] > 0")
+    builder.add_output_server("out", filtered, "DS")
+    return builder
+
+
+def test_deterministic_ids_rebuild_identically():
+    """测试确定性 ID 模式下重复构建结果一致"""
+    import json
+
+    first = _build_sample_flow(deterministic_ids=True)
+    second = _build_sample_flow(deterministic_ids=True)
+
+    assert first.doc_id == second.doc_id
+    assert json.dumps(first.build()) == json.dumps(second.build())
+
+    seeded = _build_sample_flow(deterministic_ids="other-seed")
+    assert seeded.doc_id != first.doc_id
+
+    random_ids = _build_sample_flow()
+    assert random_ids.doc_id != _build_sample_flow().doc_id
+
+
+def test_reproducible_archive_bytes_are_identical():
+    """测试 reproducible 模式下归档字节完全一致"""
+    import io
+    from cwprep import TFLPackager
+
+    archives = [
+        TFLPackager.to_bytes(*_build_sample_flow(deterministic_ids=True).build(), reproducible=True)
+        for _ in range(2)
+    ]
+    assert archives[0] == archives[1]
+
+    with zipfile.ZipFile(io.BytesIO(archives[0])) as zf:
+        assert {info.date_time for info in zf.infolist()} == {(1980, 1, 1, 0, 0, 0)}
+
+
+@pytest.mark.parametrize("json_backend", ["json", "auto"])
+def test_streamed_archive_json_matches_json_dumps(json_backend):
+    """测试流式写入的 JSON 与 json.dumps 结果一致，且支持未物化的节点"""
+    import io
+    import json
+    from cwprep import TFLPackager
+
+    builder = _build_sample_flow(deterministic_ids=True)
+    flow, display, meta = builder.build()
+    lazy_flow, _display, _meta = builder.build(materialize=False)
+    assert lazy_flow["nodes"] is builder.nodes
+
+    data = TFLPackager.to_bytes(lazy_flow, display, meta, json_backend=json_backend)
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        assert zf.read("flow") == json.dumps(flow, indent=2, ensure_ascii=False).encode("utf-8")
+
+    compact = TFLPackager.to_bytes(lazy_flow, display, meta, compact=True)
+    with zipfile.ZipFile(io.BytesIO(compact)) as zf:
+        raw = zf.read("flow")
+    assert b"\n" not in raw
+    assert json.loads(raw) == flow
+
+
+def test_unknown_json_backend_is_rejected(workspace_tmp_dir):
+    """测试未知 JSON 后端报错且不写文件"""
+    from cwprep import TFLPackager
+
+    with pytest.raises(ValueError, match="JSON backend"):
+        TFLPackager.save_tfl(str(workspace_tmp_dir / "flow.tfl"), {}, {}, {}, json_backend="simd")
+    assert list(workspace_tmp_dir.iterdir()) == []
+
+
 # ====================== File Connection Tests ======================
 
 def test_add_file_connection_excel():
@@ -698,6 +1103,81 @@ def test_build_packaged():
             assert conn["isPackaged"] == True
 
 
+def test_from_tfl_round_trips_flow(workspace_tmp_dir):
+    """测试 from_tfl() 读回 .tfl 后重新 build 内容不变"""
+    from cwprep import TFLBuilder, TFLPackager
+
+    builder = TFLBuilder(flow_name="Round Trip")
+    conn_id = builder.add_connection(host="localhost", username="root", dbname="db")
+    orders = builder.add_input_sql("Orders", "SELECT * FROM orders", conn_id)
+    users = builder.add_input_sql("Users", "SELECT * FROM users", conn_id)
+    join_id = builder.add_join("Join", orders, users, "user_id", "id")
+    builder.add_output_server("Output", join_id, "DS")
+    flow, display, meta = builder.build()
+    flow["parameters"] = {"parameters": {"p1": {"name": "Region"}}}
+    display["hiddenColumns"] = ["secret"]
+    archive_path = workspace_tmp_dir / "flow.tfl"
+    TFLPackager.save_tfl(str(archive_path), flow, display, meta)
+
+    loaded = TFLBuilder.from_tfl(str(archive_path))
+    assert loaded.flow_name == "Round Trip"
+    assert loaded.parents_of(join_id) == [(orders, "Left"), (users, "Right")]
+    assert loaded.build() == (flow, display, meta)
+
+    # 重新添加相同连接时复用已有连接 ID
+    assert loaded.add_connection(host="localhost", username="root", dbname="db") == conn_id
+
+
+def test_from_tfl_keeps_positions_and_places_new_nodes(workspace_tmp_dir):
+    """测试读回的节点保留画布位置，新节点放在空位"""
+    from cwprep import TFLBuilder, TFLPackager
+
+    builder = TFLBuilder(flow_name="Layout")
+    conn_id = builder.add_connection(host="localhost", username="root", dbname="db")
+    orders = builder.add_input_sql("Orders", "SELECT * FROM orders", conn_id)
+    filtered = builder.add_filter("Filter", orders, "[amount] > 0")
+    flow, display, meta = builder.build()
+    settings = display["flowDisplaySettings"]["flowNodeDisplaySettings"]
+    settings[filtered]["position"] = {"x": 5, "y": 3}
+    archive_path = workspace_tmp_dir / "flow.tfl"
+    TFLPackager.save_tfl(str(archive_path), flow, display, meta)
+
+    loaded = TFLBuilder.from_tfl(str(archive_path))
+    output_id = loaded.add_output_server("Output", filtered, "DS")
+    _flow, new_display, _meta = loaded.build()
+    layout = new_display["flowDisplaySettings"]["flowNodeDisplaySettings"]
+    assert layout[filtered] == settings[filtered]
+    assert layout[orders] == settings[orders]
+    assert layout[output_id]["position"] == {"x": 6, "y": 3}
+
+
+def test_from_tfl_skips_data_files_unless_asked(workspace_tmp_dir):
+    """测试 from_tfl() 默认不解压 Data/ 数据文件"""
+    from cwprep import TFLBuilder, TFLPackager
+
+    source_file = workspace_tmp_dir / "orders.csv"
+    source_file.write_text("order_id,amount\n1,120\n", encoding="utf-8")
+    builder = TFLBuilder(flow_name="Packaged")
+    conn_id = builder.add_file_connection(str(source_file))
+    input_id = builder.add_input_csv("Orders", conn_id)
+    builder.add_output_server("Output", input_id, "DS")
+    archive_path = workspace_tmp_dir / "flow.tflx"
+    TFLPackager.save_tflx(
+        str(archive_path), *builder.build(is_packaged=True),
+        data_files={conn_id: [str(source_file)]},
+    )
+
+    loaded = TFLBuilder.from_tfl(str(archive_path))
+    assert loaded.data_files == {}
+    assert set(loaded.nodes) == set(builder.nodes)
+
+    data_dir = workspace_tmp_dir / "data"
+    loaded = TFLBuilder.from_tfl(str(archive_path), data_dir=str(data_dir))
+    extracted = data_dir / conn_id / "orders.csv"
+    assert loaded.data_files == {conn_id: [str(extracted)]}
+    assert extracted.read_text(encoding="utf-8") == source_file.read_text(encoding="utf-8")
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
 
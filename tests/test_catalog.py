@@ -0,0 +1,174 @@
+"""
+cwprep flow catalog tests.
+
+Saves small flows into a directory, indexes them with FlowCatalog and checks
+the queries and the incremental refresh rules.
+"""
+
+import json
+import os
+import shutil
+import zipfile
+
+import pytest
+
+from cwprep import TFLBuilder, TFLPackager
+from cwprep.catalog import FlowCatalog, main, split_table_name, sql_tables
+
+
+def _save_flow(path, datasource="Orders DS", table="orders", server="db.local",
+               formula="[amount] * 2"):
+    builder = TFLBuilder(flow_name=os.path.splitext(os.path.basename(path))[0])
+    conn = builder.add_connection(host=server, username="etl", dbname="sales")
+    orders = builder.add_input_table(table, table, conn, schema="sales")
+    users = builder.add_input_sql(
+        "Users", "SELECT u.* FROM dbo.users u JOIN [crm].[accounts] a ON a.id = u.account_id", conn
+    )
+    join = builder.add_join("Join", orders, users, "user_id", "id")
+    calc = builder.add_calculation("Calc", join, "double_amount", formula)
+    filtered = builder.add_filter("Filter", calc, "[status] = 'paid'")
+    builder.add_output_server("Output", filtered, datasource, project_name="Finance")
+    flow, display, meta = builder.build()
+    TFLPackager.save_tfl(str(path), flow, display, meta)
+
+
+@pytest.fixture
+def flows_dir(tmp_path, capsys):
+    root = tmp_path / "flows"
+    (root / "nested").mkdir(parents=True)
+    _save_flow(root / "a.tfl")
+    _save_flow(root / "nested" / "b.tfl", datasource="Users DS", table="customers",
+               server="warehouse.local", formula="UPPER([name])")
+    (root / "notes.txt").write_text("not a flow")
+    capsys.readouterr()
+    return root
+
+
+class TestNames:
+    """Table name helpers"""
+
+    def test_split_table_name(self):
+        assert split_table_name("[sales].[orders]") == ("sales", "orders")
+        assert split_table_name("db.sales.orders") == ("sales", "orders")
+        assert split_table_name("orders") == (None, "orders")
+
+    def test_sql_tables(self):
+        sql = "select * from sales.orders o left join `crm`.`users` u on 1=1 join orders"
+        assert sql_tables(sql) == [("sales", "orders"), ("crm", "users"), (None, "orders")]
+
+
+class TestFlowCatalog:
+    """catalog.FlowCatalog"""
+
+    def test_queries(self, flows_dir, tmp_path):
+        a, b = str(flows_dir / "a.tfl"), str(flows_dir / "nested" / "b.tfl")
+        with FlowCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+            report = catalog.refresh([str(flows_dir)])
+            assert sorted(report.indexed) == [a, b] and report.scanned == 2
+
+            assert catalog.flows_reading_table("ORDERS") == [a]
+            assert catalog.flows_reading_table("orders", schema="crm") == []
+            assert catalog.flows_reading_table("accounts", schema="crm") == [a, b]
+            assert catalog.flows_publishing("users ds") == [b]
+            assert catalog.flows_using_connection(server="warehouse.local") == [b]
+            assert catalog.flows_using_connection(dbname="sales") == [a, b]
+
+            rows = catalog.search_formulas("upper(")
+            assert [(row["path"], row["column_name"]) for row in rows] == [(b, "double_amount")]
+            assert len(catalog.search_formulas("'paid'")) == 2
+            assert catalog.search_formulas("100%") == []
+            assert [row["path"] for row in catalog.search_sql("accounts")] == [a, b]
+
+            outputs = catalog.query("SELECT project_name FROM outputs WHERE path = ?", [a])
+            assert [row["project_name"] for row in outputs] == ["Finance"]
+            assert catalog.stats()["archives"] == 2
+
+    def test_incremental_refresh(self, flows_dir, tmp_path, capsys):
+        a, b = str(flows_dir / "a.tfl"), str(flows_dir / "nested" / "b.tfl")
+        with FlowCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+            catalog.refresh([str(flows_dir)])
+
+            report = catalog.refresh([str(flows_dir)])
+            assert (report.unchanged, report.indexed) == (2, [])
+
+            # Same bytes, new mtime: only the zip directory is read
+            stat = os.stat(a)
+            os.utime(a, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+            report = catalog.refresh([str(flows_dir)])
+            assert (report.touched, report.indexed) == (1, [])
+            assert catalog.refresh([str(flows_dir)]).unchanged == 2
+
+            _save_flow(flows_dir / "nested" / "b.tfl", datasource="Renamed DS")
+            os.remove(a)
+            capsys.readouterr()
+            report = catalog.refresh([str(flows_dir)])
+            assert report.indexed == [b] and report.removed == [a]
+            assert catalog.flows_publishing("Users DS") == []
+            assert catalog.flows_publishing("Renamed DS") == [b]
+            assert catalog.stats()["archives"] == 1
+
+    def test_refresh_of_other_root_keeps_rows(self, flows_dir, tmp_path):
+        with FlowCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+            catalog.refresh([str(flows_dir)])
+            report = catalog.refresh([str(flows_dir / "nested")])
+            assert report.removed == []
+            assert catalog.stats()["archives"] == 2
+
+    def test_broken_archive_is_recorded(self, flows_dir, tmp_path):
+        broken = flows_dir / "broken.tfl"
+        broken.write_bytes(b"not a zip")
+        with FlowCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+            report = catalog.refresh([str(flows_dir)])
+            assert [failure["path"] for failure in report.failed] == [str(broken)]
+            assert len(report.indexed) == 2
+            # Not retried while unchanged
+            assert catalog.refresh([str(flows_dir)]).failed == []
+
+    def test_corrupt_flow_entries(self, flows_dir, tmp_path):
+        a = flows_dir / "a.tfl"
+        with zipfile.ZipFile(a) as zf:
+            entries = {name: zf.read(name) for name in zf.namelist()}
+        flow = json.loads(entries["flow"])
+
+        truncated = flows_dir / "truncated.tfl"
+        with zipfile.ZipFile(truncated, "w") as zf:
+            for name, data in entries.items():
+                zf.writestr(name, data[: len(data) // 2] if name == "flow" else data)
+
+        odd = flows_dir / "odd.tfl"
+        next(iter(flow["nodes"].values()))["relation"] = ["not", "an", "object"]
+        with zipfile.ZipFile(odd, "w") as zf:
+            for name, data in entries.items():
+                zf.writestr(name, json.dumps(flow) if name == "flow" else data)
+
+        with FlowCatalog(str(tmp_path / "catalog.sqlite")) as catalog:
+            report = catalog.refresh([str(flows_dir)])
+            assert [failure["path"] for failure in report.failed] == [str(truncated)]
+            assert report.failed[0]["error"].startswith("ValueError")
+            assert sorted(report.indexed) == sorted(
+                [str(a), str(odd), str(flows_dir / "nested" / "b.tfl")]
+            )
+
+    def test_parallel_refresh_matches_serial(self, flows_dir, tmp_path):
+        for i in range(3):
+            shutil.copy(flows_dir / "a.tfl", flows_dir / f"copy{i}.tfl")
+        with FlowCatalog(":memory:") as serial, FlowCatalog(":memory:") as parallel:
+            serial.refresh([str(flows_dir)])
+            report = parallel.refresh([str(flows_dir)], workers=2)
+            assert len(report.indexed) == 5
+            for table in ("tables", "formulas", "outputs", "connections"):
+                sql = f"SELECT * FROM {table} ORDER BY 1, 2, 3"
+                assert [tuple(r) for r in serial.query(sql)] == [tuple(r) for r in parallel.query(sql)]
+
+    def test_invalid_workers(self, tmp_path):
+        with FlowCatalog(":memory:") as catalog:
+            with pytest.raises(ValueError, match="workers"):
+                catalog.refresh([str(tmp_path)], workers=0)
+
+
+def test_cli(flows_dir, tmp_path, capsys):
+    db = str(tmp_path / "catalog.sqlite")
+    main(["--db", db, "refresh", str(flows_dir), "--workers", "1"])
+    assert "2 indexed" in capsys.readouterr().out
+    main(["--db", db, "datasource", "Orders DS"])
+    assert capsys.readouterr().out.strip() == str(flows_dir / "a.tfl")
@@ -0,0 +1,156 @@
+"""
+cwprep structural diff tests.
+
+Builds two versions of a flow with TFLBuilder (random IDs, so nothing lines
+up by ID) and checks the nodes and actions diff_flows() reports.
+"""
+
+from cwprep import TFLBuilder, TFLPackager
+from cwprep.diff import diff_flows, diff_tfl, flow_digest, merkle_hashes
+
+
+def _build(filter_expr="[amount] > 0", extra_calc=False, drop_users=False,
+           output_name="Output", steps=None):
+    """orders JOIN users -> clean -> calc -> (calc2) -> output"""
+    builder = TFLBuilder(flow_name="orders")
+    conn = builder.add_connection(host="db.local", username="etl", dbname="sales")
+    prev = builder.add_input_table("orders", "orders", conn, schema="sales")
+    if not drop_users:
+        users = builder.add_input_sql("users", "SELECT * FROM users", conn)
+        prev = builder.add_join("Join", prev, users, "user_id", "id")
+    prev = builder.add_clean_step("Clean", prev, steps or [
+        {"type": "rename", "from": "amount", "to": "revenue"},
+        {"type": "remove", "columns": ["note"]},
+    ])
+    prev = builder.add_filter("Positive", prev, filter_expr)
+    prev = builder.add_calculation("Calc", prev, "net", "[revenue] - [discount]")
+    if extra_calc:
+        prev = builder.add_calculation("Calc2", prev, "gross", "[revenue] * 2")
+    builder.add_output_server(output_name, prev, "Orders DS")
+    return builder.build()[0]
+
+
+def _names(changes):
+    return sorted(change.name for change in changes)
+
+
+class TestMerkleHashes:
+    """diff.merkle_hashes / flow_digest"""
+
+    def test_independent_of_ids(self):
+        first, second = _build(), _build()
+        assert set(first["nodes"]).isdisjoint(second["nodes"])
+        assert sorted(merkle_hashes(first).values()) == sorted(merkle_hashes(second).values())
+        assert flow_digest(first) == flow_digest(second)
+
+    def test_change_propagates_downstream_only(self):
+        first, second = _build(), _build(filter_expr="[amount] > 10")
+
+        def by_name(flow):
+            hashes = merkle_hashes(flow)
+            return {node["name"]: hashes[nid] for nid, node in flow["nodes"].items()}
+
+        old, new = by_name(first), by_name(second)
+        assert {name for name in old if old[name] != new[name]} == {"Positive", "Calc", "Output"}
+        assert flow_digest(first) != flow_digest(second)
+
+
+class TestDiffFlows:
+    """diff.diff_flows"""
+
+    def test_identical_flows(self):
+        result = diff_flows(_build(), _build())
+        assert result.identical
+        assert result.unchanged == 7
+        assert result.summary() == "0 added, 0 removed, 0 modified, 7 unchanged"
+
+    def test_modified_node_reports_changed_keys(self):
+        result = diff_flows(_build(), _build(filter_expr="[amount] > 10"))
+        assert not result.added and not result.removed
+        assert _names(result.modified) == ["Positive"]
+        change = result.modified[0]
+        assert change.fields == ["loomContainer"]
+        assert [(a.status, a.node_type) for a in change.actions] == [
+            ("modified", ".v1.FilterOperation")
+        ]
+        assert result.unchanged == 6
+
+    def test_added_node(self):
+        result = diff_flows(_build(), _build(extra_calc=True))
+        assert _names(result.added) == ["Calc2"]
+        assert not result.removed
+        # The output now reads from Calc2
+        assert _names(result.modified) == ["Output"]
+        assert result.modified[0].fields == ["parents"]
+
+    def test_removed_branch(self):
+        result = diff_flows(_build(), _build(drop_users=True))
+        assert _names(result.removed) == ["Join", "users"]
+        assert _names(result.modified) == ["Clean"]
+        assert result.modified[0].fields == ["parents"]
+        assert result.unchanged == 4
+
+    def test_renamed_node(self):
+        result = diff_flows(_build(), _build(output_name="Final"))
+        assert _names(result.modified) == ["Final"]
+        assert result.modified[0].fields == ["name"]
+        assert not result.added and not result.removed
+
+    def test_clean_step_actions(self):
+        old = _build()
+        new = _build(steps=[
+            {"type": "rename", "from": "amount", "to": "amount_usd"},
+            {"type": "remove", "columns": ["note"]},
+            {"type": "remove", "columns": ["tmp"]},
+        ])
+        result = diff_flows(old, new)
+        assert _names(result.modified) == ["Clean"]
+        actions = [(a.status, a.node_type) for a in result.modified[0].actions]
+        assert actions == [
+            ("modified", ".v1.RenameColumn"),
+            ("added", ".v1.RemoveColumns"),
+        ]
+        assert result.modified[0].actions[0].fields == ["rename"]
+
+    def test_connection_change(self):
+        old = _build()
+        new = _build()
+        for conn in new["connections"].values():
+            conn["connectionAttributes"]["server"] = "db2.local"
+        result = diff_flows(old, new)
+        assert _names(result.modified) == ["orders", "users"]
+        assert all(change.fields == ["connection"] for change in result.modified)
+
+    def test_to_dict(self):
+        result = diff_flows(_build(), _build(extra_calc=True)).to_dict()
+        assert result["added"][0]["name"] == "Calc2"
+        assert result["added"][0]["old_id"] is None
+
+    def test_large_flow_with_one_rename(self):
+        def chain(count):
+            builder = TFLBuilder(flow_name="chain")
+            conn = builder.add_connection(host="db.local", username="etl", dbname="sales")
+            prev = builder.add_input_sql("base", "SELECT 1", conn)
+            for i in range(count):
+                prev = builder.add_calculation(f"calc_{i}", prev, f"c{i}", f"[c{i - 1}] + 1")
+            return builder.build()[0]
+
+        old, new = chain(2000), chain(2000)
+        new["nodes"][next(iter(new["nodes"]))]["name"] = "renamed"
+        result = diff_flows(old, new)
+        assert _names(result.modified) == ["renamed"]
+        assert result.modified[0].fields == ["name"]
+        assert result.unchanged == 2000
+
+
+class TestDiffTfl:
+    """diff.diff_tfl"""
+
+    def test_archives(self, tmp_path):
+        paths = []
+        for i, flow in enumerate([_build(), _build(extra_calc=True)]):
+            path = tmp_path / f"flow_{i}.tfl"
+            TFLPackager.save_tfl(str(path), flow, {}, {})
+            paths.append(str(path))
+        result = diff_tfl(*paths)
+        assert _names(result.added) == ["Calc2"]
@@ -0,0 +1,94 @@
+"""
+cwprep layered layout tests.
+
+Checks layer assignment, crossing reduction and that the builder's display
+settings use the layered positions.
+"""
+
+import pytest
+
+from cwprep import TFLBuilder
+from cwprep.layout import extend_layout, layered_layout
+
+
+def _nodes(edges, extra=()):
+    """Minimal node mapping from (parent, child) pairs."""
+    nodes = {}
+    for parent, child in edges:
+        nodes.setdefault(parent, {"nextNodes": []})
+        nodes.setdefault(child, {"nextNodes": []})
+        nodes[parent]["nextNodes"].append({"nextNodeId": child, "nextNamespace": "Default"})
+    for node_id in extra:
+        nodes.setdefault(node_id, {"nextNodes": []})
+    return nodes
+
+
+class TestLayeredLayout:
+    """layout.layered_layout"""
+
+    def test_edges_point_right_and_cells_are_unique(self):
+        nodes = _nodes([
+            ("a", "j"), ("b", "j"), ("j", "f"), ("f", "out"),
+            ("c", "u"), ("f", "u"), ("u", "out2"),
+        ])
+        positions = layered_layout(nodes, ["a", "b", "c"])
+
+        for parent, node in nodes.items():
+            for link in node["nextNodes"]:
+                assert positions[link["nextNodeId"]][0] > positions[parent][0]
+        assert len(set(positions.values())) == len(nodes)
+
+    def test_chain_stays_on_one_row_and_inputs_sit_next_to_consumer(self):
+        nodes = _nodes([("a", "b"), ("b", "c"), ("c", "d"), ("late", "d")])
+        positions = layered_layout(nodes, ["a", "late"])
+
+        assert [positions[n] for n in "abcd"] == [(0, 1), (1, 1), (2, 1), (3, 1)]
+        assert positions["late"] == (2, 2)
+
+    def test_sweeps_remove_crossing(self):
+        # Topological order puts "a" above "b", so p1 -> b crosses p2 -> a
+        nodes = _nodes([("p1", "b"), ("p2", "a"), ("p2", "b")])
+        nodes = {key: nodes[key] for key in ("p1", "p2", "a", "b")}
+
+        unswept = layered_layout(nodes, ["p1", "p2"], sweeps=0)
+        assert unswept["a"][1] < unswept["b"][1]
+
+        swept = layered_layout(nodes, ["p1", "p2"])
+        assert swept["b"][1] < swept["a"][1]
+
+    def test_negative_sweeps_are_rejected(self):
+        with pytest.raises(ValueError, match="sweeps"):
+            layered_layout({}, sweeps=-1)
+
+
+class TestExtendLayout:
+    """layout.extend_layout"""
+
+    def test_fixed_positions_are_kept_and_new_nodes_avoid_them(self):
+        nodes = _nodes([("a", "f"), ("f", "out"), ("f", "out2")], extra=["new_input"])
+        fixed = {"a": (0, 1), "f": (3, 2), "out": (4, 2), "gone": (9, 9)}
+
+        positions = extend_layout(nodes, fixed, ["a"])
+
+        assert positions["a"] == (0, 1) and positions["f"] == (3, 2)
+        assert positions["out2"] == (4, 3)
+        assert positions["new_input"] == (0, 2)
+        assert "gone" not in positions
+        assert len(set(positions.values())) == len(nodes)
+
+
+def test_builder_display_uses_layered_positions():
+    builder = TFLBuilder(flow_name="Layout")
+    conn = builder.add_connection("localhost", "root", "testdb")
+    orders = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+    users = builder.add_input_sql("users", "SELECT * FROM users", conn)
+    join = builder.add_join("Join", orders, users, "user_id", "id")
+    out = builder.add_output_server("Output", join, "DS")
+
+    _flow, display, _meta = builder.build()
+    settings = display["flowDisplaySettings"]["flowNodeDisplaySettings"]
+    position = {nid: (s["position"]["x"], s["position"]["y"]) for nid, s in settings.items()}
+
+    assert position[orders] == (0, 1) and position[users] == (0, 2)
+    assert position[join][0] == 1 and position[out][0] == 2
+    assert settings[join]["color"]["hexCss"] == "#499893"
@@ -0,0 +1,198 @@
+"""
+cwprep column lineage tests.
+
+Builds flows with TFLBuilder (adding field metadata to the inputs where a
+closed schema is needed) and checks the traced source columns and edges.
+"""
+
+import json
+
+import pytest
+
+from cwprep import TFLBuilder, TFLPackager
+from cwprep.lineage import CrossFlowLineage, FlowLineage, field_references
+
+
+def _with_fields(flow, fields_by_name):
+    """Attach field metadata to the nodes named in fields_by_name."""
+    for node in flow["nodes"].values():
+        if node["name"] in fields_by_name:
+            node["fields"] = [{"name": name} for name in fields_by_name[node["name"]]]
+    return flow
+
+
+def _sources(lineage, node_id, column):
+    return sorted((lineage.nodes[s.node_id]["name"], s.column) for s in lineage.sources(node_id, column))
+
+
+@pytest.fixture
+def orders_flow():
+    """orders JOIN users -> clean (rename, calc, remove) -> aggregate -> output."""
+    builder = TFLBuilder(flow_name="orders")
+    conn = builder.add_connection(host="db.local", username="etl", dbname="sales")
+    orders = builder.add_input_table("orders", "orders", conn, schema="sales")
+    users = builder.add_input_sql("users", "SELECT * FROM users", conn)
+    join = builder.add_join("Join", orders, users, "user_id", "id")
+    clean = builder.add_clean_step("Clean", join, [
+        {"type": "rename", "from": "amount", "to": "revenue"},
+        {"type": "remove", "columns": ["note"]},
+    ])
+    calc = builder.add_calculation("Calc", clean, "net", "[revenue] - [discount] // [ignored]")
+    agg = builder.add_aggregate("Agg", calc, ["region"], [
+        {"field": "net", "function": "SUM", "output_name": "total_net"},
+    ])
+    output = builder.add_output_server("Output", agg, "Orders DS")
+    flow = builder.build()[0]
+    _with_fields(flow, {
+        "orders": ["id", "user_id", "amount", "discount", "note"],
+        "users": ["id", "region"],
+    })
+    return flow, {"join": join, "calc": calc, "agg": agg, "output": output}
+
+
+class TestFieldReferences:
+    """lineage.field_references"""
+
+    def test_strings_and_comments_are_not_references(self):
+        formula = "IF [a] = '[b]' THEN [c]]d] ELSE [a] END // [e]"
+        assert field_references(formula) == ("a", "c]d")
+
+    def test_unparseable_formula_falls_back_to_scan(self):
+        assert field_references("{FIXED [region] : SUM([sales])}") == ("region", "sales")
+
+
+class TestFlowLineage:
+    """lineage.FlowLineage"""
+
+    def test_trace_through_rename_calc_join_and_aggregate(self, orders_flow):
+        flow, ids = orders_flow
+        lineage = FlowLineage(flow)
+
+        assert lineage.flow_name == "orders"
+        assert lineage.columns(ids["output"]) == ["region", "total_net"]
+        assert _sources(lineage, ids["output"], "total_net") == [
+            ("orders", "amount"), ("orders", "discount"),
+        ]
+        assert _sources(lineage, ids["output"], "region") == [("users", "region")]
+        # Left side wins the name; the right column is renamed "id-1"
+        assert _sources(lineage, ids["join"], "id") == [("orders", "id")]
+        assert _sources(lineage, ids["join"], "id-1") == [("users", "id")]
+        # Dropped by the clean step, the aggregate, or never existed
+        assert lineage.resolve(ids["calc"], "note") is None
+        assert lineage.resolve(ids["calc"], "amount") is None
+        assert lineage.resolve(ids["output"], "discount") is None
+
+        kinds = [derivation.kind for _ref, derivation in lineage.upstream(ids["output"], "total_net")]
+        assert kinds == ["aggregate", "calculation", "rename", "source", "source"]
+
+        source = lineage.sources(ids["output"], "total_net")[0]
+        assert (source.table, source.server, source.dbname) == ("[sales].[orders]", "db.local", "sales")
+
+    def test_open_schema_join_traces_both_sides(self):
+        builder = TFLBuilder(flow_name="open")
+        conn = builder.add_connection(host="db.local", username="etl", dbname="sales")
+        left = builder.add_input_sql("left", "SELECT * FROM a", conn)
+        right = builder.add_input_sql("right", "SELECT * FROM b", conn)
+        join = builder.add_join("Join", left, right, "k", "k")
+        calc = builder.add_calculation("Calc", join, "x2", "[x] * 2")
+        lineage = FlowLineage(builder.build()[0])
+
+        assert _sources(lineage, calc, "x2") == [("left", "x"), ("right", "x")]
+        kinds = {derivation.kind for _ref, derivation in lineage.upstream(calc, "x2")}
+        assert kinds == {"calculation", "join", "source"}
+
+    def test_pivot_unpivot_and_keep_only(self):
+        builder = TFLBuilder(flow_name="shape")
+        conn = builder.add_connection(host="db.local", username="etl", dbname="sales")
+        src = builder.add_input_sql("src", "SELECT * FROM t", conn)
+        unpivot = builder.add_unpivot("Unpivot", src, ["q1", "q2"], "quarter", "sales")
+        pivot = builder.add_pivot("Pivot", unpivot, "quarter", "sales", ["q1", "q2"],
+                                  group_by=["region"], aggregation="SUM")
+        keep = builder.add_keep_only("Keep", pivot, ["q1", "region"])
+        flow = _with_fields(builder.build()[0], {"src": ["region", "q1", "q2", "other"]})
+        lineage = FlowLineage(flow)
+
+        assert lineage.columns(unpivot) == ["region", "other", "quarter", "sales"]
+        assert _sources(lineage, unpivot, "sales") == [("src", "q1"), ("src", "q2")]
+        assert _sources(lineage, unpivot, "quarter") == []
+        assert lineage.resolve(unpivot, "q1") is None
+        assert lineage.columns(pivot) == ["region", "q1", "q2"]
+        assert _sources(lineage, keep, "q1") == [("src", "q1"), ("src", "q2")]
+        assert lineage.columns(keep) == ["q1", "region"]
+        assert lineage.resolve(keep, "q2") is None
+
+    def test_union_merges_parents(self):
+        builder = TFLBuilder(flow_name="union")
+        conn = builder.add_connection(host="db.local", username="etl", dbname="sales")
+        a = builder.add_input_sql("a", "SELECT * FROM a", conn)
+        b = builder.add_input_sql("b", "SELECT * FROM b", conn)
+        union = builder.add_union("Union", [a, b])
+        lineage = FlowLineage(builder.build()[0])
+        ref = lineage.resolve(union, "id")
+        assert lineage.derivations[ref].kind == "union"
+        assert _sources(lineage, union, "id") == [("a", "id"), ("b", "id")]
+
+    def test_edges_json(self, orders_flow):
+        flow, ids = orders_flow
+        document = json.loads(FlowLineage(flow).to_json())
+        assert document["outputs"] == {ids["output"]: "Orders DS"}
+        edges = {(e["source"].get("column"), e["target"]["column"], e["kind"]) for e in document["edges"]}
+        assert ("amount", "revenue", "rename") in edges
+        assert ("revenue", "net", "calculation") in edges
+        assert ("net", "total_net", "aggregate") in edges
+        reads = [e for e in document["edges"] if e["kind"] == "read" and e["target"]["column"] == "amount"]
+        assert reads[0]["source"] == {
+            "column": "amount", "table": "[sales].[orders]", "server": "db.local", "dbname": "sales",
+        }
+
+    def test_from_tfl(self, orders_flow, tmp_path, capsys):
+        flow, ids = orders_flow
+        path = tmp_path / "orders_v2.tfl"
+        TFLPackager.save_tfl(str(path), flow, {}, {})
+        capsys.readouterr()
+        lineage = FlowLineage.from_tfl(str(path))
+        assert lineage.flow_name == "orders_v2"
+        assert _sources(lineage, ids["output"], "region") == [("users", "region")]
+
+    def test_deep_chain(self):
+        builder = TFLBuilder(flow_name="deep")
+        conn = builder.add_connection(host="db.local", username="etl", dbname="sales")
+        parent = builder.add_input_sql("src", "SELECT * FROM t", conn)
+        for i in range(2000):
+            parent = builder.add_calculation(f"Calc {i}", parent, f"c{i}", f"[c{i - 1}] + [x]")
+        flow = builder.build()[0]
+
+        # Deeper than the recursion limit: resolution must be iterative
+        lineage = FlowLineage(flow)
+        assert _sources(lineage, parent, "c1999") == [("src", "c-1"), ("src", "x")]
+        assert len(lineage.upstream(parent, "c1999")) == 2002
+
+
+class TestCrossFlowLineage:
+    """lineage.CrossFlowLineage"""
+
+    def test_published_datasource_links_flows(self, orders_flow):
+        flow, ids = orders_flow
+        builder = TFLBuilder(flow_name="reporting")
+        conn = builder.add_connection(host="tableau.local", dbname="orders ds", db_class="sqlproxy")
+        published = builder.add_input_table("Orders DS", "sqlproxy", conn)
+        calc = builder.add_calculation("Calc", published, "net_k", "[total_net] / 1000")
+        cross = CrossFlowLineage([FlowLineage(flow), FlowLineage(builder.build()[0])])
+
+        assert cross.links == {("reporting", published): ("orders", ids["output"])}
+        sources = cross.sources("reporting", calc, "net_k")
+        assert sorted((s.flow, s.column) for s in sources) == [
+            ("orders", "amount"), ("orders", "discount"),
+        ]
+        kinds = [derivation.kind for _ref, derivation in cross.upstream("reporting", calc, "net_k")]
+        assert kinds[:3] == ["calculation", "published", "aggregate"]
+
+        published_edges = [e for e in cross.edges() if e["kind"] == "published"]
+        assert [(e["source"]["flow"], e["target"]["flow"], e["target"]["column"])
+                for e in published_edges] == [("orders", "reporting", "total_net")]
+        assert json.loads(cross.to_json())["flows"] == ["orders", "reporting"]
+
+    def test_duplicate_flow_names_are_rejected(self, orders_flow):
+        flow, _ids = orders_flow
+        with pytest.raises(ValueError, match="Duplicate flow name"):
+            CrossFlowLineage([FlowLineage(flow), FlowLineage(flow)])
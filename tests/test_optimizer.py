@@ -0,0 +1,500 @@
+"""
+cwprep flow optimizer tests.
+
+Builds small flows with TFLBuilder, runs optimizer passes and checks the
+rewritten graph (and that it still translates to SQL).
+"""
+
+import pytest
+
+from cwprep import TFLBuilder
+from cwprep.graph import FlowGraph, canonical_node, content_digest
+from cwprep.optimizer import FlowOptimizer
+from cwprep.translator import SQLTranslator
+
+
+def _action_chain(container):
+    """Inner action node types of a Container, in chain order."""
+    loom = container["loomContainer"]
+    inner = loom["nodes"]
+    order = []
+    current = loom["initialNodes"][0]
+    while current:
+        order.append(inner[current]["nodeType"])
+        links = inner[current]["nextNodes"]
+        current = links[0]["nextNodeId"] if links else None
+    return order
+
+
+def _fields(*names):
+    return [{"name": name} for name in names]
+
+
+class TestFuseContainers:
+    """Clean-step fusion pass."""
+
+    def _make_chain(self):
+        builder = TFLBuilder(flow_name="Chain")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        src = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+        step1 = builder.add_filter("Active", src, "[Status] == 'Active'")
+        step2 = builder.add_calculation("Tax", step1, "tax", "[Amount] * 0.1")
+        step3 = builder.add_rename(step2, {"tax": "vat"})
+        out = builder.add_output_server("Output", step3, "DS")
+        return builder, src, (step1, step2, step3), out
+
+    def test_linear_chain_is_fused_in_order(self):
+        builder, src, steps, out = self._make_chain()
+        report = builder.optimize(["fuse_containers"])
+
+        assert report.fused_steps == 2
+        assert report.fused_containers == [
+            {"into": steps[0], "fused": [steps[1], steps[2]], "actions": 3}
+        ]
+        assert steps[1] not in builder.nodes and steps[2] not in builder.nodes
+        fused = builder.nodes[steps[0]]
+        assert _action_chain(fused) == [
+            ".v1.FilterOperation", ".v1.AddColumn", ".v1.RenameColumn",
+        ]
+        assert [link["nextNodeId"] for link in fused["nextNodes"]] == [out]
+        assert {n["id"] for n in builder._node_order} == {src, steps[0], out}
+
+    def test_fused_flow_still_translates(self):
+        builder, _src, _steps, _out = self._make_chain()
+        flow, _, _ = builder.build(optimize=True)
+        sql = SQLTranslator().translate_flow(flow, flow_name="Chain")
+        assert "WHERE" in sql
+        assert "vat" in sql
+        assert builder.optimization_report.fused_steps == 2
+
+    def test_fan_out_and_fan_in_block_fusion(self):
+        builder = TFLBuilder(flow_name="Branches")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        src = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+        shared = builder.add_calculation("Shared", src, "x", "1")
+        left = builder.add_calculation("Left", shared, "l", "2")
+        right = builder.add_calculation("Right", shared, "r", "3")
+        union = builder.add_union("Merge", [left, right])
+        after = builder.add_calculation("After", union, "a", "4")
+        builder.add_output_server("Output", after, "DS")
+
+        report = builder.optimize(["fuse_containers"])
+
+        assert report.fused_steps == 0
+        assert all(nid in builder.nodes for nid in (shared, left, right, after))
+
+    def test_optimized_graph_stays_consistent(self):
+        builder, _src, _steps, _out = self._make_chain()
+        builder.optimize(FlowOptimizer.PASSES)
+        graph = FlowGraph(builder.nodes)
+        for node_id in builder.nodes:
+            assert all(pid in builder.nodes for pid in graph.parent_ids(node_id))
+            assert all(cid in builder.nodes for cid in graph.child_ids(node_id))
+
+    def test_unknown_pass_is_rejected(self):
+        builder, _src, _steps, _out = self._make_chain()
+        with pytest.raises(ValueError, match="Unknown optimizer pass"):
+            builder.optimize(["not_a_pass"])
+
+
+class TestFoldFilters:
+    """Filter / keep-only folding into database inputs."""
+
+    def test_table_input_gets_where_and_column_list(self):
+        builder = TFLBuilder(flow_name="Fold")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        src = builder.add_input_table("orders", "orders", conn)
+        active = builder.add_filter("Active", src, "[Status] == 'Active'")
+        keep = builder.add_keep_only("Keep", active, ["id", "Amount"])
+        out = builder.add_output_server("Output", keep, "DS")
+
+        report = builder.optimize(FlowOptimizer.PASSES)
+
+        assert builder.nodes[src]["relation"] == {
+            "type": "query",
+            "query": "SELECT `id`, `Amount` FROM `orders` WHERE `Status` = 'Active'",
+        }
+        assert [link["nextNodeId"] for link in builder.nodes[src]["nextNodes"]] == [out]
+        assert active not in builder.nodes and keep not in builder.nodes
+        assert report.folded_filters == [{
+            "input": src, "predicates": ["`Status` = 'Active'"],
+            "columns": ["id", "Amount"], "removed": [active], "trimmed": None,
+        }]
+
+    def test_keep_only_narrows_declared_fields(self):
+        builder = TFLBuilder(flow_name="Fold")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        src = builder.add_input_table("orders", "orders", conn,
+            fields=[{"name": "id", "type": "integer"}, {"name": "Status"},
+                    {"name": "Amount", "type": "real"}])
+        keep = builder.add_keep_only("Keep", src, ["Amount", "id"])
+        builder.add_output_server("Output", keep, "DS")
+
+        builder.optimize(["fold_filters"])
+
+        fields = builder.nodes[src]["fields"]
+        assert [(f["name"], f["type"], f["ordinal"]) for f in fields] == [
+            ("Amount", "real", 0), ("id", "integer", 1),
+        ]
+
+        builder = TFLBuilder(flow_name="Fold")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        src = builder.add_input_table("orders", "orders", conn, fields=_fields("id"))
+        keep = builder.add_keep_only("Keep", src, ["id", "Amount"])
+        builder.add_output_server("Output", keep, "DS")
+
+        builder.optimize(["fold_filters"])
+
+        assert builder.nodes[src]["fields"] is None
+
+    def test_build_optimize_leaves_inputs_alone(self):
+        builder = TFLBuilder(flow_name="Fold")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        src = builder.add_input_table("orders", "orders", conn)
+        big = builder.add_filter("Big", src, "[a] > 1")
+        calc = builder.add_calculation("Calc", big, "b", "[a] * 2")
+        builder.add_output_server("Output", calc, "DS")
+
+        flow = builder.build(optimize=True)[0]
+
+        assert flow["nodes"][src]["relation"] == {"type": "table", "table": "[orders]"}
+        assert builder.optimization_report.fused_steps == 1
+        assert builder.optimization_report.folded_filters == []
+
+    def test_sqlserver_query_input_is_wrapped(self):
+        builder = TFLBuilder(flow_name="Fold")
+        conn = builder.add_connection("sql01", db_class="sqlserver", authentication="sspi")
+        src = builder.add_input_sql("orders", "SELECT * FROM dbo.orders;", conn)
+        east = builder.add_value_filter("East", src, "Region", ["East", "West"])
+        builder.add_output_server("Output", east, "DS")
+
+        builder.optimize(["fold_filters"])
+
+        query = builder.nodes[src]["relation"]["query"]
+        assert query.startswith("SELECT * FROM (\nSELECT * FROM dbo.orders\n) AS cwprep_src WHERE ")
+        assert "([Region] = 'East') OR ([Region] = 'West')" in query
+        assert "([Region]) IS NULL" in query
+
+    def test_folding_stops_at_first_unportable_action(self):
+        builder = TFLBuilder(flow_name="Fold")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        src = builder.add_input_table("orders", "orders", conn)
+        big = builder.add_filter("Big", src, "[Amount] > 100")
+        tax = builder.add_calculation("Tax", big, "tax", "[Amount] * 0.1")
+        named = builder.add_filter("Named", tax, "CONTAINS([Name], 'x')")
+        builder.add_output_server("Output", named, "DS")
+
+        report = builder.optimize(FlowOptimizer.PASSES)
+
+        assert report.folded_predicates == 1
+        assert report.folded_filters[0]["trimmed"] == big
+        assert _action_chain(builder.nodes[big]) == [
+            ".v1.AddColumn", ".v1.FilterOperation",
+        ]
+        assert builder.nodes[src]["relation"]["query"].endswith("WHERE `Amount` > 100")
+
+        flow, _, _ = builder.build()
+        sql = SQLTranslator().translate_flow(flow, flow_name="Fold")
+        assert "tax" in sql
+
+    def test_fan_out_and_unportable_inputs_are_left_alone(self):
+        builder = TFLBuilder(flow_name="Fold")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        shared = builder.add_input_table("orders", "orders", conn)
+        left = builder.add_filter("Left", shared, "[Amount] > 1")
+        right = builder.add_filter("Right", shared, "[Amount] < 1")
+        union = builder.add_union("Merge", [left, right])
+        builder.add_output_server("Output", union, "DS")
+        other = builder.add_input_table("items", "items", conn)
+        dated = builder.add_filter("Dated", other, "[Day] >= #2024-01-01#")
+        builder.add_output_server("Items", dated, "DS2")
+
+        report = builder.optimize(["fold_filters"])
+
+        assert report.folded_filters == []
+        assert builder.nodes[shared]["relation"]["type"] == "table"
+        assert builder.nodes[other]["relation"]["type"] == "table"
+
+
+class TestFoldJoins:
+    """Join folding for same-connection database inputs."""
+
+    def _make_join(self, join_type="left", same_connection=True):
+        builder = TFLBuilder(flow_name="Joins")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        if not same_connection:
+            conn_right = builder.add_connection("otherhost", "root", "otherdb")
+        else:
+            conn_right = conn
+        orders = builder.add_input_table("orders", "orders", conn, schema="dbo",
+            fields=_fields("order_id", "customer_id", "region"))
+        customers = builder.add_input_sql("customers", "SELECT * FROM customers", conn_right,
+            fields=_fields("id", "region", "segment"))
+        join = builder.add_join(
+            "Orders+Customers", orders, customers,
+            ["customer_id", "region"], ["id", "region"], join_type,
+        )
+        out = builder.add_output_server("Output", join, "DS")
+        return builder, (orders, customers, join, out)
+
+    def test_join_is_replaced_by_single_sql_input(self):
+        builder, (orders, customers, join, out) = self._make_join()
+
+        report = builder.optimize(["fold_joins"])
+
+        assert len(report.folded_joins) == 1
+        entry = report.folded_joins[0]
+        assert (entry["join"], entry["left"], entry["right"]) == (join, orders, customers)
+        assert not {orders, customers, join} & set(builder.nodes)
+        assert join not in builder.node_properties
+
+        folded = builder.nodes[entry["input"]]
+        assert folded["nodeType"] == ".v1.LoadSql"
+        assert folded["name"] == "Orders+Customers"
+        assert folded["relation"]["query"] == (
+            "SELECT cwprep_l.`order_id`, cwprep_l.`customer_id`, cwprep_l.`region`,"
+            " cwprep_r.`id`, cwprep_r.`region` AS `region-1`, cwprep_r.`segment`\n"
+            "FROM `dbo`.`orders` AS cwprep_l\n"
+            "LEFT JOIN (\nSELECT * FROM customers\n) AS cwprep_r\n"
+            "    ON cwprep_l.`customer_id` = cwprep_r.`id`"
+            " AND cwprep_l.`region` = cwprep_r.`region`"
+        )
+        assert [f["name"] for f in folded["fields"]] == [
+            "order_id", "customer_id", "region", "id", "region-1", "segment",
+        ]
+        assert [link["nextNodeId"] for link in folded["nextNodes"]] == [out]
+        assert builder.initial_nodes == [entry["input"]]
+
+    def test_same_key_on_both_sides_is_renamed(self):
+        builder = TFLBuilder(flow_name="Joins")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        users = builder.add_input_table("users", "users", conn,
+            fields=_fields("id", "name"))
+        profiles = builder.add_input_table("profiles", "profiles", conn,
+            fields=_fields("id", "bio"))
+        join = builder.add_join("Users+Profiles", users, profiles, "id", "id")
+        builder.add_output_server("Output", join, "DS")
+
+        builder.optimize(FlowOptimizer.PASSES)
+        flow = builder.build()[0]
+
+        (node,) = [n for n in flow["nodes"].values() if n["nodeType"] == ".v1.LoadSql"]
+        assert node["relation"]["query"].startswith(
+            "SELECT cwprep_l.`id`, cwprep_l.`name`, cwprep_r.`id` AS `id-1`, cwprep_r.`bio`\n"
+        )
+
+    def test_plain_builder_join_is_left_alone(self):
+        builder = TFLBuilder(flow_name="Joins")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        users = builder.add_input_table("users", "users", conn)
+        profiles = builder.add_input_table("profiles", "profiles", conn)
+        join = builder.add_join("Users+Profiles", users, profiles, "id", "id")
+        builder.add_output_server("Output", join, "DS")
+
+        assert builder.optimize(["fold_joins"]).folded_joins == []
+        assert join in builder.nodes
+
+    def test_chained_joins_fold_and_filters_follow(self):
+        builder = TFLBuilder(flow_name="Joins")
+        conn = builder.add_connection("db01", db_class="postgres", username="u")
+        a = builder.add_input_table("a", "a", conn,
+            fields=_fields("id", "amount"))
+        b = builder.add_input_table("b", "b", conn,
+            fields=_fields("a_id", "label"))
+        c = builder.add_input_table("c", "c", conn,
+            fields=_fields("a_id", "note"))
+        ab = builder.add_join("ab", a, b, "id", "a_id", "inner")
+        abc = builder.add_join("abc", ab, c, "id", "a_id", "inner")
+        big = builder.add_filter("Big", abc, "[amount] > 10")
+        builder.add_output_server("Output", big, "DS")
+
+        report = builder.optimize(FlowOptimizer.PASSES)
+
+        assert [entry["join"] for entry in report.folded_joins] == [ab, abc]
+        final = builder.nodes[report.folded_joins[-1]["input"]]
+        query = final["relation"]["query"]
+        assert query.startswith(
+            'SELECT * FROM (\nSELECT cwprep_l."id", cwprep_l."amount", cwprep_l."a_id",'
+            ' cwprep_l."label", cwprep_r."a_id" AS "a_id-1", cwprep_r."note"\nFROM (\n'
+        )
+        assert 'INNER JOIN "c" AS cwprep_r' in query
+        assert query.endswith('WHERE "amount" > 10')
+        assert len(builder.nodes) == 2
+
+    def test_joins_that_do_not_translate_cleanly_are_kept(self):
+        builder, (_o, _c, full_join, _out) = self._make_join(join_type="full")
+        assert builder.optimize(["fold_joins"]).folded_joins == []
+        assert full_join in builder.nodes
+
+        builder, (_o, _c, join, _out) = self._make_join()
+        builder.nodes[join]["actionNode"]["conditions"][0]["leftExpression"] = "[a] + [b]"
+        assert builder.optimize(["fold_joins"]).folded_joins == []
+
+    def test_inputs_on_different_connections_are_kept(self):
+        builder, (_o, _c, join, _out) = self._make_join(same_connection=False)
+        report = builder.optimize(["fold_joins"])
+        assert report.folded_joins == []
+        assert join in builder.nodes
+
+
+class TestPushAggregates:
+    """Aggregate pushdown into database inputs."""
+
+    def _make_aggregate(self, function="COUNTD", db_class="mysql", fields=None):
+        builder = TFLBuilder(flow_name="Agg")
+        conn = builder.add_connection("localhost", "root", "testdb", db_class=db_class)
+        src = builder.add_input_table("orders", "orders", conn, fields=fields)
+        paid = builder.add_filter("Paid", src, "[Status] == 'paid'")
+        agg = builder.add_aggregate("By region", paid, ["Region"], [
+            {"field": "Customer", "function": function, "output_name": "Customers"},
+            {"field": "Amount", "function": "SUM"},
+        ])
+        out = builder.add_output_server("Output", agg, "DS")
+        return builder, (src, paid, agg, out)
+
+    def test_filter_and_aggregate_become_group_by_query(self):
+        builder, (src, paid, agg, out) = self._make_aggregate()
+
+        report = builder.optimize(FlowOptimizer.PASSES)
+
+        assert report.pushed_aggregates == [{
+            "aggregate": agg, "input": src,
+            "predicates": ["`Status` = 'paid'"], "removed": [paid],
+        }]
+        node = builder.nodes[src]
+        assert node["name"] == "By region"
+        assert node["relation"]["query"] == (
+            "SELECT `Region`,\n"
+            "        COUNT(DISTINCT `Customer`) AS `Customers`,\n"
+            "        SUM(`Amount`) AS `Amount`\n"
+            "    FROM `orders`\n"
+            "    WHERE `Status` = 'paid'\n"
+            "    GROUP BY `Region`"
+        )
+        assert [link["nextNodeId"] for link in node["nextNodes"]] == [out]
+        assert set(builder.nodes) == {src, out}
+
+    def test_fields_become_aggregate_outputs(self):
+        builder, (src, _paid, _agg, _out) = self._make_aggregate(fields=[
+            {"name": "Region"}, {"name": "Customer"}, {"name": "Status"},
+            {"name": "Amount", "type": "real"},
+        ])
+
+        builder.optimize(["push_aggregates"])
+
+        fields = builder.nodes[src]["fields"]
+        assert [(f["name"], f["type"], f["ordinal"]) for f in fields] == [
+            ("Region", "string", 0), ("Customers", "integer", 1), ("Amount", "real", 2),
+        ]
+
+        builder, (src, _paid, _agg, _out) = self._make_aggregate()
+        builder.optimize(["push_aggregates"])
+        assert builder.nodes[src]["fields"] is None
+
+    def test_functions_without_matching_sql_are_kept_in_prep(self):
+        builder, (_src, _paid, agg, _out) = self._make_aggregate(function="MEDIAN")
+        assert builder.optimize(["push_aggregates"]).pushed_aggregates == []
+        assert agg in builder.nodes
+
+        builder, (_src, _paid, agg, _out) = self._make_aggregate(
+            function="AVG", db_class="sqlserver"
+        )
+        assert builder.optimize(["push_aggregates"]).pushed_aggregates == []
+
+    def test_translator_still_renders_aggregate_cte(self):
+        builder, _ids = self._make_aggregate()
+        flow, _, _ = builder.build()
+        sql = SQLTranslator().translate_flow(flow, flow_name="Agg")
+        assert 'COUNT(DISTINCT "Customer") AS "Customers"' in sql
+        assert 'SUM("Amount") AS "SUM_Amount"' in sql
+
+
+class TestPruneUnreachable:
+    """Output-reachability pruning."""
+
+    def test_dead_branches_and_their_connections_are_removed(self):
+        builder = TFLBuilder(flow_name="Prune")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        unused_conn = builder.add_connection("otherhost", "root", "otherdb")
+        csv_conn = builder.add_file_connection("orders.csv")
+        src = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+        calc = builder.add_calculation("Calc", src, "x", "1")
+        out = builder.add_output_server("Output", calc, "DS")
+        dead_branch = builder.add_filter("Dead", src, "[x] > 1")
+        orphan = builder.add_input_sql("orphan", "SELECT 1", unused_conn)
+        orphan_step = builder.add_calculation("Orphan calc", orphan, "y", "2")
+        csv = builder.add_input_csv_union("csv", csv_conn, ["a.csv", "b.csv"])
+
+        pruned = builder.prune_unreachable()
+
+        assert pruned == [dead_branch, orphan, orphan_step, csv]
+        assert set(builder.nodes) == {src, calc, out}
+        assert [link["nextNodeId"] for link in builder.nodes[src]["nextNodes"]] == [calc]
+        assert list(builder.connections) == [conn]
+        assert builder.optimization_report.pruned_connections == [unused_conn, csv_conn]
+        assert builder.initial_nodes == [src]
+
+        flow, display, _ = builder.build()
+        assert flow["connectionIds"] == [conn]
+        assert set(display["flowDisplaySettings"]["flowNodeDisplaySettings"]) == {src, calc, out}
+
+    def test_flow_without_outputs_is_left_alone(self):
+        builder = TFLBuilder(flow_name="Prune")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        src = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+        assert builder.prune_unreachable() == []
+        assert src in builder.nodes and conn in builder.connections
+
+
+class TestDedupNodes:
+    """Duplicate input and common-subgraph merging."""
+
+    def test_identical_inputs_and_chains_are_merged(self):
+        builder = TFLBuilder(flow_name="Dedup")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        first = builder.add_input_table("orders", "orders", conn)
+        second = builder.add_input_table("orders (copy)", "orders", conn)
+        other = builder.add_input_table("items", "items", conn)
+        f1 = builder.add_filter("Active", first, "[Status] == 'Active'")
+        f2 = builder.add_filter("Active 2", second, "[Status] == 'Active'")
+        out1 = builder.add_output_server("Out 1", f1, "DS1")
+        out2 = builder.add_output_server("Out 2", f2, "DS2")
+        builder.add_output_server("Out 3", other, "DS3")
+
+        report = builder.optimize(["dedup_nodes"])
+
+        assert report.deduplicated_nodes == [
+            {"kept": first, "merged": [second]},
+            {"kept": f1, "merged": [f2]},
+        ]
+        assert second not in builder.nodes and f2 not in builder.nodes
+        assert [link["nextNodeId"] for link in builder.nodes[first]["nextNodes"]] == [f1]
+        assert [link["nextNodeId"] for link in builder.nodes[f1]["nextNodes"]] == [out1, out2]
+        assert builder.initial_nodes == [first, other]
+
+        graph = FlowGraph(builder.nodes)
+        assert graph.parent_ids(out2) == [f1]
+
+    def test_self_join_inputs_are_not_merged(self):
+        builder = TFLBuilder(flow_name="Dedup")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        left = builder.add_input_table("emp", "emp", conn)
+        right = builder.add_input_table("mgr", "emp", conn)
+        join = builder.add_join("Self", left, right, "manager_id", "id")
+        builder.add_output_server("Out", join, "DS")
+
+        assert builder.optimize(["dedup_nodes"]).deduplicated_nodes == []
+        assert left in builder.nodes and right in builder.nodes
+
+    def test_canonical_node_ignores_ids_and_names(self):
+        builder = TFLBuilder(flow_name="Dedup")
+        conn = builder.add_connection("localhost", "root", "testdb")
+        src = builder.add_input_table("orders", "orders", conn)
+        a = builder.add_union("A", [src, builder.add_input_table("x", "x", conn)])
+        b = builder.add_union("B", [src, builder.add_input_table("y", "y", conn)])
+
+        content_a, ids_a = canonical_node(builder.nodes[a])
+        content_b, ids_b = canonical_node(builder.nodes[b])
+        assert content_a == content_b
+        assert content_digest(content_a) == content_digest(content_b)
+        assert ids_a[a] == ids_b[b] == "$0"
@@ -0,0 +1,148 @@
+"""
+cwprep lazy flow reader tests.
+
+Saves flows with TFLPackager and checks that FlowDocument queries return the
+same data as loading the whole flow entry, with every available backend.
+"""
+
+import io
+import json
+import zipfile
+
+import pytest
+
+from cwprep import TFLBuilder, TFLPackager
+from cwprep.reader import (
+    HAS_IJSON, FlowDocument, LazyNodes, _PythonScanner, resolve_reader_backend,
+)
+
+
+BACKENDS = ["python"] + (["ijson"] if HAS_IJSON else [])
+
+
+@pytest.fixture
+def archive(tmp_path):
+    """A saved flow with escapes and bulky fields; returns (path, flow)."""
+    builder = TFLBuilder(flow_name="Reader")
+    conn = builder.add_connection(host="db.local", username="etl", dbname="sales")
+    orders = builder.add_input_sql(
+        "Orders \"quoted\" \\ path", "SELECT * FROM orders WHERE note = '{x}'", conn
+    )
+    users = builder.add_input_sql("用户", "SELECT * FROM users", conn)
+    join = builder.add_join("Join", orders, users, "user_id", "id")
+    builder.add_output_server("Output", join, "DS")
+    flow, display, meta = builder.build()
+    for node in flow["nodes"].values():
+        node["fields"] = [{"name": f"c{i}", "caption": "x" * 50} for i in range(200)]
+    path = tmp_path / "flow.tfl"
+    TFLPackager.save_tfl(str(path), flow, display, meta)
+    return str(path), json.loads(json.dumps(flow))
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+class TestFlowDocument:
+    """reader.FlowDocument"""
+
+    def test_headers_and_fields(self, archive, backend):
+        path, flow = archive
+        doc = FlowDocument(path, backend=backend, chunk_size=97)
+
+        headers = doc.headers()
+        assert list(headers) == list(flow["nodes"])
+        for node_id, header in headers.items():
+            node = flow["nodes"][node_id]
+            assert header["name"] == node["name"]
+            assert header["nodeType"] == node["nodeType"]
+            assert header["nextNodes"] == node["nextNodes"]
+            assert "fields" not in header
+        assert doc.field("initialNodes") == flow["initialNodes"]
+        assert doc.field("missing", 1) == 1
+        assert doc.connection_attributes() == {
+            conn_id: conn["connectionAttributes"]
+            for conn_id, conn in flow["connections"].items()
+        }
+
+    def test_nodes_are_materialized_on_demand(self, archive, backend):
+        path, flow = archive
+        doc = FlowDocument(path, backend=backend, chunk_size=97)
+        node_ids = list(flow["nodes"])
+
+        assert doc.node(node_ids[0]) == flow["nodes"][node_ids[0]]
+        assert doc.nodes_by_id(node_ids[1:3] + ["missing"]) == {
+            node_id: flow["nodes"][node_id] for node_id in node_ids[1:3]
+        }
+        assert dict(doc.iter_nodes()) == flow["nodes"]
+        assert len(doc.nodes) == len(node_ids) and node_ids[-1] in doc.nodes
+        assert doc.nodes[node_ids[-1]] == flow["nodes"][node_ids[-1]]
+        with pytest.raises(KeyError):
+            doc.node("missing")
+
+    def test_plain_json_file(self, archive, backend, tmp_path):
+        path, flow = archive
+        plain = tmp_path / "flow.json"
+        with zipfile.ZipFile(path) as zf:
+            plain.write_bytes(zf.read("flow"))
+        doc = FlowDocument(str(plain), backend=backend)
+        assert doc.node_ids() == list(flow["nodes"])
+
+    def test_node_mapping_makes_bounded_passes(self, backend, tmp_path, monkeypatch):
+        builder = TFLBuilder(flow_name="Passes")
+        conn = builder.add_connection(host="db.local", username="etl", dbname="sales")
+        step = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+        for i in range(40):
+            step = builder.add_filter(f"Filter {i}", step, f"[a] > {i}")
+        builder.add_output_server("Output", step, "DS")
+        flow, display, meta = builder.build()
+        path = tmp_path / "passes.tfl"
+        TFLPackager.save_tfl(str(path), flow, display, meta)
+        flow = json.loads(json.dumps(flow))
+
+        doc = FlowDocument(str(path), backend=backend)
+        passes = []
+        open_flow = doc._open
+        monkeypatch.setattr(doc, "_open", lambda: passes.append(1) or open_flow())
+
+        assert dict(doc.nodes.items()) == flow["nodes"]
+        assert list(doc.nodes.values()) == list(flow["nodes"].values())
+        # One header scan (for len()) and one streaming pass each
+        assert len(passes) == 3
+
+        doc.nodes = LazyNodes(doc, cache_size=8)
+        del passes[:]
+        assert {node_id: doc.nodes[node_id] for node_id in doc.nodes} == flow["nodes"]
+        # One header scan, then one pass per cache_size nodes
+        assert len(passes) <= 1 + -(-len(flow["nodes"]) // 8)
+
+    def test_truncated_document_raises_value_error(self, backend, tmp_path):
+        path = tmp_path / "truncated.json"
+        path.write_bytes(b'{"nodes": {"a": {"name": "x", "fields": [1, 2')
+        with pytest.raises(ValueError):
+            FlowDocument(str(path), backend=backend).headers()
+
+
+class TestPythonScanner:
+    """Pull scanner edge cases, one byte at a time."""
+
+    def test_escaped_quotes_across_chunks(self):
+        document = {"a": "x\\\\\"y\\", "nodes": {"n": {"name": "\\\"", "v": [1, {"b": None}]}}}
+        data = json.dumps(document).encode("utf-8")
+        scanner = _PythonScanner(io.BytesIO(data), chunk_size=1)
+        keys = []
+        for key in scanner.iter_object():
+            keys.append(key)
+            if key == "a":
+                scanner.skip_value()
+            else:
+                assert scanner.read_value() == document["nodes"]
+        assert keys == ["a", "nodes"]
+
+    def test_truncated_document(self):
+        scanner = _PythonScanner(io.BytesIO(b'{"a": [1, 2'), chunk_size=4)
+        with pytest.raises(ValueError):
+            for _key in scanner.iter_object():
+                scanner.skip_value()
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="reader backend"):
+        resolve_reader_backend("yaml")
@@ -0,0 +1,137 @@
+"""
+cwprep compact node record tests.
+
+Checks that NodeRecord/NodeStore behave like the plain node dicts they replace
+and that build() still produces the exact same JSON.
+"""
+
+import copy
+import json
+import pickle
+
+import pytest
+
+from cwprep import TFLBuilder, records
+from cwprep.records import NodeRecord, NodeStore
+
+
+def _load_sql_node(node_id="n1"):
+    return {
+        "nodeType": ".v1.LoadSql", "name": "orders", "id": node_id,
+        "baseType": "input", "nextNodes": [], "serialize": False, "description": None,
+        "connectionId": "c1",
+        "connectionAttributes": {"dbname": "db"},
+        "fields": None, "actions": [], "debugModeRowLimit": None,
+        "originalDataTypes": {}, "randomSampling": None,
+        "updateTimestamp": None,
+        "restrictedFields": {}, "userRenamedFields": {},
+        "selectedFields": None, "samplingType": None,
+        "groupByFields": None, "filters": [],
+        "relation": {"type": "query", "query": "SELECT 1"},
+    }
+
+
+class TestNodeRecord:
+    """NodeRecord mapping semantics."""
+
+    def test_round_trip_preserves_keys_and_order(self):
+        node = _load_sql_node()
+        record = NodeRecord.from_dict(copy.deepcopy(node))
+        assert list(record) == list(node)
+        assert record == node
+        assert json.dumps(record.to_dict()) == json.dumps(node)
+
+    def test_boilerplate_is_shared_between_records(self):
+        a = NodeRecord.from_dict(_load_sql_node("a"))
+        b = NodeRecord.from_dict(_load_sql_node("b"))
+        assert a._template is b._template
+        assert "debugModeRowLimit" not in a._template.value_index
+
+    def test_default_containers_are_copied_not_kept(self):
+        a = NodeRecord.from_dict(_load_sql_node("a"))
+        b = NodeRecord.from_dict(_load_sql_node("b"))
+        a["filters"].append({"expression": "[x] > 1"})
+        assert a["filters"] == [] and a._extra is None
+        a["filters"] = [{"expression": "[x] > 1"}]
+        assert a["filters"] == [{"expression": "[x] > 1"}]
+        assert b["filters"] == [] and b._template.defaults["filters"] == []
+        assert a.to_dict()["filters"] == [{"expression": "[x] > 1"}]
+
+    def test_not_a_dict_but_to_dict_serializes(self):
+        record = NodeRecord.from_dict(_load_sql_node())
+        assert not isinstance(record, dict)
+        with pytest.raises(TypeError):
+            json.dumps(record)
+        assert json.loads(json.dumps(record.to_dict())) == _load_sql_node()
+
+    def test_template_cache_is_bounded(self, monkeypatch):
+        monkeypatch.setattr(records, "MAX_TEMPLATES", 4)
+        monkeypatch.setattr(records, "_TEMPLATES", {})
+        nodes = [NodeRecord.from_dict({"nodeType": f".v1.T{i}", "id": str(i)}) for i in range(10)]
+        assert len(records._TEMPLATES) == 4
+        assert [node["nodeType"] for node in nodes] == [f".v1.T{i}" for i in range(10)]
+
+    def test_set_delete_and_new_keys(self):
+        record = NodeRecord.from_dict(_load_sql_node())
+        record["serialize"] = True
+        record["extra"] = 1
+        del record["description"]
+        del record["relation"]
+        assert record["serialize"] is True
+        assert "description" not in record and "relation" not in record
+        assert list(record)[-1] == "extra"
+        with pytest.raises(KeyError):
+            record["description"]
+        record["description"] = "back"
+        assert record.to_dict()["description"] == "back"
+
+    def test_to_dict_returns_independent_copy(self):
+        record = NodeRecord.from_dict(_load_sql_node())
+        plain = record.to_dict()
+        plain["actions"].append("x")
+        plain["relation"]["query"] = "changed"
+        assert record["actions"] == []
+        assert record["relation"]["query"] == "SELECT 1"
+
+    def test_pickle_and_deepcopy(self):
+        record = NodeRecord.from_dict(_load_sql_node())
+        assert pickle.loads(pickle.dumps(record)) == record
+        assert copy.deepcopy(record) == record
+
+
+class TestNodeStore:
+    """NodeStore compaction and builder integration."""
+
+    def test_assignment_compacts_plain_dicts(self):
+        store = NodeStore()
+        store["n1"] = _load_sql_node()
+        assert isinstance(store["n1"], NodeRecord)
+        assert store.to_dict() == {"n1": _load_sql_node()}
+
+    def test_nested_action_and_container_nodes_are_compacted(self):
+        builder = TFLBuilder(flow_name="Records")
+        conn = builder.add_connection("localhost", "root", "db")
+        src = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+        step = builder.add_calculation("calc", src, "double", "[amount] * 2")
+
+        loom = builder.nodes[step]["loomContainer"]
+        assert isinstance(loom, NodeRecord)
+        inner = next(iter(loom["nodes"].values()))
+        assert isinstance(inner, NodeRecord)
+        assert inner["expression"] == "[amount] * 2"
+
+    def test_build_emits_plain_json(self):
+        builder = TFLBuilder(flow_name="Records")
+        conn = builder.add_connection("localhost", "root", "db")
+        file_conn = builder.add_file_connection("orders.csv")
+        src = builder.add_input_sql("orders", "SELECT * FROM orders", conn)
+        csv = builder.add_input_csv_union("csv", file_conn, ["a.csv", "b.csv"])
+        union = builder.add_union("union", [src, csv])
+        kept = builder.add_keep_only("keep", union, ["id"])
+        builder.add_output_server("out", kept, "DS")
+
+        flow, _display, _meta = builder.build()
+        assert all(type(node) is dict for node in flow["nodes"].values())
+        generated = flow["nodes"][csv]["generatedInputs"][0]["inputNode"]
+        assert type(generated) is dict and generated["debugModeRowLimit"] is None
+        assert json.loads(json.dumps(flow))["nodes"][src]["nextNodes"][0]["nextNodeId"] == union
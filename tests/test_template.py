@@ -0,0 +1,180 @@
+"""
+cwprep flow template tests.
+
+Compiles small builder sessions into FlowTemplates and checks parameter
+substitution, ID remapping and the bulk APIs.
+"""
+
+import json
+import re
+import zipfile
+
+import pytest
+
+from cwprep import TFLBuilder, TFLPackager
+from cwprep.packager import DOCUMENT_ENTRIES
+from cwprep.template import FlowTemplate
+
+
+P = FlowTemplate.param
+FOREIGN_ID = "0f0f0f0f-1111-4222-8333-444444444444"
+
+
+def _strings(value):
+    """Every string value in a JSON document."""
+    if isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+    elif isinstance(value, str):
+        yield value
+
+
+def _renumber(docs):
+    """JSON text with every UUID replaced by its order of first appearance."""
+    text = json.dumps(docs)
+    seen = {}
+    return re.sub(
+        r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}",
+        lambda m: f"id{seen.setdefault(m.group(0), len(seen))}",
+        text,
+    )
+
+
+def _tenant_builder(**values):
+    """Input -> filter -> union -> output, parameterized by tenant."""
+    values = {name: values.get(name, P(name))
+              for name in ("schema", "table", "tenant", "datasource")}
+    builder = TFLBuilder(flow_name="Tenant Orders", deterministic_ids=True)
+    conn = builder.add_connection(host="db.local", username="etl", dbname="sales")
+    orders = builder.add_input_table("Orders", values["table"], conn,
+                                     schema=values["schema"])
+    archive = builder.add_input_sql(
+        "Archive",
+        f"SELECT * FROM archive WHERE batch <> '{FOREIGN_ID}'",
+        conn,
+    )
+    filtered = builder.add_filter("Tenant", orders, f"[tenant] == '{values['tenant']}'")
+    union = builder.add_union("All", [filtered, archive])
+    builder.add_output_server("Output", union, values["datasource"])
+    return builder
+
+
+class TestFlowTemplate:
+    """template.FlowTemplate"""
+
+    def test_param_names_are_validated(self):
+        assert P("schema") == "{{cwprep:schema}}"
+        with pytest.raises(ValueError):
+            P("bad name")
+
+    def test_instantiate_substitutes_values_and_remaps_ids(self):
+        builder = _tenant_builder()
+        template = FlowTemplate.from_builder(builder)
+        assert sorted(template.params) == ["datasource", "schema", "table", "tenant"]
+
+        values = {"schema": "acme", "table": "orders", "tenant": "Acme",
+                  "datasource": "Acme Orders"}
+        flow, display, meta = template.instantiate(values)
+        text = json.dumps(flow)
+        assert "{{cwprep:" not in text
+        assert "acme" in text and "Acme Orders" in text
+        assert "[tenant] == 'Acme'" in text
+
+        # Every builder ID is replaced, consistently across the three documents
+        assert not set(flow["nodes"]) & set(builder.nodes)
+        assert flow["documentId"] != builder.doc_id
+        assert set(flow["initialNodes"]) <= set(flow["nodes"])
+        assert set(flow["connectionIds"]) == set(flow["connections"])
+        layout = display["flowDisplaySettings"]["flowNodeDisplaySettings"]
+        assert set(layout) == set(flow["nodes"])
+        for node in flow["nodes"].values():
+            for link in node["nextNodes"]:
+                assert link["nextNodeId"] in flow["nodes"]
+        assert meta["flowEntryName"] == "flow"
+
+        # UUIDs the builder did not mint are left alone
+        assert FOREIGN_ID in text
+
+    def test_instances_get_distinct_ids_unless_seeded(self):
+        template = FlowTemplate.from_builder(_tenant_builder())
+        values = {"schema": "s", "table": "t", "tenant": "x", "datasource": "d"}
+        first, _, _ = template.instantiate(values)
+        second, _, _ = template.instantiate(values)
+        assert not set(first["nodes"]) & set(second["nodes"])
+
+        seeded = template.instantiate(values, seed="acme")
+        assert seeded == template.instantiate(values, seed="acme")
+        assert seeded != template.instantiate(values, seed="globex")
+
+    def test_values_are_json_escaped(self):
+        template = FlowTemplate.from_builder(_tenant_builder())
+        tricky = 'O\'Brien "Ltd"\\\n'
+        flow, _, _ = template.instantiate(
+            {"schema": "s", "table": "t", "tenant": tricky, "datasource": "d"}
+        )
+        assert any(tricky in value for value in _strings(flow))
+
+    def test_matches_builder_output(self):
+        template = FlowTemplate.from_builder(_tenant_builder())
+        values = {"schema": "acme", "table": "orders", "tenant": "Acme",
+                  "datasource": "Acme Orders"}
+        instance = template.instantiate(values)
+        expected = _tenant_builder(**values).build()
+
+        assert instance[0]["documentId"] != expected[0]["documentId"]
+        assert _renumber(instance) == _renumber(expected)
+
+    def test_missing_and_unknown_parameters(self):
+        template = FlowTemplate.from_builder(_tenant_builder())
+        with pytest.raises(ValueError, match="Missing"):
+            template.instantiate({"schema": "s"})
+        with pytest.raises(ValueError, match="Unknown"):
+            template.instantiate({"schema": "s", "table": "t", "tenant": "x",
+                                  "datasource": "d", "extra": 1})
+
+    def test_instantiate_many_over_processes(self):
+        template = FlowTemplate.from_builder(_tenant_builder())
+        values_list = [
+            {"schema": f"t{i}", "table": "orders", "tenant": f"T{i}", "datasource": f"D{i}"}
+            for i in range(4)
+        ]
+        serial = template.instantiate_many(values_list, seed="bulk")
+        parallel = template.instantiate_many(values_list, workers=2, seed="bulk")
+        assert serial == parallel
+        assert serial[0][0]["nodes"] != serial[1][0]["nodes"]
+        with pytest.raises(ValueError):
+            template.instantiate_many(values_list, workers=0)
+
+    def test_save_many_writes_archives(self, tmp_path):
+        template = FlowTemplate.from_builder(_tenant_builder())
+        jobs = [
+            (str(tmp_path / f"t{i}.tfl"),
+             {"schema": f"t{i}", "table": "orders", "tenant": f"T{i}", "datasource": f"D{i}"})
+            for i in range(3)
+        ]
+        paths = template.save_many(jobs, workers=2)
+        assert paths == [path for path, _ in jobs]
+        with zipfile.ZipFile(paths[1]) as zf:
+            flow = json.loads(zf.read("flow"))
+        assert "D1" in json.dumps(flow)
+
+    def test_save_writes_same_entries_as_packager(self, tmp_path, capsys):
+        template = FlowTemplate.from_builder(_tenant_builder())
+        values = {"schema": "s", "table": "t", "tenant": "Zoë", "datasource": "d"}
+        expected_path = TFLPackager.save_tfl(
+            str(tmp_path / "expected.tfl"), *template.instantiate(values, seed="x")
+        )
+        for options in ({}, {"compact": True}):
+            fast = template.save(str(tmp_path / "fast.tfl"), values, seed="x", **options)
+            fallback = template.save(str(tmp_path / "fallback.tfl"), values, seed="x",
+                                     json_backend="json", **options)
+            with zipfile.ZipFile(fast) as fast_zf, zipfile.ZipFile(fallback) as slow_zf:
+                for entry in DOCUMENT_ENTRIES:
+                    assert fast_zf.read(entry) == slow_zf.read(entry)
+        with zipfile.ZipFile(expected_path) as expected_zf, zipfile.ZipFile(
+                str(tmp_path / "fast.tfl")) as fast_zf:
+            assert json.loads(fast_zf.read("flow")) == json.loads(expected_zf.read("flow"))
+        assert "Successfully created" in capsys.readouterr().out
@@ -165,6 +165,111 @@ class TestExpressionTranslator:
         assert "IS NULL" in result
         assert "UPPER" in result
 
+    # --- Parser engine ---
+    def test_nested_calls_translate_correctly(self):
+        result = self.t.translate("MID([s], FIND([s], ',') + 1, 3)")
+        assert result == """SUBSTRING("s" FROM POSITION(',' IN "s") + 1 FOR 3)"""
+
+    def test_nested_isnull(self):
+        result = self.t.translate("ISNULL(UPPER(TRIM([Name])))")
+        assert result == '(UPPER(TRIM("Name"))) IS NULL'
+
+    def test_double_quoted_string_literal(self):
+        result = self.t.translate('[Status] = "Completed"')
+        assert result == """"Status" = 'Completed'"""
+
+    def test_dateadd_with_expression_amount(self):
+        result = self.t.translate("DATEADD('month', [n] + 1, [Date])")
+        assert result == """"Date" + ("n" + 1) * INTERVAL '1' MONTH"""
+
+    def test_predicate_inside_comparison_is_parenthesized(self):
+        result = self.t.translate("CONTAINS([Name], 'x') = TRUE")
+        assert result == """("Name" LIKE '%' || 'x' || '%') = TRUE"""
+
+    def test_double_negation_does_not_start_a_comment(self):
+        assert self.t.translate("- -[a]") == '-(-"a")'
+        assert self.t.translate("[b] * - -[a] + 1") == '"b" * -(-"a") + 1'
+
+    def test_parser_falls_back_to_regex(self):
+        # LOD expressions are outside the parser grammar
+        result = self.t.translate("{FIXED [Region]: SUM([Sales])}")
+        assert result == '{FIXED "Region": SUM("Sales")}'
+
+    def test_regex_engine_available(self):
+        regex = ExpressionTranslator(engine="regex")
+        assert regex.engine == "regex"
+        assert "CASE WHEN" in regex.translate("IIF([A] > 0, 1, 0)")
+
+    def test_unknown_engine_rejected(self):
+        with pytest.raises(ValueError):
+            ExpressionTranslator(engine="magic")
+
+    # --- Caching ---
+    def test_translate_cache_hits(self):
+        t = ExpressionTranslator(cache_size=8)
+        for _ in range(3):
+            t.translate("ISNULL([Name])")
+        info = t.cache_info()
+        assert info.hits == 2
+        assert info.misses == 1
+        assert info.maxsize == 8
+
+    def test_translate_cache_is_bounded(self):
+        t = ExpressionTranslator(cache_size=2)
+        for i in range(5):
+            t.translate(f"[a] > {i}")
+        assert t.cache_info().currsize == 2
+        t.cache_clear()
+        assert t.cache_info().currsize == 0
+
+    def test_translate_cache_disabled(self):
+        t = ExpressionTranslator(cache_size=0)
+        t.translate("[a] > 1")
+        t.translate("[a] > 1")
+        assert t.cache_info().hits == 0
+
+    def test_regex_unsupported_annotates_nested_calls(self):
+        regex = ExpressionTranslator(engine="regex")
+        result = regex.translate("SPLIT(REGEXP_REPLACE([a], 'x', 'y'), ',', 1)")
+        assert "/* UNSUPPORTED: SPLIT */" in result
+        assert "/* UNSUPPORTED: REGEXP_REPLACE */" in result
+        result = regex.translate("REGEXP_EXTRACT_NTH([a], 'x', 1)")
+        assert result.startswith("/* UNSUPPORTED: REGEXP_EXTRACT_NTH */")
+
+
+class TestExpressionParser:
+    """Test the Tableau calculation lexer/parser."""
+
+    def test_precedence(self):
+        from cwprep.expression_parser import Binary, parse_expression
+
+        tree = parse_expression("[a] OR [b] AND NOT [c] = 1 + 2 * 3")
+        assert isinstance(tree, Binary) and tree.op == "OR"
+        assert tree.right.op == "AND"
+
+    def test_field_with_escaped_bracket(self):
+        from cwprep.expression_parser import Field, parse_expression
+
+        assert parse_expression("[a]]b]") == Field("a]b")
+
+    def test_comments_are_ignored(self):
+        from cwprep.expression_parser import SqlEmitter, parse_expression
+
+        tree = parse_expression("// note\n[a] + 1 /* inline */")
+        assert SqlEmitter().emit(tree) == '"a" + 1'
+
+    def test_case_expression(self):
+        from cwprep.expression_parser import SqlEmitter, parse_expression
+
+        tree = parse_expression("CASE [Region] WHEN 'E' THEN 1 ELSE 0 END")
+        assert SqlEmitter().emit(tree) == """CASE "Region" WHEN 'E' THEN 1 ELSE 0 END"""
+
+    @pytest.mark.parametrize("formula", ["IF [a] THEN 1", "UPPER([a]", "[a] +", "1 2"])
+    def test_syntax_errors(self, formula):
+        from cwprep.expression_parser import ExpressionSyntaxError, parse_expression
+
+        with pytest.raises(ExpressionSyntaxError):
+            parse_expression(formula)
 
 # ── SQLTranslator Tests ──────────────────────────────────────────────────────
 
@@ -322,6 +427,71 @@ class TestSQLTranslator:
         sql = SQLTranslator().translate_flow({})
         assert "Empty flow" in sql or "empty" in sql.lower()
 
+    def test_join_parents_resolved_by_namespace(self):
+        """Right input added before left input still lands on the right side."""
+        builder = TFLBuilder(flow_name="Join Order")
+        conn_id = builder.add_connection("localhost", "root", "testdb")
+        customers = builder.add_input_table("customers", "customers", conn_id)
+        orders = builder.add_input_table("orders", "orders", conn_id)
+        joined = builder.add_join("Join", orders, customers, "customer_id", "id")
+        builder.add_output_server("Output", joined, "Joined_DS")
+        flow, _, _ = builder.build()
+
+        sql = SQLTranslator(include_summary=False).translate_flow(flow)
+        assert "FROM orders\n    LEFT JOIN customers" in sql
+
+    def test_long_chain_keeps_parent_order(self):
+        builder = TFLBuilder(flow_name="Chain")
+        conn_id = builder.add_connection("localhost", "root", "testdb")
+        node = builder.add_input_table("orders", "orders", conn_id)
+        for i in range(50):
+            node = builder.add_filter(f"step {i}", node, f"[Amount] > {i}")
+        builder.add_output_server("Output", node, "Chain_DS")
+        flow, _, _ = builder.build()
+
+        sql = SQLTranslator(include_summary=False, include_comments=False).translate_flow(flow)
+        assert "FROM step_48" in sql
+        assert "SELECT * FROM step_49;" in sql
+
+
+class TestFlowGraph:
+    """Test the parent/child adjacency index."""
+
+    def test_parents_carry_namespaces(self):
+        from cwprep.graph import FlowGraph
+
+        builder = TFLBuilder(flow_name="Graph")
+        conn_id = builder.add_connection("localhost", "root", "testdb")
+        a = builder.add_input_table("a", "a", conn_id)
+        b = builder.add_input_table("b", "b", conn_id)
+        joined = builder.add_join("Join", a, b, "id", "id")
+        union = builder.add_union("Union", [joined, b])
+
+        graph = FlowGraph(builder.build()[0]["nodes"])
+        assert graph.parents_of(joined) == [(a, "Left"), (b, "Right")]
+        assert graph.parent_ids(union) == [b, joined]
+        assert all(ns.startswith("Union-Namespace-") for _, ns in graph.parents_of(union))
+        assert graph.child_ids(b) == [joined, union]
+        assert graph.parents_of("missing") == []
+
+    def test_topological_order_starts_with_initial_nodes(self):
+        from cwprep.graph import FlowGraph
+
+        nodes = {
+            "out": {"nextNodes": []},
+            "mid": {"nextNodes": [{"nextNodeId": "out", "nextNamespace": "Default"}]},
+            "b": {"nextNodes": [{"nextNodeId": "mid", "nextNamespace": "Right"}]},
+            "a": {"nextNodes": [{"nextNodeId": "mid", "nextNamespace": "Left"}]},
+        }
+        order = FlowGraph(nodes).topological_order(["a", "b"])
+        assert order == ["a", "b", "mid", "out"]
+
+    def test_topological_order_ignores_dangling_edges(self):
+        from cwprep.graph import FlowGraph
+
+        nodes = {"a": {"nextNodes": [{"nextNodeId": "gone", "nextNamespace": "Default"}]}}
+        assert FlowGraph(nodes).topological_order([]) == ["a"]
+
 
 # ── MCP Integration Tests ────────────────────────────────────────────────────
 